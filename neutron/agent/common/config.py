@@ -29,6 +29,15 @@ ROOT_HELPER_OPTS = [
                help=_('Root helper application.')),
 ]
 
+ROOT_HELPER_DAEMON_OPTS = [
+    cfg.StrOpt('root_helper_daemon',
+               help=_('Root helper daemon application to use when possible. '
+                      'Commands run as root are then sent to a single '
+                      'long-lived daemon instead of spawning the root '
+                      'helper for each of them, e.g. "sudo '
+                      'neutron-rootwrap-daemon /etc/neutron/rootwrap.conf".')),
+]
+
 AGENT_STATE_OPTS = [
     cfg.FloatOpt('report_interval', default=30,
                  help=_('Seconds between nodes reporting state to server; '
@@ -78,6 +87,7 @@ def register_root_helper(conf):
     # The first call is to ensure backward compatibility
     conf.register_opts(ROOT_HELPER_OPTS)
     conf.register_opts(ROOT_HELPER_OPTS, 'AGENT')
+    conf.register_opts(ROOT_HELPER_DAEMON_OPTS, 'AGENT')
 
 
 def register_agent_state_opts_helper(conf):
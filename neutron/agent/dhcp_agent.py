@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import itertools
 import os
 import sys
 
@@ -46,6 +47,14 @@ LOG = logging.getLogger(__name__)
 
 
 class DhcpAgent(manager.Manager):
+    """DHCP agent service manager.
+
+    API version history:
+        1.0 - Initial version.
+        1.1 - Added ports_create_end.
+    """
+    RPC_API_VERSION = '1.1'
+
     OPTS = [
         cfg.IntOpt('resync_interval', default=5,
                    help=_("Interval to resync.")),
@@ -60,6 +69,16 @@ class DhcpAgent(manager.Manager):
                            "enable_isolated_metadata = True")),
         cfg.IntOpt('num_sync_threads', default=4,
                    help=_('Number of threads to use during sync process.')),
+        cfg.IntOpt('sync_networks_chunk_size', default=100,
+                   help=_('Maximum number of networks fetched from the '
+                          'server at once during the sync process. Only '
+                          'the networks which changed are fetched.')),
+        cfg.FloatOpt('reload_allocations_delay', default=0.5,
+                     help=_('Minimum time in seconds between two reloads of '
+                            'the DHCP allocations of a network on port '
+                            'events. The events received meanwhile are '
+                            'handled by a single reload. 0 reloads the '
+                            'allocations on each event.')),
         cfg.StrOpt('metadata_proxy_socket',
                    default='$state_path/metadata_proxy',
                    help=_('Location of Metadata Proxy UNIX domain '
@@ -69,6 +88,12 @@ class DhcpAgent(manager.Manager):
     def __init__(self, host=None):
         super(DhcpAgent, self).__init__(host=host)
         self.needs_resync_reasons = []
+        # the ids of the networks whose allocations were reloaded less than
+        # reload_allocations_delay ago, mapped to whether they need another
+        # reload when this delay expires
+        self.pending_reloads = {}
+        self.reload_counts = {'allocation_reloads': 0,
+                              'coalesced_reloads': 0}
         self.conf = cfg.CONF
         self.cache = NetworkCache()
         self.root_helper = config.get_root_helper(self.conf)
@@ -157,8 +182,7 @@ class DhcpAgent(manager.Manager):
         known_network_ids = set(self.cache.get_network_ids())
 
         try:
-            active_networks = self.plugin_rpc.get_active_networks_info()
-            active_network_ids = set(network.id for network in active_networks)
+            active_network_ids, chunks = self._fetch_active_networks()
             for deleted_id in known_network_ids - active_network_ids:
                 try:
                     self.disable_dhcp_helper(deleted_id)
@@ -167,8 +191,11 @@ class DhcpAgent(manager.Manager):
                     LOG.exception(_('Unable to sync network state on deleted '
                                     'network %s'), deleted_id)
 
-            for network in active_networks:
-                pool.spawn(self.safe_configure_dhcp_for_network, network)
+            # The networks of a chunk are configured while the next chunk is
+            # fetched.
+            for active_networks in chunks:
+                for network in active_networks:
+                    pool.spawn(self.safe_configure_dhcp_for_network, network)
             pool.waitall()
             LOG.info(_('Synchronizing state complete'))
 
@@ -176,6 +203,77 @@ class DhcpAgent(manager.Manager):
             self.schedule_resync(e)
             LOG.exception(_('Unable to sync network state.'))
 
+    def _fetch_active_networks(self):
+        """Returns the ids of the active networks and the networks to sync.
+
+        The networks to sync are returned by chunks, they are fetched when
+        the chunks are iterated over, except for the first one.
+        """
+        try:
+            if self._has_configured_networks():
+                revisions = self.plugin_rpc.get_active_networks_revisions()
+                network_ids = list(revisions)
+                stale_network_ids = self._get_stale_network_ids(revisions)
+            else:
+                # Nothing was configured yet, e.g. the agent just started:
+                # all the networks have to be fetched, the server would
+                # load them twice if their revisions were fetched first.
+                network_ids = self.plugin_rpc.get_active_networks()
+                stale_network_ids = network_ids
+            chunk_size = self.conf.sync_networks_chunk_size
+            first_chunk = []
+            if stale_network_ids:
+                first_chunk = self.plugin_rpc.get_networks_info(
+                    stale_network_ids[:chunk_size])
+        except n_rpc.RemoteError as e:
+            if e.exc_type not in ('NoSuchMethod', 'UnsupportedVersion'):
+                raise
+            LOG.warn(_("Server does not support fetching the networks by "
+                       "chunks, all the networks will be fetched at once"))
+            networks = self.plugin_rpc.get_active_networks_info()
+            return set(network.id for network in networks), [networks]
+        return set(network_ids), itertools.chain(
+            [first_chunk],
+            self._fetch_networks_by_chunks(stale_network_ids[chunk_size:]))
+
+    def _has_configured_networks(self):
+        # The networks found on disk when the agent starts have no subnets
+        # until they are configured
+        return any(self.cache.get_network_by_id(network_id).subnets
+                   for network_id in self.cache.get_network_ids())
+
+    def _get_stale_network_ids(self, revisions):
+        """Returns the ids of the networks which have to be configured.
+
+        These are the networks which are not in cache, whose revision
+        changed or whose DHCP server is not running anymore.
+        """
+        stale_network_ids = []
+        for network_id, revision in revisions.iteritems():
+            network = self.cache.get_network_by_id(network_id)
+            if (not network or
+                    utils.get_dhcp_network_revision(network) != revision or
+                    not self._dhcp_active(network)):
+                stale_network_ids.append(network_id)
+        LOG.debug(_('%(stale)d of the %(total)d active networks have to be '
+                    'synchronized'),
+                  {'stale': len(stale_network_ids), 'total': len(revisions)})
+        return stale_network_ids
+
+    def _dhcp_active(self, network):
+        driver = self.dhcp_driver_cls(self.conf,
+                                      network,
+                                      self.root_helper,
+                                      self.dhcp_version,
+                                      self.plugin_rpc)
+        return driver.active
+
+    def _fetch_networks_by_chunks(self, network_ids):
+        chunk_size = self.conf.sync_networks_chunk_size
+        for i in range(0, len(network_ids), chunk_size):
+            yield self.plugin_rpc.get_networks_info(
+                network_ids[i:i + chunk_size])
+
     def _periodic_resync_helper(self):
         """Resync the dhcp state at the configured interval."""
         while True:
@@ -265,6 +363,30 @@ class DhcpAgent(manager.Manager):
         else:
             self.disable_dhcp_helper(network.id)
 
+    def reload_allocations_helper(self, network):
+        """Reload the DHCP allocations of a network on port events.
+
+        The allocations are reloaded at once, and then at most once every
+        reload_allocations_delay seconds for the events received meanwhile.
+        """
+        if network.id in self.pending_reloads:
+            self.pending_reloads[network.id] = True
+            self.reload_counts['coalesced_reloads'] += 1
+            return
+        self.call_driver('reload_allocations', network)
+        self.reload_counts['allocation_reloads'] += 1
+        if self.conf.reload_allocations_delay > 0:
+            self.pending_reloads[network.id] = False
+            eventlet.spawn_after(self.conf.reload_allocations_delay,
+                                 self._pending_reload_expired, network.id)
+
+    @utils.synchronized('dhcp-agent')
+    def _pending_reload_expired(self, network_id):
+        if self.pending_reloads.pop(network_id, False):
+            network = self.cache.get_network_by_id(network_id)
+            if network:
+                self.reload_allocations_helper(network)
+
     @utils.synchronized('dhcp-agent')
     def network_create_end(self, context, payload):
         """Handle the network.create.end notification event."""
@@ -309,11 +431,21 @@ class DhcpAgent(manager.Manager):
         network = self.cache.get_network_by_id(updated_port.network_id)
         if network:
             self.cache.put_port(updated_port)
-            self.call_driver('reload_allocations', network)
+            self.reload_allocations_helper(network)
 
     # Use the update handler for the port create event.
     port_create_end = port_update_end
 
+    @utils.synchronized('dhcp-agent')
+    def ports_create_end(self, context, payload):
+        """Handle the creation of many ports of the same network."""
+        ports = [dhcp.DictModel(port) for port in payload['ports']]
+        network = self.cache.get_network_by_id(ports[0].network_id)
+        if network:
+            for port in ports:
+                self.cache.put_port(port)
+            self.reload_allocations_helper(network)
+
     @utils.synchronized('dhcp-agent')
     def port_delete_end(self, context, payload):
         """Handle the port.delete.end notification event."""
@@ -321,7 +453,7 @@ class DhcpAgent(manager.Manager):
         if port:
             network = self.cache.get_network_by_id(port.network_id)
             self.cache.remove_port(port)
-            self.call_driver('reload_allocations', network)
+            self.reload_allocations_helper(network)
 
     def enable_isolated_metadata_proxy(self, network):
 
@@ -384,6 +516,8 @@ class DhcpPluginApi(n_rpc.RpcProxy):
         1.0 - Initial version.
         1.1 - Added get_active_networks_info, create_dhcp_port,
               and update_dhcp_port methods.
+        1.2 - Added get_active_networks_revisions and get_networks_info,
+              to sync only the networks which changed, by chunks.
 
     """
 
@@ -404,6 +538,31 @@ class DhcpPluginApi(n_rpc.RpcProxy):
                              topic=self.topic)
         return [dhcp.NetModel(self.use_namespaces, n) for n in networks]
 
+    def get_active_networks_revisions(self):
+        """Make a remote process call to retrieve the network revisions."""
+        return self.call(self.context,
+                         self.make_msg('get_active_networks_revisions',
+                                       host=self.host),
+                         topic=self.topic,
+                         version='1.2')
+
+    def get_networks_info(self, network_ids):
+        """Make a remote process call to retrieve info of networks."""
+        networks = self.call(self.context,
+                             self.make_msg('get_networks_info',
+                                           network_ids=network_ids,
+                                           host=self.host),
+                             topic=self.topic,
+                             version='1.2')
+        return [dhcp.NetModel(self.use_namespaces, n) for n in networks]
+
+    def get_active_networks(self):
+        """Make a remote process call to retrieve the active network ids."""
+        return self.call(self.context,
+                         self.make_msg('get_active_networks',
+                                       host=self.host),
+                         topic=self.topic)
+
     def get_network_info(self, network_id):
         """Make a remote process call to retrieve network info."""
         network = self.call(self.context,
@@ -558,7 +717,8 @@ class DhcpAgentWithStateReport(DhcpAgent):
             'configurations': {
                 'dhcp_driver': cfg.CONF.dhcp_driver,
                 'use_namespaces': cfg.CONF.use_namespaces,
-                'dhcp_lease_duration': cfg.CONF.dhcp_lease_duration},
+                'dhcp_lease_duration': cfg.CONF.dhcp_lease_duration,
+                constants.DHCP_AGENT_BULK_PORT_NOTIFICATIONS: True},
             'start_flag': True,
             'agent_type': constants.AGENT_TYPE_DHCP}
         report_interval = cfg.CONF.AGENT.report_interval
@@ -572,6 +732,8 @@ class DhcpAgentWithStateReport(DhcpAgent):
         try:
             self.agent_state.get('configurations').update(
                 self.cache.get_state())
+            self.agent_state.get('configurations').update(
+                self.reload_counts)
             ctx = context.get_admin_context_without_session()
             self.state_rpc.report_state(ctx, self.agent_state, self.use_call)
             self.use_call = False
@@ -83,6 +83,21 @@ class FirewallDriver(object):
         """Stop filtering port."""
         raise NotImplementedError()
 
+    def update_security_group_rules(self, sg_id, rules):
+        """Update the rules of a security group.
+
+        Only used when the agent fetches rules per security group instead
+        of per port; the ports then only reference the group by its id.
+        """
+        pass
+
+    def update_security_group_members(self, sg_id, member_ips):
+        """Update the member ips of a remote security group.
+
+        member_ips is a dict of lists of ips keyed by ethertype.
+        """
+        pass
+
     def filter_defer_apply_on(self):
         """Defer application of filtering rule."""
         pass
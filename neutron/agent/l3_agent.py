@@ -14,6 +14,7 @@
 #
 
 import sys
+import time
 
 import datetime
 import eventlet
@@ -70,6 +71,9 @@ FLOATING_IP_CIDR_SUFFIX = '/32'
 PRIORITY_RPC = 0
 PRIORITY_SYNC_ROUTERS_TASK = 1
 DELETE_ROUTER = 1
+# The chunk size is halved down to this value when fetching a chunk of
+# routers times out
+SYNC_ROUTERS_MIN_CHUNK_SIZE = 32
 
 
 class L3PluginApi(n_rpc.RpcProxy):
@@ -82,6 +86,7 @@ class L3PluginApi(n_rpc.RpcProxy):
               - get_ports_by_subnet
               - get_agent_gateway_port
               Needed by the agent when operating in DVR/DVR_SNAT mode
+        1.3 - get_router_ids, to fetch the routers of a full sync by chunks
 
     """
 
@@ -99,6 +104,13 @@ class L3PluginApi(n_rpc.RpcProxy):
                                        router_ids=router_ids),
                          topic=self.topic)
 
+    def get_router_ids(self, context):
+        """Make a remote process call to retrieve the IDs of the routers."""
+        return self.call(context,
+                         self.make_msg('get_router_ids', host=self.host),
+                         topic=self.topic,
+                         version='1.3')
+
     def get_external_network_id(self, context):
         """Make a remote process call to retrieve the external network id.
 
@@ -311,6 +323,10 @@ class RouterProcessingQueue(object):
     def add(self, update):
         self._queue.put(update)
 
+    def qsize(self):
+        """Returns the approximate number of updates waiting for a worker."""
+        return self._queue.qsize()
+
     def each_update_to_next_router(self):
         """Grabs the next router from the queue and processes
 
@@ -390,6 +406,14 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
                    default='$state_path/metadata_proxy',
                    help=_('Location of Metadata Proxy UNIX domain '
                           'socket')),
+        cfg.IntOpt('router_processing_workers', default=8,
+                   help=_("Number of routers processed concurrently. "
+                          "Updates of a given router are always processed "
+                          "in order by a single worker.")),
+        cfg.IntOpt('sync_routers_chunk_size', default=256,
+                   help=_("Maximum number of routers fetched from the server "
+                          "at once during a full sync. The routers of a chunk "
+                          "are processed while the next one is fetched.")),
     ]
 
     def __init__(self, host, conf=None):
@@ -429,6 +453,10 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
         self.fip_priorities = set(range(FIP_PR_START, FIP_PR_END))
 
         self._queue = RouterProcessingQueue()
+        # routers left to process before the last full sync is complete
+        self._resync_router_ids = set()
+        self._resync_start = None
+        self.sync_routers_chunk_size = self.conf.sync_routers_chunk_size
         super(L3NATAgent, self).__init__(conf=self.conf)
 
         self.target_ex_net_id = None
@@ -1558,9 +1586,24 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
             pool.spawn_n(self._router_removed, router_id)
         pool.waitall()
 
+    def _router_update_done(self, router_id, start):
+        LOG.debug("Finished a router update for %(router_id)s in "
+                  "%(elapsed).3f seconds, %(depth)d updates queued",
+                  {'router_id': router_id, 'elapsed': time.time() - start,
+                   'depth': self._queue.qsize()})
+        self._resync_router_done(router_id)
+
+    def _resync_router_done(self, router_id):
+        if router_id in self._resync_router_ids:
+            self._resync_router_ids.discard(router_id)
+            if not self._resync_router_ids:
+                LOG.info(_("Full sync of routers completed in %.3f seconds"),
+                         time.time() - self._resync_start)
+
     def _process_router_update(self):
         for rp, update in self._queue.each_update_to_next_router():
             LOG.debug("Starting router update for %s", update.id)
+            start = time.time()
             router = update.router
             if update.action != DELETE_ROUTER and not router:
                 try:
@@ -1578,15 +1621,16 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
 
             if not router:
                 self._router_removed(update.id)
+                self._router_update_done(update.id, start)
                 continue
 
             self._process_routers([router])
-            LOG.debug("Finished a router update for %s", update.id)
+            self._router_update_done(update.id, start)
             rp.fetched_and_processed(update.timestamp)
 
     def _process_routers_loop(self):
         LOG.debug("Starting _process_routers_loop")
-        pool = eventlet.GreenPool(size=8)
+        pool = eventlet.GreenPool(size=self.conf.router_processing_workers)
         while True:
             pool.spawn_n(self._process_router_update)
 
@@ -1600,6 +1644,26 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
         if not self.conf.use_namespaces:
             return [self.conf.router_id]
 
+    def _fetch_router_ids(self, context):
+        """Returns the IDs of the routers to sync.
+
+        None is returned if the server does not support fetching them, in
+        which case all the routers have to be fetched at once.
+        """
+        try:
+            return self.plugin_rpc.get_router_ids(context)
+        except n_rpc.RemoteError as e:
+            if e.exc_type != 'UnsupportedVersion':
+                raise
+            LOG.warn(_("Server does not support fetching the router IDs, "
+                       "all the routers will be fetched at once"))
+
+    def _fetch_routers_by_chunks(self, context, router_ids):
+        chunk_size = self.sync_routers_chunk_size
+        for i in range(0, len(router_ids), chunk_size):
+            yield self.plugin_rpc.get_routers(context,
+                                              router_ids[i:i + chunk_size])
+
     @periodic_task.periodic_task
     def periodic_sync_routers_task(self, context):
         self._sync_routers_task(context)
@@ -1624,18 +1688,48 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
             self.updated_routers.clear()
             self.removed_routers.clear()
             timestamp = timeutils.utcnow()
-            routers = self.plugin_rpc.get_routers(
-                context, router_ids)
-
-            LOG.debug(_('Processing :%r'), routers)
-            for r in routers:
-                update = RouterUpdate(r['id'],
-                                      PRIORITY_SYNC_ROUTERS_TASK,
-                                      router=r,
-                                      timestamp=timestamp)
-                self._queue.add(update)
+            resync_start = time.time()
+            if router_ids is None:
+                router_ids = self._fetch_router_ids(context)
+            if router_ids is None:
+                chunks = [self.plugin_rpc.get_routers(context)]
+                router_ids = [r['id'] for r in chunks[0]]
+            else:
+                chunks = self._fetch_routers_by_chunks(context, router_ids)
+            self._resync_start = resync_start
+            self._resync_router_ids = set(router_ids) | prev_router_ids
+
+            # The routers of a chunk are processed by the workers while the
+            # next chunk is fetched.
+            curr_router_ids = set()
+            for routers in chunks:
+                LOG.debug(_('Processing :%r'), routers)
+                for r in routers:
+                    curr_router_ids.add(r['id'])
+                    update = RouterUpdate(r['id'],
+                                          PRIORITY_SYNC_ROUTERS_TASK,
+                                          router=r,
+                                          timestamp=timestamp)
+                    self._queue.add(update)
+            # Routers deleted meanwhile will not be processed
+            for router_id in set(router_ids) - curr_router_ids:
+                if router_id not in prev_router_ids:
+                    self._resync_router_done(router_id)
             self.fullsync = False
-            LOG.debug(_("_sync_routers_task successfully completed"))
+            LOG.debug(_("_sync_routers_task successfully completed, "
+                        "%d router updates queued"), self._queue.qsize())
+        except n_rpc.MessagingTimeout:
+            if self.sync_routers_chunk_size > SYNC_ROUTERS_MIN_CHUNK_SIZE:
+                self.sync_routers_chunk_size = max(
+                    self.sync_routers_chunk_size / 2,
+                    SYNC_ROUTERS_MIN_CHUNK_SIZE)
+                LOG.error(_("Server failed to return the routers in time, "
+                            "decreasing the chunk size to %d"),
+                          self.sync_routers_chunk_size)
+            else:
+                LOG.exception(_("Failed synchronizing routers due to RPC "
+                                "error"))
+            self.fullsync = True
         except n_rpc.RPCException:
             LOG.exception(_("Failed synchronizing routers due to RPC error"))
             self.fullsync = True
@@ -1644,8 +1738,6 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback, manager.Manager):
             self.fullsync = True
         else:
             # Resync is not necessary for the cleanup of stale namespaces
-            curr_router_ids = set([r['id'] for r in routers])
-
             # Two kinds of stale routers:  Routers for which info is cached in
             # self.router_info and the others.  First, handle the former.
             for router_id in prev_router_ids - curr_router_ids:
@@ -1739,6 +1831,7 @@ class L3NATAgentWithStateReport(L3NATAgent):
         configurations['ex_gw_ports'] = num_ex_gw_ports
         configurations['interfaces'] = num_interfaces
         configurations['floating_ips'] = num_floating_ips
+        configurations['router_updates_queued'] = self._queue.qsize()
         try:
             self.state_rpc.report_state(self.context, self.agent_state,
                                         self.use_call)
@@ -15,6 +15,7 @@
 
 import abc
 import collections
+import hashlib
 import os
 import re
 import shutil
@@ -178,6 +179,12 @@ class DhcpBase(object):
 
 class DhcpLocalProcess(DhcpBase):
     PORTS = []
+    # the digests of the config files written by the agent, shared by the
+    # driver instances, so that the files are not rewritten and the DHCP
+    # server not reloaded when their content does not change
+    _conf_file_digests = {}
+    # set when a config file is written with a new content
+    conf_files_changed = False
 
     def _enable_dhcp(self):
         """check if there is a subnet within the network with dhcp enabled."""
@@ -190,7 +197,12 @@ class DhcpLocalProcess(DhcpBase):
         """Enables DHCP for this network by spawning a local process."""
         interface_name = self.device_manager.setup(self.network)
         if self.active:
-            self.restart()
+            if self._process_is_current(interface_name):
+                LOG.debug(_('Reusing the DHCP process of network %s'),
+                          self.network.id)
+                self.reload_allocations()
+            else:
+                self.restart()
         elif self._enable_dhcp():
             self.interface_name = interface_name
             self.spawn_process()
@@ -229,6 +241,9 @@ class DhcpLocalProcess(DhcpBase):
         confs_dir = os.path.abspath(os.path.normpath(self.conf.dhcp_confs))
         conf_dir = os.path.join(confs_dir, self.network.id)
         shutil.rmtree(conf_dir, ignore_errors=True)
+        for file_name in self._conf_file_digests.keys():
+            if os.path.dirname(file_name) == conf_dir:
+                del self._conf_file_digests[file_name]
 
     def get_conf_file_name(self, kind, ensure_conf_dir=False):
         """Returns the file name for a given kind of config file."""
@@ -257,6 +272,38 @@ class DhcpLocalProcess(DhcpBase):
         LOG.debug(msg % file_name)
         return None
 
+    def _replace_conf_file(self, file_name, data):
+        """Write a config file unless it was last written with that data."""
+        if isinstance(data, six.text_type):
+            data = data.encode('utf-8')
+        digest = hashlib.sha1(data).hexdigest()
+        if self._conf_file_digests.get(file_name) == digest:
+            return
+        utils.replace_file(file_name, data)
+        self._conf_file_digests[file_name] = digest
+        self.conf_files_changed = True
+
+    def _get_process_cmdline(self):
+        """Returns the arguments of the running DHCP process, if any."""
+        pid = self.pid
+        if pid is None:
+            return None
+
+        try:
+            with open('/proc/%s/cmdline' % pid, 'r') as f:
+                return f.read().rstrip('\0').split('\0')
+        except IOError:
+            return None
+
+    def _process_is_current(self, interface_name):
+        """Whether the running process serves the current configuration.
+
+        Such a process only has to reload its allocations instead of being
+        restarted when DHCP is enabled again for the network, e.g. when the
+        agent restarts.
+        """
+        return False
+
     @property
     def pid(self):
         """Last known pid for the DHCP process spawned for this network."""
@@ -341,6 +388,26 @@ class Dnsmasq(DhcpLocalProcess):
             self.NEUTRON_NETWORK_ID_KEY: self.network.id,
         }
 
+        cmd = self._build_cmdline()
+        self._output_hosts_file()
+        self._output_addn_hosts_file()
+        self._output_opts_file()
+
+        ip_wrapper = ip_lib.IPWrapper(self.root_helper,
+                                      self.network.namespace)
+        ip_wrapper.netns.execute(cmd, addl_env=env)
+
+    def _process_is_current(self, interface_name):
+        """Whether dnsmasq was spawned with the current command line.
+
+        The allocations are in files dnsmasq reloads, the other settings are
+        in its command line.
+        """
+        return (self.interface_name == interface_name and
+                self._get_process_cmdline() == self._build_cmdline())
+
+    def _build_cmdline(self):
+        """Returns the command line spawning dnsmasq for the network."""
         cmd = [
             'dnsmasq',
             '--no-hosts',
@@ -351,9 +418,9 @@ class Dnsmasq(DhcpLocalProcess):
             '--except-interface=lo',
             '--pid-file=%s' % self.get_conf_file_name(
                 'pid', ensure_conf_dir=True),
-            '--dhcp-hostsfile=%s' % self._output_hosts_file(),
-            '--addn-hosts=%s' % self._output_addn_hosts_file(),
-            '--dhcp-optsfile=%s' % self._output_opts_file(),
+            '--dhcp-hostsfile=%s' % self.get_conf_file_name('host'),
+            '--addn-hosts=%s' % self.get_conf_file_name('addn_hosts'),
+            '--dhcp-optsfile=%s' % self.get_conf_file_name('opts'),
             '--leasefile-ro',
         ]
 
@@ -413,9 +480,7 @@ class Dnsmasq(DhcpLocalProcess):
         if self.conf.dhcp_domain:
             cmd.append('--domain=%s' % self.conf.dhcp_domain)
 
-        ip_wrapper = ip_lib.IPWrapper(self.root_helper,
-                                      self.network.namespace)
-        ip_wrapper.netns.execute(cmd, addl_env=env)
+        return cmd
 
     def _release_lease(self, mac_address, ip):
         """Release a DHCP lease."""
@@ -435,9 +500,14 @@ class Dnsmasq(DhcpLocalProcess):
             return
 
         self._release_unused_leases()
+        self.conf_files_changed = False
         self._output_hosts_file()
         self._output_addn_hosts_file()
         self._output_opts_file()
+        if not self.conf_files_changed and self.active:
+            LOG.debug(_('DHCP configuration of network %s is unchanged, '
+                        'not reloading dnsmasq'), self.network.id)
+            return
         if self.active:
             cmd = ['kill', '-HUP', self.pid]
             utils.execute(cmd, self.root_helper)
@@ -520,7 +590,7 @@ class Dnsmasq(DhcpLocalProcess):
                 buf.write('%s,%s,%s\n' %
                           (port.mac_address, name, ip_address))
 
-        utils.replace_file(filename, buf.getvalue())
+        self._replace_conf_file(filename, buf.getvalue())
         LOG.debug(_('Done building host file %s'), filename)
         return filename
 
@@ -561,7 +631,7 @@ class Dnsmasq(DhcpLocalProcess):
             # order to obtain it in PTR responses.
             buf.write('%s\t%s %s\n' % (alloc.ip_address, fqdn, hostname))
         addn_hosts = self.get_conf_file_name('addn_hosts')
-        utils.replace_file(addn_hosts, buf.getvalue())
+        self._replace_conf_file(addn_hosts, buf.getvalue())
         return addn_hosts
 
     def _output_opts_file(self):
@@ -642,7 +712,7 @@ class Dnsmasq(DhcpLocalProcess):
                                                    ','.join(ips)))
 
         name = self.get_conf_file_name('opts')
-        utils.replace_file(name, '\n'.join(options))
+        self._replace_conf_file(name, '\n'.join(options))
         return name
 
     def _make_subnet_interface_ip_map(self):
@@ -0,0 +1,107 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Manages kernel ipsets used to match remote security group members."""
+
+from neutron.agent.linux import utils as linux_utils
+from neutron.common import utils
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# ipset set names are limited to 31 characters, and we need room for the
+# suffix of the temporary set used when swapping in a full refresh.
+SWAP_SUFFIX = '-n'
+IPSET_NAME_MAX_LENGTH = 31 - len(SWAP_SUFFIX)
+
+# Above this number of changes a set is rebuilt and swapped in with a
+# single 'ipset restore' instead of issuing one add/del per member.
+IPSET_ADD_BULK_THRESHOLD = 5
+
+IPSET_FAMILY = {'IPv4': 'inet', 'IPv6': 'inet6'}
+
+
+def get_ipset_name(sg_id, ethertype):
+    """Return the name of the ipset holding members of a security group."""
+    return ('%s%s' % (ethertype, sg_id))[:IPSET_NAME_MAX_LENGTH]
+
+
+class IpsetManager(object):
+    """Wrapper for the ipset command line tool.
+
+    The manager remembers the members it has programmed in each set so
+    that a membership change only issues the add/del commands needed to
+    reach the new state.
+    """
+
+    def __init__(self, execute=None, root_helper=None, namespace=None):
+        self.execute = execute or linux_utils.execute
+        self.root_helper = root_helper
+        self.namespace = namespace
+        self.ipset_sets = {}
+
+    def set_exists(self, set_name):
+        return set_name in self.ipset_sets
+
+    @utils.synchronized('ipset', external=True)
+    def set_members(self, set_name, ethertype, member_ips):
+        """Make the content of an ipset match the given member ips.
+
+        The set is created if it does not exist yet.
+        """
+        new_members = set(member_ips)
+        if set_name not in self.ipset_sets:
+            self._refresh_ipset(set_name, ethertype, new_members)
+            return
+        old_members = self.ipset_sets[set_name]
+        to_add = new_members - old_members
+        to_del = old_members - new_members
+        if len(to_add) + len(to_del) > IPSET_ADD_BULK_THRESHOLD:
+            self._refresh_ipset(set_name, ethertype, new_members)
+            return
+        for member_ip in sorted(to_add):
+            self._apply(['ipset', 'add', '-exist', set_name, member_ip])
+        for member_ip in sorted(to_del):
+            self._apply(['ipset', 'del', '-exist', set_name, member_ip])
+        self.ipset_sets[set_name] = new_members
+
+    @utils.synchronized('ipset', external=True)
+    def destroy_ipset(self, set_name):
+        if set_name not in self.ipset_sets:
+            return
+        self._apply(['ipset', 'destroy', set_name], check_exit_code=False)
+        del self.ipset_sets[set_name]
+
+    def _refresh_ipset(self, set_name, ethertype, member_ips):
+        """Rebuild a set atomically by swapping in a fully populated copy."""
+        new_set_name = set_name + SWAP_SUFFIX
+        family = IPSET_FAMILY[ethertype]
+        process_input = ['create %s hash:ip family %s -exist' %
+                         (set_name, family),
+                         'create %s hash:ip family %s -exist' %
+                         (new_set_name, family),
+                         'flush %s' % new_set_name]
+        for member_ip in sorted(member_ips):
+            process_input.append('add %s %s' % (new_set_name, member_ip))
+        process_input += ['swap %s %s' % (new_set_name, set_name),
+                          'destroy %s' % new_set_name]
+        self._apply(['ipset', 'restore', '-exist'],
+                    process_input='\n'.join(process_input) + '\n')
+        self.ipset_sets[set_name] = set(member_ips)
+
+    def _apply(self, cmd, process_input=None, check_exit_code=True):
+        if self.namespace:
+            cmd = ['ip', 'netns', 'exec', self.namespace] + cmd
+        LOG.debug(_("Running ipset command: %s"), cmd)
+        return self.execute(cmd, root_helper=self.root_helper,
+                            process_input=process_input,
+                            check_exit_code=check_exit_code)
@@ -13,16 +13,21 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
+
 import netaddr
 from oslo.config import cfg
 
 from neutron.agent import firewall
+from neutron.agent.linux import ipset_manager
 from neutron.agent.linux import iptables_manager
 from neutron.common import constants
 from neutron.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
+cfg.CONF.import_opt('enable_ipset', 'neutron.agent.securitygroups_rpc',
+                    group='SECURITYGROUP')
 SG_CHAIN = 'sg-chain'
 INGRESS_DIRECTION = 'ingress'
 EGRESS_DIRECTION = 'egress'
@@ -30,6 +35,13 @@ SPOOF_FILTER = 'spoof-filter'
 CHAIN_NAME_PREFIX = {INGRESS_DIRECTION: 'i',
                      EGRESS_DIRECTION: 'o',
                      SPOOF_FILTER: 's'}
+# prefix of the chains shared by the ports of a same set of security groups
+SG_SET_CHAIN_NAME_PREFIX = {INGRESS_DIRECTION: 'gi',
+                            EGRESS_DIRECTION: 'go'}
+DIRECTION_IP_PREFIX = {INGRESS_DIRECTION: 'source_ip_prefix',
+                       EGRESS_DIRECTION: 'dest_ip_prefix'}
+IPSET_DIRECTION = {INGRESS_DIRECTION: 'src',
+                   EGRESS_DIRECTION: 'dst'}
 LINUX_DEV_LEN = 14
 
 
@@ -41,9 +53,22 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
     def __init__(self):
         self.iptables = iptables_manager.IptablesManager(
             root_helper=cfg.CONF.AGENT.root_helper,
-            use_ipv6=True)
+            use_ipv6=True,
+            incremental_apply=True)
+        self.ipset = ipset_manager.IpsetManager(
+            root_helper=cfg.CONF.AGENT.root_helper)
+        self.enable_ipset = cfg.CONF.SECURITYGROUP.enable_ipset
         # list of port which has security group
         self.filtered_ports = {}
+        # rules and member ips of security groups, keyed by security group
+        # id, when they are not provided in the port itself
+        self.sg_rules = {}
+        self.sg_members = {}
+        # iptables rules compiled for a set of security groups, keyed by
+        # direction and security group ids, and the names of their chains
+        # currently set up
+        self.sg_set_chains = {}
+        self._sg_set_chain_names = set()
         self._add_fallback_chain_v4v6()
         self._defer_apply = False
         self._pre_defer_filtered_ports = None
@@ -52,6 +77,27 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
     def ports(self):
         return self.filtered_ports
 
+    def update_security_group_rules(self, sg_id, sg_rules):
+        LOG.debug(_("Update rules of security group (%s)"), sg_id)
+        if self.sg_rules.get(sg_id) != sg_rules:
+            # rules of the sets of security groups including it must be
+            # compiled again
+            for key in self.sg_set_chains.keys():
+                if sg_id in key[1]:
+                    del self.sg_set_chains[key]
+        self.sg_rules[sg_id] = sg_rules
+
+    def update_security_group_members(self, sg_id, sg_members):
+        LOG.debug(_("Update members of security group (%s)"), sg_id)
+        self.sg_members[sg_id] = sg_members
+        if self.enable_ipset and not self._defer_apply:
+            # Only sets already referenced by port chains are refreshed,
+            # the others are created when a port chain needs them.
+            for ethertype, member_ips in sg_members.items():
+                ipset_name = ipset_manager.get_ipset_name(sg_id, ethertype)
+                if self.ipset.set_exists(ipset_name):
+                    self.ipset.set_members(ipset_name, ethertype, member_ips)
+
     def prepare_port_filter(self, port):
         LOG.debug(_("Preparing device (%s) filter"), port['device'])
         self._remove_chains()
@@ -59,6 +105,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         # each security group has it own chains
         self._setup_chains()
         self.iptables.apply()
+        self._remove_unused_ipsets()
 
     def update_port_filter(self, port):
         LOG.debug(_("Updating device (%s) filter"), port['device'])
@@ -70,6 +117,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self.filtered_ports[port['device']] = port
         self._setup_chains()
         self.iptables.apply()
+        self._remove_unused_ipsets()
 
     def remove_port_filter(self, port):
         LOG.debug(_("Removing device (%s) filter"), port['device'])
@@ -81,6 +129,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self.filtered_ports.pop(port['device'], None)
         self._setup_chains()
         self.iptables.apply()
+        self._remove_unused_ipsets()
 
     def _setup_chains(self):
         """Setup ingress and egress chain for a port."""
@@ -88,12 +137,51 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             self._setup_chains_apply(self.filtered_ports)
 
     def _setup_chains_apply(self, ports):
+        if self.enable_ipset:
+            self._update_ipset_members(ports)
         self._add_chain_by_name_v4v6(SG_CHAIN)
         for port in ports.values():
             self._setup_chain(port, INGRESS_DIRECTION)
             self._setup_chain(port, EGRESS_DIRECTION)
             self.iptables.ipv4['filter'].add_rule(SG_CHAIN, '-j ACCEPT')
             self.iptables.ipv6['filter'].add_rule(SG_CHAIN, '-j ACCEPT')
+        # forget the rules compiled for sets no port uses anymore
+        for key in self.sg_set_chains.keys():
+            if self.sg_set_chains[key][0] not in self._sg_set_chain_names:
+                del self.sg_set_chains[key]
+
+    def _get_remote_sg_ethertypes(self, ports):
+        """Return the (security group id, ethertype) used as remote."""
+        remote_sgs = set()
+        for port in ports.values():
+            for sg_id in port.get('security_groups', []):
+                for rule in self.sg_rules.get(sg_id, []):
+                    if rule.get('remote_group_id'):
+                        remote_sgs.add((rule['remote_group_id'],
+                                        rule['ethertype']))
+        return remote_sgs
+
+    def _update_ipset_members(self, ports):
+        for sg_id, ethertype in self._get_remote_sg_ethertypes(ports):
+            member_ips = self.sg_members.get(sg_id, {}).get(ethertype, [])
+            self.ipset.set_members(
+                ipset_manager.get_ipset_name(sg_id, ethertype),
+                ethertype, member_ips)
+
+    def _remove_unused_ipsets(self):
+        """Destroy the ipsets no longer referenced by any port chain.
+
+        This must only run once the iptables rules using them have been
+        removed from the kernel.
+        """
+        if not self.enable_ipset or self._defer_apply:
+            return
+        used_ipsets = set(
+            ipset_manager.get_ipset_name(sg_id, ethertype)
+            for sg_id, ethertype in self._get_remote_sg_ethertypes(
+                self.filtered_ports))
+        for ipset_name in set(self.ipset.ipset_sets) - used_ipsets:
+            self.ipset.destroy_ipset(ipset_name)
 
     def _remove_chains(self):
         """Remove ingress and egress chain for a port."""
@@ -105,6 +193,9 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             self._remove_chain(port, INGRESS_DIRECTION)
             self._remove_chain(port, EGRESS_DIRECTION)
             self._remove_chain(port, SPOOF_FILTER)
+        for chain_name in self._sg_set_chain_names:
+            self._remove_chain_by_name_v4v6(chain_name)
+        self._sg_set_chain_names = set()
         self._remove_chain_by_name_v4v6(SG_CHAIN)
 
     def _setup_chain(self, port, DIRECTION):
@@ -174,13 +265,28 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                 ipv4_sg_rules.append(rule)
             elif rule.get('ethertype') == constants.IPv6:
                 if rule.get('protocol') == 'icmp':
-                    rule['protocol'] = 'icmpv6'
+                    # do not modify the rules of the port, they are
+                    # compared with the rules of the next refresh
+                    rule = dict(rule, protocol='icmpv6')
                 ipv6_sg_rules.append(rule)
         return ipv4_sg_rules, ipv6_sg_rules
 
-    def _select_sgr_by_direction(self, port, direction):
+    def _select_sgr_by_direction(self, port, direction,
+                                 with_sg_rules=True):
+        rules = [rule
+                 for rule in port.get('security_group_rules', [])
+                 if rule['direction'] == direction]
+        if with_sg_rules:
+            rules += self._select_sg_rules_by_direction(
+                port.get('security_groups', []), direction)
+        return rules
+
+    def _select_sg_rules_by_direction(self, sg_ids, direction):
+        # The rules of security groups are only known by the firewall in
+        # ipset mode, where remote groups are matched with their ipset.
         return [rule
-                for rule in port.get('security_group_rules', [])
+                for sg_id in sg_ids
+                for rule in self.sg_rules.get(sg_id, [])
                 if rule['direction'] == direction]
 
     def _setup_spoof_filter_chain(self, port, table, mac_ip_pairs, rules):
@@ -249,10 +355,53 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                              icmp6_type]
         return icmpv6_rules
 
+    def _get_sg_set_ids(self, port):
+        """Return the security groups whose rules can be shared.
+
+        The rules of security groups are only the same for every port when
+        remote groups are matched with ipsets instead of being expanded
+        with the member ips of each port.
+        """
+        if not self.enable_ipset:
+            return ()
+        return tuple(sorted(sg_id for sg_id in port.get('security_groups', [])
+                            if sg_id in self.sg_rules))
+
+    def _sg_set_chain_name(self, sg_ids, direction):
+        digest = hashlib.sha1(','.join(sg_ids)).hexdigest()
+        return iptables_manager.get_chain_name(
+            '%s%s' % (SG_SET_CHAIN_NAME_PREFIX[direction], digest))
+
+    def _setup_sg_set_chain(self, sg_ids, direction):
+        """Setup the chain shared by the ports of a set of security groups.
+
+        Rules are only compiled again once the rules of one of the groups
+        changed.
+        """
+        key = (direction, sg_ids)
+        if key not in self.sg_set_chains:
+            ipv4_sg_rules, ipv6_sg_rules = self._split_sgr_by_ethertype(
+                self._select_sg_rules_by_direction(sg_ids, direction))
+            self.sg_set_chains[key] = (
+                self._sg_set_chain_name(sg_ids, direction),
+                self._build_sgr_iptables_rules(ipv4_sg_rules) +
+                ['-j $sg-fallback'],
+                self._build_sgr_iptables_rules(ipv6_sg_rules) +
+                ['-j $sg-fallback'])
+        chain_name, ipv4_rules, ipv6_rules = self.sg_set_chains[key]
+        if chain_name not in self._sg_set_chain_names:
+            self._add_chain_by_name_v4v6(chain_name)
+            self._add_rule_to_chain_v4v6(chain_name, ipv4_rules, ipv6_rules)
+            self._sg_set_chain_names.add(chain_name)
+        return chain_name
+
     def _add_rule_by_security_group(self, port, direction):
         chain_name = self._port_chain_name(port, direction)
-        # select rules for current direction
-        security_group_rules = self._select_sgr_by_direction(port, direction)
+        sg_ids = self._get_sg_set_ids(port)
+        # select rules for current direction, the rules of security groups
+        # are in the shared chain of their set if any
+        security_group_rules = self._select_sgr_by_direction(
+            port, direction, with_sg_rules=not sg_ids)
         # split groups by ip version
         # for ipv4, iptables command is used
         # for ipv6, iptables6 command is used
@@ -267,10 +416,23 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             self._drop_dhcp_rule(ipv4_iptables_rule, ipv6_iptables_rule)
         if direction == INGRESS_DIRECTION:
             ipv6_iptables_rule += self._accept_inbound_icmpv6()
-        ipv4_iptables_rule += self._convert_sgr_to_iptables_rules(
-            ipv4_sg_rules)
-        ipv6_iptables_rule += self._convert_sgr_to_iptables_rules(
-            ipv6_sg_rules)
+        if sg_ids:
+            # the shared chain returns on matching rules and otherwise
+            # jumps to the fallback chain
+            sg_set_chain = self._setup_sg_set_chain(sg_ids, direction)
+            sg_set_rules = ['-j $%s' % sg_set_chain, '-j RETURN']
+            for iptables_rule, sg_rules in (
+                    (ipv4_iptables_rule, ipv4_sg_rules),
+                    (ipv6_iptables_rule, ipv6_sg_rules)):
+                self._drop_invalid_packets(iptables_rule)
+                self._allow_established(iptables_rule)
+                iptables_rule += self._build_sgr_iptables_rules(sg_rules)
+                iptables_rule += sg_set_rules
+        else:
+            ipv4_iptables_rule += self._convert_sgr_to_iptables_rules(
+                ipv4_sg_rules)
+            ipv6_iptables_rule += self._convert_sgr_to_iptables_rules(
+                ipv6_sg_rules)
         self._add_rule_to_chain_v4v6(chain_name,
                                      ipv4_iptables_rule,
                                      ipv6_iptables_rule)
@@ -279,6 +441,13 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         iptables_rules = []
         self._drop_invalid_packets(iptables_rules)
         self._allow_established(iptables_rules)
+        iptables_rules += self._build_sgr_iptables_rules(security_group_rules)
+        iptables_rules += ['-j $sg-fallback']
+
+        return iptables_rules
+
+    def _build_sgr_iptables_rules(self, security_group_rules):
+        iptables_rules = []
         for rule in security_group_rules:
             # These arguments MUST be in the format iptables-save will
             # display them: source/dest, protocol, sport, dport, target
@@ -297,11 +466,9 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                                    rule.get('protocol'),
                                    rule.get('port_range_min'),
                                    rule.get('port_range_max'))
+            args += self._remote_group_arg(rule)
             args += ['-j RETURN']
             iptables_rules += [' '.join(args)]
-
-        iptables_rules += ['-j $sg-fallback']
-
         return iptables_rules
 
     def _drop_invalid_packets(self, iptables_rules):
@@ -344,6 +511,19 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
                     '--%ss' % direction,
                     '%s:%s' % (port_range_min, port_range_max)]
 
+    def _remote_group_arg(self, rule):
+        # NOTE: rules expanded by the server keep their remote_group_id
+        # next to the member ip prefix, the ipset is only used for rules
+        # which were not expanded.
+        remote_group_id = rule.get('remote_group_id')
+        if (not remote_group_id or not self.enable_ipset or
+                rule.get(DIRECTION_IP_PREFIX[rule['direction']])):
+            return []
+        ipset_name = ipset_manager.get_ipset_name(remote_group_id,
+                                                  rule['ethertype'])
+        return ['-m set', '--match-set', ipset_name,
+                IPSET_DIRECTION[rule['direction']]]
+
     def _ip_prefix_arg(self, direction, ip_prefix):
         #NOTE (nati) : source_group_id is converted to list of source_
         # ip_prefix in server side
@@ -368,6 +548,7 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             self._pre_defer_filtered_ports = None
             self._setup_chains_apply(self.filtered_ports)
             self.iptables.defer_apply_off()
+            self._remove_unused_ipsets()
 
 
 class OVSHybridIptablesFirewallDriver(IptablesFirewallDriver):
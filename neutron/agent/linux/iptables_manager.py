@@ -277,7 +277,7 @@ class IptablesManager(object):
 
     def __init__(self, _execute=None, state_less=False,
                  root_helper=None, use_ipv6=False, namespace=None,
-                 binary_name=binary_name):
+                 binary_name=binary_name, incremental_apply=False):
         if _execute:
             self.execute = _execute
         else:
@@ -289,6 +289,15 @@ class IptablesManager(object):
         self.iptables_apply_deferred = False
         self.wrap_name = binary_name[:16]
 
+        # When incremental_apply is set, only the wrapped chains which
+        # changed since the last successful apply are sent to
+        # iptables-restore --noflush. The state of the tables as of the
+        # last successful apply is kept per command (iptables/ip6tables).
+        self.incremental_apply = incremental_apply
+        self._applied_state = {}
+        # Number of chains and rules written by the last apply
+        self.apply_stats = {'full': False, 'chains': 0, 'rules': 0}
+
         self.ipv4 = {'filter': IptablesTable(binary_name=self.wrap_name)}
         self.ipv6 = {'filter': IptablesTable(binary_name=self.wrap_name)}
 
@@ -381,50 +390,169 @@ class IptablesManager(object):
         same component of Nova, and replace them with our current set of
         rules. This happens atomically, thanks to iptables-restore.
 
+        With incremental_apply, only the chains changed since the last
+        successful apply are rewritten, unless the incremental update
+        fails, in which case the tables are fully resynchronized.
+
         """
         s = [('iptables', self.ipv4)]
         if self.use_ipv6:
             s += [('ip6tables', self.ipv6)]
 
+        self.apply_stats = {'full': False, 'chains': 0, 'rules': 0}
         for cmd, tables in s:
-            args = ['%s-save' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            all_tables = self.execute(args, root_helper=self.root_helper)
-            all_lines = all_tables.split('\n')
-            for table_name, table in tables.iteritems():
-                start, end = self._find_table(all_lines, table_name)
-                all_lines[start:end] = self._modify_rules(
-                    all_lines[start:end], table, table_name)
-
-            args = ['%s-restore' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            try:
-                self.execute(args, process_input='\n'.join(all_lines),
-                             root_helper=self.root_helper)
-            except RuntimeError as r_error:
-                with excutils.save_and_reraise_exception():
-                    try:
-                        line_no = int(re.search(
-                            'iptables-restore: line ([0-9]+?) failed',
-                            str(r_error)).group(1))
-                        context = IPTABLES_ERROR_LINES_OF_CONTEXT
-                        log_start = max(0, line_no - context)
-                        log_end = line_no + context
-                    except AttributeError:
-                        # line error wasn't found, print all lines instead
-                        log_start = 0
-                        log_end = len(all_lines)
-                    log_lines = ('%7d. %s' % (idx, l)
-                                 for idx, l in enumerate(
-                                     all_lines[log_start:log_end],
-                                     log_start + 1)
-                                 )
-                    LOG.error(_("IPTablesManager.apply failed to apply the "
-                                "following set of iptables rules:\n%s"),
-                              '\n'.join(log_lines))
-        LOG.debug(_("IPTablesManager.apply completed with success"))
+            if not self.incremental_apply:
+                self._apply_full(cmd, tables)
+                continue
+            state = self._get_tables_state(tables)
+            if not self._apply_incremental(cmd, state):
+                self._applied_state.pop(cmd, None)
+                self._apply_full(cmd, tables)
+            self._applied_state[cmd] = state
+        LOG.debug(_("IPTablesManager.apply completed with success, "
+                    "%(chains)d chains and %(rules)d rules written "
+                    "(full resync: %(full)s)"), self.apply_stats)
+
+    def _get_tables_state(self, tables):
+        """Return the expected content of the tables.
+
+        The content of the wrapped chains, which only we write to, is kept
+        per chain. The unwrapped chains and rules are shared with other
+        components, any change of those requires a full apply.
+        """
+        state = {}
+        for table_name, table in tables.iteritems():
+            chains = dict(('%s-%s' % (self.wrap_name, name), [])
+                          for name in table.chains)
+            rules = ([r for r in table.rules if r.top] +
+                     [r for r in table.rules if not r.top])
+            unwrapped_rules = []
+            # Like _modify_rules, keep the last occurrence of duplicates
+            seen_rules = set()
+            for rule in reversed(rules):
+                rule_str = str(rule)
+                if rule_str in seen_rules:
+                    continue
+                seen_rules.add(rule_str)
+                if rule.wrap:
+                    chains['%s-%s' % (self.wrap_name, rule.chain)].insert(
+                        0, rule_str)
+                else:
+                    unwrapped_rules.insert(0, rule_str)
+            state[table_name] = {
+                'chains': dict((name, tuple(chain_rules))
+                               for name, chain_rules in chains.iteritems()),
+                'unwrapped': (frozenset(table.unwrapped_chains),
+                              tuple(unwrapped_rules)),
+                'pending_removes': bool(table.remove_chains or
+                                        table.remove_rules)}
+        return state
+
+    def _get_incremental_lines(self, cmd, state):
+        """Return the iptables-restore --noflush input to reach state.
+
+        None is returned when the change can't be applied incrementally.
+        """
+        applied_state = self._applied_state.get(cmd)
+        if applied_state is None:
+            return
+        all_lines = []
+        for table_name, table_state in state.iteritems():
+            applied = applied_state.get(table_name)
+            if (applied is None or table_state['pending_removes'] or
+                    table_state['unwrapped'] != applied['unwrapped']):
+                return
+            chains = table_state['chains']
+            applied_chains = applied['chains']
+            dirty_chains = sorted(name for name, rules in chains.iteritems()
+                                  if applied_chains.get(name) != rules)
+            removed_chains = sorted(set(applied_chains) - set(chains))
+            if not dirty_chains and not removed_chains:
+                continue
+            # Declaring a chain with --noflush creates it, or flushes it if
+            # it exists. Removed chains are flushed before being deleted so
+            # that the jumps they contain do not prevent other deletions.
+            lines = ['*%s' % table_name]
+            lines += [':%s - [0:0]' % name
+                      for name in dirty_chains + removed_chains]
+            for name in dirty_chains:
+                lines += chains[name]
+                self.apply_stats['rules'] += len(chains[name])
+            lines += ['-X %s' % name for name in removed_chains]
+            lines += ['COMMIT']
+            self.apply_stats['chains'] += (len(dirty_chains) +
+                                           len(removed_chains))
+            all_lines += lines
+        return all_lines
+
+    def _apply_incremental(self, cmd, state):
+        """Try to apply only the chains changed since the last apply.
+
+        Returns False when a full apply is required.
+        """
+        all_lines = self._get_incremental_lines(cmd, state)
+        if all_lines is None:
+            return False
+        if not all_lines:
+            return True
+        args = ['%s-restore' % (cmd,), '--noflush']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        try:
+            self.execute(args, process_input='\n'.join(all_lines) + '\n',
+                         root_helper=self.root_helper)
+        except RuntimeError as r_error:
+            # The content of the kernel tables drifted from what we last
+            # applied, for instance a chain was deleted behind our back.
+            LOG.warn(_("Incremental %(cmd)s-restore failed, doing a full "
+                       "resync: %(error)s"), {'cmd': cmd, 'error': r_error})
+            self.apply_stats['chains'] = 0
+            self.apply_stats['rules'] = 0
+            return False
+        return True
+
+    def _apply_full(self, cmd, tables):
+        self.apply_stats['full'] = True
+        args = ['%s-save' % (cmd,), '-c']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        all_tables = self.execute(args, root_helper=self.root_helper)
+        all_lines = all_tables.split('\n')
+        for table_name, table in tables.iteritems():
+            start, end = self._find_table(all_lines, table_name)
+            all_lines[start:end] = self._modify_rules(
+                all_lines[start:end], table, table_name)
+            self.apply_stats['chains'] += (len(table.chains) +
+                                           len(table.unwrapped_chains))
+            self.apply_stats['rules'] += len(table.rules)
+
+        args = ['%s-restore' % (cmd,), '-c']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        try:
+            self.execute(args, process_input='\n'.join(all_lines),
+                         root_helper=self.root_helper)
+        except RuntimeError as r_error:
+            with excutils.save_and_reraise_exception():
+                try:
+                    line_no = int(re.search(
+                        'iptables-restore: line ([0-9]+?) failed',
+                        str(r_error)).group(1))
+                    context = IPTABLES_ERROR_LINES_OF_CONTEXT
+                    log_start = max(0, line_no - context)
+                    log_end = line_no + context
+                except AttributeError:
+                    # line error wasn't found, print all lines instead
+                    log_start = 0
+                    log_end = len(all_lines)
+                log_lines = ('%7d. %s' % (idx, l)
+                             for idx, l in enumerate(
+                                 all_lines[log_start:log_end],
+                                 log_start + 1)
+                             )
+                LOG.error(_("IPTablesManager.apply failed to apply the "
+                            "following set of iptables rules:\n%s"),
+                          '\n'.join(log_lines))
 
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
@@ -13,9 +13,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
 from oslo.config import cfg
 
 from neutron.agent.linux import ip_lib
+from neutron.agent.linux import ovsdb_native
 from neutron.agent.linux import utils
 from neutron.common import exceptions
 from neutron.common import utils as common_utils
@@ -32,6 +35,19 @@ OPTS = [
     cfg.IntOpt('ovs_vsctl_timeout',
                default=DEFAULT_OVS_VSCTL_TIMEOUT,
                help=_('Timeout in seconds for ovs-vsctl commands')),
+    cfg.StrOpt('ovsdb_interface',
+               choices=['vsctl', 'native'],
+               default='vsctl',
+               help=_("The interface used to access the OVS database: "
+                      "'vsctl' runs ovs-vsctl for every operation, 'native' "
+                      "keeps a connection to ovsdb-server and a local copy "
+                      "of its Bridge, Port and Interface tables")),
+    cfg.StrOpt('ovsdb_connection',
+               default='tcp:127.0.0.1:6640',
+               help=_("The connection to ovsdb-server used by the native "
+                      "interface, either tcp:IP:PORT or unix:PATH. "
+                      "ovsdb-server must accept connections on it, e.g. "
+                      "with 'ovs-vsctl set-manager ptcp:6640:127.0.0.1'")),
 ]
 cfg.CONF.register_opts(OPTS)
 
@@ -58,6 +74,7 @@ class BaseOVS(object):
     def __init__(self, root_helper):
         self.root_helper = root_helper
         self.vsctl_timeout = cfg.CONF.ovs_vsctl_timeout
+        self.ovsdb = get_ovsdb_connection()
 
     def run_vsctl(self, args, check_error=False):
         full_args = ["ovs-vsctl", "--timeout=%d" % self.vsctl_timeout] + args
@@ -71,6 +88,23 @@ class BaseOVS(object):
                 if not check_error:
                     ctxt.reraise = False
 
+    def run_ovsdb(self, method, *args, **kwargs):
+        """Call a method of the native OVSDB connection.
+
+        Errors are handled like in run_vsctl, they are only raised when
+        check_error is True.
+        """
+        check_error = kwargs.pop('check_error', False)
+        try:
+            return getattr(self.ovsdb, method)(*args, **kwargs)
+        except Exception as e:
+            with excutils.save_and_reraise_exception() as ctxt:
+                LOG.error(_("Unable to execute OVSDB %(method)s%(args)s. "
+                            "Exception: %(exception)s"),
+                          {'method': method, 'args': args, 'exception': e})
+                if not check_error:
+                    ctxt.reraise = False
+
     def add_bridge(self, bridge_name):
         self.run_vsctl(["--", "--may-exist", "add-br", bridge_name])
         return OVSBridge(bridge_name, self.root_helper)
@@ -79,6 +113,9 @@ class BaseOVS(object):
         self.run_vsctl(["--", "--if-exists", "del-br", bridge_name])
 
     def bridge_exists(self, bridge_name):
+        if self.ovsdb:
+            return bridge_name in self.run_ovsdb('get_bridge_names',
+                                                 check_error=True)
         try:
             self.run_vsctl(['br-exists', bridge_name], check_error=True)
         except RuntimeError as e:
@@ -89,6 +126,9 @@ class BaseOVS(object):
         return True
 
     def get_bridge_name_for_port_name(self, port_name):
+        if self.ovsdb:
+            return self.run_ovsdb('get_bridge_for_port', port_name,
+                                  check_error=True)
         try:
             return self.run_vsctl(['port-to-br', port_name], check_error=True)
         except RuntimeError as e:
@@ -105,7 +145,7 @@ class OVSBridge(BaseOVS):
         super(OVSBridge, self).__init__(root_helper)
         self.br_name = br_name
         self.defer_apply_flows = False
-        self.deferred_flows = {'add': '', 'mod': '', 'del': ''}
+        self.deferred_flows = []
 
     def set_controller(self, controller_names):
         vsctl_command = ['--', 'set-controller', self.br_name]
@@ -143,19 +183,31 @@ class OVSBridge(BaseOVS):
         self.create()
 
     def add_port(self, port_name):
-        self.run_vsctl(["--", "--may-exist", "add-port", self.br_name,
-                        port_name])
+        if self.ovsdb:
+            self.run_ovsdb('add_port', self.br_name, port_name)
+        else:
+            self.run_vsctl(["--", "--may-exist", "add-port", self.br_name,
+                            port_name])
         return self.get_port_ofport(port_name)
 
     def delete_port(self, port_name):
-        self.run_vsctl(["--", "--if-exists", "del-port", self.br_name,
-                        port_name])
+        if self.ovsdb:
+            self.run_ovsdb('delete_ports', self.br_name, [port_name])
+        else:
+            self.run_vsctl(["--", "--if-exists", "del-port", self.br_name,
+                            port_name])
 
     def set_db_attribute(self, table_name, record, column, value):
+        if self.ovsdb and self.ovsdb.is_monitored(table_name, column):
+            self.run_ovsdb('set_column', table_name, record, column, value)
+            return
         args = ["set", table_name, record, "%s=%s" % (column, value)]
         self.run_vsctl(args)
 
     def clear_db_attribute(self, table_name, record, column):
+        if self.ovsdb and self.ovsdb.is_monitored(table_name, column):
+            self.run_ovsdb('clear_column', table_name, record, column)
+            return
         args = ["clear", table_name, record, column]
         self.run_vsctl(args)
 
@@ -192,21 +244,21 @@ class OVSBridge(BaseOVS):
     def add_flow(self, **kwargs):
         flow_str = _build_flow_expr_str(kwargs, 'add')
         if self.defer_apply_flows:
-            self.deferred_flows['add'] += flow_str + '\n'
+            self.deferred_flows.append(('add', flow_str))
         else:
             self.run_ofctl("add-flow", [flow_str])
 
     def mod_flow(self, **kwargs):
         flow_str = _build_flow_expr_str(kwargs, 'mod')
         if self.defer_apply_flows:
-            self.deferred_flows['mod'] += flow_str + '\n'
+            self.deferred_flows.append(('mod', flow_str))
         else:
             self.run_ofctl("mod-flows", [flow_str])
 
     def delete_flows(self, **kwargs):
         flow_expr_str = _build_flow_expr_str(kwargs, 'del')
         if self.defer_apply_flows:
-            self.deferred_flows['del'] += flow_expr_str + '\n'
+            self.deferred_flows.append(('del', flow_expr_str))
         else:
             self.run_ofctl("del-flows", [flow_expr_str])
 
@@ -240,18 +292,16 @@ class OVSBridge(BaseOVS):
         # Note(ethuleau): stash flows and disable deferred mode. Then apply
         # flows from the stashed reference to be sure to not purge flows that
         # were added between two ofctl commands.
-        stashed_deferred_flows, self.deferred_flows = (
-            self.deferred_flows, {'add': '', 'mod': '', 'del': ''}
-        )
+        stashed_deferred_flows, self.deferred_flows = self.deferred_flows, []
         self.defer_apply_flows = False
-        for action, flows in stashed_deferred_flows.items():
-            if flows:
-                LOG.debug(_('Applying following deferred flows '
-                            'to bridge %s'), self.br_name)
-                for line in flows.splitlines():
-                    LOG.debug(_('%(action)s: %(flow)s'),
-                              {'action': action, 'flow': line})
-                self.run_ofctl('%s-flows' % action, ['-'], flows)
+        for action, flows in _coalesce_flows(stashed_deferred_flows):
+            LOG.debug(_('Applying following deferred flows '
+                        'to bridge %s'), self.br_name)
+            for line in flows:
+                LOG.debug(_('%(action)s: %(flow)s'),
+                          {'action': action, 'flow': line})
+            self.run_ofctl('%s-flows' % action, ['-'],
+                           ''.join(flow + '\n' for flow in flows))
 
     def add_tunnel_port(self, port_name, remote_ip, local_ip,
                         tunnel_type=p_const.TYPE_GRE,
@@ -287,6 +337,10 @@ class OVSBridge(BaseOVS):
         return self.get_port_ofport(local_name)
 
     def db_get_map(self, table, record, column, check_error=False):
+        if self.ovsdb and self.ovsdb.is_monitored(table, column):
+            row = self.run_ovsdb('get_row', table, record,
+                                 check_error=check_error)
+            return dict(row[column]) if row else {}
         output = self.run_vsctl(["get", table, record, column], check_error)
         if output:
             output_str = output.rstrip("\n\r")
@@ -294,6 +348,12 @@ class OVSBridge(BaseOVS):
         return {}
 
     def db_get_val(self, table, record, column, check_error=False):
+        if self.ovsdb and self.ovsdb.is_monitored(table, column):
+            row = self.run_ovsdb('get_row', table, record,
+                                 check_error=check_error)
+            if row:
+                return ovsdb_native.format_value(row[column])
+            return
         output = self.run_vsctl(["get", table, record, column], check_error)
         if output:
             return output.rstrip("\n\r")
@@ -309,6 +369,9 @@ class OVSBridge(BaseOVS):
         return ret
 
     def get_port_name_list(self):
+        if self.ovsdb:
+            return [port['name'] for port in self.run_ovsdb(
+                'get_bridge_ports', self.br_name, check_error=True)]
         res = self.run_vsctl(["list-ports", self.br_name], check_error=True)
         if res:
             return res.strip().split("\n")
@@ -352,23 +415,30 @@ class OVSBridge(BaseOVS):
 
         return edge_ports
 
-    def get_vif_port_set(self):
+    def _get_interface_rows(self):
+        """Return the name, external_ids and ofport of the interfaces."""
+        if self.ovsdb:
+            return [(iface['name'], iface['external_ids'], iface['ofport'])
+                    for iface in self.run_ovsdb('get_bridge_interfaces',
+                                                self.br_name,
+                                                check_error=True)]
         port_names = self.get_port_name_list()
-        edge_ports = set()
         args = ['--format=json', '--', '--columns=name,external_ids,ofport',
                 'list', 'Interface']
         result = self.run_vsctl(args, check_error=True)
         if not result:
-            return edge_ports
-        for row in jsonutils.loads(result)['data']:
-            name = row[0]
-            if name not in port_names:
-                continue
-            external_ids = dict(row[1][1])
+            return []
+        return [(row[0], dict(row[1][1]), row[2])
+                for row in jsonutils.loads(result)['data']
+                if row[0] in port_names]
+
+    def get_vif_port_set(self):
+        edge_ports = set()
+        for row in self._get_interface_rows():
+            name, external_ids, ofport = row
             # Do not consider VIFs which aren't yet ready
             # This can happen when ofport values are either [] or ["set", []]
             # We will therefore consider only integer values for ofport
-            ofport = row[2]
             try:
                 int_ofport = int(ofport)
             except (ValueError, TypeError):
@@ -405,6 +475,10 @@ class OVSBridge(BaseOVS):
         in the "Interface" table queried by the get_vif_port_set() method.
 
         """
+        if self.ovsdb:
+            return dict((port['name'], port['tag']) for port in
+                        self.run_ovsdb('get_bridge_ports', self.br_name,
+                                       check_error=True))
         port_names = self.get_port_name_list()
         args = ['--format=json', '--', '--columns=name,tag', 'list', 'Port']
         result = self.run_vsctl(args, check_error=True)
@@ -421,6 +495,8 @@ class OVSBridge(BaseOVS):
         return port_tag_dict
 
     def get_vif_port_by_id(self, port_id):
+        if self.ovsdb:
+            return self._get_vif_port_by_id_native(port_id)
         args = ['--format=json', '--', '--columns=external_ids,name,ofport',
                 'find', 'Interface',
                 'external_ids:iface-id="%s"' % port_id]
@@ -463,12 +539,41 @@ class OVSBridge(BaseOVS):
             LOG.warn(_("Unable to parse interface details. Exception: %s"), e)
             return
 
+    def _get_vif_port_by_id_native(self, port_id):
+        iface = self.run_ovsdb('find_interface', 'iface-id', port_id)
+        if not iface:
+            return
+        port_name = iface['name']
+        switch = self.run_ovsdb('get_bridge_for_iface', port_name)
+        if switch != self.br_name:
+            LOG.info(_("Port: %(port_name)s is on %(switch)s,"
+                       " not on %(br_name)s"), {'port_name': port_name,
+                                                'switch': switch,
+                                                'br_name': self.br_name})
+            return
+        ofport = iface['ofport']
+        if not isinstance(ofport, int) or ofport == -1:
+            LOG.warn(_("ofport: %(ofport)s for VIF: %(vif)s is not a "
+                       "positive integer"), {'ofport': ofport,
+                                             'vif': port_id})
+            return
+        vif_mac = iface['external_ids'].get('attached-mac')
+        if vif_mac is None:
+            LOG.warn(_("Unable to parse interface details. "
+                       "Exception: %s"), 'attached-mac')
+            return
+        return VifPort(port_name, ofport, port_id, vif_mac, self)
+
     def delete_ports(self, all_ports=False):
         if all_ports:
             port_names = self.get_port_name_list()
         else:
-            port_names = (port.port_name for port in self.get_vif_ports())
+            port_names = [port.port_name for port in self.get_vif_ports()]
 
+        if self.ovsdb:
+            # All the ports are removed within a single transaction.
+            self.run_ovsdb('delete_ports', self.br_name, port_names)
+            return
         for port_name in port_names:
             self.delete_port(port_name)
 
@@ -489,7 +594,21 @@ class OVSBridge(BaseOVS):
         self.destroy()
 
 
+def get_ovsdb_connection():
+    """Return the native OVSDB connection, or None to use ovs-vsctl."""
+    if cfg.CONF.ovsdb_interface == 'native':
+        return ovsdb_native.get_connection(cfg.CONF.ovsdb_connection,
+                                           cfg.CONF.ovs_vsctl_timeout)
+
+
 def get_bridge_for_iface(root_helper, iface):
+    ovsdb = get_ovsdb_connection()
+    if ovsdb:
+        try:
+            return ovsdb.get_bridge_for_iface(iface)
+        except Exception:
+            LOG.exception(_("Interface %s not found."), iface)
+            return None
     args = ["ovs-vsctl", "--timeout=%d" % cfg.CONF.ovs_vsctl_timeout,
             "iface-to-br", iface]
     try:
@@ -500,6 +619,14 @@ def get_bridge_for_iface(root_helper, iface):
 
 
 def get_bridges(root_helper):
+    ovsdb = get_ovsdb_connection()
+    if ovsdb:
+        try:
+            return ovsdb.get_bridge_names()
+        except Exception as e:
+            with excutils.save_and_reraise_exception():
+                LOG.exception(_("Unable to retrieve bridges. "
+                                "Exception: %s"), e)
     args = ["ovs-vsctl", "--timeout=%d" % cfg.CONF.ovs_vsctl_timeout,
             "list-br"]
     try:
@@ -519,6 +646,27 @@ def get_bridge_external_bridge_id(root_helper, bridge):
         return None
 
 
+def _coalesce_flows(flows):
+    """Group deferred flow modifications into ovs-ofctl batches.
+
+    Consecutive modifications with the same action are applied by a single
+    ovs-ofctl call, so that the order between additions, modifications and
+    deletions is kept. Within a batch, an addition or a modification
+    overrides a previous one with the same match, and duplicate deletions
+    are dropped.
+
+    Returns a list of (action, flows) tuples.
+    """
+    batches = []
+    for action, flow in flows:
+        if not batches or batches[-1][0] != action:
+            batches.append((action, collections.OrderedDict()))
+        match, sep, _actions = flow.rpartition('actions=')
+        key = match if sep and action != 'del' else flow
+        batches[-1][1][key] = flow
+    return [(action, list(batch.values())) for action, batch in batches]
+
+
 def _build_flow_expr_str(flow_dict, cmd):
     flow_expr_arr = []
     actions = None
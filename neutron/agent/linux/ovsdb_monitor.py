@@ -15,11 +15,18 @@
 import eventlet
 
 from neutron.agent.linux import async_process
+from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
 
+# Actions reported by 'ovsdb-client monitor' for each row.
+OVSDB_ACTION_INITIAL = 'initial'
+OVSDB_ACTION_INSERT = 'insert'
+OVSDB_ACTION_DELETE = 'delete'
+OVSDB_ACTION_NEW = 'new'
+
 
 class OvsdbMonitor(async_process.AsyncProcess):
     """Manages an invocation of 'ovsdb-client monitor'."""
@@ -52,23 +59,44 @@ class OvsdbMonitor(async_process.AsyncProcess):
             # stop the monitor.
 
 
+def _ovsdb_value_to_py(value):
+    """Convert a value of the ovsdb JSON format to a python one.
+
+    Sets are converted to lists, except for empty sets which are
+    converted to None since they represent unset optional columns.
+    """
+    if isinstance(value, list):
+        kind, data = value
+        if kind == 'map':
+            return dict(data)
+        if kind == 'set':
+            return [_ovsdb_value_to_py(item) for item in data] or None
+        # 'uuid' or 'named-uuid'
+        return data
+    return value
+
+
 class SimpleInterfaceMonitor(OvsdbMonitor):
     """Monitors the Interface table of the local host's ovsdb for changes.
 
     The has_updates() method indicates whether changes to the ovsdb
     Interface table have been detected since the monitor started or
     since the previous access.
+
+    The changes are also parsed into events which are returned, and
+    cleared, by get_events().
     """
 
     def __init__(self, root_helper=None, respawn_interval=None):
         super(SimpleInterfaceMonitor, self).__init__(
             'Interface',
-            columns=['name', 'ofport'],
+            columns=['name', 'ofport', 'external_ids'],
             format='json',
             root_helper=root_helper,
             respawn_interval=respawn_interval,
         )
         self.data_received = False
+        self.new_events = []
 
     @property
     def is_active(self):
@@ -85,7 +113,56 @@ class SimpleInterfaceMonitor(OvsdbMonitor):
         the absence of updates at the expense of potential false
         positives.
         """
-        return bool(list(self.iter_stdout())) or not self.is_active
+        return self.process_events() or not self.is_active
+
+    def process_events(self):
+        """Parse the output received since the last call into events.
+
+        Each event is an (event_type, device) tuple where event_type is
+        'added', 'removed' or 'modified', and device is a dict with the
+        name, ofport and external_ids of the interface.
+
+        Returns whether any output was received.
+        """
+        output = list(self.iter_stdout())
+        for line in output:
+            try:
+                update = jsonutils.loads(line)
+                headings = update['headings']
+                rows = [dict(zip(headings, row)) for row in update['data']]
+            except (ValueError, KeyError, TypeError):
+                LOG.warning(_("Unable to parse ovsdb monitor output: %s"),
+                            line)
+                continue
+            for row in rows:
+                action = row['action']
+                if action in (OVSDB_ACTION_INITIAL, OVSDB_ACTION_INSERT):
+                    event_type = 'added'
+                elif action == OVSDB_ACTION_DELETE:
+                    event_type = 'removed'
+                elif action == OVSDB_ACTION_NEW:
+                    event_type = 'modified'
+                else:
+                    # The old values of a modified row are not needed.
+                    continue
+                device = {'name': row['name'],
+                          'ofport': _ovsdb_value_to_py(row['ofport']),
+                          'external_ids': _ovsdb_value_to_py(
+                              row['external_ids']) or {}}
+                self.new_events.append((event_type, device))
+        return bool(output)
+
+    def get_events(self):
+        """Return the interface events received since the last call.
+
+        None is returned if the monitor is not active, since events may
+        then have been missed.
+        """
+        self.process_events()
+        events, self.new_events = self.new_events, []
+        if not self.is_active:
+            return None
+        return events
 
     def start(self, block=False, timeout=5):
         super(SimpleInterfaceMonitor, self).start()
@@ -96,6 +173,7 @@ class SimpleInterfaceMonitor(OvsdbMonitor):
 
     def _kill(self, *args, **kwargs):
         self.data_received = False
+        self.new_events = []
         super(SimpleInterfaceMonitor, self)._kill(*args, **kwargs)
 
     def _read_stdout(self):
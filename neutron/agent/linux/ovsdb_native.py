@@ -0,0 +1,514 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Native OVSDB client used by ovs_lib instead of forking ovs-vsctl.
+
+A single JSON-RPC connection (RFC 7047) to ovsdb-server is kept open. The
+Bridge, Port and Interface tables are monitored, and the monitor updates
+keep an in-memory replica of them up to date, so reads do not need a round
+trip to the server. Writes are sent as a single 'transact' request.
+"""
+
+import codecs
+import re
+import select
+import socket
+import threading
+import time
+
+import six
+
+from neutron.openstack.common import jsonutils
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+DATABASE = 'Open_vSwitch'
+MONITOR_ID = 'neutron-ovs-lib'
+
+# Columns replicated for each monitored table. The Interface statistics
+# are left out on purpose since ovs-vswitchd refreshes them every few
+# seconds.
+MONITORED_COLUMNS = {
+    'Open_vSwitch': ['bridges', 'cur_cfg', 'next_cfg'],
+    'Bridge': ['name', 'ports', 'datapath_id', 'external_ids'],
+    'Port': ['name', 'interfaces', 'tag'],
+    'Interface': ['name', 'type', 'ofport', 'external_ids', 'options'],
+}
+
+_BARE_STRING_RE = re.compile(r'^[a-zA-Z_][a-zA-Z0-9_.-]*$')
+_JSON_DELIMITERS = re.compile(r'[][{}"\\]')
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def get_connection(connection, timeout):
+    """Return the shared connection to the given ovsdb-server."""
+    with _connections_lock:
+        if connection not in _connections:
+            _connections[connection] = OvsdbConnection(connection, timeout)
+        return _connections[connection]
+
+
+class Uuid(six.text_type):
+    """A row reference, formatted without quotes like ovs-vsctl does."""
+
+
+class ColumnType(object):
+    """What is needed from the schema to convert the values of a column."""
+
+    def __init__(self, column_type):
+        if isinstance(column_type, six.string_types):
+            column_type = {'key': column_type}
+        key = column_type['key']
+        self.key_type = key if isinstance(key, six.string_types) else (
+            key['type'])
+        self.is_map = 'value' in column_type
+        max_ = column_type.get('max', 1)
+        self.is_set = not self.is_map and (max_ == 'unlimited' or max_ > 1)
+
+    def decode(self, value):
+        if isinstance(value, list) and value and value[0] == 'map':
+            return dict((_decode_atom(k), _decode_atom(v))
+                        for k, v in value[1])
+        if isinstance(value, list) and value and value[0] == 'set':
+            items = [_decode_atom(atom) for atom in value[1]]
+        else:
+            items = [_decode_atom(value)]
+        if self.is_map:
+            return {}
+        if self.is_set:
+            return items
+        # Optional scalar columns are empty sets when not set, ovs-vsctl
+        # shows them as [].
+        return items[0] if items else []
+
+    def encode(self, value):
+        if self.is_map:
+            return ['map', [[_encode_atom(k), _encode_atom(v)]
+                            for k, v in sorted(value.items())]]
+        if isinstance(value, list):
+            return ['set', [_encode_atom(atom) for atom in value]]
+        return _encode_atom(value)
+
+    def parse(self, value):
+        """Convert a value given as a string on the ovs-vsctl command line."""
+        if not isinstance(value, six.string_types):
+            return value
+        if self.key_type == 'integer':
+            return int(value)
+        if self.key_type == 'real':
+            return float(value)
+        if self.key_type == 'boolean':
+            return value == 'true'
+        if self.key_type == 'uuid':
+            return Uuid(value)
+        if len(value) > 1 and value[0] == value[-1] == '"':
+            return jsonutils.loads(value)
+        return value
+
+
+def _decode_atom(atom):
+    if isinstance(atom, list) and atom[0] == 'uuid':
+        return Uuid(atom[1])
+    return atom
+
+
+def _encode_atom(atom):
+    if isinstance(atom, Uuid):
+        return ['uuid', atom]
+    return atom
+
+
+def _format_atom(atom):
+    if isinstance(atom, bool):
+        return 'true' if atom else 'false'
+    if isinstance(atom, Uuid):
+        return atom
+    if isinstance(atom, six.string_types):
+        if _BARE_STRING_RE.match(atom) and atom not in ('true', 'false'):
+            return atom
+        return jsonutils.dumps(atom)
+    return str(atom)
+
+
+def format_value(value):
+    """Format a replicated value the way 'ovs-vsctl get' prints it."""
+    if isinstance(value, dict):
+        return '{%s}' % ', '.join('%s=%s' % (_format_atom(k),
+                                             _format_atom(v))
+                                  for k, v in sorted(value.items()))
+    if isinstance(value, list):
+        return '[%s]' % ', '.join(_format_atom(atom) for atom in value)
+    return _format_atom(value)
+
+
+class OvsdbConnection(object):
+    """JSON-RPC connection to ovsdb-server with a replica of its tables."""
+
+    def __init__(self, connection, timeout):
+        self.connection = connection
+        self.timeout = timeout
+        self.columns = {}
+        self.tables = {}
+        self._names = {}
+        self._sock = None
+        self._reset_reader()
+        self._next_id = 0
+        self._lock = threading.RLock()
+
+    def _open_socket(self):
+        kind, _sep, address = self.connection.partition(':')
+        if kind == 'tcp':
+            host, _sep, port = address.rpartition(':')
+            return socket.create_connection((host, int(port)), self.timeout)
+        elif kind == 'unix':
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(address)
+            return sock
+        raise ValueError(_("Invalid OVSDB connection: %s") % self.connection)
+
+    def _connect(self):
+        LOG.debug(_("Connecting to ovsdb-server at %s"), self.connection)
+        self._sock = self._open_socket()
+        self._reset_reader()
+        try:
+            schema = self._call('get_schema', [DATABASE])
+            self.columns = dict(
+                (table, dict((column, ColumnType(
+                    schema['tables'][table]['columns'][column]['type']))
+                    for column in columns))
+                for table, columns in MONITORED_COLUMNS.items())
+            requests = dict((table, {'columns': columns})
+                            for table, columns in MONITORED_COLUMNS.items())
+            self.tables = dict((table, {}) for table in MONITORED_COLUMNS)
+            self._names = dict((table, {}) for table in MONITORED_COLUMNS)
+            self._apply_update(self._call('monitor',
+                                          [DATABASE, MONITOR_ID, requests]))
+        except Exception:
+            self._disconnect()
+            raise
+
+    def _disconnect(self):
+        if self._sock:
+            try:
+                self._sock.close()
+            except socket.error:
+                pass
+        self._sock = None
+
+    def _send(self, message):
+        self._sock.sendall(jsonutils.dumps(message))
+
+    def _reset_reader(self):
+        # Characters of the message being received, and the framing state
+        # of the JSON text read so far. Only new data is ever scanned, so
+        # large replies arriving in many reads are parsed in linear time.
+        self._pending = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    def _read_messages(self, timeout):
+        """Read from the socket and return the complete messages received.
+
+        Returns an empty list if nothing could be read within the timeout.
+        """
+        if not select.select([self._sock], [], [], timeout)[0]:
+            return []
+        data = self._sock.recv(65536)
+        if not data:
+            raise IOError(_("Connection to ovsdb-server closed"))
+        # A multibyte character may be split across two reads.
+        text = self._utf8.decode(data)
+        messages = []
+        start = 0
+        # Skip the character escaped at the end of the previous read.
+        pos = int(self._escaped)
+        while True:
+            match = _JSON_DELIMITERS.search(text, pos)
+            if not match:
+                break
+            char, pos = match.group(), match.end()
+            if self._in_string:
+                if char == '\\':
+                    pos += 1
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if not self._depth:
+                    self._pending.append(text[start:pos])
+                    messages.append(jsonutils.loads(''.join(self._pending)))
+                    self._pending = []
+                    start = pos
+        self._escaped = pos > len(text)
+        if self._depth or text[start:].strip():
+            self._pending.append(text[start:])
+        return messages
+
+    def _handle_message(self, message):
+        method = message.get('method')
+        if method == 'update':
+            self._apply_update(message['params'][1])
+        elif method == 'echo':
+            self._send({'id': message['id'], 'result': message['params'],
+                        'error': None})
+
+    def _call(self, method, params):
+        self._next_id += 1
+        request_id = self._next_id
+        self._send({'method': method, 'params': params, 'id': request_id})
+        deadline = time.time() + self.timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise IOError(_("Timeout waiting for ovsdb-server to "
+                                "answer %s") % method)
+            for message in self._read_messages(remaining):
+                if 'method' in message:
+                    self._handle_message(message)
+                elif message.get('id') == request_id:
+                    if message.get('error'):
+                        raise RuntimeError(
+                            _("OVSDB %(method)s failed: %(error)s") %
+                            {'method': method, 'error': message['error']})
+                    # ovsdb-server sends the monitor updates caused by a
+                    # transaction before replying to it, so the replica
+                    # already reflects the transaction at this point.
+                    return message['result']
+
+    def _ensure_connected(self):
+        if not self._sock:
+            self._connect()
+
+    def refresh(self):
+        """Apply the monitor updates received since the last call."""
+        with self._lock:
+            try:
+                self._ensure_connected()
+                for message in self._read_messages(0):
+                    self._handle_message(message)
+            except (IOError, socket.error) as e:
+                LOG.warning(_("Lost connection to ovsdb-server: %s, "
+                              "reconnecting"), e)
+                self._disconnect()
+                self._connect()
+
+    def transact(self, operations, wait_for_vswitchd=False):
+        """Run the operations in a single transaction.
+
+        With wait_for_vswitchd, also wait until ovs-vswitchd has applied
+        the new configuration, like ovs-vsctl does by default.
+        """
+        if wait_for_vswitchd:
+            operations = operations + [
+                {'op': 'mutate', 'table': 'Open_vSwitch', 'where': [],
+                 'mutations': [['next_cfg', '+=', 1]]},
+                {'op': 'select', 'table': 'Open_vSwitch', 'where': [],
+                 'columns': ['next_cfg']}]
+        with self._lock:
+            try:
+                self._ensure_connected()
+                results = self._call('transact', [DATABASE] + operations)
+            except (IOError, socket.error):
+                self._disconnect()
+                raise
+            for operation, result in zip(operations, results):
+                if result and result.get('error'):
+                    raise RuntimeError(
+                        _("OVSDB transaction %(ops)s failed: %(result)s") %
+                        {'ops': operations, 'result': result})
+            if len(results) > len(operations):
+                # Extra results report errors of the whole transaction,
+                # e.g. a constraint violation found at commit time.
+                raise RuntimeError(
+                    _("OVSDB transaction %(ops)s failed: %(result)s") %
+                    {'ops': operations, 'result': results[-1]})
+            if wait_for_vswitchd:
+                self._wait_for_cfg(results[-1]['rows'][0]['next_cfg'])
+            return results
+
+    def _wait_for_cfg(self, next_cfg):
+        deadline = time.time() + self.timeout
+        while True:
+            ovs = list(self.tables['Open_vSwitch'].values())
+            if ovs and ovs[0]['cur_cfg'] >= next_cfg:
+                return
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                LOG.warning(_("Timeout waiting for ovs-vswitchd to apply "
+                              "configuration %s"), next_cfg)
+                return
+            for message in self._read_messages(remaining):
+                self._handle_message(message)
+
+    def _apply_update(self, update):
+        for table, rows in update.items():
+            columns = self.columns[table]
+            replica = self.tables[table]
+            names = self._names[table]
+            for uuid, change in rows.items():
+                old_row = replica.get(uuid)
+                if old_row and 'name' in old_row:
+                    names.pop(old_row['name'], None)
+                if change.get('new') is None:
+                    replica.pop(uuid, None)
+                    continue
+                row = dict(old_row or {})
+                for column, value in change['new'].items():
+                    row[column] = columns[column].decode(value)
+                row['_uuid'] = Uuid(uuid)
+                replica[uuid] = row
+                if 'name' in row:
+                    names[row['name']] = uuid
+
+    # Helpers used by ovs_lib, all of them are served from the replica.
+
+    def is_monitored(self, table, column=None):
+        table = self.get_table_name(table)
+        return table is not None and (
+            column is None or
+            column.partition(':')[0] in MONITORED_COLUMNS[table])
+
+    @staticmethod
+    def get_table_name(table):
+        """Return the monitored table matching a case insensitive name."""
+        for name in MONITORED_COLUMNS:
+            if name.lower() == table.lower():
+                return name
+
+    def find_row(self, table, record):
+        """Return the row matching a name or a uuid, or None."""
+        self.refresh()
+        table = self.get_table_name(table)
+        uuid = self._names[table].get(record, record)
+        return self.tables[table].get(uuid)
+
+    def get_row(self, table, record):
+        row = self.find_row(table, record)
+        if row is None:
+            raise RuntimeError(_("no row \"%(record)s\" in table "
+                                 "%(table)s") % {'record': record,
+                                                 'table': table})
+        return row
+
+    def get_bridge_names(self):
+        self.refresh()
+        return sorted(row['name'] for row in self.tables['Bridge'].values())
+
+    def get_bridge_ports(self, bridge_name):
+        """Return the Port rows of a bridge, except its local port."""
+        bridge = self.get_row('Bridge', bridge_name)
+        ports = self.tables['Port']
+        return sorted((ports[uuid] for uuid in bridge['ports']
+                       if uuid in ports and
+                       ports[uuid]['name'] != bridge_name),
+                      key=lambda port: port['name'])
+
+    def get_bridge_interfaces(self, bridge_name):
+        interfaces = self.tables['Interface']
+        return [interfaces[uuid]
+                for port in self.get_bridge_ports(bridge_name)
+                for uuid in port['interfaces'] if uuid in interfaces]
+
+    def get_bridge_for_port(self, port_name):
+        port = self.find_row('Port', port_name)
+        if port is None:
+            return
+        for bridge in self.tables['Bridge'].values():
+            if port['_uuid'] in bridge['ports']:
+                return bridge['name']
+
+    def get_bridge_for_iface(self, iface_name):
+        iface = self.find_row('Interface', iface_name)
+        if iface is None:
+            return
+        for port in self.tables['Port'].values():
+            if iface['_uuid'] in port['interfaces']:
+                return self.get_bridge_for_port(port['name'])
+
+    def find_interface(self, external_id, value):
+        self.refresh()
+        for iface in self.tables['Interface'].values():
+            if iface['external_ids'].get(external_id) == value:
+                return iface
+
+    # Write helpers, each of them runs a single transaction.
+
+    def set_column(self, table, record, column, value):
+        table = self.get_table_name(table)
+        row = self.get_row(table, record)
+        column, _sep, key = column.partition(':')
+        column_type = self.columns[table][column]
+        if key:
+            mutations = [[column, 'delete', ['set', [key]]],
+                         [column, 'insert', ['map', [[key, value]]]]]
+            operation = {'op': 'mutate', 'mutations': mutations}
+        else:
+            operation = {'op': 'update', 'row': {
+                column: column_type.encode(column_type.parse(value))}}
+        operation.update({'table': table,
+                          'where': [['_uuid', '==', ['uuid', row['_uuid']]]]})
+        self.transact([operation])
+
+    def clear_column(self, table, record, column):
+        table = self.get_table_name(table)
+        row = self.get_row(table, record)
+        column_type = self.columns[table][column]
+        empty = ['map', []] if column_type.is_map else ['set', []]
+        self.transact([{'op': 'update', 'table': table,
+                        'where': [['_uuid', '==', ['uuid', row['_uuid']]]],
+                        'row': {column: empty}}])
+
+    def add_port(self, bridge_name, port_name):
+        """Add a port with a single interface, unless it already exists."""
+        if self.find_row('Port', port_name) is not None:
+            return
+        bridge = self.get_row('Bridge', bridge_name)
+        self.transact([
+            {'op': 'insert', 'table': 'Interface', 'uuid-name': 'iface',
+             'row': {'name': port_name}},
+            {'op': 'insert', 'table': 'Port', 'uuid-name': 'port',
+             'row': {'name': port_name,
+                     'interfaces': ['named-uuid', 'iface']}},
+            {'op': 'mutate', 'table': 'Bridge',
+             'where': [['_uuid', '==', ['uuid', bridge['_uuid']]]],
+             'mutations': [['ports', 'insert',
+                            ['set', [['named-uuid', 'port']]]]]}],
+            wait_for_vswitchd=True)
+
+    def delete_ports(self, bridge_name, port_names):
+        """Remove the ports from the bridge, ignoring missing ones."""
+        bridge = self.find_row('Bridge', bridge_name)
+        if bridge is None:
+            return
+        uuids = []
+        for port_name in port_names:
+            port = self.find_row('Port', port_name)
+            if port is not None and port['_uuid'] in bridge['ports']:
+                uuids.append(['uuid', port['_uuid']])
+        if not uuids:
+            return
+        # Port and Interface rows are not root rows, so they are garbage
+        # collected once the bridge does not refer to them anymore.
+        self.transact([{'op': 'mutate', 'table': 'Bridge',
+                        'where': [['_uuid', '==', ['uuid', bridge['_uuid']]]],
+                        'mutations': [['ports', 'delete', ['set', uuids]]]}],
+                      wait_for_vswitchd=True)
@@ -25,6 +25,8 @@ import tempfile
 
 from eventlet.green import subprocess
 from eventlet import greenthread
+from oslo.config import cfg
+from oslo.rootwrap import client
 
 from neutron.common import constants
 from neutron.common import utils
@@ -34,6 +36,8 @@ from neutron.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
 
+_rootwrap_daemon_clients = {}
+
 
 def create_process(cmd, root_helper=None, addl_env=None):
     """Create a process object for the given command.
@@ -59,19 +63,57 @@ def create_process(cmd, root_helper=None, addl_env=None):
     return obj, cmd
 
 
+def get_root_helper_daemon():
+    try:
+        return cfg.CONF.AGENT.root_helper_daemon
+    except (cfg.NoSuchOptError, cfg.NoSuchGroupError):
+        return None
+
+
+def get_rootwrap_daemon_client(root_helper_daemon):
+    """Return the client of the rootwrap daemon started by the command.
+
+    The daemon is spawned on the first command it is asked to run, and
+    respawned by the client if it dies.
+    """
+    if root_helper_daemon not in _rootwrap_daemon_clients:
+        _rootwrap_daemon_clients[root_helper_daemon] = client.Client(
+            shlex.split(root_helper_daemon))
+    return _rootwrap_daemon_clients[root_helper_daemon]
+
+
+def execute_rootwrap_daemon(cmd, root_helper_daemon, process_input=None,
+                            addl_env=None):
+    cmd = map(str, cmd)
+    LOG.debug(_("Running command (rootwrap daemon): %s"), cmd)
+    env = None
+    if addl_env:
+        env = os.environ.copy()
+        env.update(addl_env)
+    returncode, _stdout, _stderr = get_rootwrap_daemon_client(
+        root_helper_daemon).execute(cmd, env, process_input)
+    return cmd, returncode, _stdout, _stderr
+
+
 def execute(cmd, root_helper=None, process_input=None, addl_env=None,
             check_exit_code=True, return_stderr=False):
     try:
-        obj, cmd = create_process(cmd, root_helper=root_helper,
-                                  addl_env=addl_env)
-        _stdout, _stderr = (process_input and
-                            obj.communicate(process_input) or
-                            obj.communicate())
-        obj.stdin.close()
+        root_helper_daemon = root_helper and get_root_helper_daemon()
+        if root_helper_daemon:
+            cmd, returncode, _stdout, _stderr = execute_rootwrap_daemon(
+                cmd, root_helper_daemon, process_input, addl_env)
+        else:
+            obj, cmd = create_process(cmd, root_helper=root_helper,
+                                      addl_env=addl_env)
+            _stdout, _stderr = (process_input and
+                                obj.communicate(process_input) or
+                                obj.communicate())
+            obj.stdin.close()
+            returncode = obj.returncode
         m = _("\nCommand: %(cmd)s\nExit code: %(code)s\nStdout: %(stdout)r\n"
-              "Stderr: %(stderr)r") % {'cmd': cmd, 'code': obj.returncode,
+              "Stderr: %(stderr)r") % {'cmd': cmd, 'code': returncode,
                                        'stdout': _stdout, 'stderr': _stderr}
-        if obj.returncode:
+        if returncode:
             LOG.error(m)
             if check_exit_code:
                 raise RuntimeError(m)
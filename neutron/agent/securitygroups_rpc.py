@@ -16,12 +16,17 @@
 
 from oslo.config import cfg
 
+from neutron.common import rpc as n_rpc
 from neutron.common import topics
 from neutron.openstack.common import importutils
 from neutron.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
 SG_RPC_VERSION = "1.1"
+# security_group_info_for_devices was added in version 1.2
+SG_INFO_RPC_VERSION = "1.2"
+# security_group_member_ips_delta was added in version 1.3
+SG_MEMBER_IPS_RPC_VERSION = "1.3"
 
 security_group_opts = [
     cfg.StrOpt(
@@ -33,7 +38,14 @@ security_group_opts = [
         help=_(
             'Controls whether the neutron security group API is enabled '
             'in the server. It should be false when using no security '
-            'groups or using the nova security group API.'))
+            'groups or using the nova security group API.')),
+    cfg.BoolOpt(
+        'enable_ipset',
+        default=False,
+        help=_('Use ipset to match remote security group members in the '
+               'iptables based firewall drivers. Rules are fetched once per '
+               'security group and a membership change only updates the '
+               'ipset of the group.'))
 ]
 cfg.CONF.register_opts(security_group_opts, 'SECURITYGROUP')
 
@@ -83,6 +95,24 @@ class SecurityGroupServerRpcApiMixin(object):
                          version=SG_RPC_VERSION,
                          topic=self.topic)
 
+    def security_group_info_for_devices(self, context, devices):
+        LOG.debug(_("Get security group information "
+                    "for devices via rpc %r"), devices)
+        return self.call(context,
+                         self.make_msg('security_group_info_for_devices',
+                                       devices=devices),
+                         version=SG_INFO_RPC_VERSION,
+                         topic=self.topic)
+
+    def security_group_member_ips_delta(self, context, security_groups):
+        LOG.debug(_("Get member ips changes of security groups "
+                    "via rpc %r"), security_groups)
+        return self.call(context,
+                         self.make_msg('security_group_member_ips_delta',
+                                       security_groups=security_groups),
+                         version=SG_MEMBER_IPS_RPC_VERSION,
+                         topic=self.topic)
+
 
 class SecurityGroupAgentRpcCallbackMixin(object):
     """A mix-in that enable SecurityGroup agent
@@ -132,6 +162,9 @@ class SecurityGroupAgentRpcMixin(object):
     """A mix-in that enable SecurityGroup agent
     support in agent implementations.
     """
+    # Counters of the devices whose filter was refreshed or found unchanged
+    # by refresh_firewall, reported in the agent state
+    firewall_refresh_stats = None
 
     def init_firewall(self, defer_refresh_firewall=False):
         firewall_driver = cfg.CONF.SECURITYGROUP.firewall_driver
@@ -150,13 +183,100 @@ class SecurityGroupAgentRpcMixin(object):
         self.devices_to_refilter = set()
         # Flag raised when a global refresh is needed
         self.global_refresh_firewall = False
+        # Stores security groups whose members should be refreshed when
+        # deferred refresh is enabled.
+        self.sg_members_to_refresh = set()
+        # Whether security_group_info_for_devices is used; None until the
+        # server has been asked whether it supports it.
+        self._use_enhanced_rpc = (
+            None if cfg.CONF.SECURITYGROUP.enable_ipset else False)
+        # Whether security_group_member_ips_delta is used, same as above
+        self._use_member_delta_rpc = None
+        # Member ips of remote security groups handed to the firewall and
+        # their version, keyed by security group id
+        self.sg_member_ips = {}
+        self.sg_member_versions = {}
+        # Rules of security groups handed to the firewall
+        self.sg_rules = {}
+        self.firewall_refresh_stats = {'refreshes': 0,
+                                       'devices_refreshed': 0,
+                                       'devices_unchanged': 0}
+
+    @property
+    def use_enhanced_rpc(self):
+        if self._use_enhanced_rpc is None:
+            self._use_enhanced_rpc = (
+                self._check_enhanced_rpc_is_supported_by_server())
+        return self._use_enhanced_rpc
+
+    def _check_enhanced_rpc_is_supported_by_server(self):
+        try:
+            self.plugin_rpc.security_group_info_for_devices(
+                self.context, devices=[])
+        except n_rpc.RemoteError as e:
+            if e.exc_type not in ('UnsupportedVersion', 'NoSuchMethod'):
+                raise
+            LOG.warning(_("security_group_info_for_devices rpc call not "
+                          "supported by the server, falling back to "
+                          "security_group_rules_for_devices"))
+            return False
+        return True
+
+    @property
+    def use_member_delta_rpc(self):
+        if self._use_member_delta_rpc is None:
+            self._use_member_delta_rpc = (
+                self._check_member_delta_rpc_is_supported_by_server())
+        return self._use_member_delta_rpc
+
+    def _check_member_delta_rpc_is_supported_by_server(self):
+        try:
+            self.plugin_rpc.security_group_member_ips_delta(
+                self.context, security_groups={})
+        except n_rpc.RemoteError as e:
+            if e.exc_type not in ('UnsupportedVersion', 'NoSuchMethod'):
+                raise
+            LOG.warning(_("security_group_member_ips_delta rpc call not "
+                          "supported by the server, falling back to "
+                          "security_group_info_for_devices"))
+            return False
+        return True
+
+    def _update_security_group_members(self, sg_id, member_ips, version):
+        self.firewall.update_security_group_members(sg_id, member_ips)
+        self.sg_member_ips[sg_id] = member_ips
+        self.sg_member_versions[sg_id] = version
+
+    def _get_devices_with_security_group_info(self, device_ids,
+                                              updated_sg_ids=None):
+        """Fetch port dicts and hand security group info to the firewall.
+
+        :param updated_sg_ids: if set, the ids of the security groups whose
+                               rules changed are added to it
+        """
+        if not self.use_enhanced_rpc:
+            return self.plugin_rpc.security_group_rules_for_devices(
+                self.context, device_ids)
+        devices_info = self.plugin_rpc.security_group_info_for_devices(
+            self.context, device_ids)
+        for sg_id, sg_rules in devices_info['security_groups'].items():
+            if (updated_sg_ids is not None and
+                    self.sg_rules.get(sg_id) != sg_rules):
+                updated_sg_ids.add(sg_id)
+            self.sg_rules[sg_id] = sg_rules
+            self.firewall.update_security_group_rules(sg_id, sg_rules)
+        versions = devices_info.get('sg_member_versions', {})
+        for sg_id, member_ips in devices_info['sg_member_ips'].items():
+            self._update_security_group_members(sg_id, member_ips,
+                                                versions.get(sg_id))
+        return devices_info['devices']
 
     def prepare_devices_filter(self, device_ids):
         if not device_ids:
             return
         LOG.info(_("Preparing filters for devices %s"), device_ids)
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, list(device_ids))
+        devices = self._get_devices_with_security_group_info(
+            list(device_ids))
         with self.firewall.defer_apply():
             for device in devices.values():
                 self.firewall.prepare_port_filter(device)
@@ -171,10 +291,82 @@ class SecurityGroupAgentRpcMixin(object):
     def security_groups_member_updated(self, security_groups):
         LOG.info(_("Security group "
                    "member updated %r"), security_groups)
+        if self.use_enhanced_rpc:
+            # Port chains only reference the ipsets of remote groups, so
+            # updating the members of the sets is enough.
+            self._security_group_members_updated(security_groups)
+            return
         self._security_group_updated(
             security_groups,
             'security_group_source_groups')
 
+    def _security_group_members_updated(self, security_groups):
+        sec_grp_set = set(security_groups)
+        updated_groups = set()
+        for device in self.firewall.ports.values():
+            updated_groups |= sec_grp_set & set(
+                device.get('security_group_source_groups', []))
+        if not updated_groups:
+            return
+        if self.defer_refresh_firewall:
+            LOG.debug(_("Adding %s security groups to the list of groups "
+                        "for which members need to be refreshed"),
+                      updated_groups)
+            self.sg_members_to_refresh |= updated_groups
+        else:
+            self.refresh_security_group_members(updated_groups)
+
+    def refresh_security_group_members(self, security_groups):
+        """Refresh the member ips of remote security groups.
+
+        Member ips are fetched through a single device referencing each
+        group instead of re-fetching the rules of every affected device.
+        """
+        LOG.info(_("Refresh members of security groups %r"),
+                 security_groups)
+        if self.use_member_delta_rpc:
+            self._refresh_security_group_members_delta(security_groups)
+            return
+        device_ids = set()
+        remaining = set(security_groups)
+        for device in self.firewall.ports.values():
+            source_groups = remaining & set(
+                device.get('security_group_source_groups', []))
+            if source_groups:
+                device_ids.add(device['device'])
+                remaining -= source_groups
+        if not device_ids:
+            return
+        devices_info = self.plugin_rpc.security_group_info_for_devices(
+            self.context, list(device_ids))
+        versions = devices_info.get('sg_member_versions', {})
+        for sg_id, member_ips in devices_info['sg_member_ips'].items():
+            if sg_id in security_groups:
+                self._update_security_group_members(sg_id, member_ips,
+                                                    versions.get(sg_id))
+
+    def _refresh_security_group_members_delta(self, security_groups):
+        """Apply the member ips changes since the versions held."""
+        versions = dict((sg_id, self.sg_member_versions.get(sg_id))
+                        for sg_id in security_groups)
+        deltas = self.plugin_rpc.security_group_member_ips_delta(
+            self.context, security_groups=versions)
+        for sg_id, delta in deltas.items():
+            if 'members' in delta:
+                member_ips = delta['members']
+            elif delta['version'] == versions[sg_id]:
+                continue
+            else:
+                old_member_ips = self.sg_member_ips.get(sg_id, {})
+                member_ips = {}
+                for ethertype, added in delta['added'].items():
+                    removed = delta['removed'].get(ethertype, [])
+                    member_ips[ethertype] = [
+                        ip for ip in old_member_ips.get(ethertype, [])
+                        if ip not in removed] + added
+            self._update_security_group_members(sg_id, member_ips,
+                                                delta['version'])
+
     def _security_group_updated(self, security_groups, attribute):
         devices = []
         sec_grp_set = set(security_groups)
@@ -218,15 +410,40 @@ class SecurityGroupAgentRpcMixin(object):
             if not device_ids:
                 LOG.info(_("No ports here to refresh firewall"))
                 return
-        devices = self.plugin_rpc.security_group_rules_for_devices(
-            self.context, device_ids)
+        updated_sg_ids = set()
+        devices = self._get_devices_with_security_group_info(
+            device_ids, updated_sg_ids)
+        updated_devices = [device for device in devices.values()
+                           if self._port_filter_changed(device,
+                                                        updated_sg_ids)]
+        self.firewall_refresh_stats['refreshes'] += 1
+        self.firewall_refresh_stats['devices_refreshed'] += len(
+            updated_devices)
+        self.firewall_refresh_stats['devices_unchanged'] += (
+            len(devices) - len(updated_devices))
+        if not updated_devices:
+            LOG.debug(_("Filters of devices %s are unchanged"),
+                      devices.keys())
+            return
         with self.firewall.defer_apply():
-            for device in devices.values():
+            for device in updated_devices:
                 LOG.debug(_("Update port filter for %s"), device['device'])
                 self.firewall.update_port_filter(device)
 
+    def _port_filter_changed(self, device, updated_sg_ids):
+        """Check whether the filter of a device must be updated.
+
+        It is the case when the port dict differs from the one the filter
+        was applied with, or when the rules of one of its security groups
+        changed.
+        """
+        if self.firewall.ports.get(device['device']) != device:
+            return True
+        return bool(updated_sg_ids & set(device.get('security_groups', [])))
+
     def firewall_refresh_needed(self):
-        return self.global_refresh_firewall or self.devices_to_refilter
+        return (self.global_refresh_firewall or self.devices_to_refilter or
+                self.sg_members_to_refresh)
 
     def setup_port_filters(self, new_devices, updated_devices):
         """Configure port filters for devices.
@@ -247,8 +464,14 @@ class SecurityGroupAgentRpcMixin(object):
         # losing updates occurring during firewall refresh
         devices_to_refilter = self.devices_to_refilter
         global_refresh_firewall = self.global_refresh_firewall
+        sg_members_to_refresh = self.sg_members_to_refresh
         self.devices_to_refilter = set()
         self.global_refresh_firewall = False
+        self.sg_members_to_refresh = set()
+        if sg_members_to_refresh:
+            LOG.debug(_("Refreshing members of %d security groups"),
+                      len(sg_members_to_refresh))
+            self.refresh_security_group_members(sg_members_to_refresh)
         # TODO(salv-orlando): Avoid if possible ever performing the global
         # refresh providing a precise list of devices for which firewall
         # should be refreshed
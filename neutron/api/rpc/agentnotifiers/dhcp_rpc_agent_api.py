@@ -13,11 +13,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+
 from neutron.common import constants
 from neutron.common import rpc as n_rpc
 from neutron.common import topics
 from neutron.common import utils
 from neutron import manager
+from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
 
 
@@ -25,8 +28,14 @@ LOG = logging.getLogger(__name__)
 
 
 class DhcpAgentNotifyAPI(n_rpc.RpcProxy):
-    """API for plugin to notify DHCP agent."""
+    """API for plugin to notify DHCP agent.
+
+    API version history:
+        1.0 - Initial version.
+        1.1 - Added ports_create_end.
+    """
     BASE_RPC_API_VERSION = '1.0'
+    BULK_PORTS_RPC_API_VERSION = '1.1'
     # It seems dhcp agent does not support bulk operation
     VALID_RESOURCES = ['network', 'subnet', 'port']
     VALID_METHOD_NAMES = ['network.create.end',
@@ -109,22 +118,61 @@ class DhcpAgentNotifyAPI(n_rpc.RpcProxy):
         if fanout_required:
             self._fanout_message(context, method, payload)
         elif cast_required:
-            admin_ctx = (context if context.is_admin else context.elevated())
-            network = self.plugin.get_network(admin_ctx, network_id)
-            agents = self.plugin.get_dhcp_agents_hosting_networks(
-                context, [network_id])
-
-            # schedule the network first, if needed
-            schedule_required = method == 'port_create_end'
-            if schedule_required:
-                agents = self._schedule_network(admin_ctx, network, agents)
-
-            enabled_agents = self._get_enabled_agents(
-                context, network, agents, method, payload)
-            for agent in enabled_agents:
+            for agent in self._get_agents_to_notify(context, method, payload,
+                                                    network_id):
                 self._cast_message(
                     context, method, payload, agent.host, agent.topic)
 
+    def _get_agents_to_notify(self, context, method, payload, network_id):
+        admin_ctx = (context if context.is_admin else context.elevated())
+        network = self.plugin.get_network(admin_ctx, network_id)
+        agents = self.plugin.get_dhcp_agents_hosting_networks(
+            context, [network_id])
+
+        # schedule the network first, if needed
+        schedule_required = method in ('port_create_end', 'ports_create_end')
+        if schedule_required:
+            agents = self._schedule_network(admin_ctx, network, agents)
+
+        return self._get_enabled_agents(
+            context, network, agents, method, payload)
+
+    def _notify_ports_created(self, context, ports, network_id):
+        """Notify the agents hosting the network of the ports created on it.
+
+        The ports are notified at once to the agents which report that they
+        support it, and one by one to the others and when fanout is needed.
+        """
+        payload = {'ports': ports}
+        if not utils.is_extension_supported(
+                self.plugin, constants.DHCP_AGENT_SCHEDULER_EXT_ALIAS):
+            for port in ports:
+                self._fanout_message(context, 'port_create_end',
+                                     {'port': port})
+            return
+        for agent in self._get_agents_to_notify(
+                context, 'ports_create_end', payload, network_id):
+            if self._supports_bulk_ports(agent):
+                self.cast(
+                    context, self.make_msg('ports_create_end',
+                                           payload=payload),
+                    topic='%s.%s' % (agent.topic, agent.host),
+                    version=self.BULK_PORTS_RPC_API_VERSION)
+            else:
+                for port in ports:
+                    self._cast_message(context, 'port_create_end',
+                                       {'port': port}, agent.host,
+                                       agent.topic)
+
+    @staticmethod
+    def _supports_bulk_ports(agent):
+        try:
+            configurations = jsonutils.loads(agent.configurations)
+        except (TypeError, ValueError):
+            return False
+        return bool(configurations.get(
+            constants.DHCP_AGENT_BULK_PORT_NOTIFICATIONS))
+
     def _cast_message(self, context, method, payload, host,
                       topic=topics.DHCP_AGENT):
         """Cast the payload to the dhcp agent running on the host."""
@@ -175,3 +223,21 @@ class DhcpAgentNotifyAPI(n_rpc.RpcProxy):
                                     network_id)
         else:
             self._notify_agents(context, method_name, data, network_id)
+
+    def notify_bulk(self, context, resource, bodies, method_name):
+        """Notify the same event for many resources of a type.
+
+        The ports created on a network are notified at once, the other
+        events are notified like with notify.
+        """
+        if resource == 'port' and method_name == 'port.create.end':
+            ports_by_network = collections.OrderedDict()
+            for port in bodies:
+                if 'network_id' in port:
+                    ports_by_network.setdefault(port['network_id'],
+                                                []).append(port)
+            for network_id, ports in ports_by_network.iteritems():
+                self._notify_ports_created(context, ports, network_id)
+        else:
+            for body in bodies:
+                self.notify(context, {resource: body}, method_name)
@@ -26,6 +26,7 @@ from neutron.api.v2 import resource as wsgi_resource
 from neutron.common import constants as const
 from neutron.common import exceptions
 from neutron.common import rpc as n_rpc
+from neutron.openstack.common import excutils
 from neutron.openstack.common import log as logging
 from neutron import policy
 from neutron import quota
@@ -245,6 +246,10 @@ class Controller(object):
         if do_authz:
             # FIXME(salvatore-orlando): obj_getter might return references to
             # other resources. Must check authZ on them too.
+            # Load the parent resources referenced by the policy at once
+            # rather than for each object.
+            policy.fetch_parent_attributes(self._plugin_handlers[self.SHOW],
+                                           obj_list)
             # Omit items from list that should not be visible
             obj_list = [obj for obj in obj_list
                         if policy.check(request.context,
@@ -289,6 +294,12 @@ class Controller(object):
     def _send_dhcp_notification(self, context, data, methodname):
         if cfg.CONF.dhcp_agent_notification:
             if self._collection in data:
+                notify_bulk = getattr(self._dhcp_agent_notifier,
+                                      'notify_bulk', None)
+                if notify_bulk:
+                    notify_bulk(context, self._resource,
+                                data[self._collection], methodname)
+                    return
                 for body in data[self._collection]:
                     item = {self._resource: body}
                     self._dhcp_agent_notifier.notify(context, item, methodname)
@@ -381,37 +392,50 @@ class Controller(object):
         if self._collection in body:
             # Have to account for bulk create
             items = body[self._collection]
-            deltas = {}
-            bulk = True
         else:
             items = [body]
-            bulk = False
         # Ensure policy engine is initialized
         policy.init()
+        deltas = {}
         for item in items:
             self._validate_network_tenant_ownership(request,
                                                     item[self._resource])
             policy.enforce(request.context,
                            action,
                            item[self._resource])
+            tenant_id = item[self._resource]['tenant_id']
+            deltas[tenant_id] = deltas.get(tenant_id, 0) + 1
+        reservations = []
+        try:
+            for tenant_id, delta in deltas.items():
+                reservations.append(quota.QUOTAS.make_reservation(
+                    request.context, tenant_id, self._resource, delta,
+                    self._plugin, self._collection))
+        except exceptions.QuotaResourceUnknown as e:
+            # We don't want to quota this resource
+            LOG.debug(e)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._cancel_reservations(request.context, reservations)
+        try:
+            result = self._create(request, body, action, parent_id)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._cancel_reservations(request.context, reservations)
+        for reservation in reservations:
+            quota.QUOTAS.commit_reservation(request.context, reservation)
+        return result
+
+    def _cancel_reservations(self, context, reservations):
+        for reservation in reservations:
             try:
-                tenant_id = item[self._resource]['tenant_id']
-                count = quota.QUOTAS.count(request.context, self._resource,
-                                           self._plugin, self._collection,
-                                           tenant_id)
-                if bulk:
-                    delta = deltas.get(tenant_id, 0) + 1
-                    deltas[tenant_id] = delta
-                else:
-                    delta = 1
-                kwargs = {self._resource: count + delta}
-            except exceptions.QuotaResourceUnknown as e:
-                # We don't want to quota this resource
-                LOG.debug(e)
-            else:
-                quota.QUOTAS.limit_check(request.context,
-                                         item[self._resource]['tenant_id'],
-                                         **kwargs)
+                quota.QUOTAS.cancel_reservation(context, reservation)
+            except Exception:
+                # The reservation expires anyway
+                LOG.exception(_("Unable to cancel quota reservation %s"),
+                              reservation)
+
+    def _create(self, request, body, action, parent_id):
 
         def notify(create_result):
             notifier_method = self._resource + '.create.end'
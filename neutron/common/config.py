@@ -69,6 +69,13 @@ core_opts = [
                help=_("Maximum number of host routes per subnet")),
     cfg.IntOpt('max_fixed_ips_per_port', default=5,
                help=_("Maximum number of fixed ips per port")),
+    cfg.StrOpt('ip_allocator_driver',
+               default='neutron.db.ip_allocator.AvailabilityRangeAllocator',
+               help=_("Driver used to allocate the IP addresses of ports")),
+    cfg.IntOpt('ip_allocation_retries', default=16,
+               help=_("How many random IP addresses the RandomAllocator "
+                      "will try on a subnet before looking for a free "
+                      "one")),
     cfg.IntOpt('dhcp_lease_duration', default=86400,
                deprecated_name='dhcp_lease_time',
                help=_("DHCP lease duration (in seconds). Use -1 to tell "
@@ -90,6 +90,10 @@ AGENT_TYPE_SDNVE = 'IBM SDN-VE agent'
 AGENT_TYPE_NIC_SWITCH = 'NIC Switch agent'
 L2_AGENT_TOPIC = 'N/A'
 
+# Configuration reported by the DHCP agents which handle the creation of
+# many ports of a network in a single notification
+DHCP_AGENT_BULK_PORT_NOTIFICATIONS = 'bulk_port_notifications'
+
 PAGINATION_INFINITE = 'infinite'
 
 SORT_DIRECTION_ASC = 'asc'
@@ -33,6 +33,7 @@ from eventlet.green import subprocess
 from oslo.config import cfg
 
 from neutron.common import constants as q_const
+from neutron.openstack.common import jsonutils
 from neutron.openstack.common import lockutils
 from neutron.openstack.common import log as logging
 
@@ -303,6 +304,31 @@ def get_dhcp_agent_device_id(network_id, host):
     return 'dhcp%s-%s' % (host_uuid, network_id)
 
 
+def get_dhcp_network_revision(network):
+    """Returns a digest of the attributes of a network served by DHCP.
+
+    Only the attributes of the network, of its DHCP enabled subnets and of
+    its ports which are used by the DHCP agents are taken into account, so
+    that an agent can tell whether the network it has in cache is current.
+    """
+    subnets = sorted(
+        (subnet['id'], subnet['cidr'], subnet['ip_version'],
+         subnet['gateway_ip'], subnet.get('dns_nameservers'),
+         subnet.get('host_routes'), subnet.get('ipv6_ra_mode'),
+         subnet.get('ipv6_address_mode'))
+        for subnet in network.get('subnets', []) if subnet['enable_dhcp'])
+    ports = sorted(
+        (port['id'], port['mac_address'], port.get('device_id'),
+         port.get('device_owner'),
+         sorted((fixed_ip['subnet_id'], fixed_ip['ip_address'])
+                for fixed_ip in port['fixed_ips']),
+         port.get('extra_dhcp_opts'))
+        for port in network.get('ports', []))
+    data = jsonutils.dumps([network['id'], network['admin_state_up'],
+                            subnets, ports], sort_keys=True)
+    return hashlib.sha1(data).hexdigest()
+
+
 def cpu_count():
     try:
         return multiprocessing.cpu_count()
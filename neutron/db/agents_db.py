@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
 from eventlet import greenthread
 
 from oslo.config import cfg
@@ -22,6 +24,7 @@ from sqlalchemy.orm import exc
 from sqlalchemy import sql
 
 from neutron.common import rpc as n_rpc
+from neutron import context as n_context
 from neutron.db import model_base
 from neutron.db import models_v2
 from neutron.extensions import agent as ext_agent
@@ -29,6 +32,7 @@ from neutron import manager
 from neutron.openstack.common import excutils
 from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
+from neutron.openstack.common import loopingcall
 from neutron.openstack.common import timeutils
 
 LOG = logging.getLogger(__name__)
@@ -37,6 +41,20 @@ cfg.CONF.register_opt(
                help=_("Seconds to regard the agent is down; should be at "
                       "least twice report_interval, to be sure the "
                       "agent is down for good.")))
+cfg.CONF.register_opt(
+    cfg.IntOpt('agent_heartbeat_flush_interval', default=0,
+               help=_("Seconds during which the heartbeats of agents whose "
+                      "configuration did not change are kept in memory, "
+                      "before being written to the database in bulk. "
+                      "Agents are regarded as down this much later. 0 "
+                      "writes each heartbeat immediately.")))
+cfg.CONF.register_opt(
+    cfg.IntOpt('agent_configurations_write_interval', default=300,
+               help=_("Minimum seconds between two writes of the "
+                      "configurations of an agent when its heartbeats are "
+                      "kept in memory. Changed configurations, like the "
+                      "counters some agents report, are written at most "
+                      "this often, and when the agent restarts.")))
 
 
 class Agent(model_base.BASEV2, models_v2.HasId):
@@ -84,8 +102,11 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
 
     @classmethod
     def is_agent_down(cls, heart_beat_time):
-        return timeutils.is_older_than(heart_beat_time,
-                                       cfg.CONF.agent_down_time)
+        # The heartbeats kept in memory by the servers are written to the
+        # database up to agent_heartbeat_flush_interval later.
+        return timeutils.is_older_than(
+            heart_beat_time,
+            cfg.CONF.agent_down_time + cfg.CONF.agent_heartbeat_flush_interval)
 
     def get_configuration_dict(self, agent_db):
         try:
@@ -196,6 +217,123 @@ class AgentDbMixin(ext_agent.AgentPluginBase):
                     ctxt.reraise = False
                     return self._create_or_update_agent(context, agent)
 
+    def update_agents_heartbeats(self, context, heartbeats):
+        """Write the heartbeats of existing agents.
+
+        heartbeats is a list of (agent state, heartbeat time, write
+        configurations) tuples. The configurations of an agent are only
+        written if write configurations is True and they changed; the
+        heartbeat timestamps of the other agents are updated in bulk. A
+        heartbeat older than the stored one is not written, since other
+        servers may have written a later heartbeat of the same agent.
+        """
+        hosts = set(heartbeat[0]['host'] for heartbeat in heartbeats)
+        with context.session.begin(subtransactions=True):
+            query = context.session.query(Agent.id, Agent.agent_type,
+                                          Agent.host, Agent.configurations)
+            agents = dict(((agent_type, host), (agent_id, configurations))
+                          for agent_id, agent_type, host, configurations in
+                          query.filter(Agent.host.in_(hosts)))
+            timestamps = []
+            for agent, heartbeat, write_configurations in heartbeats:
+                agent_db = agents.get((agent['agent_type'], agent['host']))
+                if not agent_db:
+                    # The agent has been deleted meanwhile
+                    self._create_or_update_agent(context, agent)
+                    continue
+                agent_id, configurations = agent_db
+                configurations_dict = agent.get('configurations', {})
+                try:
+                    changed = write_configurations and (
+                        jsonutils.loads(configurations) !=
+                        configurations_dict)
+                except ValueError:
+                    changed = True
+                if changed:
+                    query = context.session.query(Agent).filter(
+                        Agent.id == agent_id,
+                        Agent.heartbeat_timestamp < heartbeat)
+                    query.update(
+                        {'configurations': jsonutils.dumps(
+                            configurations_dict),
+                         'heartbeat_timestamp': heartbeat},
+                        synchronize_session=False)
+                else:
+                    timestamps.append({'agent_id': agent_id,
+                                       'heartbeat': heartbeat})
+            if timestamps:
+                table = Agent.__table__
+                context.session.execute(
+                    table.update().
+                    where(sa.and_(
+                        table.c.id == sa.bindparam('agent_id'),
+                        table.c.heartbeat_timestamp < sa.bindparam(
+                            'heartbeat'))).
+                    values(heartbeat_timestamp=sa.bindparam('heartbeat')),
+                    timestamps)
+
+
+class AgentHeartbeats(object):
+    """Write-behind buffer of the agent heartbeats.
+
+    The first heartbeat received from an agent, and the ones sent when it
+    starts, are written immediately. The latest heartbeat of each agent
+    is otherwise kept in memory and written to the database every
+    agent_heartbeat_flush_interval seconds, along with its configurations
+    if they were last written agent_configurations_write_interval seconds
+    ago or more.
+    """
+
+    def __init__(self, plugin, interval):
+        self.plugin = plugin
+        self.interval = interval
+        # (agent_type, host): (agent state, heartbeat time)
+        self._pending = {}
+        # agents whose heartbeats are known to have been written
+        self._written = set()
+        # (agent_type, host): time their configurations were last written
+        self._configurations_written = {}
+        self._flush_loop = None
+
+    def report(self, context, agent):
+        key = (agent['agent_type'], agent['host'])
+        if agent.get('start_flag') or key not in self._written:
+            self._pending.pop(key, None)
+            self.plugin.create_or_update_agent(context, agent)
+            self._written.add(key)
+            self._configurations_written[key] = timeutils.utcnow()
+            return
+        self._pending[key] = (agent, timeutils.utcnow())
+        if not self._flush_loop:
+            self._flush_loop = loopingcall.FixedIntervalLoopingCall(
+                self.flush)
+            self._flush_loop.start(interval=self.interval,
+                                   initial_delay=self.interval)
+
+    def flush(self):
+        pending = self._pending
+        self._pending = {}
+        if not pending:
+            return
+        now = timeutils.utcnow()
+        written_before = now - datetime.timedelta(
+            seconds=cfg.CONF.agent_configurations_write_interval)
+        due = set(key for key in pending
+                  if self._configurations_written[key] <= written_before)
+        heartbeats = [(agent, heartbeat, key in due)
+                      for key, (agent, heartbeat) in pending.items()]
+        try:
+            self.plugin.update_agents_heartbeats(
+                n_context.get_admin_context(), heartbeats)
+        except Exception:
+            LOG.exception(_("Failed to write the heartbeats of %d agents"),
+                          len(pending))
+            # Write their next heartbeats immediately
+            self._written.difference_update(pending)
+            return
+        for key in due:
+            self._configurations_written[key] = now
+
 
 class AgentExtRpcCallback(n_rpc.RpcCallback):
     """Processes the rpc report in plugin implementations."""
@@ -206,6 +344,7 @@ class AgentExtRpcCallback(n_rpc.RpcCallback):
     def __init__(self, plugin=None):
         super(AgentExtRpcCallback, self).__init__()
         self.plugin = plugin
+        self.heartbeats = None
 
     def report_state(self, context, **kwargs):
         """Report state from agent to server."""
@@ -217,4 +356,10 @@ class AgentExtRpcCallback(n_rpc.RpcCallback):
         agent_state = kwargs['agent_state']['agent_state']
         if not self.plugin:
             self.plugin = manager.NeutronManager.get_plugin()
-        self.plugin.create_or_update_agent(context, agent_state)
+        if cfg.CONF.agent_heartbeat_flush_interval > 0:
+            if not self.heartbeats:
+                self.heartbeats = AgentHeartbeats(
+                    self.plugin, cfg.CONF.agent_heartbeat_flush_interval)
+            self.heartbeats.report(context, agent_state)
+        else:
+            self.plugin.create_or_update_agent(context, agent_state)
@@ -39,6 +39,10 @@ AGENTS_SCHEDULER_OPTS = [
                 help=_('Allow auto scheduling networks to DHCP agent.')),
     cfg.IntOpt('dhcp_agents_per_network', default=1,
                help=_('Number of DHCP agents scheduled to host a network.')),
+    cfg.FloatOpt('dhcp_load_port_weight', default=0.1,
+                 help=_('Load of a port relative to the load of a network '
+                        'when the WeightScheduler computes the load of a '
+                        'DHCP agent.')),
 ]
 
 cfg.CONF.register_opts(AGENTS_SCHEDULER_OPTS)
@@ -15,6 +15,7 @@
 
 import weakref
 
+from sqlalchemy import orm
 from sqlalchemy import sql
 
 from neutron.common import exceptions as n_exc
@@ -140,8 +141,24 @@ class CommonDbMixin(object):
                     query = result_filter(query, filters)
         return query
 
+    def _apply_fields_to_query(self, query, model, fields):
+        """Don't load the relationships of model when they aren't needed.
+
+        This is the case when only columns of model are requested, as the
+        relationships are then neither used to make the resource dicts nor
+        by the dict extend functions, which are skipped for such fields.
+        """
+        if fields:
+            columns = orm.class_mapper(model).column_attrs.keys()
+            if set(fields).issubset(columns):
+                query = query.options(orm.lazyload('*'))
+        return query
+
     def _apply_dict_extend_functions(self, resource_type,
-                                     response, db_object):
+                                     response, db_object, fields=None):
+        if fields and set(fields).issubset(response):
+            # None of the requested attributes is added by the extensions
+            return
         for func in self._dict_extend_functions.get(
             resource_type, []):
             args = (response, db_object)
@@ -173,6 +190,7 @@ class CommonDbMixin(object):
                                            limit=limit,
                                            marker_obj=marker_obj,
                                            page_reverse=page_reverse)
+        query = self._apply_fields_to_query(query, model, fields)
         items = [dict_func(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
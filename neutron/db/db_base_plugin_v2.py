@@ -34,6 +34,7 @@ from neutron.extensions import l3
 from neutron import manager
 from neutron import neutron_plugin_base_v2
 from neutron.openstack.common import excutils
+from neutron.openstack.common import importutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import uuidutils
 from neutron.plugins.common import constants as service_constants
@@ -68,6 +69,8 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
     __native_pagination_support = True
     __native_sorting_support = True
 
+    _ip_allocator = None
+
     def __init__(self):
         db.configure_db()
         if cfg.CONF.notify_nova_on_port_status_changes:
@@ -82,6 +85,13 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             event.listen(models_v2.Port.status, 'set',
                          self.nova_notifier.record_port_status_changed)
 
+    @property
+    def ip_allocator(self):
+        if self._ip_allocator is None:
+            self._ip_allocator = importutils.import_object(
+                cfg.CONF.ip_allocator_driver)
+        return self._ip_allocator
+
     @classmethod
     def register_dict_extend_funcs(cls, resource, funcs):
         cur_funcs = cls._dict_extend_functions.get(resource, [])
@@ -127,16 +137,20 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         return context.session.query(models_v2.Subnet).all()
 
     @staticmethod
-    def _generate_mac(context, network_id):
+    def _random_mac():
         base_mac = cfg.CONF.base_mac.split(':')
+        mac = [int(base_mac[0], 16), int(base_mac[1], 16),
+               int(base_mac[2], 16), random.randint(0x00, 0xff),
+               random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
+        if base_mac[3] != '00':
+            mac[3] = int(base_mac[3], 16)
+        return ':'.join(map(lambda x: "%02x" % x, mac))
+
+    @staticmethod
+    def _generate_mac(context, network_id):
         max_retries = cfg.CONF.mac_generation_retries
         for i in range(max_retries):
-            mac = [int(base_mac[0], 16), int(base_mac[1], 16),
-                   int(base_mac[2], 16), random.randint(0x00, 0xff),
-                   random.randint(0x00, 0xff), random.randint(0x00, 0xff)]
-            if base_mac[3] != '00':
-                mac[3] = int(base_mac[3], 16)
-            mac_address = ':'.join(map(lambda x: "%02x" % x, mac))
+            mac_address = NeutronDbPluginV2._random_mac()
             if NeutronDbPluginV2._check_unique_mac(context, network_id,
                                                    mac_address):
                 LOG.debug(_("Generated mac for network %(network_id)s "
@@ -153,6 +167,36 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                   max_retries)
         raise n_exc.MacAddressGenerationFailure(net_id=network_id)
 
+    @staticmethod
+    def _generate_macs(context, network_id, count, reserved=()):
+        """Generate unique mac addresses for many ports of a network.
+
+        The candidates of each attempt are checked with a single query.
+        reserved are mac addresses not to generate although they are not
+        in use yet, such as the ones requested for the other ports of a
+        bulk request.
+        """
+        mac_addresses = set()
+        if not count:
+            return []
+        max_retries = cfg.CONF.mac_generation_retries
+        for i in range(max_retries):
+            candidates = set(NeutronDbPluginV2._random_mac()
+                             for j in range(count - len(mac_addresses)))
+            candidates -= mac_addresses
+            candidates.difference_update(reserved)
+            mac_qry = context.session.query(models_v2.Port.mac_address)
+            mac_qry = mac_qry.filter(
+                models_v2.Port.network_id == network_id,
+                models_v2.Port.mac_address.in_(candidates))
+            candidates -= set(mac_address for mac_address, in mac_qry)
+            mac_addresses |= candidates
+            if len(mac_addresses) == count:
+                return list(mac_addresses)
+        LOG.error(_("Unable to generate mac address after %s attempts"),
+                  max_retries)
+        raise n_exc.MacAddressGenerationFailure(net_id=network_id)
+
     @staticmethod
     def _check_unique_mac(context, network_id, mac_address):
         mac_qry = context.session.query(models_v2.Port)
@@ -226,6 +270,54 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             return {'ip_address': ip_address, 'subnet_id': subnet['id']}
         raise n_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
 
+    @staticmethod
+    def _generate_ips(context, subnets, count):
+        """Generate count IP addresses from the subnets in one pass.
+
+        The availability ranges of the subnets are locked and updated once
+        for all the addresses. They are rebuilt if they run out, as with
+        _generate_ip.
+        """
+        ips = NeutronDbPluginV2._try_generate_ips(context, subnets, count)
+        if len(ips) < count:
+            NeutronDbPluginV2._rebuild_availability_ranges(context, subnets)
+            # The addresses generated so far are not allocated yet, so the
+            # rebuilt ranges still include them
+            for ip in ips:
+                NeutronDbPluginV2._allocate_specific_ip(
+                    context, ip['subnet_id'], ip['ip_address'])
+            ips += NeutronDbPluginV2._try_generate_ips(context, subnets,
+                                                       count - len(ips))
+            if len(ips) < count:
+                raise n_exc.IpAddressGenerationFailure(
+                    net_id=subnets[0]['network_id'])
+        return ips
+
+    @staticmethod
+    def _try_generate_ips(context, subnets, count):
+        """Generate up to count IP addresses from the subnets."""
+        ips = []
+        range_qry = context.session.query(
+            models_v2.IPAvailabilityRange).join(
+                models_v2.IPAllocationPool).with_lockmode('update')
+        for subnet in subnets:
+            for ip_range in range_qry.filter_by(subnet_id=subnet['id']):
+                first_ip = netaddr.IPAddress(ip_range['first_ip'])
+                last_ip = netaddr.IPAddress(ip_range['last_ip'])
+                taken = min(count - len(ips), int(last_ip) - int(first_ip) + 1)
+                ips += [{'ip_address': str(first_ip + i),
+                         'subnet_id': subnet['id']} for i in range(taken)]
+                if int(first_ip) + taken > int(last_ip):
+                    context.session.delete(ip_range)
+                else:
+                    ip_range['first_ip'] = str(first_ip + taken)
+                if len(ips) == count:
+                    return ips
+            LOG.debug(_("All IPs from subnet %(subnet_id)s (%(cidr)s) "
+                        "allocated"),
+                      {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
+        return ips
+
     @staticmethod
     def _rebuild_availability_ranges(context, subnets):
         ip_qry = context.session.query(
@@ -425,8 +517,9 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         for fixed in fixed_ips:
             if 'ip_address' in fixed:
                 # Remove the IP address from the allocation pool
-                NeutronDbPluginV2._allocate_specific_ip(
-                    context, fixed['subnet_id'], fixed['ip_address'])
+                self.ip_allocator.allocate_specific_ip(
+                    context, network['id'], fixed['subnet_id'],
+                    fixed['ip_address'])
                 ips.append({'ip_address': fixed['ip_address'],
                             'subnet_id': fixed['subnet_id']})
             # Only subnet ID is specified => need to generate IP
@@ -434,7 +527,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             else:
                 subnets = [self._get_subnet(context, fixed['subnet_id'])]
                 # IP address allocation
-                result = self._generate_ip(context, subnets)
+                result = self.ip_allocator.generate_ip(context, subnets)
                 ips.append({'ip_address': result['ip_address'],
                             'subnet_id': result['subnet_id']})
         return ips
@@ -475,12 +568,14 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             ips = self._allocate_fixed_ips(context, network, to_add)
         return ips, prev_ips
 
-    def _allocate_ips_for_port(self, context, network, port):
+    def _allocate_ips_for_port(self, context, network, port, subnets=None):
         """Allocate IP addresses for the port.
 
         If port['fixed_ips'] is set to 'ATTR_NOT_SPECIFIED', allocate IP
         addresses for the port. If port['fixed_ips'] contains an IP address or
         a subnet_id then allocate an IP address accordingly.
+        subnets is the list of subnet dicts of the network, if already
+        fetched.
         """
         p = port['port']
         ips = []
@@ -492,37 +587,72 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                                            p['fixed_ips'])
             ips = self._allocate_fixed_ips(context, network, configured_ips)
         else:
-            filter = {'network_id': [p['network_id']]}
-            subnets = self.get_subnets(context, filters=filter)
-            # Split into v4 and v6 subnets
-            v4 = []
-            v6 = []
-            for subnet in subnets:
-                if subnet['ip_version'] == 4:
-                    v4.append(subnet)
-                else:
-                    v6.append(subnet)
-            for subnet in v6:
-                if self._check_if_subnet_uses_eui64(subnet):
-                    #(dzyu) If true, calculate an IPv6 address
-                    # by mac address and prefix, then remove this
-                    # subnet from the array of subnets that will be passed
-                    # to the _generate_ip() function call, since we just
-                    # generated an IP.
-                    mac = p['mac_address']
-                    prefix = subnet['cidr']
-                    ip_address = ipv6_utils.get_ipv6_addr_by_EUI64(
-                        prefix, mac)
-                    ips.append({'ip_address': ip_address.format(),
-                                'subnet_id': subnet['id']})
-                    v6.remove(subnet)
-            version_subnets = [v4, v6]
+            if subnets is None:
+                filter = {'network_id': [p['network_id']]}
+                subnets = self.get_subnets(context, filters=filter)
+            ips, version_subnets = self._get_eui64_ips_and_subnets(
+                subnets, p['mac_address'])
             for subnets in version_subnets:
-                if subnets:
-                    result = NeutronDbPluginV2._generate_ip(context, subnets)
+                result = self.ip_allocator.generate_ip(context, subnets)
+                ips.append({'ip_address': result['ip_address'],
+                            'subnet_id': result['subnet_id']})
+        return ips
+
+    def _allocate_ips_for_ports(self, context, network, ports, subnets):
+        """Allocate IP addresses for ports of the same network.
+
+        Returns the list of the IPs of each port. The addresses of the
+        ports without fixed_ips are generated for all of them at once, in
+        one pass over the subnets of each IP version. subnets is the list
+        of subnet dicts of the network.
+        """
+        port_ips = []
+        generated_port_ips = []
+        for port in ports:
+            p = port['port']
+            if p['fixed_ips'] is not attributes.ATTR_NOT_SPECIFIED:
+                port_ips.append(self._allocate_ips_for_port(
+                    context, network, port, subnets))
+                continue
+            ips, version_subnets = self._get_eui64_ips_and_subnets(
+                subnets, p['mac_address'])
+            port_ips.append(ips)
+            generated_port_ips.append(ips)
+        if generated_port_ips:
+            # The subnets to generate addresses from do not depend on the
+            # port
+            for subnets in version_subnets:
+                results = self.ip_allocator.generate_ips(
+                    context, subnets, len(generated_port_ips))
+                for ips, result in zip(generated_port_ips, results):
                     ips.append({'ip_address': result['ip_address'],
                                 'subnet_id': result['subnet_id']})
-        return ips
+        return port_ips
+
+    def _get_eui64_ips_and_subnets(self, subnets, mac_address):
+        """Split the subnets of a port without fixed_ips.
+
+        Returns the IPs of the port calculated by EUI-64 from its mac
+        address, and the non empty lists of the IPv4 and of the other IPv6
+        subnets, from each of which an address must be generated.
+        """
+        ips = []
+        v4 = []
+        v6 = []
+        for subnet in subnets:
+            if subnet['ip_version'] == 4:
+                v4.append(subnet)
+            elif self._check_if_subnet_uses_eui64(subnet):
+                #(dzyu) If true, calculate an IPv6 address
+                # by mac address and prefix, no address needs to be
+                # generated from this subnet.
+                ip_address = ipv6_utils.get_ipv6_addr_by_EUI64(
+                    subnet['cidr'], mac_address)
+                ips.append({'ip_address': ip_address.format(),
+                            'subnet_id': subnet['id']})
+            else:
+                v6.append(subnet)
+        return ips, [subnets for subnets in (v4, v6) if subnets]
 
     def _validate_subnet_cidr(self, context, network, new_subnet_cidr):
         """Validate the CIDR for a subnet.
@@ -740,13 +870,13 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                'tenant_id': network['tenant_id'],
                'admin_state_up': network['admin_state_up'],
                'status': network['status'],
-               'shared': network['shared'],
-               'subnets': [subnet['id']
-                           for subnet in network['subnets']]}
+               'shared': network['shared']}
+        if not fields or 'subnets' in fields:
+            res['subnets'] = [subnet['id'] for subnet in network['subnets']]
         # Call auxiliary extend functions, if any
         if process_extensions:
             self._apply_dict_extend_functions(
-                attributes.NETWORKS, res, network)
+                attributes.NETWORKS, res, network, fields)
         return self._fields(res, fields)
 
     def _make_subnet_dict(self, subnet, fields=None):
@@ -756,20 +886,23 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                'network_id': subnet['network_id'],
                'ip_version': subnet['ip_version'],
                'cidr': subnet['cidr'],
-               'allocation_pools': [{'start': pool['first_ip'],
-                                     'end': pool['last_ip']}
-                                    for pool in subnet['allocation_pools']],
                'gateway_ip': subnet['gateway_ip'],
                'enable_dhcp': subnet['enable_dhcp'],
                'ipv6_ra_mode': subnet['ipv6_ra_mode'],
                'ipv6_address_mode': subnet['ipv6_address_mode'],
-               'dns_nameservers': [dns['address']
-                                   for dns in subnet['dns_nameservers']],
-               'host_routes': [{'destination': route['destination'],
-                                'nexthop': route['nexthop']}
-                               for route in subnet['routes']],
                'shared': subnet['shared']
                }
+        if not fields or 'allocation_pools' in fields:
+            res['allocation_pools'] = [{'start': pool['first_ip'],
+                                        'end': pool['last_ip']}
+                                       for pool in subnet['allocation_pools']]
+        if not fields or 'dns_nameservers' in fields:
+            res['dns_nameservers'] = [dns['address']
+                                      for dns in subnet['dns_nameservers']]
+        if not fields or 'host_routes' in fields:
+            res['host_routes'] = [{'destination': route['destination'],
+                                   'nexthop': route['nexthop']}
+                                  for route in subnet['routes']]
         return self._fields(res, fields)
 
     def _make_port_dict(self, port, fields=None,
@@ -781,15 +914,16 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                "mac_address": port["mac_address"],
                "admin_state_up": port["admin_state_up"],
                "status": port["status"],
-               "fixed_ips": [{'subnet_id': ip["subnet_id"],
-                              'ip_address': ip["ip_address"]}
-                             for ip in port["fixed_ips"]],
                "device_id": port["device_id"],
                "device_owner": port["device_owner"]}
+        if not fields or 'fixed_ips' in fields:
+            res['fixed_ips'] = [{'subnet_id': ip["subnet_id"],
+                                 'ip_address': ip["ip_address"]}
+                                for ip in port["fixed_ips"]]
         # Call auxiliary extend functions, if any
         if process_extensions:
             self._apply_dict_extend_functions(
-                attributes.PORTS, res, port)
+                attributes.PORTS, res, port, fields)
         return self._fields(res, fields)
 
     def _create_bulk(self, resource, context, request_items):
@@ -1118,7 +1252,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             first_ip=p['start'], last_ip=p['end'],
             subnet_id=id) for p in s['allocation_pools']]
         context.session.add_all(new_pools)
-        NeutronDbPluginV2._rebuild_availability_ranges(context, [s])
+        self.ip_allocator.update_allocation_pools(context, s)
         #Gather new pools for result:
         result_pools = [{'start': pool['start'],
                          'end': pool['end']}
@@ -1221,6 +1355,17 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
         return self._create_bulk('port', context, ports)
 
     def create_port(self, context, port):
+        return self._create_port(context, port)
+
+    def _create_port(self, context, port, network=None, subnets=None,
+                     mac_generated=False, ips=None):
+        """Create a port in the database.
+
+        The network model and the subnet dicts of the network can be given
+        when already fetched, mac_generated tells that the mac address
+        of the port was generated with _generate_macs, and ips are the IPs
+        of the port if already allocated with _allocate_ips_for_ports.
+        """
         p = port['port']
         port_id = p.get('id') or uuidutils.generate_uuid()
         network_id = p['network_id']
@@ -1232,7 +1377,8 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                                                     tenant_id)
 
         with context.session.begin(subtransactions=True):
-            network = self._get_network(context, network_id)
+            if network is None:
+                network = self._get_network(context, network_id)
 
             # Ensure that a MAC address is defined and it is unique on the
             # network
@@ -1242,7 +1388,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                 #calculating an EUI-64 address for a v6 subnet
                 p['mac_address'] = NeutronDbPluginV2._generate_mac(context,
                                                                    network_id)
-            else:
+            elif not mac_generated:
                 # Ensure that the mac on the network is unique
                 if not NeutronDbPluginV2._check_unique_mac(context,
                                                            network_id,
@@ -1251,7 +1397,9 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                                 mac=p['mac_address'])
 
             # Returns the IP's for the port
-            ips = self._allocate_ips_for_port(context, network, port)
+            if ips is None:
+                ips = self._allocate_ips_for_port(context, network, port,
+                                                  subnets)
 
             if 'status' not in p:
                 status = constants.PORT_STATUS_ACTIVE
@@ -1280,13 +1428,8 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                'network_id': network_id,
                                'subnet_id': subnet_id,
                                'port_id': port_id})
-                    allocated = models_v2.IPAllocation(
-                        network_id=network_id,
-                        port_id=port_id,
-                        ip_address=ip_address,
-                        subnet_id=subnet_id,
-                    )
-                    context.session.add(allocated)
+                    self.ip_allocator.store_allocation(
+                        context, network_id, subnet_id, ip_address, port_id)
 
         return self._make_port_dict(port, process_extensions=False)
 
@@ -1324,10 +1467,9 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
                 # Update ips if necessary
                 for ip in added_ips:
-                    allocated = models_v2.IPAllocation(
-                        network_id=port['network_id'], port_id=port.id,
-                        ip_address=ip['ip_address'], subnet_id=ip['subnet_id'])
-                    context.session.add(allocated)
+                    self.ip_allocator.store_allocation(
+                        context, port['network_id'], ip['subnet_id'],
+                        ip['ip_address'], port.id)
             # Remove all attributes in p which are not in the port DB model
             # and then update the port
             port.update(self._filter_non_model_columns(p, models_v2.Port))
@@ -1404,6 +1546,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                       sorts=sorts, limit=limit,
                                       marker_obj=marker_obj,
                                       page_reverse=page_reverse)
+        query = self._apply_fields_to_query(query, models_v2.Port, fields)
         items = [self._make_port_dict(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
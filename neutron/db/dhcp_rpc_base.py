@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+
 from oslo.config import cfg
 from oslo.db import exception as db_exc
 
@@ -86,25 +88,57 @@ class DhcpRpcCallbackMixin(object):
         nets = self._get_active_networks(context, **kwargs)
         return [net['id'] for net in nets]
 
-    def get_active_networks_info(self, context, **kwargs):
-        """Returns all the networks/subnets/ports in system."""
-        host = kwargs.get('host')
-        LOG.debug(_('get_active_networks_info from %s'), host)
-        networks = self._get_active_networks(context, **kwargs)
+    def _get_networks_info(self, context, networks):
+        """Adds their DHCP enabled subnets and their ports to networks."""
         plugin = manager.NeutronManager.get_plugin()
         filters = {'network_id': [network['id'] for network in networks]}
         ports = plugin.get_ports(context, filters=filters)
         filters['enable_dhcp'] = [True]
         subnets = plugin.get_subnets(context, filters=filters)
 
+        subnets_by_network = collections.defaultdict(list)
+        for subnet in subnets:
+            subnets_by_network[subnet['network_id']].append(subnet)
+        ports_by_network = collections.defaultdict(list)
+        for port in ports:
+            ports_by_network[port['network_id']].append(port)
         for network in networks:
-            network['subnets'] = [subnet for subnet in subnets
-                                  if subnet['network_id'] == network['id']]
-            network['ports'] = [port for port in ports
-                                if port['network_id'] == network['id']]
+            network['subnets'] = subnets_by_network[network['id']]
+            network['ports'] = ports_by_network[network['id']]
 
         return networks
 
+    def get_active_networks_info(self, context, **kwargs):
+        """Returns all the networks/subnets/ports in system."""
+        host = kwargs.get('host')
+        LOG.debug(_('get_active_networks_info from %s'), host)
+        networks = self._get_active_networks(context, **kwargs)
+        return self._get_networks_info(context, networks)
+
+    def get_active_networks_revisions(self, context, **kwargs):
+        """Returns the revisions of the active networks of a DHCP agent.
+
+        The agent only fetches with get_networks_info the networks whose
+        revision differs from the one of the network in its cache.
+        """
+        host = kwargs.get('host')
+        LOG.debug(_('get_active_networks_revisions from %s'), host)
+        networks = self._get_networks_info(
+            context, self._get_active_networks(context, **kwargs))
+        return dict((network['id'], utils.get_dhcp_network_revision(network))
+                    for network in networks)
+
+    def get_networks_info(self, context, **kwargs):
+        """Returns the given active networks with their subnets/ports."""
+        network_ids = kwargs.get('network_ids')
+        host = kwargs.get('host')
+        LOG.debug(_('get_networks_info of %(count)d networks from %(host)s'),
+                  {'count': len(network_ids), 'host': host})
+        plugin = manager.NeutronManager.get_plugin()
+        filters = {'id': network_ids, 'admin_state_up': [True]}
+        networks = plugin.get_networks(context, filters=filters)
+        return self._get_networks_info(context, networks)
+
     def get_network_info(self, context, **kwargs):
         """Retrieve and return a extended information about a network."""
         network_id = kwargs.get('network_id')
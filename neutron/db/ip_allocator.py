@@ -0,0 +1,240 @@
+# Copyright (c) 2014 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import abc
+import random
+
+import netaddr
+from oslo.config import cfg
+from oslo.db import exception as db_exc
+import six
+
+from neutron.common import exceptions as n_exc
+from neutron.db import db_base_plugin_v2
+from neutron.db import models_v2
+from neutron.openstack.common import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+@six.add_metaclass(abc.ABCMeta)
+class IpAllocator(object):
+    """Chooses the IP addresses given to ports.
+
+    The allocator is called within the transaction creating or updating
+    the port, and is responsible for making sure that an address it
+    hands out is not used by another port of the subnet.
+    """
+
+    @abc.abstractmethod
+    def generate_ip(self, context, subnets):
+        """Allocate a free IP address from one of the given subnets.
+
+        Returns a dict with the ip_address and the subnet_id, or raises
+        IpAddressGenerationFailure if all the subnets are exhausted.
+        """
+
+    def generate_ips(self, context, subnets, count):
+        """Allocate count free IP addresses from the given subnets.
+
+        Returns a list of dicts like generate_ip. Allocators which can
+        hand out several addresses at once should override this.
+        """
+        return [self.generate_ip(context, subnets) for i in range(count)]
+
+    @abc.abstractmethod
+    def allocate_specific_ip(self, context, network_id, subnet_id,
+                             ip_address):
+        """Allocate the given IP address on the subnet."""
+
+    @abc.abstractmethod
+    def store_allocation(self, context, network_id, subnet_id, ip_address,
+                         port_id):
+        """Record that the IP address allocated on the subnet is in use.
+
+        This is called for every fixed IP of the port once the port
+        itself has been added to the session.
+        """
+
+    @abc.abstractmethod
+    def update_allocation_pools(self, context, subnet):
+        """Called once the allocation pools of a subnet have changed."""
+
+
+class AvailabilityRangeAllocator(IpAllocator):
+    """Allocate addresses from the IPAvailabilityRange table.
+
+    Addresses are handed out in order from the first available range of
+    the subnet, which is locked for update while it is being modified.
+    """
+
+    def generate_ip(self, context, subnets):
+        return db_base_plugin_v2.NeutronDbPluginV2._generate_ip(context,
+                                                                subnets)
+
+    def generate_ips(self, context, subnets, count):
+        return db_base_plugin_v2.NeutronDbPluginV2._generate_ips(
+            context, subnets, count)
+
+    def allocate_specific_ip(self, context, network_id, subnet_id,
+                             ip_address):
+        db_base_plugin_v2.NeutronDbPluginV2._allocate_specific_ip(
+            context, subnet_id, ip_address)
+
+    def store_allocation(self, context, network_id, subnet_id, ip_address,
+                         port_id):
+        allocated = models_v2.IPAllocation(network_id=network_id,
+                                           port_id=port_id,
+                                           ip_address=ip_address,
+                                           subnet_id=subnet_id)
+        context.session.add(allocated)
+
+    def update_allocation_pools(self, context, subnet):
+        db_base_plugin_v2.NeutronDbPluginV2._rebuild_availability_ranges(
+            context, [subnet])
+
+
+class RandomAllocator(IpAllocator):
+    """Allocate random addresses from the allocation pools without locking.
+
+    An address is reserved by inserting its IPAllocation row within a
+    savepoint: the primary key of the table guarantees that concurrent
+    transactions cannot reserve the same address, and a conflict only
+    costs another attempt with a different address. Ports created
+    concurrently on the same network therefore do not wait on each
+    other, unlike with the AvailabilityRangeAllocator.
+
+    The IPAvailabilityRange table is not maintained by this allocator,
+    so it must not be replaced by the AvailabilityRangeAllocator once
+    ports have been created.
+    """
+
+    def generate_ip(self, context, subnets):
+        return self._generate_ip(context, subnets, {})
+
+    def generate_ips(self, context, subnets, count):
+        # The allocation pools of the subnets are read once for all the
+        # addresses
+        pool_ranges = {}
+        return [self._generate_ip(context, subnets, pool_ranges)
+                for i in range(count)]
+
+    def _generate_ip(self, context, subnets, pool_ranges):
+        for subnet in subnets:
+            if subnet['id'] not in pool_ranges:
+                pool_ranges[subnet['id']] = self._get_pool_ranges(context,
+                                                                  subnet)
+            ip_address = self._generate_ip_on_subnet(
+                context, subnet, pool_ranges[subnet['id']])
+            if ip_address:
+                LOG.debug(_("Allocated IP %(ip_address)s on subnet "
+                            "%(subnet_id)s"),
+                          {'ip_address': ip_address,
+                           'subnet_id': subnet['id']})
+                return {'ip_address': ip_address, 'subnet_id': subnet['id']}
+            LOG.debug(_("All IPs from subnet %(subnet_id)s (%(cidr)s) "
+                        "allocated"),
+                      {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
+        raise n_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def allocate_specific_ip(self, context, network_id, subnet_id,
+                             ip_address):
+        if not self._reserve_ip(context, network_id, subnet_id, ip_address):
+            raise n_exc.IpAddressInUse(net_id=network_id,
+                                       ip_address=ip_address)
+
+    def store_allocation(self, context, network_id, subnet_id, ip_address,
+                         port_id):
+        # Addresses reserved by this allocator are already in the
+        # session, so the lookup does not hit the database for them.
+        allocated = context.session.query(models_v2.IPAllocation).get(
+            (ip_address, subnet_id, network_id))
+        if allocated:
+            allocated.port_id = port_id
+        else:
+            allocated = models_v2.IPAllocation(network_id=network_id,
+                                               port_id=port_id,
+                                               ip_address=ip_address,
+                                               subnet_id=subnet_id)
+            context.session.add(allocated)
+
+    def update_allocation_pools(self, context, subnet):
+        pass
+
+    @staticmethod
+    def _get_pool_ranges(context, subnet):
+        pool_qry = context.session.query(models_v2.IPAllocationPool.first_ip,
+                                         models_v2.IPAllocationPool.last_ip)
+        return [(int(netaddr.IPAddress(first_ip)),
+                 int(netaddr.IPAddress(last_ip)))
+                for first_ip, last_ip in pool_qry.filter_by(
+                    subnet_id=subnet['id'])]
+
+    def _generate_ip_on_subnet(self, context, subnet, ranges):
+        size = sum(last - first + 1 for first, last in ranges)
+        if not size:
+            return
+
+        retries = cfg.CONF.ip_allocation_retries
+        for i in range(retries):
+            ip_address = self._get_ip_at(ranges,
+                                         random.randint(0, size - 1))
+            if self._reserve_ip(context, subnet['network_id'], subnet['id'],
+                                ip_address):
+                return ip_address
+        LOG.debug(_("Failed to allocate a random IP on subnet %(subnet_id)s "
+                    "after %(retries)s attempts, looking for a free one"),
+                  {'subnet_id': subnet['id'], 'retries': retries})
+
+        # The subnet is crowded: walk the pools from a random position,
+        # skipping the addresses known to be allocated. Within the next
+        # len(allocated) + retries addresses at least 'retries' ones were
+        # free when the allocations were read.
+        ip_qry = context.session.query(models_v2.IPAllocation.ip_address)
+        allocated = set(int(netaddr.IPAddress(ip_address)) for ip_address, in
+                        ip_qry.filter_by(subnet_id=subnet['id']))
+        start = random.randint(0, size - 1)
+        for i in range(min(size, len(allocated) + retries)):
+            ip_address = self._get_ip_at(ranges, (start + i) % size)
+            if int(netaddr.IPAddress(ip_address)) in allocated:
+                continue
+            if self._reserve_ip(context, subnet['network_id'], subnet['id'],
+                                ip_address):
+                return ip_address
+
+    @staticmethod
+    def _get_ip_at(ranges, index):
+        """Return the address at the given position within the ranges."""
+        for first, last in ranges:
+            if index <= last - first:
+                return str(netaddr.IPAddress(first + index))
+            index -= last - first + 1
+
+    @staticmethod
+    def _reserve_ip(context, network_id, subnet_id, ip_address):
+        """Insert the IPAllocation row of an address not bound to a port yet.
+
+        Returns False if the address is already allocated.
+        """
+        try:
+            with context.session.begin_nested():
+                context.session.add(models_v2.IPAllocation(
+                    network_id=network_id,
+                    ip_address=ip_address,
+                    subnet_id=subnet_id))
+        except db_exc.DBDuplicateEntry:
+            return False
+        return True
@@ -153,8 +153,7 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
         else:
             return {'routers': []}
 
-    def list_active_sync_routers_on_active_l3_agent(
-            self, context, host, router_ids):
+    def list_router_ids_on_host(self, context, host, router_ids=None):
         agent = self._get_agent_by_type_and_host(
             context, constants.AGENT_TYPE_L3, host)
         if not agent.admin_state_up:
@@ -166,7 +165,11 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
         if router_ids:
             query = query.filter(
                 RouterL3AgentBinding.router_id.in_(router_ids))
-        router_ids = [item[0] for item in query]
+        return [item[0] for item in query]
+
+    def list_active_sync_routers_on_active_l3_agent(
+            self, context, host, router_ids):
+        router_ids = self.list_router_ids_on_host(context, host, router_ids)
         if router_ids:
             return self.get_sync_data(context, router_ids=router_ids,
                                       active=True)
@@ -274,8 +277,8 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
 
     def schedule_routers(self, context, routers):
         """Schedule the routers to l3 agents."""
-        for router in routers:
-            self.schedule_router(context, router)
+        if self.router_scheduler:
+            self.router_scheduler.schedule_routers(self, context, routers)
 
     def get_l3_agent_with_min_routers(self, context, agent_ids):
         """Return l3 agent with the least number of routers."""
@@ -287,3 +290,13 @@ class L3AgentSchedulerDbMixin(l3agentscheduler.L3AgentSchedulerPluginBase,
                 RouterL3AgentBinding.l3_agent_id).order_by('count')
         res = query.filter(agents_db.Agent.id.in_(agent_ids)).first()
         return res[0]
+
+    def get_l3_agents_router_counts(self, context, agent_ids):
+        """Return the number of routers of each l3 agent, keyed by id."""
+        query = context.session.query(
+            RouterL3AgentBinding.l3_agent_id,
+            func.count(RouterL3AgentBinding.router_id))
+        query = query.filter(RouterL3AgentBinding.l3_agent_id.in_(agent_ids))
+        counts = dict.fromkeys(agent_ids, 0)
+        counts.update(query.group_by(RouterL3AgentBinding.l3_agent_id))
+        return counts
@@ -50,6 +50,10 @@ CORE_ROUTER_ATTRS = ('id', 'name', 'tenant_id', 'admin_state_up', 'status')
 class Router(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
     """Represents a v2 neutron router."""
 
+    __table_args__ = (
+        sa.Index('ix_routers_tenant_id_id', 'tenant_id', 'id'),
+    )
+
     name = sa.Column(sa.String(255))
     status = sa.Column(sa.String(16))
     admin_state_up = sa.Column(sa.Boolean)
@@ -64,6 +68,10 @@ class FloatingIP(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
     may not be associated with an internal port/ip address/router.
     """
 
+    __table_args__ = (
+        sa.Index('ix_floatingips_tenant_id_id', 'tenant_id', 'id'),
+    )
+
     floating_ip_address = sa.Column(sa.String(64), nullable=False)
     floating_network_id = sa.Column(sa.String(36), nullable=False)
     floating_port_id = sa.Column(sa.String(36), sa.ForeignKey('ports.id'),
@@ -110,19 +118,22 @@ class L3_NAT_db_mixin(l3.RouterPluginBase):
 
     def _make_router_dict(self, router, fields=None, process_extensions=True):
         res = dict((key, router[key]) for key in CORE_ROUTER_ATTRS)
-        if router['gw_port_id']:
-            ext_gw_info = {'network_id': router.gw_port['network_id']}
-        else:
-            ext_gw_info = None
-        res.update({
-            EXTERNAL_GW_INFO: ext_gw_info,
-            'gw_port_id': router['gw_port_id'],
-        })
+        res['gw_port_id'] = router['gw_port_id']
+        extend_fields = fields
+        if not fields or EXTERNAL_GW_INFO in fields:
+            if router['gw_port_id']:
+                ext_gw_info = {'network_id': router.gw_port['network_id']}
+            else:
+                ext_gw_info = None
+            res[EXTERNAL_GW_INFO] = ext_gw_info
+            # The extensions complete the external gateway info
+            extend_fields = None
         # NOTE(salv-orlando): The following assumes this mixin is used in a
         # class inheriting from CommonDbMixin, which is true for all existing
         # plugins.
         if process_extensions:
-            self._apply_dict_extend_functions(l3.ROUTERS, res, router)
+            self._apply_dict_extend_functions(l3.ROUTERS, res, router,
+                                              extend_fields)
         return self._fields(res, fields)
 
     def _create_router_db(self, context, router, tenant_id):
@@ -32,6 +32,12 @@ def should_run(active_plugins, migrate_plugins):
         return set(active_plugins) & set(migrate_plugins)
 
 
+def schema_has_table(table_name):
+    """Check whether the specified table exists in the current schema."""
+    insp = sa.engine.reflection.Inspector.from_engine(op.get_bind())
+    return table_name in insp.get_table_names()
+
+
 def alter_enum(table, column, enum_type, nullable):
     bind = op.get_bind()
     engine = bind.engine
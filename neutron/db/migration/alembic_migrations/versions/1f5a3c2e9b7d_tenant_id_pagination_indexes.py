@@ -0,0 +1,59 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""Add tenant_id, id indexes for paginated listing
+
+Revision ID: 1f5a3c2e9b7d
+Revises: 3e1b6e8b4cf4
+Create Date: 2014-07-28 15:04:37.219840
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '1f5a3c2e9b7d'
+down_revision = '3e1b6e8b4cf4'
+
+# The router, floating IP and security group tables only exist with the
+# plugins supporting them, so the migration runs wherever they exist.
+migration_for_plugins = [
+    '*'
+]
+
+from alembic import op
+
+from neutron.db import migration
+
+
+TABLES = ['networks', 'subnets', 'ports', 'routers', 'floatingips',
+          'securitygroups']
+
+
+def upgrade(active_plugins=None, options=None):
+    if not migration.should_run(active_plugins, migration_for_plugins):
+        return
+
+    for table in TABLES:
+        if migration.schema_has_table(table):
+            op.create_index('ix_%s_tenant_id_id' % table, table,
+                            ['tenant_id', 'id'])
+
+
+def downgrade(active_plugins=None, options=None):
+    if not migration.should_run(active_plugins, migration_for_plugins):
+        return
+
+    for table in TABLES:
+        if migration.schema_has_table(table):
+            op.drop_index('ix_%s_tenant_id_id' % table, table)
@@ -0,0 +1,57 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""Add member_revision to security groups
+
+Revision ID: 3e1b6e8b4cf4
+Revises: 2026156eab2f
+Create Date: 2014-07-21 11:32:08.613520
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3e1b6e8b4cf4'
+down_revision = '2026156eab2f'
+
+# The securitygroups table is created by the migrations of each plugin
+# supporting security groups, so the migration runs wherever it exists.
+migration_for_plugins = [
+    '*'
+]
+
+from alembic import op
+import sqlalchemy as sa
+
+from neutron.db import migration
+
+
+def upgrade(active_plugins=None, options=None):
+    if not migration.should_run(active_plugins, migration_for_plugins):
+        return
+    if not migration.schema_has_table('securitygroups'):
+        return
+
+    op.add_column('securitygroups',
+                  sa.Column('member_revision', sa.Integer(), nullable=False,
+                            server_default='0'))
+
+
+def downgrade(active_plugins=None, options=None):
+    if not migration.should_run(active_plugins, migration_for_plugins):
+        return
+    if not migration.schema_has_table('securitygroups'):
+        return
+
+    op.drop_column('securitygroups', 'member_revision')
@@ -0,0 +1,77 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""Add quota usage and reservation tables
+
+Revision ID: 4a8f2c6d1e3b
+Revises: 1f5a3c2e9b7d
+Create Date: 2014-07-30 10:12:45.802317
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '4a8f2c6d1e3b'
+down_revision = '1f5a3c2e9b7d'
+
+# The quotas table is created by the migrations of each plugin supporting
+# the database quota driver, so the migration runs wherever it exists.
+migration_for_plugins = [
+    '*'
+]
+
+from alembic import op
+import sqlalchemy as sa
+
+from neutron.db import migration
+
+
+def upgrade(active_plugins=None, options=None):
+    if not migration.should_run(active_plugins, migration_for_plugins):
+        return
+    if not migration.schema_has_table('quotas'):
+        return
+
+    op.create_table(
+        'quotausages',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('tenant_id', sa.String(length=255), nullable=True),
+        sa.Column('resource', sa.String(length=255), nullable=True),
+        sa.Column('in_use', sa.Integer(), nullable=False),
+        sa.Column('counted_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('tenant_id', 'resource',
+                            name='uniq_quotausages0tenant_id0resource'))
+    op.create_index('ix_quotausages_tenant_id', 'quotausages',
+                    ['tenant_id'], unique=False)
+    op.create_table(
+        'quotareservations',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('tenant_id', sa.String(length=255), nullable=True),
+        sa.Column('resource', sa.String(length=255), nullable=True),
+        sa.Column('delta', sa.Integer(), nullable=False),
+        sa.Column('expiration', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'))
+    op.create_index('ix_quotareservations_tenant_id',
+                    'quotareservations', ['tenant_id'], unique=False)
+
+
+def downgrade(active_plugins=None, options=None):
+    if not migration.should_run(active_plugins, migration_for_plugins):
+        return
+    if not migration.schema_has_table('quotausages'):
+        return
+
+    op.drop_table('quotareservations')
+    op.drop_table('quotausages')
@@ -13,11 +13,21 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import datetime
+
+from oslo.config import cfg
+from oslo.db import exception as db_exc
 import sqlalchemy as sa
+from sqlalchemy import event
+from sqlalchemy import orm
 
 from neutron.common import exceptions
 from neutron.db import model_base
 from neutron.db import models_v2
+from neutron.openstack.common import timeutils
+from neutron.openstack.common import uuidutils
+from neutron import quota
 
 
 class Quota(model_base.BASEV2, models_v2.HasId):
@@ -31,6 +41,30 @@ class Quota(model_base.BASEV2, models_v2.HasId):
     limit = sa.Column(sa.Integer)
 
 
+class QuotaUsage(model_base.BASEV2, models_v2.HasId):
+    """Represent the number of resources in use by a tenant.
+
+    These rows are maintained by TrackedDbQuotaDriver.
+    """
+    __table_args__ = (
+        sa.UniqueConstraint('tenant_id', 'resource',
+                            name='uniq_quotausages0tenant_id0resource'),
+    )
+
+    tenant_id = sa.Column(sa.String(255), index=True)
+    resource = sa.Column(sa.String(255))
+    in_use = sa.Column(sa.Integer, nullable=False)
+    counted_at = sa.Column(sa.DateTime, nullable=False)
+
+
+class QuotaReservation(model_base.BASEV2, models_v2.HasId):
+    """Represent resources of a tenant being created by a request."""
+    tenant_id = sa.Column(sa.String(255), index=True)
+    resource = sa.Column(sa.String(255))
+    delta = sa.Column(sa.Integer, nullable=False)
+    expiration = sa.Column(sa.DateTime, nullable=False)
+
+
 class DbQuotaDriver(object):
     """Driver to perform necessary checks to enforce quotas and obtain quota
     information.
@@ -177,3 +211,220 @@ class DbQuotaDriver(object):
                  if quotas[key] >= 0 and quotas[key] < val]
         if overs:
             raise exceptions.OverQuota(overs=sorted(overs))
+
+
+def _get_usage_table(resource):
+    """Return the table of the rows of a resource, if they can be counted.
+
+    The table of a resource is found by name, e.g. securitygroups for
+    security_group, and must have a tenant_id column.
+    """
+    table = model_base.BASEV2.metadata.tables.get(
+        resource.replace('_', '') + 's')
+    if table is not None and 'tenant_id' in table.c:
+        return table
+
+
+class TrackedDbQuotaDriver(DbQuotaDriver):
+    """Database quota driver keeping track of the resources in use.
+
+    The resources of a tenant are counted the first time its quota is
+    checked, then the count is kept up to date as the rows of the resource
+    are inserted and deleted, in the same transaction. The resources are
+    counted again once the count is older than usage_recount_interval, to
+    correct the drift of rows deleted in bulk, without the ORM.
+
+    Create requests reserve the resources they create, so that concurrent
+    requests can't exceed the quota. Resources without a table of their
+    own are counted with the plugin on each check, as DbQuotaDriver does.
+    """
+
+    @staticmethod
+    def _get_usage(context, tenant_id, resource, table, lock=False):
+        """Return the number of resources in use, counting them if needed.
+
+        Must be called in a transaction.
+        """
+        now = timeutils.utcnow()
+        query = context.session.query(QuotaUsage).filter_by(
+            tenant_id=tenant_id, resource=resource)
+        if lock:
+            query = query.with_lockmode('update')
+        usage = query.first()
+        if usage is None:
+            try:
+                with context.session.begin_nested():
+                    usage = QuotaUsage(
+                        id=uuidutils.generate_uuid(), tenant_id=tenant_id,
+                        resource=resource, counted_at=now,
+                        in_use=context.session.query(table).filter(
+                            table.c.tenant_id == tenant_id).count())
+                    context.session.add(usage)
+            except db_exc.DBDuplicateEntry:
+                # A concurrent request counted the resources meanwhile.
+                # There was no row to lock, it is locked now.
+                return query.with_lockmode('update').one().in_use
+        else:
+            interval = cfg.CONF.QUOTAS.usage_recount_interval
+            if interval < 0 or usage.counted_at >= now - datetime.timedelta(
+                    seconds=interval):
+                return usage.in_use
+            usage.in_use = context.session.query(table).filter(
+                table.c.tenant_id == tenant_id).count()
+            usage.counted_at = now
+        context.session.query(QuotaReservation).filter(
+            QuotaReservation.tenant_id == tenant_id,
+            QuotaReservation.resource == resource,
+            QuotaReservation.expiration < now).delete()
+        return usage.in_use
+
+    @staticmethod
+    def _get_reserved(context, tenant_id, resource):
+        reserved = context.session.query(
+            sa.func.sum(QuotaReservation.delta)).filter(
+                QuotaReservation.tenant_id == tenant_id,
+                QuotaReservation.resource == resource,
+                QuotaReservation.expiration >= timeutils.utcnow()).scalar()
+        return reserved or 0
+
+    @classmethod
+    def get_detailed_tenant_quotas(cls, context, resources, tenant_id):
+        """Given a list of resources, retrieve the quotas and usage of a
+        tenant.
+
+        :param context: The request context, for access checks.
+        :param resources: A dictionary of the registered resource keys.
+        :param tenant_id: The ID of the tenant to return quotas for.
+        :return dict: from resource name to dict of limit, used and
+                      reserved, without used for the resources whose usage
+                      is not tracked
+        """
+        quotas = cls.get_tenant_quotas(context, resources, tenant_id)
+        details = {}
+        with context.session.begin(subtransactions=True):
+            for key, limit in quotas.items():
+                details[key] = {'limit': limit,
+                                'reserved': cls._get_reserved(
+                                    context, tenant_id, key)}
+                table = _get_usage_table(key)
+                if table is not None:
+                    details[key]['used'] = cls._get_usage(
+                        context, tenant_id, key, table)
+        return details
+
+    def make_reservation(self, context, tenant_id, resources, resource,
+                         delta, plugin, collection):
+        """Reserve delta more resources for a tenant if they fit its quota.
+
+        :param context: The request context, for access checks.
+        :param tenant_id: The tenant_id to check the quota.
+        :param resources: A dictionary of the registered resources.
+        :param resource: The name of the resource, as a string.
+        :param delta: The number of resources to be created.
+        :param plugin: The plugin counting the resources without table.
+        :param collection: The collection of the resources.
+        :return: The id of the reservation, or None when nothing needs
+                 to be reserved.
+        """
+        limit = self._get_quotas(context, tenant_id, resources,
+                                 [resource])[resource]
+        if limit < 0:
+            return
+        table = _get_usage_table(resource)
+        if table is None:
+            self.limit_check(context, tenant_id, resources, {
+                resource: resources[resource].count(
+                    context, plugin, collection, tenant_id) + delta})
+            return
+        with context.session.begin(subtransactions=True):
+            in_use = self._get_usage(context, tenant_id, resource, table,
+                                     lock=True)
+            reserved = self._get_reserved(context, tenant_id, resource)
+            if in_use + reserved + delta > limit:
+                raise exceptions.OverQuota(overs=[resource])
+            reservation = QuotaReservation(
+                id=uuidutils.generate_uuid(),
+                tenant_id=tenant_id,
+                resource=resource,
+                delta=delta,
+                expiration=timeutils.utcnow() + datetime.timedelta(
+                    seconds=cfg.CONF.QUOTAS.reservation_expiration))
+            context.session.add(reservation)
+        return reservation.id
+
+    @staticmethod
+    def _delete_reservation(context, reservation_id):
+        with context.session.begin(subtransactions=True):
+            context.session.query(QuotaReservation).filter_by(
+                id=reservation_id).delete()
+
+    def commit_reservation(self, context, reservation_id):
+        # The resources created were added to the usage when inserted
+        self._delete_reservation(context, reservation_id)
+
+    def cancel_reservation(self, context, reservation_id):
+        self._delete_reservation(context, reservation_id)
+
+
+def _get_tracked_resources():
+    """Return the tracked resources by the name of their table."""
+    return dict((name.replace('_', '') + 's', name)
+                for name in quota.QUOTAS.resources)
+
+
+def _add_to_usages(session, deltas):
+    usages = QuotaUsage.__table__
+    for (tenant_id, resource), delta in deltas.items():
+        if delta:
+            # A missing usage is counted the next time the quota is checked
+            session.execute(usages.update().where(sa.and_(
+                usages.c.tenant_id == tenant_id,
+                usages.c.resource == resource)).values(
+                    in_use=usages.c.in_use + delta))
+
+
+@event.listens_for(orm.Session, 'after_flush')
+def _update_usages(session, flush_context):
+    """Add the rows inserted and deleted by a flush to the usages."""
+    if cfg.CONF.QUOTAS.quota_driver != quota.QUOTA_TRACKED_DRIVER:
+        return
+    resources = _get_tracked_resources()
+    deltas = collections.defaultdict(int)
+    for objs, delta in ((session.new, 1), (session.deleted, -1)):
+        for obj in objs:
+            resource = resources.get(getattr(obj, '__tablename__', None))
+            if resource:
+                deltas[(obj.tenant_id, resource)] += delta
+    _add_to_usages(session, deltas)
+
+
+@event.listens_for(orm.Session, 'after_bulk_delete')
+def _update_usages_after_bulk_delete(delete_context):
+    """Subtract the rows deleted by Query.delete() from the usages.
+
+    The tenants of the rows are known when all of them were loaded in the
+    session. Otherwise the usages of the resource which no longer match the
+    rows of their tenant are removed, so that they are counted again the
+    next time the quota of the tenant is checked.
+    """
+    if cfg.CONF.QUOTAS.quota_driver != quota.QUOTA_TRACKED_DRIVER:
+        return
+    resource = _get_tracked_resources().get(delete_context.primary_table.name)
+    if not resource or not delete_context.rowcount:
+        return
+    session = delete_context.session
+    tenant_ids = [orm.attributes.instance_state(obj).dict.get('tenant_id')
+                  for obj in getattr(delete_context, 'matched_objects', [])]
+    if len(tenant_ids) == delete_context.rowcount and all(tenant_ids):
+        deltas = collections.defaultdict(int)
+        for tenant_id in tenant_ids:
+            deltas[(tenant_id, resource)] -= 1
+        _add_to_usages(session, deltas)
+    else:
+        usages = QuotaUsage.__table__
+        table = delete_context.primary_table
+        in_use = sa.select([sa.func.count()]).select_from(table).where(
+            table.c.tenant_id == usages.c.tenant_id).as_scalar()
+        session.execute(usages.delete().where(sa.and_(
+            usages.c.resource == resource,
+            usages.c.in_use != in_use)))
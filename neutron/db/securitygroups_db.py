@@ -36,8 +36,15 @@ IP_PROTOCOL_MAP = {constants.PROTO_NAME_TCP: constants.PROTO_NUM_TCP,
 class SecurityGroup(model_base.BASEV2, models_v2.HasId, models_v2.HasTenant):
     """Represents a v2 neutron security group."""
 
+    __table_args__ = (
+        sa.Index('ix_securitygroups_tenant_id_id', 'tenant_id', 'id'),
+    )
+
     name = sa.Column(sa.String(255))
     description = sa.Column(sa.String(255))
+    # Bumped whenever the member ips of the group change
+    member_revision = sa.Column(sa.Integer, nullable=False,
+                                server_default='0')
 
 
 class SecurityGroupPortBinding(model_base.BASEV2):
@@ -218,8 +225,10 @@ class SecurityGroupDbMixin(ext_sg.SecurityGroupPluginBase):
                'name': security_group['name'],
                'tenant_id': security_group['tenant_id'],
                'description': security_group['description']}
-        res['security_group_rules'] = [self._make_security_group_rule_dict(r)
-                                       for r in security_group.rules]
+        if not fields or 'security_group_rules' in fields:
+            res['security_group_rules'] = [
+                self._make_security_group_rule_dict(r)
+                for r in security_group.rules]
         return self._fields(res, fields)
 
     def _make_security_group_binding_dict(self, security_group, fields=None):
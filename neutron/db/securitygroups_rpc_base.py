@@ -13,14 +13,21 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import hashlib
+
 import netaddr
+from sqlalchemy import event
+from sqlalchemy import orm
 from sqlalchemy.orm import exc
 
 from neutron.common import constants as q_const
 from neutron.common import ipv6_utils as ipv6
 from neutron.common import utils
+from neutron.db import api as db_api
 from neutron.db import models_v2
 from neutron.db import securitygroups_db as sg_db
+from neutron.extensions import allowedaddresspairs as addr_pair
 from neutron.extensions import securitygroup as ext_sg
 from neutron.openstack.common import log as logging
 
@@ -35,6 +42,104 @@ DIRECTION_IP_PREFIX = {'ingress': 'source_ip_prefix',
                        'egress': 'dest_ip_prefix'}
 
 
+# Number of member ip snapshots kept for each security group to compute
+# membership deltas from
+SG_MEMBER_SNAPSHOTS = 4
+
+# Number of security groups whose member ips are cached, the least recently
+# used ones are evicted first
+SG_MEMBER_CACHE_SIZE = 1024
+
+# Key of the security groups whose member revision must be bumped once the
+# transaction of a session ends, in the info of the session
+SG_MEMBER_REVISIONS_KEY = 'security_group_member_revisions'
+
+
+def _get_member_ips_version(member_ips):
+    """Return a digest identifying the member ips of a security group."""
+    ips = sorted(ip for ips in member_ips.values() for ip in ips)
+    return hashlib.sha1(','.join(ips)).hexdigest()
+
+
+class SecurityGroupMemberCache(object):
+    """Per process cache of the member ips of remote security groups.
+
+    Member ips are cached along with the member_revision of the group they
+    were selected for, which is bumped whenever one of its ports is
+    created, deleted or has its addresses changed, so they are only
+    selected again once the revision changed. A few snapshots of the
+    member ips are also kept per group, keyed by their version, so that
+    membership deltas can be computed against the version an agent holds.
+    At most size groups are cached, the least recently used are evicted.
+    """
+
+    def __init__(self, snapshots=SG_MEMBER_SNAPSHOTS,
+                 size=SG_MEMBER_CACHE_SIZE):
+        self.snapshots = snapshots
+        self.size = size
+        self._ips = collections.OrderedDict()
+        self._snapshots = collections.OrderedDict()
+
+    def _get(self, cache, sg_id):
+        value = cache.pop(sg_id, None)
+        if value is not None:
+            cache[sg_id] = value
+        return value
+
+    def _set(self, cache, sg_id, value):
+        cache.pop(sg_id, None)
+        cache[sg_id] = value
+        while len(cache) > self.size:
+            cache.popitem(last=False)
+
+    def get_ips(self, sg_id, revision):
+        cached = self._get(self._ips, sg_id)
+        if cached and cached[0] == revision:
+            return cached[1]
+
+    def set_ips(self, sg_id, revision, ips):
+        self._set(self._ips, sg_id, (revision, ips))
+
+    def add_snapshot(self, sg_id, version, member_ips):
+        snapshots = [snapshot for snapshot in self._snapshots.get(sg_id, [])
+                     if snapshot[0] != version]
+        snapshots.append((version, member_ips))
+        self._set(self._snapshots, sg_id, snapshots[-self.snapshots:])
+
+    def get_snapshot(self, sg_id, version):
+        for snapshot_version, member_ips in self._get(self._snapshots,
+                                                      sg_id) or []:
+            if snapshot_version == version:
+                return member_ips
+
+    def discard(self, sg_id):
+        self._ips.pop(sg_id, None)
+        self._snapshots.pop(sg_id, None)
+
+
+def _bump_member_revisions(security_group_ids):
+    sg_model = sg_db.SecurityGroup
+    session = db_api.get_session()
+    with session.begin():
+        query = session.query(sg_model)
+        query = query.filter(sg_model.id.in_(list(security_group_ids)))
+        query.update({'member_revision': sg_model.member_revision + 1},
+                     synchronize_session=False)
+
+
+@event.listens_for(orm.Session, 'after_transaction_end')
+def _bump_member_revisions_after_transaction(session, transaction):
+    """Bump the member revisions deferred until the transaction ended.
+
+    They are bumped whether the transaction was committed or rolled back,
+    the latter only costs agents a selection of the member ips.
+    """
+    if session.transaction is None:
+        security_group_ids = session.info.pop(SG_MEMBER_REVISIONS_KEY, None)
+        if security_group_ids:
+            _bump_member_revisions(security_group_ids)
+
+
 class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
 
     def create_security_group_rule(self, context, security_group_rule):
@@ -99,12 +204,37 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         """
         need_notify = False
         if (original_port['fixed_ips'] != updated_port['fixed_ips'] or
+            original_port.get(addr_pair.ADDRESS_PAIRS) !=
+            updated_port.get(addr_pair.ADDRESS_PAIRS) or
             not utils.compare_elements(
                 original_port.get(ext_sg.SECURITYGROUPS),
                 updated_port.get(ext_sg.SECURITYGROUPS))):
             need_notify = True
+            self.bump_security_group_member_revisions(
+                context,
+                set(original_port.get(ext_sg.SECURITYGROUPS) or []) |
+                set(updated_port.get(ext_sg.SECURITYGROUPS) or []))
         return need_notify
 
+    def bump_security_group_member_revisions(self, context,
+                                             security_group_ids):
+        """Invalidate the member ips cached for security groups.
+
+        This must be called before agents are notified, so that they fetch
+        the new member ips. The revisions are bumped in a transaction of
+        their own once the transaction of the context session, if any, has
+        ended, so that port operations do not hold the lock of the security
+        group rows, like the one of the default group, until they commit.
+        """
+        if not security_group_ids:
+            return
+        session = context.session
+        if session.transaction is None:
+            _bump_member_revisions(security_group_ids)
+        else:
+            session.info.setdefault(SG_MEMBER_REVISIONS_KEY, set()).update(
+                security_group_ids)
+
     def notify_security_groups_member_updated(self, context, port):
         """Notify update event of security group members.
 
@@ -116,6 +246,8 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         occurs and the plugin agent fetches the update provider
         rule in the other RPC call (security_group_rules_for_devices).
         """
+        self.bump_security_group_member_revisions(
+            context, port.get(ext_sg.SECURITYGROUPS))
         if port['device_owner'] == q_const.DEVICE_OWNER_DHCP:
             self.notifier.security_groups_provider_updated(context)
         # For IPv6, provider rule need to be updated in case router
@@ -128,12 +260,43 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
             self.notifier.security_groups_member_updated(
                 context, port.get(ext_sg.SECURITYGROUPS))
 
+    def notify_security_groups_member_updated_bulk(self, context, ports):
+        """Notify update event of security group members of many ports.
+
+        This is the same as notify_security_groups_member_updated for each
+        port, with at most one notification of each kind.
+        """
+        provider_updated = False
+        security_groups = []
+        updated_security_groups = set()
+        for port in ports:
+            port_security_groups = port.get(ext_sg.SECURITYGROUPS) or []
+            updated_security_groups.update(port_security_groups)
+            if port['device_owner'] == q_const.DEVICE_OWNER_DHCP:
+                provider_updated = True
+            elif port['device_owner'] == q_const.DEVICE_OWNER_ROUTER_INTF:
+                if any(netaddr.IPAddress(fixed_ip['ip_address']).version == 6
+                       for fixed_ip in port['fixed_ips']):
+                    provider_updated = True
+            else:
+                security_groups += [sg_id for sg_id in port_security_groups
+                                    if sg_id not in security_groups]
+        self.bump_security_group_member_revisions(context,
+                                                  updated_security_groups)
+        if provider_updated:
+            self.notifier.security_groups_provider_updated(context)
+        if security_groups:
+            self.notifier.security_groups_member_updated(context,
+                                                         security_groups)
+
 
 class SecurityGroupServerRpcCallbackMixin(object):
     """A mix-in that enable SecurityGroup agent support in plugin
     implementations.
     """
 
+    member_cache = SecurityGroupMemberCache()
+
     def security_group_rules_for_devices(self, context, **kwargs):
         """Return security group rules for each port.
 
@@ -144,7 +307,66 @@ class SecurityGroupServerRpcCallbackMixin(object):
         :returns: port correspond to the devices with security group rules
         """
         devices = kwargs.get('devices')
+        ports = self._get_ports_for_devices(devices)
+        return self._security_group_rules_for_ports(context, ports)
+
+    def security_group_info_for_devices(self, context, **kwargs):
+        """Return security group information for each port.
+
+        Unlike security_group_rules_for_devices, remote_group_id rules
+        are not expanded into one rule per member ip address. Rules are
+        returned once per security group, and member ip addresses once
+        per remote group and ethertype, so that the agent can match them
+        with ipsets.
 
+        :params devices: list of devices
+        :returns: dict with 'devices' (port correspond to the devices with
+                  provider rules), 'security_groups' (rules keyed by
+                  security group id) and 'sg_member_ips' (member ips keyed
+                  by remote security group id and ethertype)
+        """
+        devices = kwargs.get('devices')
+        ports = self._get_ports_for_devices(devices)
+        return self.security_group_info_for_ports(context, ports)
+
+    def security_group_member_ips_delta(self, context, **kwargs):
+        """Return the changes of member ips of remote security groups.
+
+        :params security_groups: dict of the version of the member ips held
+                                 by the agent (or None), keyed by remote
+                                 security group id
+        :returns: dict keyed by remote security group id with the current
+                  'version' of its member ips and either the 'added' and
+                  'removed' member ips since the version held by the agent,
+                  or all the 'members' when the server does not know that
+                  version (anymore)
+        """
+        versions = kwargs.get('security_groups') or {}
+        sg_info = {'sg_member_ips': dict(
+            (sg_id, {q_const.IPv4: [], q_const.IPv6: []})
+            for sg_id in versions)}
+        self._get_security_group_member_ips(context, sg_info)
+        deltas = {}
+        for sg_id, member_ips in sg_info['sg_member_ips'].iteritems():
+            version = sg_info['sg_member_versions'][sg_id]
+            previous_ips = None
+            if versions[sg_id]:
+                previous_ips = self.member_cache.get_snapshot(
+                    sg_id, versions[sg_id])
+            if previous_ips is None:
+                deltas[sg_id] = {'version': version, 'members': member_ips}
+                continue
+            delta = {'version': version, 'added': {}, 'removed': {}}
+            for ethertype, ips in member_ips.iteritems():
+                old_ips = previous_ips.get(ethertype, [])
+                delta['added'][ethertype] = [ip for ip in ips
+                                             if ip not in old_ips]
+                delta['removed'][ethertype] = [ip for ip in old_ips
+                                               if ip not in ips]
+            deltas[sg_id] = delta
+        return deltas
+
+    def _get_ports_for_devices(self, devices):
         ports = {}
         for device in devices:
             port = self.get_port_from_device(device)
@@ -153,7 +375,68 @@ class SecurityGroupServerRpcCallbackMixin(object):
             if port['device_owner'].startswith('network:'):
                 continue
             ports[port['id']] = port
-        return self._security_group_rules_for_ports(context, ports)
+        return ports
+
+    def security_group_info_for_ports(self, context, ports):
+        sg_info = {'devices': ports,
+                   'security_groups': {},
+                   'sg_member_ips': {}}
+        rules_in_db = self._select_rules_for_ports(context, ports)
+        for (binding, rule_in_db) in rules_in_db:
+            port = ports[binding['port_id']]
+            security_group_id = rule_in_db['security_group_id']
+            remote_group_id = rule_in_db.get('remote_group_id')
+            if remote_group_id:
+                if (remote_group_id not in
+                        port['security_group_source_groups']):
+                    port['security_group_source_groups'].append(
+                        remote_group_id)
+                # Members are always reported for both ethertypes so that
+                # the agent can refresh any set of the group from a single
+                # device referencing it.
+                sg_info['sg_member_ips'].setdefault(
+                    remote_group_id, {q_const.IPv4: [], q_const.IPv6: []})
+            rule_dict = self._make_rule_dict(rule_in_db)
+            sg_rules = sg_info['security_groups'].setdefault(
+                security_group_id, [])
+            if rule_dict not in sg_rules:
+                sg_rules.append(rule_dict)
+        # Provider rules do not belong to any security group, so they are
+        # still returned in the rules of each port.
+        self._apply_provider_rule(context, ports)
+        return self._get_security_group_member_ips(context, sg_info)
+
+    def _get_security_group_member_ips(self, context, sg_info):
+        member_ips = sg_info['sg_member_ips']
+        ips = self._select_ips_for_remote_group(context, member_ips.keys())
+        for sg_id, ips_in_group in ips.iteritems():
+            for ip in ips_in_group:
+                ethertype = 'IPv%d' % netaddr.IPNetwork(ip).version
+                if ip not in member_ips[sg_id][ethertype]:
+                    member_ips[sg_id][ethertype].append(ip)
+        sg_info['sg_member_versions'] = {}
+        for sg_id, ips_in_group in member_ips.iteritems():
+            version = _get_member_ips_version(ips_in_group)
+            sg_info['sg_member_versions'][sg_id] = version
+            self.member_cache.add_snapshot(sg_id, version, ips_in_group)
+        return sg_info
+
+    def _make_rule_dict(self, rule_in_db):
+        direction = rule_in_db['direction']
+        rule_dict = {
+            'security_group_id': rule_in_db['security_group_id'],
+            'direction': direction,
+            'ethertype': rule_in_db['ethertype'],
+        }
+        for key in ('protocol', 'port_range_min', 'port_range_max',
+                    'remote_ip_prefix', 'remote_group_id'):
+            if rule_in_db.get(key):
+                if key == 'remote_ip_prefix':
+                    direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
+                    rule_dict[direction_ip_prefix] = rule_in_db[key]
+                    continue
+                rule_dict[key] = rule_in_db[key]
+        return rule_dict
 
     def _select_rules_for_ports(self, context, ports):
         if not ports:
@@ -170,10 +453,48 @@ class SecurityGroupServerRpcCallbackMixin(object):
         query = query.filter(sg_binding_port.in_(ports.keys()))
         return query.all()
 
+    def _select_member_revisions(self, context, remote_group_ids):
+        query = context.session.query(sg_db.SecurityGroup.id,
+                                      sg_db.SecurityGroup.member_revision)
+        query = query.filter(sg_db.SecurityGroup.id.in_(remote_group_ids))
+        return dict(query)
+
     def _select_ips_for_remote_group(self, context, remote_group_ids):
+        """Return the ips of the ports of each remote security group.
+
+        Ips are taken from the member cache unless the member revision of
+        the group changed since they were selected. The returned lists are
+        shared with the cache and must not be modified.
+        """
         ips_by_group = {}
         if not remote_group_ids:
             return ips_by_group
+        remote_group_ids = set(remote_group_ids)
+        revisions = self._select_member_revisions(context, remote_group_ids)
+        stale_group_ids = []
+        for remote_group_id in remote_group_ids:
+            if remote_group_id not in revisions:
+                # the group was deleted
+                self.member_cache.discard(remote_group_id)
+                ips_by_group[remote_group_id] = []
+                continue
+            ips = self.member_cache.get_ips(remote_group_id,
+                                            revisions[remote_group_id])
+            if ips is None:
+                stale_group_ids.append(remote_group_id)
+            else:
+                ips_by_group[remote_group_id] = ips
+        if stale_group_ids:
+            selected = self._select_member_ips_for_remote_group(
+                context, stale_group_ids)
+            for remote_group_id, ips in selected.iteritems():
+                self.member_cache.set_ips(remote_group_id,
+                                          revisions[remote_group_id], ips)
+            ips_by_group.update(selected)
+        return ips_by_group
+
+    def _select_member_ips_for_remote_group(self, context, remote_group_ids):
+        ips_by_group = {}
         for remote_group_id in remote_group_ids:
             ips_by_group[remote_group_id] = []
 
@@ -359,20 +680,7 @@ class SecurityGroupServerRpcCallbackMixin(object):
         for (binding, rule_in_db) in rules_in_db:
             port_id = binding['port_id']
             port = ports[port_id]
-            direction = rule_in_db['direction']
-            rule_dict = {
-                'security_group_id': rule_in_db['security_group_id'],
-                'direction': direction,
-                'ethertype': rule_in_db['ethertype'],
-            }
-            for key in ('protocol', 'port_range_min', 'port_range_max',
-                        'remote_ip_prefix', 'remote_group_id'):
-                if rule_in_db.get(key):
-                    if key == 'remote_ip_prefix':
-                        direction_ip_prefix = DIRECTION_IP_PREFIX[direction]
-                        rule_dict[direction_ip_prefix] = rule_in_db[key]
-                        continue
-                    rule_dict[key] = rule_in_db[key]
-            port['security_group_rules'].append(rule_dict)
+            port['security_group_rules'].append(
+                self._make_rule_dict(rule_in_db))
         self._apply_provider_rule(context, ports)
         return self._convert_remote_group_id_to_ip_prefix(context, ports)
@@ -37,6 +37,9 @@ def paginate_query(query, model, limit, sorts, marker_obj=None):
     (k1 > X1) or (k1 == X1 && k2 > X2) or (k1 == X1 && k2 == X2 && k3 > X3)
     The reason of didn't use OFFSET clause was it don't scale, please refer
     discussion at https://lists.launchpad.net/openstack/msg02547.html
+    The redundant k1 >= X1 criterion is added as well, so that the database
+    can start scanning an index on the sort keys from the marker. NULL
+    values of nullable sort keys are sorted before the other values.
 
     We also have to cope with different sort directions.
 
@@ -89,11 +92,8 @@ def paginate_query(query, model, limit, sorts, marker_obj=None):
         for i, sort in enumerate(sorts):
             crit_attrs = [(getattr(model, sorts[j][0]) == marker_values[j])
                           for j in moves.xrange(i)]
-            model_attr = getattr(model, sort[0])
-            if sort[1]:
-                crit_attrs.append((model_attr > marker_values[i]))
-            else:
-                crit_attrs.append((model_attr < marker_values[i]))
+            crit_attrs.append(_after_marker_value(model, sort,
+                                                  marker_values[i]))
 
             criteria = sqlalchemy.sql.and_(*crit_attrs)
             criteria_list.append(criteria)
@@ -101,7 +101,35 @@ def paginate_query(query, model, limit, sorts, marker_obj=None):
         f = sqlalchemy.sql.or_(*criteria_list)
         query = query.filter(f)
 
+        # Redundant with the criteria above, but unlike the disjunction it
+        # lets the database seek to the marker in an index on the sort keys
+        if len(sorts) > 1 and marker_values[0] is not None:
+            query = query.filter(_after_marker_value(
+                model, sorts[0], marker_values[0], inclusive=True))
+
     if limit:
         query = query.limit(limit)
 
     return query
+
+
+def _after_marker_value(model, sort, value, inclusive=False):
+    """Return the criterion of the values following a marker value.
+
+    NULL is sorted before any other value, as by MySQL and SQLite, and
+    cannot be compared with them. An inclusive criterion is only built
+    for other values.
+    """
+    sort_key, ascending = sort
+    model_attr = getattr(model, sort_key)
+    if value is None:
+        if ascending:
+            return model_attr.isnot(None)
+        return sqlalchemy.sql.false()
+    if ascending:
+        return model_attr >= value if inclusive else model_attr > value
+    criterion = model_attr <= value if inclusive else model_attr < value
+    column = model.__table__.columns.get(sort_key)
+    if column is None or column.nullable:
+        criterion = sqlalchemy.sql.or_(criterion, model_attr.is_(None))
+    return criterion
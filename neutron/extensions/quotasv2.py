@@ -33,6 +33,7 @@ RESOURCE_NAME = 'quota'
 RESOURCE_COLLECTION = RESOURCE_NAME + "s"
 QUOTAS = quota.QUOTAS
 DB_QUOTA_DRIVER = 'neutron.db.quota_db.DbQuotaDriver'
+TRACKED_DB_QUOTA_DRIVER = 'neutron.db.quota_db.TrackedDbQuotaDriver'
 EXTENDED_ATTRIBUTES_2_0 = {
     RESOURCE_COLLECTION: {}
 }
@@ -87,6 +88,17 @@ class QuotaSetsController(wsgi.Controller):
                                        "to access quotas for another tenant"))
         return {self._resource_name: self._get_quotas(request, id)}
 
+    def details(self, request, id):
+        if id != request.context.tenant_id:
+            self._check_admin(request.context,
+                              reason=_("Only admin is authorized "
+                                       "to access quotas for another tenant"))
+        if not hasattr(self._driver, 'get_detailed_tenant_quotas'):
+            msg = _('The quota driver does not track usage.')
+            raise webob.exc.HTTPNotImplemented(msg)
+        return {self._resource_name: self._driver.get_detailed_tenant_quotas(
+            request.context, QUOTAS.resources, id)}
+
     def _check_admin(self, context,
                      reason=_("Only admin can view or configure quota")):
         if not context.is_admin:
@@ -122,7 +134,8 @@ class Quotasv2(extensions.ExtensionDescriptor):
     @classmethod
     def get_description(cls):
         description = 'Expose functions for quotas management'
-        if cfg.CONF.QUOTAS.quota_driver == DB_QUOTA_DRIVER:
+        if cfg.CONF.QUOTAS.quota_driver in (DB_QUOTA_DRIVER,
+                                            TRACKED_DB_QUOTA_DRIVER):
             description += ' per tenant'
         return description
 
@@ -143,7 +156,8 @@ class Quotasv2(extensions.ExtensionDescriptor):
         return [extensions.ResourceExtension(
             Quotasv2.get_alias(),
             controller,
-            collection_actions={'tenant': 'GET'})]
+            collection_actions={'tenant': 'GET'},
+            member_actions={'details': 'GET'})]
 
     def get_extended_resources(self, version):
         if version == "2.0":
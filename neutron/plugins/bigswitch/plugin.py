@@ -117,7 +117,10 @@ class RestProxyCallbacks(n_rpc.RpcCallback,
                          sg_rpc_base.SecurityGroupServerRpcCallbackMixin,
                          dhcp_rpc_base.DhcpRpcCallbackMixin):
 
-    RPC_API_VERSION = '1.1'
+    # 1.2 Added get_active_networks_revisions and get_networks_info for
+    #     the DHCP agents
+    # 1.3 Added security_group_member_ips_delta
+    RPC_API_VERSION = '1.3'
 
     def get_port_from_device(self, device):
         port_id = re.sub(r"^tap", "", device)
@@ -812,8 +815,8 @@ class NeutronRestProxyV2(NeutronRestProxyV2Base,
         with context.session.begin(subtransactions=True):
             router_ids = self.disassociate_floatingips(
                 context, port_id, do_notify=False)
-            self._delete_port_security_group_bindings(context, port_id)
             port = super(NeutronRestProxyV2, self).get_port(context, port_id)
+            self._delete_port_security_group_bindings(context, port_id)
             # Tenant ID must come from network in case the network is shared
             tenid = self._get_port_net_tenantid(context, port)
             self._delete_port(context, port_id)
@@ -821,6 +824,7 @@ class NeutronRestProxyV2(NeutronRestProxyV2Base,
 
         # now that we've left db transaction, we are safe to notify
         self.notify_routers_updated(context, router_ids)
+        self.notify_security_groups_member_updated(context, port)
 
     @put_context_in_serverpool
     def create_subnet(self, context, subnet):
@@ -83,7 +83,8 @@ class BridgeRpcCallbacks(n_rpc.RpcCallback,
                          sg_db_rpc.SecurityGroupServerRpcCallbackMixin):
     """Agent callback."""
 
-    RPC_API_VERSION = '1.2'
+    # 1.3 Support security_group_member_ips_delta
+    RPC_API_VERSION = '1.3'
     # Device names start with "tap"
     # history
     #   1.1 Support Security Group RPC
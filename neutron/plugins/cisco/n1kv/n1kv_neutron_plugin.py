@@ -65,7 +65,9 @@ class N1kvRpcCallbacks(n_rpc.RpcCallback,
     """Class to handle agent RPC calls."""
 
     # Set RPC API version to 1.1 by default.
-    RPC_API_VERSION = '1.1'
+    # 1.2 Added get_active_networks_revisions and get_networks_info for
+    #     the DHCP agents
+    RPC_API_VERSION = '1.2'
 
 
 class N1kvNeutronPluginV2(db_base_plugin_v2.NeutronDbPluginV2,
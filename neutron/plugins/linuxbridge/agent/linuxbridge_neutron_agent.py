@@ -787,6 +787,9 @@ class LinuxBridgeNeutronAgentRPC(sg_rpc.SecurityGroupAgentRpcMixin):
         try:
             devices = len(self.br_mgr.get_tap_devices())
             self.agent_state.get('configurations')['devices'] = devices
+            if self.firewall_refresh_stats:
+                self.agent_state.get('configurations')[
+                    'firewall_refresh'] = dict(self.firewall_refresh_stats)
             self.state_rpc.report_state(self.context,
                                         self.agent_state)
             self.agent_state.pop('start_flag', None)
@@ -62,7 +62,8 @@ class LinuxBridgeRpcCallbacks(n_rpc.RpcCallback,
     # history
     #   1.1 Support Security Group RPC
     #   1.2 Support get_devices_details_list
-    RPC_API_VERSION = '1.2'
+    #   1.3 Support security_group_member_ips_delta
+    RPC_API_VERSION = '1.3'
     # Device names start with "tap"
     TAP_PREFIX_LEN = 3
 
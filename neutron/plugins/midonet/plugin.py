@@ -176,7 +176,9 @@ def _check_resource_exists(func, id, name, raise_exc=False):
 
 class MidoRpcCallbacks(n_rpc.RpcCallback,
                        dhcp_rpc_base.DhcpRpcCallbackMixin):
-    RPC_API_VERSION = '1.1'
+    # 1.2 Added get_active_networks_revisions and get_networks_info for
+    #     the DHCP agents
+    RPC_API_VERSION = '1.2'
 
 
 class MidonetPluginException(n_exc.NeutronException):
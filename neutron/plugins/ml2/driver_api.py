@@ -565,6 +565,35 @@ class MechanismDriver(object):
         """
         pass
 
+    def create_port_bulk_precommit(self, contexts):
+        """Allocate resources for many new ports.
+
+        :param contexts: list of PortContext instances describing the
+        ports.
+
+        Called inside transaction context on session when ports are
+        created in bulk. Drivers able to handle the ports at once can
+        override it, by default create_port_precommit is called for each
+        port.
+        """
+        for context in contexts:
+            self.create_port_precommit(context)
+
+    def create_port_bulk_postcommit(self, contexts):
+        """Create many ports.
+
+        :param contexts: list of PortContext instances describing the
+        ports.
+
+        Called after the transaction creating ports in bulk completes.
+        Drivers able to handle the ports at once, for instance with a
+        single request to a controller, can override it, by default
+        create_port_postcommit is called for each port. Raising an
+        exception will result in the deletion of all the ports.
+        """
+        for context in contexts:
+            self.create_port_postcommit(context)
+
     def update_port_precommit(self, context):
         """Update resources of a port.
 
@@ -24,6 +24,11 @@ l2_population_options = [
     cfg.IntOpt('agent_boot_time', default=180,
                help=_('Delay within which agent is expected to update '
                       'existing ports whent it restarts')),
+    cfg.FloatOpt('notification_batch_interval', default=0.5,
+                 help=_('Seconds during which the fdb updates sent to an '
+                        'agent are delayed, so that the ones sent '
+                        'meanwhile are merged in fewer messages. 0 sends '
+                        'them immediately')),
 ]
 
 cfg.CONF.register_opts(l2_population_options, "l2pop")
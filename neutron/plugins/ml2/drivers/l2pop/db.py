@@ -91,6 +91,25 @@ class L2populationDbMixin(base_db.CommonDbMixin):
                                      l2_const.SUPPORTED_AGENT_TYPES))
             return query
 
+    def get_network_hosts(self, session, network_id):
+        """Returns the hosts of the agents with ports on the network."""
+        with session.begin(subtransactions=True):
+            hosts = set()
+            for binding_model in (ml2_models.PortBinding,
+                                  ml2_models.DVRPortBinding):
+                query = session.query(binding_model.host).distinct()
+                query = query.join(agents_db.Agent,
+                                   agents_db.Agent.host == binding_model.host)
+                query = query.join(models_v2.Port,
+                                   models_v2.Port.id == binding_model.port_id)
+                query = query.filter(models_v2.Port.network_id == network_id,
+                                     models_v2.Port.admin_state_up ==
+                                     sql.true(),
+                                     agents_db.Agent.agent_type.in_(
+                                         l2_const.SUPPORTED_AGENT_TYPES))
+                hosts.update(host for host, in query)
+            return hosts
+
     def get_agent_network_active_port_count(self, session, agent_host,
                                             network_id):
         with session.begin(subtransactions=True):
@@ -47,12 +47,27 @@ class L2populationMechanismDriver(api.MechanismDriver,
         return [[port['mac_address'],
                  ip['ip_address']] for ip in port['fixed_ips']]
 
+    def _notify_network_agents(self, method, network_id, fdb_entries,
+                               port_host):
+        """Notify the agents with ports on the network of fdb changes.
+
+        Agents without ports on the network are not notified: they get
+        the whole list of fdb entries when their first port is up.
+        """
+        if not fdb_entries:
+            return
+        session = db_api.get_session()
+        hosts = self.get_network_hosts(session, network_id)
+        hosts.discard(port_host)
+        notify = getattr(self.L2populationAgentNotify, method)
+        for host in hosts:
+            notify(self.rpc_ctx, fdb_entries, host)
+
     def delete_port_postcommit(self, context):
-        fanout_msg = self._update_port_down(
-            context, context.current, context.host)
-        if fanout_msg:
-            self.L2populationAgentNotify.remove_fdb_entries(
-                self.rpc_ctx, fanout_msg)
+        port = context.current
+        fdb_entries = self._update_port_down(context, port, context.host)
+        self._notify_network_agents('remove_fdb_entries', port['network_id'],
+                                    fdb_entries, context.host)
 
     def _get_diff_ips(self, orig, port):
         orig_ips = set([ip['ip_address'] for ip in orig['fixed_ips']])
@@ -86,8 +101,9 @@ class L2populationMechanismDriver(api.MechanismDriver,
         if port_mac_ip:
             ports['after'] = port_mac_ip
 
-        self.L2populationAgentNotify.update_fdb_entries(
-            self.rpc_ctx, {'chg_ip': upd_fdb_entries})
+        self._notify_network_agents('update_fdb_entries', port['network_id'],
+                                    {'chg_ip': upd_fdb_entries},
+                                    context.original_host)
 
         return True
 
@@ -112,8 +128,9 @@ class L2populationMechanismDriver(api.MechanismDriver,
             elif context.status == const.PORT_STATUS_DOWN:
                 fdb_entries = self._update_port_down(
                     context, port, context.host)
-                self.L2populationAgentNotify.remove_fdb_entries(
-                    self.rpc_ctx, fdb_entries)
+                self._notify_network_agents('remove_fdb_entries',
+                                            port['network_id'], fdb_entries,
+                                            context.host)
             elif context.status == const.PORT_STATUS_BUILD:
                 orig = self.migrated_ports.pop(port['id'], None)
                 if orig:
@@ -122,8 +139,9 @@ class L2populationMechanismDriver(api.MechanismDriver,
                     # this port has been migrated: remove its entries from fdb
                     fdb_entries = self._update_port_down(
                         context, original_port, original_host)
-                    self.L2populationAgentNotify.remove_fdb_entries(
-                        self.rpc_ctx, fdb_entries)
+                    self._notify_network_agents('remove_fdb_entries',
+                                                port['network_id'],
+                                                fdb_entries, original_host)
 
     def _get_port_infos(self, context, port, agent_host):
         if not agent_host:
@@ -212,8 +230,8 @@ class L2populationMechanismDriver(api.MechanismDriver,
         # Notify other agents to add fdb rule for current port
         other_fdb_entries[network_id]['ports'][agent_ip] += port_fdb_entries
 
-        self.L2populationAgentNotify.add_fdb_entries(self.rpc_ctx,
-                                                     other_fdb_entries)
+        self._notify_network_agents('add_fdb_entries', network_id,
+                                    other_fdb_entries, agent_host)
 
     def _update_port_down(self, context, port, agent_host):
         port_infos = self._get_port_infos(context, port, agent_host)
@@ -17,6 +17,11 @@
 # @author: Francois Eleouet, Orange
 # @author: Mathieu Rohon, Orange
 
+import copy
+
+import eventlet
+from oslo.config import cfg
+
 from neutron.common import rpc as n_rpc
 from neutron.common import topics
 from neutron.openstack.common import log as logging
@@ -24,6 +29,22 @@ from neutron.openstack.common import log as logging
 
 LOG = logging.getLogger(__name__)
 
+# Methods whose fdb entries are merged when they are sent to an agent
+# within the same batch interval
+MERGEABLE_METHODS = ('add_fdb_entries', 'remove_fdb_entries')
+
+
+def _merge_fdb_entries(fdb_entries, new_fdb_entries):
+    for network_id, network in new_fdb_entries.items():
+        if network_id not in fdb_entries:
+            fdb_entries[network_id] = copy.deepcopy(network)
+            continue
+        ports = fdb_entries[network_id]['ports']
+        for agent_ip, agent_ports in network['ports'].items():
+            merged_ports = ports.setdefault(agent_ip, [])
+            merged_ports.extend([port for port in agent_ports
+                                 if port not in merged_ports])
+
 
 class L2populationAgentNotifyAPI(n_rpc.RpcProxy):
     BASE_RPC_API_VERSION = '1.0'
@@ -35,6 +56,10 @@ class L2populationAgentNotifyAPI(n_rpc.RpcProxy):
         self.topic_l2pop_update = topics.get_topic_name(topic,
                                                         topics.L2POPULATION,
                                                         topics.UPDATE)
+        # Notifications waiting to be sent, by host, in the order they
+        # have to be sent
+        self._pending_notifications = {}
+        self._flush_scheduled = False
 
     def _notification_fanout(self, context, method, fdb_entries):
         LOG.debug(_('Fanout notify l2population agents at %(topic)s '
@@ -48,6 +73,37 @@ class L2populationAgentNotifyAPI(n_rpc.RpcProxy):
                          topic=self.topic_l2pop_update)
 
     def _notification_host(self, context, method, fdb_entries, host):
+        if cfg.CONF.l2pop.notification_batch_interval <= 0:
+            self._cast_host(context, method, fdb_entries, host)
+            return
+
+        notifications = self._pending_notifications.setdefault(host, [])
+        if (notifications and notifications[-1][0] == method and
+                method in MERGEABLE_METHODS):
+            # Entries are only merged with the last notification so that
+            # notifications of different kinds stay ordered.
+            _merge_fdb_entries(notifications[-1][1], fdb_entries)
+        else:
+            notifications.append((method, copy.deepcopy(fdb_entries)))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            eventlet.spawn_after(cfg.CONF.l2pop.notification_batch_interval,
+                                 self._flush_notifications, context)
+
+    def _flush_notifications(self, context):
+        pending = self._pending_notifications
+        self._pending_notifications = {}
+        self._flush_scheduled = False
+        for host, notifications in pending.items():
+            for method, fdb_entries in notifications:
+                try:
+                    self._cast_host(context, method, fdb_entries, host)
+                except Exception:
+                    LOG.exception(_("Failed to notify l2population agent "
+                                    "%(host)s of %(method)s"),
+                                  {'host': host, 'method': method})
+
+    def _cast_host(self, context, method, fdb_entries, host):
         LOG.debug(_('Notify l2population agent %(host)s at %(topic)s the '
                     'message %(method)s with %(fdb_entries)s'),
                   {'host': host,
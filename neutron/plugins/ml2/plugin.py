@@ -13,11 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import contextlib
 from eventlet import greenthread
 
 from oslo.config import cfg
 from oslo.db import exception as os_db_exception
+import sqlalchemy as sa
 from sqlalchemy import exc as sql_exc
 from sqlalchemy.orm import exc as sa_exc
 
@@ -48,6 +50,7 @@ from neutron.openstack.common import importutils
 from neutron.openstack.common import jsonutils
 from neutron.openstack.common import lockutils
 from neutron.openstack.common import log
+from neutron.openstack.common import uuidutils
 from neutron.plugins.common import constants as service_constants
 from neutron.plugins.ml2.common import exceptions as ml2_exc
 from neutron.plugins.ml2 import config  # noqa
@@ -188,9 +191,10 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             value = None
         return value
 
-    def _extend_network_dict_provider(self, context, network):
+    def _extend_network_dict_provider(self, context, network, segments=None):
         id = network['id']
-        segments = db.get_network_segments(context.session, id)
+        if segments is None:
+            segments = db.get_network_segments(context.session, id)
         if not segments:
             LOG.error(_("Network %s has no segments"), id)
             network[provider.NETWORK_TYPE] = None
@@ -772,7 +776,14 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             # the fact that an error occurred.
             LOG.error(_("mechanism_manager.delete_subnet_postcommit failed"))
 
-    def create_port(self, context, port):
+    def _create_port_db(self, context, port, network=None, network_db=None,
+                        subnets=None, mac_generated=False, ips=None):
+        """Create a port and its binding without calling mechanism drivers.
+
+        network and network_db are the network dict and model of the port,
+        subnets the subnet dicts of the network, and ips the IPs of the
+        port, if already fetched or allocated.
+        """
         attrs = port['port']
         attrs['status'] = const.PORT_STATUS_DOWN
 
@@ -781,9 +792,12 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             self._ensure_default_security_group_on_port(context, port)
             sgids = self._get_security_groups_on_port(context, port)
             dhcp_opts = port['port'].get(edo_ext.EXTRADHCPOPTS, [])
-            result = super(Ml2Plugin, self).create_port(context, port)
+            result = super(Ml2Plugin, self)._create_port(
+                context, port, network=network_db, subnets=subnets,
+                mac_generated=mac_generated, ips=ips)
             self._process_port_create_security_group(context, result, sgids)
-            network = self.get_network(context, result['network_id'])
+            if network is None:
+                network = self.get_network(context, result['network_id'])
             binding = db.add_port_binding(session, result['id'])
             mech_context = driver_context.PortContext(self, context, result,
                                                       network, binding)
@@ -794,6 +808,12 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
                     attrs.get(addr_pair.ADDRESS_PAIRS)))
             self._process_port_create_extra_dhcp_opts(context, result,
                                                       dhcp_opts)
+        return result, mech_context
+
+    def create_port(self, context, port):
+        session = context.session
+        with session.begin(subtransactions=True):
+            result, mech_context = self._create_port_db(context, port)
             self.mechanism_manager.create_port_precommit(mech_context)
 
         try:
@@ -817,6 +837,96 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
                 self.delete_port(context, result['id'])
         return bound_context._port
 
+    def create_port_bulk(self, context, ports):
+        """Create ports in a single transaction.
+
+        Networks and their subnets are fetched once, mac addresses are
+        generated with one uniqueness check per network, IP addresses are
+        generated in one pass over the subnets of each network, and
+        mechanism drivers are called once with the contexts of all the
+        ports. If any port fails to be created, none is.
+        """
+        items = ports['ports']
+        session = context.session
+        networks = {}
+        with session.begin(subtransactions=True):
+            for item in items:
+                network_id = item['port']['network_id']
+                if network_id not in networks:
+                    networks[network_id] = {
+                        'db': self._get_network(context, network_id),
+                        'dict': self.get_network(context, network_id),
+                        'subnets': self.get_subnets(
+                            context, filters={'network_id': [network_id]}),
+                        'macs': 0,
+                        'requested_macs': set(),
+                        'items': []}
+                networks[network_id]['items'].append(item)
+                mac_address = item['port'].get('mac_address')
+                if mac_address is attributes.ATTR_NOT_SPECIFIED:
+                    networks[network_id]['macs'] += 1
+                else:
+                    networks[network_id]['requested_macs'].add(mac_address)
+            for network_id, network in networks.iteritems():
+                # Requested mac addresses are only added to the database
+                # with their ports, after the mac addresses are generated
+                network['macs'] = self._generate_macs(
+                    context, network_id, network['macs'],
+                    reserved=network['requested_macs'])
+
+            macs_generated = [item['port'].get('mac_address') is
+                              attributes.ATTR_NOT_SPECIFIED for item in items]
+            for item, mac_generated in zip(items, macs_generated):
+                if mac_generated:
+                    network = networks[item['port']['network_id']]
+                    item['port']['mac_address'] = network['macs'].pop()
+            for network in networks.itervalues():
+                # The IPs of the ports of the network, in the order of items
+                network['ips'] = iter(self._allocate_ips_for_ports(
+                    context, network['db'], network['items'],
+                    network['subnets']))
+
+            results = []
+            for item, mac_generated in zip(items, macs_generated):
+                network = networks[item['port']['network_id']]
+                results.append(self._create_port_db(
+                    context, item, network=network['dict'],
+                    network_db=network['db'], subnets=network['subnets'],
+                    mac_generated=mac_generated, ips=next(network['ips'])))
+            mech_contexts = [mech_context for port, mech_context in results]
+            self.mechanism_manager.create_port_bulk_precommit(mech_contexts)
+
+        port_ids = [port['id'] for port, mech_context in results]
+        try:
+            self.mechanism_manager.create_port_bulk_postcommit(mech_contexts)
+        except ml2_exc.MechanismDriverError:
+            with excutils.save_and_reraise_exception():
+                LOG.error(_("mechanism_manager.create_port_bulk_postcommit "
+                            "failed, deleting ports %s"), port_ids)
+                self._delete_ports(context, port_ids)
+
+        self.notify_security_groups_member_updated_bulk(
+            context, [port for port, mech_context in results])
+
+        bound_ports = []
+        for port, mech_context in results:
+            try:
+                bound_context = self._bind_port_if_needed(mech_context)
+            except ml2_exc.MechanismDriverError:
+                with excutils.save_and_reraise_exception():
+                    LOG.error(_("_bind_port_if_needed failed, deleting "
+                                "ports %s"), port_ids)
+                    self._delete_ports(context, port_ids)
+            bound_ports.append(bound_context._port)
+        return bound_ports
+
+    def _delete_ports(self, context, port_ids):
+        for port_id in port_ids:
+            try:
+                self.delete_port(context, port_id)
+            except Exception:
+                LOG.exception(_("Failed to delete port %s"), port_id)
+
     def update_port(self, context, id, port):
         attrs = port['port']
         need_port_update_notify = False
@@ -938,6 +1048,123 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
 
         return self._bind_port_if_needed(port_context)
 
+    def get_bound_ports_contexts(self, plugin_context, port_ids):
+        """Return bound PortContexts for a list of (possibly truncated) ids.
+
+        This is the bulk version of get_bound_port_context: ports with
+        their bindings and fixed IPs, their networks and the segments of
+        those networks are each loaded with a single query. The result
+        maps every requested id to its PortContext, or to None if no
+        port, or more than one port, matches it.
+        """
+        result = dict.fromkeys(port_ids)
+        if not port_ids:
+            return result
+        session = plugin_context.session
+        port_contexts = {}
+        with session.begin(subtransactions=True):
+            full_ids = [port_id for port_id in port_ids
+                        if uuidutils.is_uuid_like(port_id)]
+            prefixes = [port_id for port_id in port_ids
+                        if not uuidutils.is_uuid_like(port_id)]
+            criteria = [models_v2.Port.id.startswith(prefix)
+                        for prefix in prefixes]
+            if full_ids:
+                criteria.append(models_v2.Port.id.in_(full_ids))
+            ports_db = (session.query(models_v2.Port).
+                        filter(sa.or_(*criteria)).all())
+
+            matches = collections.defaultdict(list)
+            prefix_lengths = set(len(prefix) for prefix in prefixes)
+            for port_db in ports_db:
+                matches[port_db.id].append(port_db)
+                for length in prefix_lengths:
+                    matches[port_db.id[:length]].append(port_db)
+
+            networks, segments = self._get_networks_and_segments(
+                plugin_context,
+                set(port_db.network_id for port_db in ports_db))
+            for port_id in port_ids:
+                found = matches.get(port_id, [])
+                if len(found) > 1:
+                    LOG.error(_("Multiple ports have port_id starting "
+                                "with %s"), port_id)
+                    continue
+                elif not found:
+                    continue
+                port_db = found[0]
+                port = self._make_port_dict(port_db)
+                port_contexts[port_id] = driver_context.PortContext(
+                    self, plugin_context, port,
+                    networks[port_db.network_id], port_db.port_binding,
+                    segments=segments[port_db.network_id])
+
+        # Binding calls into the mechanism drivers, so it has to happen
+        # outside of the transaction, one port at a time.
+        for port_id, port_context in port_contexts.iteritems():
+            result[port_id] = self._bind_port_if_needed(port_context)
+        return result
+
+    def _get_networks_and_segments(self, context, network_ids):
+        network_ids = list(network_ids)
+        segments = db.get_networks_segments(context.session, network_ids)
+        networks = {}
+        if network_ids:
+            for network in super(Ml2Plugin, self).get_networks(
+                    context, filters={'id': network_ids}):
+                self._extend_network_dict_provider(
+                    context, network, segments[network['id']])
+                networks[network['id']] = network
+        return networks, segments
+
+    def update_port_statuses(self, context, port_statuses, host=None):
+        """Bulk version of update_port_status.
+
+        port_statuses maps full port ids to their new status. Ports that
+        need a transition are switched with one UPDATE per target status
+        and the mechanism drivers are called for each of them. Returns
+        the list of ids of the ports that exist.
+        """
+        mech_contexts = []
+        session = context.session
+        with contextlib.nested(lockutils.lock('db-access'),
+                               session.begin(subtransactions=True)):
+            ports = (session.query(models_v2.Port).
+                     filter(models_v2.Port.id.in_(port_statuses.keys())).
+                     all())
+            found_ids = [port.id for port in ports]
+            missing = set(port_statuses) - set(found_ids)
+            for port_id in missing:
+                LOG.warning(_("Port %(port)s updated up by agent not found"),
+                            {'port': port_id})
+            changed = [port for port in ports
+                       if port.status != port_statuses[port.id]]
+            networks, segments = self._get_networks_and_segments(
+                context, set(port.network_id for port in changed))
+            ids_by_status = collections.defaultdict(list)
+            for port in changed:
+                status = port_statuses[port.id]
+                original_port = self._make_port_dict(port)
+                updated_port = dict(original_port, status=status)
+                mech_context = driver_context.PortContext(
+                    self, context, updated_port, networks[port.network_id],
+                    port.port_binding, original_port=original_port,
+                    segments=segments[port.network_id])
+                self.mechanism_manager.update_port_precommit(mech_context)
+                mech_contexts.append(mech_context)
+                ids_by_status[status].append(port.id)
+            for status, ids in ids_by_status.iteritems():
+                (session.query(models_v2.Port).
+                 filter(models_v2.Port.id.in_(ids)).
+                 update({'status': status}, synchronize_session=False))
+            for port in changed:
+                session.expire(port, ['status'])
+
+        for mech_context in mech_contexts:
+            self.mechanism_manager.update_port_postcommit(mech_context)
+
+        return found_ids
+
     def update_port_status(self, context, port_id, status, host=None):
         """
         Returns port_id (non-truncated uuid) if the port exists.
@@ -90,6 +90,49 @@ class RpcCallbacks(n_rpc.RpcCallback,
 
         plugin = manager.NeutronManager.get_plugin()
         port_context = plugin.get_bound_port_context(rpc_context, port_id)
+        entry = self._make_device_details(device, port_id, port_context,
+                                          agent_id)
+        new_status = self._get_new_port_status(port_context, entry)
+        if new_status:
+            plugin.update_port_status(rpc_context,
+                                      port_id,
+                                      new_status,
+                                      host)
+        return entry
+
+    def get_devices_details_list(self, rpc_context, **kwargs):
+        """Agent requests the details of a list of devices.
+
+        All the ports are fetched and their status updated in bulk,
+        instead of going through get_device_details for each device.
+        """
+        agent_id = kwargs.get('agent_id')
+        devices = kwargs.get('devices', [])
+        host = kwargs.get('host')
+        LOG.debug("Details of %(count)d devices requested by agent "
+                  "%(agent_id)s with host %(host)s",
+                  {'count': len(devices), 'agent_id': agent_id,
+                   'host': host})
+        port_ids = [self._device_to_port_id(device) for device in devices]
+
+        plugin = manager.NeutronManager.get_plugin()
+        port_contexts = plugin.get_bound_ports_contexts(rpc_context,
+                                                        list(set(port_ids)))
+        entries = []
+        new_statuses = {}
+        for device, port_id in zip(devices, port_ids):
+            port_context = port_contexts[port_id]
+            entry = self._make_device_details(device, port_id, port_context,
+                                              agent_id)
+            new_status = self._get_new_port_status(port_context, entry)
+            if new_status:
+                new_statuses[port_context.current['id']] = new_status
+            entries.append(entry)
+        if new_statuses:
+            plugin.update_port_statuses(rpc_context, new_statuses, host)
+        return entries
+
+    def _make_device_details(self, device, port_id, port_context, agent_id):
         if not port_context:
             LOG.warning(_("Device %(device)s requested by agent "
                           "%(agent_id)s not found in database"),
@@ -109,14 +152,6 @@ class RpcCallbacks(n_rpc.RpcCallback,
                          'vif_type': port[portbindings.VIF_TYPE]})
             return {'device': device}
 
-        new_status = (q_const.PORT_STATUS_BUILD if port['admin_state_up']
-                      else q_const.PORT_STATUS_DOWN)
-        if port['status'] != new_status:
-            plugin.update_port_status(rpc_context,
-                                      port_id,
-                                      new_status,
-                                      host)
-
         entry = {'device': device,
                  'network_id': port['network_id'],
                  'port_id': port_id,
@@ -130,15 +165,16 @@ class RpcCallbacks(n_rpc.RpcCallback,
         LOG.debug(_("Returning: %s"), entry)
         return entry
 
-    def get_devices_details_list(self, rpc_context, **kwargs):
-        return [
-            self.get_device_details(
-                rpc_context,
-                device=device,
-                **kwargs
-            )
-            for device in kwargs.pop('devices', [])
-        ]
+    @staticmethod
+    def _get_new_port_status(port_context, entry):
+        """Return the status the port has to switch to, if any."""
+        if 'port_id' not in entry:
+            return
+        port = port_context.current
+        new_status = (q_const.PORT_STATUS_BUILD if port['admin_state_up']
+                      else q_const.PORT_STATUS_DOWN)
+        if port['status'] != new_status:
+            return new_status
 
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent."""
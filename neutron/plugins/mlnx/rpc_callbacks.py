@@ -33,7 +33,8 @@ class MlnxRpcCallbacks(n_rpc.RpcCallback,
     # History
     #  1.1 Support Security Group RPC
     #  1.2 Support get_devices_details_list
-    RPC_API_VERSION = '1.2'
+    #  1.3 Support security_group_member_ips_delta
+    RPC_API_VERSION = '1.3'
 
     #to be compatible with Linux Bridge Agent on Network Node
     TAP_PREFIX_LEN = 3
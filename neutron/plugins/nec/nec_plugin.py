@@ -682,8 +682,9 @@ class NECPluginV2AgentNotifierApi(n_rpc.RpcProxy,
 
 class DhcpRpcCallback(n_rpc.RpcCallback,
                       dhcp_rpc_base.DhcpRpcCallbackMixin):
-    # DhcpPluginApi BASE_RPC_API_VERSION
-    RPC_API_VERSION = '1.1'
+    # 1.1  DhcpPluginApi BASE_RPC_API_VERSION
+    # 1.2  Added get_active_networks_revisions and get_networks_info
+    RPC_API_VERSION = '1.2'
 
 
 class L3RpcCallback(n_rpc.RpcCallback, l3_rpc_base.L3RpcCallbackMixin):
@@ -696,7 +697,7 @@ class SecurityGroupServerRpcCallback(
     n_rpc.RpcCallback,
     sg_db_rpc.SecurityGroupServerRpcCallbackMixin):
 
-    RPC_API_VERSION = sg_rpc.SG_RPC_VERSION
+    RPC_API_VERSION = sg_rpc.SG_MEMBER_IPS_RPC_VERSION
 
     @staticmethod
     def get_port_from_device(device):
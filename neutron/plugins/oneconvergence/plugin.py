@@ -56,7 +56,10 @@ class NVSDPluginRpcCallbacks(n_rpc.RpcCallback,
                              l3_rpc_base.L3RpcCallbackMixin,
                              sg_db_rpc.SecurityGroupServerRpcCallbackMixin):
 
-    RPC_API_VERSION = '1.1'
+    # 1.2 Added get_active_networks_revisions and get_networks_info for
+    #     the DHCP agents
+    # 1.3 Added security_group_member_ips_delta
+    RPC_API_VERSION = '1.3'
 
     @staticmethod
     def get_port_from_device(device):
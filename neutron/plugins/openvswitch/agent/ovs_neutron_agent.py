@@ -14,6 +14,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import hashlib
 import signal
 import sys
@@ -210,6 +211,7 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
         self.polling_interval = polling_interval
         self.minimize_polling = minimize_polling
         self.ovsdb_monitor_respawn_interval = ovsdb_monitor_respawn_interval
+        self.port_scan_interval = cfg.CONF.AGENT.port_scan_interval
 
         if tunnel_types:
             self.enable_tunneling = True
@@ -269,6 +271,9 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
         # How many devices are likely used by a VM
         self.agent_state.get('configurations')['devices'] = (
             self.int_br_device_count)
+        if self.sg_agent and self.sg_agent.firewall_refresh_stats:
+            self.agent_state.get('configurations')['firewall_refresh'] = (
+                dict(self.sg_agent.firewall_refresh_stats))
         try:
             self.state_rpc.report_state(self.context,
                                         self.agent_state)
@@ -356,12 +361,9 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                                                      self.local_vlan_map):
             agent_ports.pop(self.local_ip, None)
             if len(agent_ports):
-                if not self.enable_distributed_routing:
-                    self.tun_br.defer_apply_on()
-                self.fdb_add_tun(context, lvm, agent_ports,
-                                 self.tun_br_ofports)
-                if not self.enable_distributed_routing:
-                    self.tun_br.defer_apply_off()
+                with self._deferred_flows([self.tun_br]):
+                    self.fdb_add_tun(context, lvm, agent_ports,
+                                     self.tun_br_ofports)
 
     def fdb_remove(self, context, fdb_entries):
         LOG.debug("fdb_remove received")
@@ -369,12 +371,43 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                                                      self.local_vlan_map):
             agent_ports.pop(self.local_ip, None)
             if len(agent_ports):
-                if not self.enable_distributed_routing:
-                    self.tun_br.defer_apply_on()
-                self.fdb_remove_tun(context, lvm, agent_ports,
-                                    self.tun_br_ofports)
-                if not self.enable_distributed_routing:
-                    self.tun_br.defer_apply_off()
+                with self._deferred_flows([self.tun_br]):
+                    self.fdb_remove_tun(context, lvm, agent_ports,
+                                        self.tun_br_ofports)
+
+    @contextlib.contextmanager
+    def _deferred_flows(self, bridges=None):
+        '''Batch the flows modified within the block.
+
+        The flows of each bridge are applied by a few ovs-ofctl calls when
+        the block exits, unless an enclosing block already defers them.
+
+        :param bridges: the bridges to defer, all of them by default.
+        '''
+        # TODO(vivek): DVR flows are only getting partially configured
+        # when deferred, so they are applied one by one for now.
+        if self.enable_distributed_routing:
+            yield
+            return
+        if bridges is None:
+            bridges = [self.int_br] + self.phys_brs.values()
+            if self.enable_tunneling:
+                bridges.append(self.tun_br)
+        bridges = [br for br in bridges if not br.defer_apply_flows]
+        for br in bridges:
+            br.defer_apply_on()
+        try:
+            yield
+        finally:
+            start = time.time()
+            for br in bridges:
+                br.defer_apply_off()
+            if bridges:
+                LOG.debug(_("Iteration:%(iter_num)d - deferred flows "
+                            "applied on %(bridges)s in %(elapsed).3f"),
+                          {'iter_num': self.iter_num,
+                           'bridges': [br.br_name for br in bridges],
+                           'elapsed': time.time() - start})
 
     def add_fdb_flow(self, port_info, remote_ip, lvm, ofport):
         if port_info == q_const.FLOODING_ENTRY:
@@ -1017,6 +1050,65 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
         port_info['removed'] = registered_ports - cur_ports
         return port_info
 
+    def process_ports_events(self, events, registered_ports,
+                             updated_ports=None):
+        '''Compute the port changes from the ovsdb monitor events.
+
+        Unlike scan_ports, only the interfaces concerned by the events are
+        looked at. Returns None if the events are not sufficient, in which
+        case all the ports must be scanned.
+
+        :param events: the events returned by the polling manager.
+        :param registered_ports: the ports known to be on the bridge.
+        :param updated_ports: the ports updated on the server.
+        '''
+        # Only the latest event of each interface matters
+        devices = {}
+        for event_type, device in events:
+            devices[device['name']] = (event_type, device)
+
+        added = set()
+        removed = set()
+        modified = set()
+        present = set()
+        for event_type, device in devices.values():
+            external_ids = device['external_ids']
+            if 'attached-mac' not in external_ids:
+                continue
+            vif_id = external_ids.get('iface-id')
+            if not vif_id:
+                if 'xs-vif-uuid' in external_ids:
+                    # The iface-id must be retrieved from XAPI
+                    return
+                continue
+            ofport = device['ofport']
+            if (event_type != 'removed' and isinstance(ofport, int) and
+                    ofport > 0 and self._is_port_on_int_br(device['name'])):
+                present.add(vif_id)
+                if vif_id not in registered_ports:
+                    added.add(vif_id)
+                elif event_type == 'modified':
+                    modified.add(vif_id)
+            elif vif_id in registered_ports:
+                removed.add(vif_id)
+        # The interface of a port may have been replaced by another one
+        removed -= present
+
+        cur_ports = (registered_ports - removed) | added
+        self.int_br_device_count = len(cur_ports)
+        port_info = {'current': cur_ports}
+        updated_ports = ((updated_ports or set()) | modified) & cur_ports
+        if updated_ports:
+            port_info['updated'] = updated_ports
+        if added or removed:
+            port_info['added'] = added
+            port_info['removed'] = removed
+        return port_info
+
+    def _is_port_on_int_br(self, port_name):
+        br_name = self.int_br.get_bridge_name_for_port_name(port_name)
+        return (br_name or '').strip() == self.int_br.br_name
+
     def check_changed_vlans(self, registered_ports):
         """Return ports which have lost their vlan tag.
 
@@ -1148,47 +1240,57 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                 cfg.CONF.host)
         except Exception as e:
             raise DeviceListRetrievalError(devices=devices, error=e)
-        for details in devices_details_list:
-            device = details['device']
-            LOG.debug("Processing port: %s", device)
-            port = self.int_br.get_vif_port_by_id(device)
-            if not port:
-                # The port disappeared and cannot be processed
-                LOG.info(_("Port %s was not found on the integration bridge "
-                           "and will therefore not be processed"), device)
-                skipped_devices.append(device)
-                continue
+        devices_up = []
+        devices_down = []
+        with self._deferred_flows():
+            for details in devices_details_list:
+                device = details['device']
+                LOG.debug("Processing port: %s", device)
+                port = self.int_br.get_vif_port_by_id(device)
+                if not port:
+                    # The port disappeared and cannot be processed
+                    LOG.info(_("Port %s was not found on the integration "
+                               "bridge and will therefore not be processed"),
+                             device)
+                    skipped_devices.append(device)
+                    continue
 
-            if 'port_id' in details:
-                LOG.info(_("Port %(device)s updated. Details: %(details)s"),
-                         {'device': device, 'details': details})
-                self.treat_vif_port(port, details['port_id'],
-                                    details['network_id'],
-                                    details['network_type'],
-                                    details['physical_network'],
-                                    details['segmentation_id'],
-                                    details['admin_state_up'],
-                                    details['fixed_ips'],
-                                    details['device_owner'],
-                                    ovs_restarted)
-                # update plugin about port status
-                # FIXME(salv-orlando): Failures while updating device status
-                # must be handled appropriately. Otherwise this might prevent
-                # neutron server from sending network-vif-* events to the nova
-                # API server, thus possibly preventing instance spawn.
-                if details.get('admin_state_up'):
-                    LOG.debug(_("Setting status for %s to UP"), device)
-                    self.plugin_rpc.update_device_up(
-                        self.context, device, self.agent_id, cfg.CONF.host)
+                if 'port_id' in details:
+                    LOG.info(_("Port %(device)s updated. Details: "
+                               "%(details)s"),
+                             {'device': device, 'details': details})
+                    self.treat_vif_port(port, details['port_id'],
+                                        details['network_id'],
+                                        details['network_type'],
+                                        details['physical_network'],
+                                        details['segmentation_id'],
+                                        details['admin_state_up'],
+                                        details['fixed_ips'],
+                                        details['device_owner'],
+                                        ovs_restarted)
+                    if details.get('admin_state_up'):
+                        devices_up.append(device)
+                    else:
+                        devices_down.append(device)
                 else:
-                    LOG.debug(_("Setting status for %s to DOWN"), device)
-                    self.plugin_rpc.update_device_down(
-                        self.context, device, self.agent_id, cfg.CONF.host)
-                LOG.info(_("Configuration for device %s completed."), device)
-            else:
-                LOG.warn(_("Device %s not defined on plugin"), device)
-                if (port and port.ofport != -1):
-                    self.port_dead(port)
+                    LOG.warn(_("Device %s not defined on plugin"), device)
+                    if (port and port.ofport != -1):
+                        self.port_dead(port)
+        # update plugin about port status once the flows are applied
+        # FIXME(salv-orlando): Failures while updating device status
+        # must be handled appropriately. Otherwise this might prevent
+        # neutron server from sending network-vif-* events to the nova
+        # API server, thus possibly preventing instance spawn.
+        for device in devices_up:
+            LOG.debug(_("Setting status for %s to UP"), device)
+            self.plugin_rpc.update_device_up(
+                self.context, device, self.agent_id, cfg.CONF.host)
+            LOG.info(_("Configuration for device %s completed."), device)
+        for device in devices_down:
+            LOG.debug(_("Setting status for %s to DOWN"), device)
+            self.plugin_rpc.update_device_down(
+                self.context, device, self.agent_id, cfg.CONF.host)
+            LOG.info(_("Configuration for device %s completed."), device)
         return skipped_devices
 
     def treat_ancillary_devices_added(self, devices):
@@ -1214,19 +1316,20 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
     def treat_devices_removed(self, devices):
         resync = False
         self.sg_agent.remove_devices_filter(devices)
-        for device in devices:
-            LOG.info(_("Attachment %s removed"), device)
-            try:
-                self.plugin_rpc.update_device_down(self.context,
-                                                   device,
-                                                   self.agent_id,
-                                                   cfg.CONF.host)
-            except Exception as e:
-                LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
-                          {'device': device, 'e': e})
-                resync = True
-                continue
-            self.port_unbound(device)
+        with self._deferred_flows():
+            for device in devices:
+                LOG.info(_("Attachment %s removed"), device)
+                try:
+                    self.plugin_rpc.update_device_down(self.context,
+                                                       device,
+                                                       self.agent_id,
+                                                       cfg.CONF.host)
+                except Exception as e:
+                    LOG.debug(_("port_removed failed for %(device)s: %(e)s"),
+                              {'device': device, 'e': e})
+                    resync = True
+                    continue
+                self.port_unbound(device)
         return resync
 
     def treat_ancillary_devices_removed(self, devices):
@@ -1399,6 +1502,8 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
         ancillary_ports = set()
         tunnel_sync = True
         ovs_restarted = False
+        port_scan_required = True
+        last_port_scan = 0
         while self.run_daemon_loop:
             start = time.time()
             port_stats = {'regular': {'added': 0,
@@ -1413,6 +1518,7 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                 ports.clear()
                 ancillary_ports.clear()
                 sync = False
+                port_scan_required = True
                 polling_manager.force_polling()
             ovs_restarted = self.check_ovs_restart()
             if ovs_restarted:
@@ -1434,7 +1540,12 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                 except Exception:
                     LOG.exception(_("Error while synchronizing tunnels"))
                     tunnel_sync = True
-            if self._agent_has_updates(polling_manager) or ovs_restarted:
+            # Periodically scan all the ports in case some events were
+            # missed by the ovsdb monitor.
+            if start - last_port_scan >= self.port_scan_interval:
+                port_scan_required = True
+            if (self._agent_has_updates(polling_manager) or ovs_restarted or
+                    port_scan_required):
                 try:
                     LOG.debug(_("Agent rpc_loop - iteration:%(iter_num)d - "
                                 "starting polling. Elapsed:%(elapsed).3f"),
@@ -1447,7 +1558,17 @@ class OVSNeutronAgent(n_rpc.RpcCallback,
                     updated_ports_copy = self.updated_ports
                     self.updated_ports = set()
                     reg_ports = (set() if ovs_restarted else ports)
-                    port_info = self.scan_ports(reg_ports, updated_ports_copy)
+                    events = polling_manager.get_events()
+                    port_info = None
+                    if not (port_scan_required or ovs_restarted or
+                            events is None):
+                        port_info = self.process_ports_events(
+                            events, reg_ports, updated_ports_copy)
+                    if port_info is None:
+                        port_info = self.scan_ports(reg_ports,
+                                                    updated_ports_copy)
+                        port_scan_required = False
+                        last_port_scan = start
                     LOG.debug(_("Agent rpc_loop - iteration:%(iter_num)d - "
                                 "port information retrieved. "
                                 "Elapsed:%(elapsed).3f"),
@@ -71,6 +71,12 @@ agent_opts = [
                default=constants.DEFAULT_OVSDBMON_RESPAWN,
                help=_("The number of seconds to wait before respawning the "
                       "ovsdb monitor after losing communication with it")),
+    cfg.IntOpt('port_scan_interval', default=60,
+               help=_("When minimize_polling is enabled, the number of "
+                      "seconds between two scans of all the ports of the "
+                      "integration bridge. In between, only the interfaces "
+                      "reported as changed by the ovsdb monitor are "
+                      "processed.")),
     cfg.ListOpt('tunnel_types', default=DEFAULT_TUNNEL_TYPES,
                 help=_("Network types supported by the agent "
                        "(gre and/or vxlan)")),
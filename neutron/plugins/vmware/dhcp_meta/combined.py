@@ -61,6 +61,10 @@ class DhcpAgentNotifyAPI(dhcp_rpc_agent_api.DhcpAgentNotifyAPI):
             # back, since they were modified
             plugin.port_special_owners.remove(const.DEVICE_OWNER_DHCP)
 
+    def notify_bulk(self, context, resource, bodies, methodname):
+        for body in bodies:
+            self.notify(context, {resource: body}, methodname)
+
 
 def handle_network_dhcp_access(plugin, context, network, action):
     nsx_svc.handle_network_dhcp_access(plugin, context, network, action)
@@ -43,7 +43,9 @@ METADATA_DHCP_ROUTE = '169.254.169.254/32'
 class NSXRpcCallbacks(n_rpc.RpcCallback,
                       dhcp_rpc_base.DhcpRpcCallbackMixin):
 
-    RPC_API_VERSION = '1.1'
+    # 1.2 Added get_active_networks_revisions and get_networks_info for
+    #     the DHCP agents
+    RPC_API_VERSION = '1.2'
 
 
 def handle_network_dhcp_access(plugin, context, network, action):
@@ -34,6 +34,13 @@ from neutron.openstack.common import policy
 LOG = logging.getLogger(__name__)
 _POLICY_PATH = None
 _POLICY_CACHE = {}
+# Compiled match rules of read actions and results of their evaluation.
+# Both are only valid for the rules in _CACHED_RULES.
+_CACHED_RULES = None
+_COMPILED_RULES = {}
+_CHECK_RESULTS = {}
+_CHECK_RESULTS_SIZE = 10000
+_MISSING = object()
 ADMIN_CTX_POLICY = 'context_is_admin'
 # Maps deprecated 'extension' policies to new-style policies
 DEPRECATED_POLICY_MAP = {
@@ -58,8 +65,12 @@ cfg.CONF.import_opt('policy_file', 'neutron.common.config')
 def reset():
     global _POLICY_PATH
     global _POLICY_CACHE
+    global _CACHED_RULES
     _POLICY_PATH = None
     _POLICY_CACHE = {}
+    _CACHED_RULES = None
+    _COMPILED_RULES.clear()
+    _CHECK_RESULTS.clear()
     policy.reset()
 
 
@@ -221,6 +232,24 @@ class OwnerCheck(policy.Check):
                 reason=err_reason)
         super(OwnerCheck, self).__init__(kind, match)
 
+    def get_parent_attribute(self):
+        """Return the parent resource and field of the target field.
+
+        E.g. ('network', 'tenant_id') for %(network:tenant_id)s, or
+        (None, None) when the target field is not a parent attribute.
+        """
+        for separator in (':', '_'):
+            if separator in self.target_field:
+                return tuple(self.target_field.split(separator, 1))
+        return None, None
+
+    def get_parent_foreign_key(self):
+        """Return the attribute referencing the parent resource, if any."""
+        parent_res = self.get_parent_attribute()[0]
+        if parent_res:
+            return attributes.RESOURCE_FOREIGN_KEYS.get(
+                "%ss" % parent_res)
+
     def __call__(self, target, creds):
         if self.target_field not in target:
             # policy needs a plugin check
@@ -327,6 +356,171 @@ def _prepare_check(context, action, target):
     return match_rule, target, credentials
 
 
+def _get_check_fields(rule, target_fields, cred_fields, rules_seen,
+                      owner_checks=None):
+    """Collect the target and credential fields a rule depends on.
+
+    The OwnerChecks loading an attribute of a parent resource are also
+    collected in owner_checks when given.
+
+    Return False if the result of the rule may depend on anything else,
+    in which case it must not be cached.
+    """
+    if isinstance(rule, (policy.TrueCheck, policy.FalseCheck)):
+        return True
+    if isinstance(rule, policy.NotCheck):
+        return _get_check_fields(rule.rule, target_fields, cred_fields,
+                                 rules_seen, owner_checks)
+    if isinstance(rule, (policy.AndCheck, policy.OrCheck)):
+        # Every sub rule is walked, to collect all the owner checks
+        cacheable = True
+        for sub_rule in rule.rules:
+            if not _get_check_fields(sub_rule, target_fields, cred_fields,
+                                     rules_seen, owner_checks):
+                cacheable = False
+        return cacheable
+    if isinstance(rule, policy.RuleCheck):
+        if rule.match in rules_seen:
+            return True
+        rules_seen.add(rule.match)
+        try:
+            sub_rule = policy._rules[rule.match]
+        except KeyError:
+            # RuleCheck fails closed
+            return True
+        return _get_check_fields(sub_rule, target_fields, cred_fields,
+                                 rules_seen, owner_checks)
+    if isinstance(rule, policy.RoleCheck):
+        cred_fields.add('roles')
+        return True
+    if isinstance(rule, FieldCheck):
+        target_fields.add(rule.field)
+        return True
+    if isinstance(rule, OwnerCheck):
+        # The parent resource is loaded when the field is not in the target
+        target_fields.add(rule.target_field)
+        parent_foreign_key = rule.get_parent_foreign_key()
+        if parent_foreign_key:
+            target_fields.add(parent_foreign_key)
+            if owner_checks is not None:
+                owner_checks.append(rule)
+        cred_fields.add(rule.kind)
+        return True
+    if type(rule) is policy.GenericCheck:
+        target_fields.update(re.findall('%\((.*?)\)', rule.match))
+        cred_fields.add(rule.kind)
+        return True
+    return False
+
+
+def _compile_rule(action):
+    """Return the match rule of a read action and the fields it reads.
+
+    The fields are None when results of the rule cannot be cached.
+    """
+    global _CACHED_RULES
+    if policy._rules is not _CACHED_RULES:
+        # policy.json was reloaded or the rules were replaced
+        _COMPILED_RULES.clear()
+        _CHECK_RESULTS.clear()
+        _CACHED_RULES = policy._rules
+    try:
+        return _COMPILED_RULES[action]
+    except KeyError:
+        pass
+    match_rule = _build_match_rule(action, {})
+    target_fields = set()
+    cred_fields = set()
+    if _get_check_fields(match_rule, target_fields, cred_fields, set()):
+        compiled = (match_rule, tuple(target_fields), tuple(cred_fields))
+    else:
+        compiled = (match_rule, None, None)
+    _COMPILED_RULES[action] = compiled
+    return compiled
+
+
+def _freeze(value):
+    # Lists of roles; values that stay unhashable are not cached
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+def _check(context, action, target):
+    """Evaluate the policy of an action on a target.
+
+    Match rules of read actions do not depend on the target, they are
+    built once and the result of their evaluation is memoised for targets
+    and credentials with the same values for the fields the rule reads,
+    like the items of a list request.
+    """
+    if target is None:
+        target = {}
+    resource, is_write = get_resource_and_action(action)
+    if is_write or not policy._rules:
+        rule, target, credentials = _prepare_check(context, action, target)
+        return policy.check(rule, target, credentials)
+    rule, target_fields, cred_fields = _compile_rule(action)
+    credentials = context.to_dict()
+    if target_fields is None:
+        return policy.check(rule, target, credentials)
+    key = (action,
+           tuple([_freeze(target.get(f, _MISSING)) for f in target_fields]),
+           tuple([_freeze(credentials.get(f, _MISSING))
+                  for f in cred_fields]))
+    try:
+        return _CHECK_RESULTS[key]
+    except TypeError:
+        # Unhashable values
+        return policy.check(rule, target, credentials)
+    except KeyError:
+        pass
+    result = policy.check(rule, target, credentials)
+    if len(_CHECK_RESULTS) >= _CHECK_RESULTS_SIZE:
+        _CHECK_RESULTS.clear()
+    _CHECK_RESULTS[key] = result
+    return result
+
+
+def fetch_parent_attributes(action, targets):
+    """Load the parent resource attributes the policy of an action reads.
+
+    OwnerCheck loads the parent resource of every target it is run on when
+    the policy references one of its attributes, like the owner of the
+    network of a port. For a list of targets of a read action the parents
+    are loaded here instead, with one query per parent resource type, and
+    their attributes are set in the targets.
+    """
+    if not targets or not policy._rules:
+        return
+    owner_checks = []
+    _get_check_fields(_compile_rule(action)[0], set(), set(), set(),
+                      owner_checks)
+    for check in owner_checks:
+        parent_res, parent_field = check.get_parent_attribute()
+        parent_foreign_key = check.get_parent_foreign_key()
+        targets_to_fill = [target for target in targets
+                           if check.target_field not in target and
+                           parent_foreign_key in target]
+        if not targets_to_fill:
+            continue
+        manager = importutils.import_module('neutron.manager')
+        f = getattr(manager.NeutronManager.get_instance().plugin,
+                    'get_%ss' % parent_res)
+        context = importutils.import_module('neutron.context')
+        parent_ids = set(target[parent_foreign_key]
+                         for target in targets_to_fill)
+        parents = f(context.get_admin_context(),
+                    filters={'id': list(parent_ids)},
+                    fields=['id', parent_field])
+        values = dict((parent['id'], parent[parent_field])
+                      for parent in parents)
+        for target in targets_to_fill:
+            if target[parent_foreign_key] in values:
+                target[check.target_field] = values[
+                    target[parent_foreign_key]]
+
+
 def check(context, action, target, plugin=None, might_not_exist=False):
     """Verifies that the action is valid on the target in this context.
 
@@ -346,7 +540,7 @@ def check(context, action, target, plugin=None, might_not_exist=False):
     """
     if might_not_exist and not (policy._rules and action in policy._rules):
         return True
-    return policy.check(*(_prepare_check(context, action, target)))
+    return _check(context, action, target)
 
 
 def enforce(context, action, target, plugin=None):
@@ -364,8 +558,7 @@ def enforce(context, action, target, plugin=None):
     :raises neutron.exceptions.PolicyNotAuthorized: if verification fails.
     """
 
-    rule, target, credentials = _prepare_check(context, action, target)
-    result = policy.check(rule, target, credentials, action=action)
+    result = _check(context, action, target)
     if not result:
         LOG.debug(_("Failed policy check for '%s'"), action)
         raise exceptions.PolicyNotAuthorized(action=action)
@@ -26,6 +26,7 @@ from neutron.openstack.common import log as logging
 LOG = logging.getLogger(__name__)
 QUOTA_DB_MODULE = 'neutron.db.quota_db'
 QUOTA_DB_DRIVER = 'neutron.db.quota_db.DbQuotaDriver'
+QUOTA_TRACKED_DRIVER = 'neutron.db.quota_db.TrackedDbQuotaDriver'
 QUOTA_CONF_DRIVER = 'neutron.quota.ConfDriver'
 
 quota_opts = [
@@ -52,6 +53,17 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default=QUOTA_DB_DRIVER,
                help=_('Default driver to use for quota checks')),
+    cfg.IntOpt('usage_recount_interval',
+               default=3600,
+               help=_('Number of seconds after which the resources in use '
+                      'by a tenant are counted again by drivers tracking '
+                      'usage, to correct any drift of the usage counters. '
+                      'A negative value means never.')),
+    cfg.IntOpt('reservation_expiration',
+               default=120,
+               help=_('Number of seconds after which the resources '
+                      'reserved by a create request which did not complete '
+                      'no longer count against the quota of the tenant.')),
 ]
 # Register the configuration options
 cfg.CONF.register_opts(quota_opts, 'QUOTAS')
@@ -219,7 +231,7 @@ class QuotaEngine(object):
         if self._driver is None:
             _driver_class = (self._driver_class or
                              cfg.CONF.QUOTAS.quota_driver)
-            if (_driver_class == QUOTA_DB_DRIVER and
+            if (_driver_class in (QUOTA_DB_DRIVER, QUOTA_TRACKED_DRIVER) and
                     QUOTA_DB_MODULE not in sys.modules):
                 # If quotas table is not loaded, force config quota driver.
                 _driver_class = QUOTA_CONF_DRIVER
@@ -297,6 +309,48 @@ class QuotaEngine(object):
         return self.get_driver().limit_check(context, tenant_id,
                                              self._resources, values)
 
+    def make_reservation(self, context, tenant_id, resource, delta,
+                         plugin, collection):
+        """Check that delta more resources fit in the quota of a tenant.
+
+        If the quota driver tracks usage, the resources are also reserved
+        until the reservation is committed, once they are created, or
+        cancelled. Otherwise they are counted with the plugin, and there
+        is no reservation.
+
+        This method will raise a QuotaResourceUnknown exception if the
+        resource is unknown, and an OverQuota exception if the resources
+        don't fit in the quota.
+
+        :param context: The request context, for access checks.
+        :param tenant_id: The tenant_id to check the quota.
+        :param resource: The name of the resource, as a string.
+        :param delta: The number of resources to be created.
+        :param plugin: The plugin which counts the resources.
+        :param collection: The collection of the resources.
+        :return: The id of the reservation, or None.
+        """
+
+        driver = self.get_driver()
+        if hasattr(driver, 'make_reservation'):
+            if resource not in self._resources:
+                raise exceptions.QuotaResourceUnknown(unknown=[resource])
+            return driver.make_reservation(context, tenant_id,
+                                           self._resources, resource, delta,
+                                           plugin, collection)
+        count = self.count(context, resource, plugin, collection, tenant_id)
+        self.limit_check(context, tenant_id, **{resource: count + delta})
+
+    def commit_reservation(self, context, reservation_id):
+        """Release a reservation once its resources are created."""
+        if reservation_id:
+            self.get_driver().commit_reservation(context, reservation_id)
+
+    def cancel_reservation(self, context, reservation_id):
+        """Release a reservation whose resources were not created."""
+        if reservation_id:
+            self.get_driver().cancel_reservation(context, reservation_id)
+
     @property
     def resources(self):
         return self._resources
@@ -17,6 +17,7 @@ import random
 
 from oslo.config import cfg
 from oslo.db import exception as db_exc
+from sqlalchemy import func
 from sqlalchemy import sql
 
 from neutron.common import constants
@@ -54,6 +55,36 @@ class ChanceScheduler(object):
                       {'network_id': network_id,
                        'agent_id': agent})
 
+    def _bind_networks(self, context, bindings):
+        """Bind a list of (agent, network_id) tuples in one transaction.
+
+        If one of the networks was bound to its agent in the meantime, the
+        bindings are written one by one instead.
+        """
+        if not bindings:
+            return
+        try:
+            with context.session.begin(subtransactions=True):
+                for agent, network_id in bindings:
+                    binding = agentschedulers_db.NetworkDhcpAgentBinding()
+                    binding.dhcp_agent = agent
+                    binding.network_id = network_id
+                    context.session.add(binding)
+        except db_exc.DBDuplicateEntry:
+            LOG.debug(_('Some networks are already bound, binding the '
+                        'networks one by one'))
+            for agent, network_id in bindings:
+                self._schedule_bind_network(context, [agent], network_id)
+            return
+        for agent, network_id in bindings:
+            LOG.debug(_('Network %(network_id)s is scheduled to be '
+                        'hosted by DHCP agent %(agent_id)s'),
+                      {'network_id': network_id,
+                       'agent_id': agent})
+
+    def _choose_agents(self, plugin, context, agents, n_agents):
+        return random.sample(agents, n_agents)
+
     def schedule(self, plugin, context, network):
         """Schedule the network to active DHCP agent(s).
 
@@ -88,10 +119,26 @@ class ChanceScheduler(object):
                 LOG.warn(_('No more DHCP agents'))
                 return
             n_agents = min(len(active_dhcp_agents), n_agents)
-            chosen_agents = random.sample(active_dhcp_agents, n_agents)
-        self._schedule_bind_network(context, chosen_agents, network['id'])
+            chosen_agents = self._choose_agents(plugin, context,
+                                                active_dhcp_agents, n_agents)
+        self._bind_networks(context, [(agent, network['id'])
+                                      for agent in chosen_agents])
         return chosen_agents
 
+    def _get_active_agents_by_network(self, context):
+        """Return the ids of the alive enabled agents hosting each network."""
+        query = context.session.query(
+            agentschedulers_db.NetworkDhcpAgentBinding.network_id,
+            agents_db.Agent.id,
+            agents_db.Agent.heartbeat_timestamp)
+        query = query.join(agents_db.Agent)
+        query = query.filter(agents_db.Agent.admin_state_up == sql.true())
+        agents_by_network = {}
+        for network_id, agent_id, heartbeat_timestamp in query:
+            if not agents_db.AgentDbMixin.is_agent_down(heartbeat_timestamp):
+                agents_by_network.setdefault(network_id, set()).add(agent_id)
+        return agents_by_network
+
     def auto_schedule_networks(self, plugin, context, host):
         """Schedule non-hosted networks to the DHCP agent on
         the specified host.
@@ -113,21 +160,52 @@ class ChanceScheduler(object):
                                  agents_db.Agent.host == host,
                                  agents_db.Agent.admin_state_up == sql.true())
             dhcp_agents = query.all()
+            # the agents hosting every network are fetched at once rather
+            # than with a query per network
+            agents_by_network = self._get_active_agents_by_network(context)
             for dhcp_agent in dhcp_agents:
                 if agents_db.AgentDbMixin.is_agent_down(
                     dhcp_agent.heartbeat_timestamp):
                     LOG.warn(_('DHCP agent %s is not active'), dhcp_agent.id)
                     continue
                 for net_id in net_ids:
-                    agents = plugin.get_dhcp_agents_hosting_networks(
-                        context, [net_id], active=True)
-                    if len(agents) >= agents_per_network:
+                    agent_ids = agents_by_network.setdefault(net_id, set())
+                    if len(agent_ids) >= agents_per_network:
                         continue
-                    if any(dhcp_agent.id == agent.id for agent in agents):
+                    if dhcp_agent.id in agent_ids:
                         continue
                     bindings_to_add.append((dhcp_agent, net_id))
+                    agent_ids.add(dhcp_agent.id)
         # do it outside transaction so particular scheduling results don't
         # make other to fail
-        for agent, net_id in bindings_to_add:
-            self._schedule_bind_network(context, [agent], net_id)
+        self._bind_networks(context, bindings_to_add)
         return True
+
+
+class WeightScheduler(ChanceScheduler):
+    """Allocate the DHCP agents with the lowest load to a network.
+
+    The load of an agent is the number of networks bound to it, plus the
+    number of ports it last reported weighted by dhcp_load_port_weight.
+    """
+
+    def _get_agents_load(self, plugin, context, agents):
+        """Return the load of the agents, keyed by agent id."""
+        binding = agentschedulers_db.NetworkDhcpAgentBinding
+        query = context.session.query(binding.dhcp_agent_id,
+                                      func.count(binding.network_id))
+        query = query.filter(binding.dhcp_agent_id.in_(
+            [agent['id'] for agent in agents]))
+        networks = dict(query.group_by(binding.dhcp_agent_id))
+        port_weight = cfg.CONF.dhcp_load_port_weight
+        return dict((agent['id'],
+                     networks.get(agent['id'], 0) + port_weight *
+                     plugin.get_configuration_dict(agent).get('ports', 0))
+                    for agent in agents)
+
+    def _choose_agents(self, plugin, context, agents, n_agents):
+        load = self._get_agents_load(plugin, context, agents)
+        # shuffle first so that agents with the same load are picked evenly
+        agents = random.sample(agents, len(agents))
+        agents.sort(key=lambda agent: load[agent['id']])
+        return agents[:n_agents]
@@ -24,6 +24,7 @@ from neutron.common import constants
 from neutron.db import agents_db
 from neutron.db import l3_agentschedulers_db
 from neutron.db import l3_db
+from neutron.db import models_v2
 from neutron.openstack.common import log as logging
 
 
@@ -66,54 +67,53 @@ class L3Scheduler(object):
             if agents_db.AgentDbMixin.is_agent_down(
                 l3_agent.heartbeat_timestamp):
                 LOG.warn(_('L3 agent %s is not active'), l3_agent.id)
-            # check if each of the specified routers is hosted
-            if router_ids:
-                unscheduled_router_ids = []
-                for router_id in router_ids:
-                    l3_agents = plugin.get_l3_agents_hosting_routers(
-                        context, [router_id], admin_state_up=True)
-                    if l3_agents:
-                        LOG.debug(_('Router %(router_id)s has already been'
-                                    ' hosted by L3 agent %(agent_id)s'),
-                                  {'router_id': router_id,
-                                   'agent_id': l3_agents[0]['id']})
-                    else:
-                        unscheduled_router_ids.append(router_id)
-                if not unscheduled_router_ids:
-                    # all (specified) routers are already scheduled
-                    return False
-            else:
-                # get all routers that are not hosted
-                #TODO(gongysh) consider the disabled agent's router
-                stmt = ~sql.exists().where(
-                    l3_db.Router.id ==
-                    l3_agentschedulers_db.RouterL3AgentBinding.router_id)
-                unscheduled_router_ids = [router_id_[0] for router_id_ in
-                                          context.session.query(
-                                              l3_db.Router.id).filter(stmt)]
-                if not unscheduled_router_ids:
-                    LOG.debug(_('No non-hosted routers'))
-                    return False
+            routers = self._get_unscheduled_routers(context, router_ids)
+            if not routers:
+                LOG.debug(_('No non-hosted routers'))
+                return False
 
             # check if the configuration of l3 agent is compatible
             # with the router
-            routers = plugin.get_routers(
-                context, filters={'id': unscheduled_router_ids})
-            to_removed_ids = []
-            for router in routers:
-                candidates = plugin.get_l3_agent_candidates(router, [l3_agent])
-                if not candidates:
-                    to_removed_ids.append(router['id'])
-            router_ids = set([r['id'] for r in routers]) - set(to_removed_ids)
-            if not router_ids:
+            bindings = [(router['id'], l3_agent) for router in routers
+                        if plugin.get_l3_agent_candidates(router, [l3_agent])]
+            if not bindings:
                 LOG.warn(_('No routers compatible with L3 agent configuration'
                            ' on host %s'), host)
                 return False
 
-            for router_id in router_ids:
-                self.bind_router(context, router_id, l3_agent)
+            self.bind_routers(context, bindings)
         return True
 
+    def _get_unscheduled_routers(self, context, router_ids=None):
+        """Return the routers not hosted by any L3 agent.
+
+        If router_ids is given, only these routers are considered, and the
+        ones only hosted by disabled L3 agents are returned as well. The
+        routers only have the id and external_gateway_info attributes
+        needed to check the L3 agents able to host them, and are loaded
+        with a single query.
+        """
+        query = context.session.query(l3_db.Router.id,
+                                      models_v2.Port.network_id)
+        query = query.outerjoin(
+            models_v2.Port, l3_db.Router.gw_port_id == models_v2.Port.id)
+        hosted = sql.exists().where(
+            l3_db.Router.id ==
+            l3_agentschedulers_db.RouterL3AgentBinding.router_id)
+        if router_ids:
+            # The given routers are also scheduled when they are only
+            # hosted by disabled agents
+            hosted = hosted.where(sql.and_(
+                l3_agentschedulers_db.RouterL3AgentBinding.l3_agent_id ==
+                agents_db.Agent.id,
+                agents_db.Agent.admin_state_up == sql.true()))
+            query = query.filter(l3_db.Router.id.in_(router_ids))
+        query = query.filter(~hosted)
+        return [{'id': router_id,
+                 'external_gateway_info': (network_id and
+                                           {'network_id': network_id})}
+                for router_id, network_id in query]
+
     def get_candidates(self, plugin, context, sync_router):
         """Return L3 agents where a router could be scheduled."""
         with context.session.begin(subtransactions=True):
@@ -155,6 +155,25 @@ class L3Scheduler(object):
                       {'router_id': router_id,
                        'agent_id': chosen_agent.id})
 
+    def bind_routers(self, context, bindings):
+        """Bind a list of (router_id, l3 agent) tuples in one transaction."""
+        with context.session.begin(subtransactions=True):
+            for router_id, chosen_agent in bindings:
+                binding = l3_agentschedulers_db.RouterL3AgentBinding()
+                binding.l3_agent = chosen_agent
+                binding.router_id = router_id
+                context.session.add(binding)
+        for router_id, chosen_agent in bindings:
+            LOG.debug(_('Router %(router_id)s is scheduled to '
+                        'L3 agent %(agent_id)s'),
+                      {'router_id': router_id,
+                       'agent_id': chosen_agent.id})
+
+    def schedule_routers(self, plugin, context, router_ids):
+        """Schedule the routers to active L3 agents."""
+        for router_id in router_ids:
+            self.schedule(plugin, context, router_id)
+
 
 class ChanceScheduler(L3Scheduler):
     """Randomly allocate an L3 agent for a router."""
@@ -190,3 +209,36 @@ class LeastRoutersScheduler(L3Scheduler):
             self.bind_router(context, router_id, chosen_agent)
 
             return chosen_agent
+
+    def schedule_routers(self, plugin, context, router_ids):
+        """Schedule the routers to the L3 agents with the fewest routers.
+
+        The number of routers of each active L3 agent is queried once and
+        kept up to date as the routers are assigned, and the bindings are
+        written together.
+        """
+        if not router_ids:
+            return
+        with context.session.begin(subtransactions=True):
+            routers = self._get_unscheduled_routers(context, router_ids)
+            if not routers:
+                return
+            active_l3_agents = plugin.get_l3_agents(context, active=True)
+            if not active_l3_agents:
+                LOG.warn(_('No active L3 agents'))
+                return
+            counts = plugin.get_l3_agents_router_counts(
+                context, [l3_agent.id for l3_agent in active_l3_agents])
+            bindings = []
+            for router in routers:
+                candidates = plugin.get_l3_agent_candidates(
+                    router, active_l3_agents)
+                if not candidates:
+                    LOG.warn(_('No L3 agents can host the router %s'),
+                             router['id'])
+                    continue
+                chosen_agent = min(candidates,
+                                   key=lambda l3_agent: counts[l3_agent.id])
+                counts[chosen_agent.id] += 1
+                bindings.append((router['id'], chosen_agent))
+            self.bind_routers(context, bindings)
@@ -36,9 +36,10 @@ from neutron.plugins.common import constants
 class L3RouterPluginRpcCallbacks(n_rpc.RpcCallback,
                                  l3_rpc_base.L3RpcCallbackMixin):
 
-    RPC_API_VERSION = '1.2'
+    RPC_API_VERSION = '1.3'
     # history
     #   1.2 Added methods for DVR support
+    #   1.3 Added get_router_ids
 
 
 class L3RouterPlugin(common_db_mixin.CommonDbMixin,
@@ -59,6 +60,9 @@ class L3RouterPlugin(common_db_mixin.CommonDbMixin,
     supported_extension_aliases = ["dvr", "router", "ext-gw-mode",
                                    "extraroute", "l3_agent_scheduler"]
 
+    __native_pagination_support = True
+    __native_sorting_support = True
+
     def __init__(self):
         qdbapi.register_models(base=model_base.BASEV2)
         self.setup_rpc()
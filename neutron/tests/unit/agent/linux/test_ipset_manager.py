@@ -0,0 +1,97 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from neutron.agent.linux import ipset_manager
+from neutron.tests import base
+
+TEST_SET_NAME = 'IPv4fake_sgid'
+FAKE_IPS = ['10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.4',
+            '10.0.0.5', '10.0.0.6']
+
+
+class TestIpsetManager(base.BaseTestCase):
+    def setUp(self):
+        super(TestIpsetManager, self).setUp()
+        self.root_helper = 'sudo'
+        self.execute = mock.Mock()
+        self.ipset = ipset_manager.IpsetManager(execute=self.execute,
+                                                root_helper=self.root_helper)
+
+    def _restore_call(self, member_ips):
+        process_input = ['create %s hash:ip family inet -exist' %
+                         TEST_SET_NAME,
+                         'create %s-n hash:ip family inet -exist' %
+                         TEST_SET_NAME,
+                         'flush %s-n' % TEST_SET_NAME]
+        process_input += ['add %s-n %s' % (TEST_SET_NAME, ip)
+                          for ip in member_ips]
+        process_input += ['swap %s-n %s' % (TEST_SET_NAME, TEST_SET_NAME),
+                          'destroy %s-n' % TEST_SET_NAME]
+        return mock.call(['ipset', 'restore', '-exist'],
+                         root_helper=self.root_helper,
+                         process_input='\n'.join(process_input) + '\n',
+                         check_exit_code=True)
+
+    def test_get_ipset_name(self):
+        sg_id = 'c5a1e9d8-57f2-4c37-9ea2-5fc5cbf25b0d'
+        name = ipset_manager.get_ipset_name(sg_id, 'IPv6')
+        self.assertEqual(ipset_manager.IPSET_NAME_MAX_LENGTH, len(name))
+        self.assertTrue(name.startswith('IPv6c5a1e9d8'))
+
+    def test_set_members_creates_set(self):
+        self.ipset.set_members(TEST_SET_NAME, 'IPv4', ['10.0.0.1'])
+        self.execute.assert_called_once_with(
+            ['ipset', 'restore', '-exist'], root_helper=self.root_helper,
+            process_input=mock.ANY, check_exit_code=True)
+        self.assertTrue(self.ipset.set_exists(TEST_SET_NAME))
+
+    def test_set_members_adds_and_deletes_members(self):
+        self.ipset.set_members(TEST_SET_NAME, 'IPv4', ['10.0.0.1'])
+        self.execute.reset_mock()
+        self.ipset.set_members(TEST_SET_NAME, 'IPv4', ['10.0.0.2'])
+        self.execute.assert_has_calls(
+            [mock.call(['ipset', 'add', '-exist', TEST_SET_NAME, '10.0.0.2'],
+                       root_helper=self.root_helper, process_input=None,
+                       check_exit_code=True),
+             mock.call(['ipset', 'del', '-exist', TEST_SET_NAME, '10.0.0.1'],
+                       root_helper=self.root_helper, process_input=None,
+                       check_exit_code=True)])
+        self.assertEqual(2, self.execute.call_count)
+
+    def test_set_members_unchanged(self):
+        self.ipset.set_members(TEST_SET_NAME, 'IPv4', ['10.0.0.1'])
+        self.execute.reset_mock()
+        self.ipset.set_members(TEST_SET_NAME, 'IPv4', ['10.0.0.1'])
+        self.assertFalse(self.execute.called)
+
+    def test_set_members_bulk_refresh(self):
+        self.ipset.set_members(TEST_SET_NAME, 'IPv4', [])
+        self.execute.reset_mock()
+        self.ipset.set_members(TEST_SET_NAME, 'IPv4', FAKE_IPS)
+        self.execute.assert_has_calls([self._restore_call(FAKE_IPS)],
+                                      any_order=True)
+        self.assertEqual(1, self.execute.call_count)
+
+    def test_destroy_ipset(self):
+        self.ipset.set_members(TEST_SET_NAME, 'IPv4', [])
+        self.execute.reset_mock()
+        self.ipset.destroy_ipset(TEST_SET_NAME)
+        self.execute.assert_called_once_with(
+            ['ipset', 'destroy', TEST_SET_NAME], root_helper=self.root_helper,
+            process_input=None, check_exit_code=False)
+        self.assertFalse(self.ipset.set_exists(TEST_SET_NAME))
+
+    def test_destroy_unknown_ipset(self):
+        self.ipset.destroy_ipset(TEST_SET_NAME)
+        self.assertFalse(self.execute.called)
@@ -494,6 +494,28 @@ class OVS_Lib_Test(base.BaseTestCase):
             mock.call('mod-flows', ['-'], 'modified_flow_2\n')
         ])
 
+    def test_defer_apply_flows_coalesced(self):
+        run_ofctl = mock.patch.object(self.br, 'run_ofctl').start()
+
+        self.br.defer_apply_on()
+        self.br.mod_flow(table=1, dl_vlan=1, actions='output:1')
+        self.br.mod_flow(table=1, dl_vlan=2, actions='output:1')
+        self.br.mod_flow(table=1, dl_vlan=1, actions='output:1,2')
+        self.br.delete_flows(in_port=1)
+        self.br.delete_flows(in_port=1)
+        self.br.add_flow(priority=2, in_port=1, actions='drop')
+        self.br.defer_apply_off()
+
+        self.assertEqual([
+            mock.call('mod-flows', ['-'],
+                      'table=1,dl_vlan=1,actions=output:1,2\n'
+                      'table=1,dl_vlan=2,actions=output:1\n'),
+            mock.call('del-flows', ['-'], 'in_port=1\n'),
+            mock.call('add-flows', ['-'],
+                      'hard_timeout=0,idle_timeout=0,priority=2,'
+                      'in_port=1,actions=drop\n')],
+            run_ofctl.call_args_list)
+
     def test_add_tunnel_port(self):
         pname = "tap99"
         local_ip = "1.1.1.1"
@@ -13,9 +13,11 @@
 #    under the License.
 
 import eventlet.event
+import eventlet.queue
 import mock
 
 from neutron.agent.linux import ovsdb_monitor
+from neutron.openstack.common import jsonutils
 from neutron.tests import base
 
 
@@ -101,3 +103,50 @@ class TestSimpleInterfaceMonitor(base.BaseTestCase):
                 return_value=output):
             self.monitor._read_stdout()
         self.assertFalse(self.monitor.data_received)
+
+    def _set_output(self, *lines):
+        self.monitor._stdout_lines = eventlet.queue.LightQueue()
+        for line in lines:
+            self.monitor._stdout_lines.put(jsonutils.dumps(line))
+
+    def test_process_events(self):
+        headings = ['row', 'action', 'name', 'ofport', 'external_ids']
+        ext_ids = ['map', [['iface-id', 'vif1'], ['attached-mac', 'mac1']]]
+        self._set_output(
+            {'headings': headings,
+             'data': [['uuid1', 'initial', 'tap1', 1, ext_ids],
+                      ['uuid2', 'initial', 'br-int', 65534, ['map', []]]]},
+            {'headings': headings,
+             'data': [['uuid3', 'insert', 'tap2', ['set', []], ['map', []]]]},
+            {'headings': headings,
+             'data': [['uuid3', 'old', '', ['set', []], ''],
+                      ['uuid3', 'new', 'tap2', 2, ext_ids]]},
+            {'headings': headings,
+             'data': [['uuid1', 'delete', 'tap1', 1, ext_ids]]})
+        self.assertTrue(self.monitor.process_events())
+        ext_ids_dict = {'iface-id': 'vif1', 'attached-mac': 'mac1'}
+        self.assertEqual(
+            [('added', {'name': 'tap1', 'ofport': 1,
+                        'external_ids': ext_ids_dict}),
+             ('added', {'name': 'br-int', 'ofport': 65534,
+                        'external_ids': {}}),
+             ('added', {'name': 'tap2', 'ofport': None, 'external_ids': {}}),
+             ('modified', {'name': 'tap2', 'ofport': 2,
+                           'external_ids': ext_ids_dict}),
+             ('removed', {'name': 'tap1', 'ofport': 1,
+                          'external_ids': ext_ids_dict})],
+            self.monitor.new_events)
+        self.assertFalse(self.monitor.process_events())
+
+    def test_get_events_clears_events(self):
+        self.monitor.new_events = [('added', {})]
+        with mock.patch.object(
+                ovsdb_monitor.SimpleInterfaceMonitor, 'is_active',
+                new_callable=mock.PropertyMock(return_value=True)):
+            self.assertEqual([('added', {})], self.monitor.get_events())
+            self.assertEqual([], self.monitor.get_events())
+
+    def test_get_events_returns_none_if_not_active(self):
+        self.monitor.new_events = [('added', {})]
+        self.assertIsNone(self.monitor.get_events())
+        self.assertEqual([], self.monitor.new_events)
@@ -0,0 +1,460 @@
+# Copyright 2014 OpenStack Foundation.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+
+import mock
+from oslo.config import cfg
+
+from neutron.agent.linux import ovs_lib
+from neutron.agent.linux import ovsdb_native
+from neutron.openstack.common import uuidutils
+from neutron.tests import base
+
+
+SCHEMA = {'name': 'Open_vSwitch', 'tables': {
+    'Open_vSwitch': {'columns': {
+        'bridges': {'type': {'key': {'type': 'uuid'},
+                             'min': 0, 'max': 'unlimited'}},
+        'cur_cfg': {'type': 'integer'},
+        'next_cfg': {'type': 'integer'}}},
+    'Bridge': {'columns': {
+        'name': {'type': 'string'},
+        'ports': {'type': {'key': {'type': 'uuid'},
+                           'min': 0, 'max': 'unlimited'}},
+        'datapath_id': {'type': {'key': 'string', 'min': 0, 'max': 1}},
+        'external_ids': {'type': {'key': 'string', 'value': 'string',
+                                  'min': 0, 'max': 'unlimited'}}}},
+    'Port': {'columns': {
+        'name': {'type': 'string'},
+        'interfaces': {'type': {'key': {'type': 'uuid'},
+                                'min': 1, 'max': 'unlimited'}},
+        'tag': {'type': {'key': {'type': 'integer'}, 'min': 0, 'max': 1}}}},
+    'Interface': {'columns': {
+        'name': {'type': 'string'},
+        'type': {'type': 'string'},
+        'ofport': {'type': {'key': 'integer', 'min': 0, 'max': 1}},
+        'external_ids': {'type': {'key': 'string', 'value': 'string',
+                                  'min': 0, 'max': 'unlimited'}},
+        'options': {'type': {'key': 'string', 'value': 'string',
+                             'min': 0, 'max': 'unlimited'}}}},
+}}
+
+
+class FakeOvsdbServer(object):
+    """In-memory ovsdb-server speaking JSON-RPC through a fake socket.
+
+    Like ovs-vswitchd, it assigns an ofport to new interfaces and applies
+    the new configuration as soon as a transaction bumps next_cfg.
+    """
+
+    def __init__(self):
+        self.tables = dict((table, {}) for table in SCHEMA['tables'])
+        self.monitor_id = None
+        self.requests = []
+        self.output = ''
+        self.next_ofport = 1
+        self.root = self._insert('Open_vSwitch', {
+            'bridges': ['set', []], 'cur_cfg': 0, 'next_cfg': 0})
+
+    # socket interface
+
+    def sendall(self, data):
+        message = json.loads(data)
+        self.requests.append(message)
+        if 'result' in message:
+            return
+        method = message['method']
+        if method == 'get_schema':
+            result = SCHEMA
+        elif method == 'monitor':
+            self.monitor_id = message['params'][1]
+            result = self._rows_update(self.tables, {})
+        elif method == 'transact':
+            result = self._transact(message['params'][1:])
+        self._write({'id': message['id'], 'result': result, 'error': None})
+
+    def recv(self, size):
+        data, self.output = self.output[:size], self.output[size:]
+        return data
+
+    def close(self):
+        pass
+
+    def fake_select(self, rlist, wlist, xlist, timeout):
+        return (rlist if self.output else [], [], [])
+
+    # database
+
+    def _write(self, message):
+        self.output += json.dumps(message)
+
+    def _insert(self, table, row, uuid=None):
+        uuid = uuid or uuidutils.generate_uuid()
+        full_row = {'_uuid': ['uuid', uuid]}
+        for column, column_schema in SCHEMA['tables'][table][
+                'columns'].items():
+            column_type = ovsdb_native.ColumnType(column_schema['type'])
+            if column_type.is_map:
+                full_row[column] = ['map', []]
+            elif isinstance(column_schema['type'], dict):
+                full_row[column] = ['set', []]
+            else:
+                full_row[column] = {'integer': 0}.get(column_type.key_type,
+                                                      '')
+        full_row.update(row)
+        self.tables[table][uuid] = full_row
+        return uuid
+
+    def add_bridge(self, name, ports=(), port_uuids=()):
+        port_uuids = [self.add_port(port)
+                      for port in (name,) + ports] + list(port_uuids)
+        bridge = self._insert('Bridge', {
+            'name': name,
+            'ports': ['set', [['uuid', uuid] for uuid in port_uuids]]})
+        self.tables['Open_vSwitch'][self.root]['bridges'][1].append(
+            ['uuid', bridge])
+        return bridge
+
+    def add_port(self, name, tag=None, external_ids=None):
+        iface = self._insert('Interface', {
+            'name': name, 'ofport': self.next_ofport,
+            'external_ids': ['map', sorted((external_ids or {}).items())]})
+        self.next_ofport += 1
+        return self._insert('Port', {
+            'name': name, 'interfaces': ['set', [['uuid', iface]]],
+            'tag': tag if tag is not None else ['set', []]})
+
+    def _resolve(self, value, named):
+        if isinstance(value, dict):
+            return dict((key, self._resolve(item, named))
+                        for key, item in value.items())
+        if isinstance(value, list):
+            if value and value[0] == 'named-uuid':
+                return ['uuid', named[value[1]]]
+            return [self._resolve(item, named) for item in value]
+        return value
+
+    @staticmethod
+    def _atoms(value):
+        if isinstance(value, list) and value[0] in ('set', 'map'):
+            return value[1]
+        return [value]
+
+    def _match(self, table, where):
+        rows = self.tables[table].values()
+        for column, function, value in where:
+            rows = [row for row in rows if row[column] == value]
+        return rows
+
+    def _transact(self, operations):
+        old = json.loads(json.dumps(self.tables))
+        named = {}
+        results = []
+        for operation in operations:
+            # Named uuids can only refer to rows inserted previously.
+            operation = self._resolve(operation, named)
+            table = operation['table']
+            if operation['op'] == 'insert':
+                uuid = uuidutils.generate_uuid()
+                named[operation['uuid-name']] = uuid
+                self._insert(table, operation['row'], uuid)
+                if table == 'Interface':
+                    self.tables[table][uuid]['ofport'] = self.next_ofport
+                    self.next_ofport += 1
+                results.append({'uuid': ['uuid', uuid]})
+                continue
+            rows = self._match(table, operation['where'])
+            if operation['op'] == 'select':
+                results.append({'rows': [
+                    dict((column, row[column])
+                         for column in operation['columns'])
+                    for row in rows]})
+                continue
+            for row in rows:
+                if operation['op'] == 'update':
+                    row.update(operation['row'])
+                    continue
+                for column, mutator, value in operation['mutations']:
+                    if mutator == '+=':
+                        row[column] += value
+                        continue
+                    kind = 'map' if row[column][0] == 'map' else 'set'
+                    if mutator == 'insert':
+                        row[column] = [kind, self._atoms(row[column]) +
+                                       self._atoms(value)]
+                    elif mutator == 'delete':
+                        # Map keys can be deleted by key or by key-value.
+                        atoms = self._atoms(value)
+                        row[column] = [kind, [
+                            atom for atom in self._atoms(row[column])
+                            if atom not in atoms and (
+                                kind != 'map' or atom[0] not in atoms)]]
+            results.append({'count': len(rows)})
+        self._collect_garbage()
+        ovs = self.tables['Open_vSwitch'][self.root]
+        ovs['cur_cfg'] = ovs['next_cfg']
+        self._write({'method': 'update', 'id': None,
+                     'params': [self.monitor_id,
+                                self._rows_update(self.tables, old)]})
+        return results
+
+    def _collect_garbage(self):
+        ports = set(uuid for bridge in self.tables['Bridge'].values()
+                    for _kind, uuid in self._atoms(bridge['ports']))
+        self.tables['Port'] = dict((uuid, row) for uuid, row in
+                                   self.tables['Port'].items()
+                                   if uuid in ports)
+        ifaces = set(uuid for port in self.tables['Port'].values()
+                     for _kind, uuid in self._atoms(port['interfaces']))
+        self.tables['Interface'] = dict((uuid, row) for uuid, row in
+                                        self.tables['Interface'].items()
+                                        if uuid in ifaces)
+
+    def _rows_update(self, new, old):
+        update = {}
+        for table, columns in ovsdb_native.MONITORED_COLUMNS.items():
+            changes = {}
+            for uuid in set(new[table]) | set(old.get(table, {})):
+                new_row = new[table].get(uuid)
+                old_row = old.get(table, {}).get(uuid)
+                if new_row == old_row:
+                    continue
+                change = {}
+                if new_row is not None:
+                    change['new'] = dict((column, new_row[column])
+                                         for column in columns)
+                if old_row is not None:
+                    change['old'] = dict((column, old_row[column])
+                                         for column in columns)
+                changes[uuid] = change
+            if changes:
+                update[table] = changes
+        return update
+
+
+class OvsdbNativeTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(OvsdbNativeTestCase, self).setUp()
+        self.server = FakeOvsdbServer()
+        self.server.add_bridge('br-int', ('tap1', 'tap2'))
+        self.server.add_bridge('br-ex')
+        mock.patch.object(ovsdb_native.OvsdbConnection, '_open_socket',
+                          return_value=self.server).start()
+        mock.patch.object(ovsdb_native.select, 'select',
+                          side_effect=self.server.fake_select).start()
+        self.ovsdb = ovsdb_native.OvsdbConnection('tcp:127.0.0.1:6640', 10)
+
+    def _methods(self):
+        return [request.get('method') for request in self.server.requests]
+
+    def test_reads_are_served_from_replica(self):
+        self.assertEqual(['br-ex', 'br-int'], self.ovsdb.get_bridge_names())
+        self.assertEqual(['tap1', 'tap2'],
+                         [port['name'] for port in
+                          self.ovsdb.get_bridge_ports('br-int')])
+        self.assertEqual('br-int', self.ovsdb.get_bridge_for_iface('tap2'))
+        self.assertEqual(2, self.ovsdb.find_row('Interface', 'tap1')['ofport'])
+        self.assertIsNone(self.ovsdb.get_bridge_for_port('missing'))
+        self.assertEqual(['get_schema', 'monitor'], self._methods())
+
+    def test_updates_are_applied_before_reads(self):
+        self.ovsdb.get_bridge_names()
+        self.server.add_bridge('br-tun')
+        self.server._write({'method': 'update', 'id': None, 'params': [
+            ovsdb_native.MONITOR_ID, self.server._rows_update(
+                self.server.tables, {})]})
+        self.assertIn('br-tun', self.ovsdb.get_bridge_names())
+
+    def test_echo_is_answered(self):
+        self.ovsdb.get_bridge_names()
+        self.server._write({'method': 'echo', 'params': [], 'id': 'echo'})
+        self.ovsdb.get_bridge_names()
+        self.assertEqual({'id': 'echo', 'result': [], 'error': None},
+                         self.server.requests[-1])
+
+    def test_set_column_map_key_and_value(self):
+        self.ovsdb.set_column('Port', 'tap1', 'tag', '5')
+        self.ovsdb.set_column('interface', 'tap1', 'options:peer', 'tap2')
+        self.assertEqual(5, self.ovsdb.find_row('Port', 'tap1')['tag'])
+        self.assertEqual({'peer': 'tap2'},
+                         self.ovsdb.find_row('Interface', 'tap1')['options'])
+        self.ovsdb.clear_column('Port', 'tap1', 'tag')
+        self.assertEqual([], self.ovsdb.find_row('Port', 'tap1')['tag'])
+
+    def test_set_column_missing_record(self):
+        self.assertRaises(RuntimeError, self.ovsdb.set_column,
+                          'Port', 'missing', 'tag', '5')
+
+    def test_add_and_delete_ports(self):
+        self.ovsdb.add_port('br-int', 'tap3')
+        self.ovsdb.add_port('br-int', 'tap3')
+        self.assertEqual(1, self._methods().count('transact'))
+        self.assertEqual(['tap1', 'tap2', 'tap3'],
+                         [port['name'] for port in
+                          self.ovsdb.get_bridge_ports('br-int')])
+        self.ovsdb.delete_ports('br-int', ['tap1', 'tap3', 'missing'])
+        self.assertEqual(2, self._methods().count('transact'))
+        self.assertEqual(['tap2'],
+                         [port['name'] for port in
+                          self.ovsdb.get_bridge_ports('br-int')])
+        self.assertIsNone(self.ovsdb.find_row('Interface', 'tap1'))
+
+    def test_transact_waits_for_vswitchd(self):
+        self.ovsdb.add_port('br-int', 'tap3')
+        ovs = list(self.ovsdb.tables['Open_vSwitch'].values())[0]
+        self.assertEqual(1, ovs['cur_cfg'])
+
+    def test_transact_error(self):
+        self.ovsdb.get_bridge_names()
+        with mock.patch.object(self.server, '_transact',
+                               return_value=[{'error': 'constraint'}]):
+            self.assertRaises(RuntimeError, self.ovsdb.transact,
+                              [{'op': 'comment', 'comment': 'test'}])
+
+    def test_reconnect_after_connection_lost(self):
+        self.ovsdb.get_bridge_names()
+        self.server.output = ''
+        with mock.patch.object(self.server, 'recv', return_value=''):
+            self.server.output = ' '
+            self.assertRaises(IOError, self.ovsdb._read_messages, 0)
+        self.server.output = ''
+        self.ovsdb._disconnect()
+        self.assertEqual(['br-ex', 'br-int'], self.ovsdb.get_bridge_names())
+        self.assertEqual(2, self._methods().count('monitor'))
+
+    def test_partial_messages_are_buffered(self):
+        self.ovsdb.get_bridge_names()
+        self.server._write({'method': 'echo', 'params': [], 'id': 'x'})
+        data = self.server.output
+        self.server.output = data[:5]
+        self.assertEqual([], self.ovsdb._read_messages(0))
+        self.server.output = data[5:]
+        self.assertEqual([{'method': 'echo', 'params': [], 'id': 'x'}],
+                         self.ovsdb._read_messages(0))
+
+    def test_multibyte_character_split_across_reads(self):
+        self.ovsdb.get_bridge_names()
+        data = u'{"id": "x", "result": ["br-\u00e9"], "error": null}'
+        data = data.encode('utf-8')
+        split = data.index(b'\xa9')
+        self.server.output = data[:split]
+        self.assertEqual([], self.ovsdb._read_messages(0))
+        self.server.output = data[split:]
+        self.assertEqual([{'id': 'x', 'result': [u'br-\u00e9'],
+                           'error': None}],
+                         self.ovsdb._read_messages(0))
+
+    def test_delimiters_inside_strings_are_ignored(self):
+        self.ovsdb.get_bridge_names()
+        message = {'id': 'x', 'result': ['{"[\\', '}]'], 'error': None}
+        self.server._write(message)
+        data = self.server.output
+        for split in range(1, len(data)):
+            self.server.output = data[:split]
+            self.assertEqual([], self.ovsdb._read_messages(0))
+            self.server.output = data[split:]
+            self.assertEqual([message], self.ovsdb._read_messages(0))
+
+    def test_several_messages_in_one_read(self):
+        self.ovsdb.get_bridge_names()
+        self.server._write({'method': 'echo', 'params': [], 'id': 'x'})
+        self.server.output += '\n'
+        self.server._write({'method': 'echo', 'params': [], 'id': 'y'})
+        self.server.output += '\n{"id": '
+        self.assertEqual([{'method': 'echo', 'params': [], 'id': 'x'},
+                          {'method': 'echo', 'params': [], 'id': 'y'}],
+                         self.ovsdb._read_messages(0))
+        self.server.output = '"z", "result": [], "error": null}'
+        self.assertEqual([{'id': 'z', 'result': [], 'error': None}],
+                         self.ovsdb._read_messages(0))
+
+
+class FormatValueTestCase(base.BaseTestCase):
+
+    def test_format_value(self):
+        self.assertEqual('5', ovsdb_native.format_value(5))
+        self.assertEqual('[]', ovsdb_native.format_value([]))
+        self.assertEqual('br-int', ovsdb_native.format_value('br-int'))
+        self.assertEqual('"0000aabb"', ovsdb_native.format_value('0000aabb'))
+        self.assertEqual('"true"', ovsdb_native.format_value('true'))
+        self.assertEqual('{a=b, c="1.1.1.1:2"}', ovsdb_native.format_value(
+            {'c': '1.1.1.1:2', 'a': 'b'}))
+
+
+class OVSBridgeNativeTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(OVSBridgeNativeTestCase, self).setUp()
+        self.server = FakeOvsdbServer()
+        mac = 'fa:16:3e:00:00:01'
+        port = self.server.add_port('tap1', tag=1, external_ids={
+            'iface-id': 'vif-1', 'attached-mac': mac})
+        self.server.add_bridge('br-int', port_uuids=[port])
+        self.server.add_bridge('br-ex')
+        # Not attached to any bridge
+        self.server.add_port('tap2', external_ids={'iface-id': 'vif-2',
+                                                   'attached-mac': mac})
+        mock.patch.object(ovsdb_native.OvsdbConnection, '_open_socket',
+                          return_value=self.server).start()
+        mock.patch.object(ovsdb_native.select, 'select',
+                          side_effect=self.server.fake_select).start()
+        mock.patch.dict(ovsdb_native._connections, clear=True).start()
+        cfg.CONF.set_override('ovsdb_interface', 'native')
+        self.execute = mock.patch(
+            'neutron.agent.linux.utils.execute').start()
+        self.br = ovs_lib.OVSBridge('br-int', 'sudo')
+
+    def test_reads_do_not_run_vsctl(self):
+        self.assertTrue(self.br.bridge_exists('br-ex'))
+        self.assertFalse(self.br.bridge_exists('br-tun'))
+        self.assertEqual(['tap1'], self.br.get_port_name_list())
+        self.assertEqual('br-int',
+                         self.br.get_bridge_name_for_port_name('tap1'))
+        self.assertEqual('1', self.br.db_get_val('Port', 'tap1', 'tag'))
+        self.assertEqual({'iface-id': 'vif-1',
+                          'attached-mac': 'fa:16:3e:00:00:01'},
+                         self.br.db_get_map('Interface', 'tap1',
+                                            'external_ids'))
+        self.assertEqual(set(['vif-1']), self.br.get_vif_port_set())
+        self.assertEqual({'tap1': 1}, self.br.get_port_tag_dict())
+        self.assertEqual('tap1', self.br.get_vif_port_by_id('vif-1').port_name)
+        self.assertIsNone(self.br.get_vif_port_by_id('vif-2'))
+        self.assertEqual(['br-ex', 'br-int'], ovs_lib.get_bridges('sudo'))
+        self.assertFalse(self.execute.called)
+
+    def test_db_get_val_missing_record(self):
+        self.assertIsNone(self.br.db_get_val('Port', 'missing', 'tag'))
+        self.assertRaises(RuntimeError, self.br.db_get_val,
+                          'Port', 'missing', 'tag', check_error=True)
+
+    def test_writes(self):
+        ofport = self.br.add_port('tap3')
+        self.assertEqual(self.br.db_get_val('Interface', 'tap3', 'ofport'),
+                         ofport)
+        self.assertNotEqual(ovs_lib.constants.INVALID_OFPORT, ofport)
+        self.br.set_db_attribute('Port', 'tap3', 'tag', 4095)
+        self.assertEqual({'tap1': 1, 'tap3': 4095},
+                         self.br.get_port_tag_dict())
+        self.br.clear_db_attribute('Port', 'tap3', 'tag')
+        self.assertEqual('[]', self.br.db_get_val('Port', 'tap3', 'tag'))
+        self.br.delete_ports(all_ports=True)
+        self.assertEqual([], self.br.get_port_name_list())
+        self.assertFalse(self.execute.called)
+
+    def test_unmonitored_table_uses_vsctl(self):
+        self.br.set_db_attribute('Controller', 'br-int', 'inactivity_probe',
+                                 1000)
+        self.assertTrue(self.execute.called)
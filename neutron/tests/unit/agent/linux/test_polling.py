@@ -84,6 +84,9 @@ class TestAlwaysPoll(base.BaseTestCase):
         pm = polling.AlwaysPoll()
         self.assertTrue(pm.is_polling_required)
 
+    def test_get_events_returns_none(self):
+        self.assertIsNone(polling.AlwaysPoll().get_events())
+
 
 class TestInterfacePollingMinimizer(base.BaseTestCase):
 
@@ -101,6 +104,12 @@ class TestInterfacePollingMinimizer(base.BaseTestCase):
             self.pm.stop()
         mock_stop.assert_called_with()
 
+    def test_get_events_returns_monitor_events(self):
+        with mock.patch.object(self.pm._monitor, 'get_events',
+                               return_value=[]) as mock_get_events:
+            self.assertEqual([], self.pm.get_events())
+        mock_get_events.assert_called_with()
+
     def mock_has_updates(self, return_value):
         target = ('neutron.agent.linux.ovsdb_monitor.SimpleInterfaceMonitor'
                   '.has_updates')
@@ -13,12 +13,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextlib
 import datetime
 import mock
 
 from neutron.api.rpc.agentnotifiers import dhcp_rpc_agent_api
+from neutron.common import constants
 from neutron.common import utils
 from neutron.db import agents_db
+from neutron.openstack.common import jsonutils
 from neutron.openstack.common import timeutils
 from neutron.tests import base
 
@@ -152,3 +155,66 @@ class TestDhcpAgentNotifyAPI(base.BaseTestCase):
     def test__cast_message(self):
         self.notifier._cast_message(mock.ANY, mock.ANY, mock.ANY)
         self.assertEqual(1, self.mock_cast.call_count)
+
+    def _test_notify_bulk_ports(self, configurations):
+        agent = agents_db.Agent(host='host', topic='dhcp_agent',
+                                configurations=jsonutils.dumps(
+                                    configurations))
+        ports = [{'id': 'foo_port_id', 'network_id': 'foo_network_id'},
+                 {'id': 'bar_port_id', 'network_id': 'foo_network_id'},
+                 {'id': 'baz_port_id', 'network_id': 'bar_network_id'}]
+        with contextlib.nested(
+            mock.patch.object(self.notifier, '_get_agents_to_notify',
+                              return_value=[agent]),
+            mock.patch.object(self.notifier, 'cast')
+        ) as (get_agents, self.mock_bulk_cast):
+            self.notifier.notify_bulk(mock.ANY, 'port', ports,
+                                      'port.create.end')
+        self.assertEqual(
+            [mock.call(mock.ANY, 'ports_create_end', {'ports': ports[:2]},
+                       'foo_network_id'),
+             mock.call(mock.ANY, 'ports_create_end', {'ports': ports[2:]},
+                       'bar_network_id')],
+            get_agents.call_args_list)
+        return ports
+
+    def test_notify_bulk_ports(self):
+        ports = self._test_notify_bulk_ports(
+            {constants.DHCP_AGENT_BULK_PORT_NOTIFICATIONS: True})
+        self.assertEqual(
+            [mock.call(mock.ANY, self.notifier.make_msg(
+                'ports_create_end', payload={'ports': ports[:2]}),
+                topic='dhcp_agent.host', version='1.1'),
+             mock.call(mock.ANY, self.notifier.make_msg(
+                 'ports_create_end', payload={'ports': ports[2:]}),
+                 topic='dhcp_agent.host', version='1.1')],
+            self.mock_bulk_cast.call_args_list)
+        self.assertFalse(self.mock_cast.called)
+
+    def test_notify_bulk_ports_to_agent_without_bulk_support(self):
+        ports = self._test_notify_bulk_ports({})
+        self.assertEqual(
+            [mock.call(mock.ANY, 'port_create_end', {'port': port},
+                       'host', 'dhcp_agent') for port in ports],
+            self.mock_cast.call_args_list)
+        self.assertFalse(self.mock_bulk_cast.called)
+
+    def test_notify_bulk_ports_fanout(self):
+        self.mock_util.return_value = False
+        ports = [{'id': 'foo_port_id', 'network_id': 'foo_network_id'},
+                 {'id': 'bar_port_id', 'network_id': 'foo_network_id'}]
+        self.notifier.notify_bulk(mock.ANY, 'port', ports, 'port.create.end')
+        self.assertEqual(
+            [mock.call(mock.ANY, 'port_create_end', {'port': port})
+             for port in ports],
+            self.mock_fanout.call_args_list)
+
+    def test_notify_bulk_networks(self):
+        networks = [{'id': 'foo_network_id'}, {'id': 'bar_network_id'}]
+        with mock.patch.object(self.notifier, 'notify') as notify:
+            self.notifier.notify_bulk(mock.ANY, 'network', networks,
+                                      'network.create.end')
+        self.assertEqual(
+            [mock.call(mock.ANY, {'network': network}, 'network.create.end')
+             for network in networks],
+            notify.call_args_list)
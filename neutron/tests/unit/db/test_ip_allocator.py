@@ -0,0 +1,131 @@
+# Copyright (c) 2014 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from oslo.config import cfg
+import webob.exc
+
+from neutron.common import exceptions as n_exc
+from neutron import context
+from neutron.db import ip_allocator
+from neutron.db import models_v2
+from neutron import manager
+from neutron.tests import base
+from neutron.tests.unit import test_db_plugin
+
+
+class TestRandomAllocatorHelpers(base.BaseTestCase):
+
+    def test_get_ip_at(self):
+        ranges = [(10, 12), (20, 20), (30, 31)]
+        ips = [ip_allocator.RandomAllocator._get_ip_at(ranges, i)
+               for i in range(6)]
+        self.assertEqual(['0.0.0.10', '0.0.0.11', '0.0.0.12',
+                          '0.0.0.20', '0.0.0.30', '0.0.0.31'], ips)
+
+
+class TestRandomAllocator(test_db_plugin.NeutronDbPluginV2TestCase):
+
+    def setUp(self):
+        cfg.CONF.set_override('ip_allocator_driver',
+                              'neutron.db.ip_allocator.RandomAllocator')
+        super(TestRandomAllocator, self).setUp()
+        self.plugin = manager.NeutronManager.get_plugin()
+        self.ctx = context.get_admin_context()
+
+    def _delete_ports(self, ports):
+        for port in ports:
+            self._delete('ports', port['port']['id'])
+
+    def _get_allocations(self, subnet_id):
+        return (self.ctx.session.query(models_v2.IPAllocation).
+                filter_by(subnet_id=subnet_id).all())
+
+    def test_allocator_is_loaded(self):
+        self.assertIsInstance(self.plugin.ip_allocator,
+                              ip_allocator.RandomAllocator)
+
+    def test_allocate_until_exhausted(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            network_id = subnet['subnet']['network_id']
+            # .1 is the gateway, leaving .2 to .6 in the pool
+            ports = [self._make_port(self.fmt, network_id)
+                     for i in range(5)]
+            ips = set(port['port']['fixed_ips'][0]['ip_address']
+                      for port in ports)
+            self.assertEqual(set(['10.0.0.%d' % i for i in range(2, 7)]),
+                             ips)
+            res = self._create_port(self.fmt, network_id)
+            self.assertEqual(webob.exc.HTTPConflict.code, res.status_int)
+
+            allocations = self._get_allocations(subnet['subnet']['id'])
+            self.assertEqual(5, len(allocations))
+            self.assertTrue(all(a.port_id for a in allocations))
+            self._delete_ports(ports)
+
+    def test_crowded_subnet_falls_back_to_free_address(self):
+        cfg.CONF.set_override('ip_allocation_retries', 1)
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            network_id = subnet['subnet']['network_id']
+            fixed_ips = [{'ip_address': '10.0.0.%d' % i} for i in range(2, 6)]
+            crowd = self._make_port(self.fmt, network_id, fixed_ips=fixed_ips)
+            with mock.patch('random.randint', return_value=0):
+                port = self._make_port(self.fmt, network_id,
+                                       mac_address='fa:16:3e:00:00:01')
+            self.assertEqual('10.0.0.6',
+                             port['port']['fixed_ips'][0]['ip_address'])
+            self._delete_ports([crowd, port])
+
+    def test_reserve_conflict_is_retried(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            network_id = subnet['subnet']['network_id']
+            other = self._make_port(self.fmt, network_id,
+                                    fixed_ips=[{'ip_address': '10.0.0.2'}])
+            with mock.patch('random.randint', side_effect=[0, 1]):
+                port = self._make_port(self.fmt, network_id,
+                                       mac_address='fa:16:3e:00:00:01')
+            self.assertEqual('10.0.0.3',
+                             port['port']['fixed_ips'][0]['ip_address'])
+            self._delete_ports([other, port])
+
+    def test_specific_ip_already_reserved(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            allocator = self.plugin.ip_allocator
+            subnet = subnet['subnet']
+            with self.ctx.session.begin():
+                allocator.allocate_specific_ip(self.ctx,
+                                               subnet['network_id'],
+                                               subnet['id'], '10.0.0.4')
+                self.assertRaises(n_exc.IpAddressInUse,
+                                  allocator.allocate_specific_ip,
+                                  self.ctx, subnet['network_id'],
+                                  subnet['id'], '10.0.0.4')
+                allocator.store_allocation(self.ctx, subnet['network_id'],
+                                           subnet['id'], '10.0.0.4', None)
+            self.assertEqual(1, len(self._get_allocations(subnet['id'])))
+
+    def test_update_port_adds_address(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            with self.port(subnet=subnet) as port:
+                subnet_id = subnet['subnet']['id']
+                fixed_ips = port['port']['fixed_ips'] + [
+                    {'subnet_id': subnet_id}]
+                req = self.new_update_request(
+                    'ports', {'port': {'fixed_ips': fixed_ips}},
+                    port['port']['id'])
+                res = self.deserialize(self.fmt, req.get_response(self.api))
+                ips = [ip['ip_address'] for ip in res['port']['fixed_ips']]
+                self.assertEqual(2, len(set(ips)))
+                self.assertEqual(2, len(self._get_allocations(subnet_id)))
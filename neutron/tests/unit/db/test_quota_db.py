@@ -15,11 +15,21 @@
 #
 # @author: Sergio Cazzolato, Intel
 
+import datetime
+
+import mock
+from oslo.config import cfg
+from sqlalchemy import orm
+
+from neutron.api.v2 import attributes
 from neutron.common import exceptions
 from neutron import context
 from neutron.db import api as db
 from neutron.db import db_base_plugin_v2 as base_plugin
+from neutron.db import models_v2
 from neutron.db import quota_db
+from neutron.openstack.common import timeutils
+from neutron import quota
 from neutron.tests import base
 
 
@@ -141,3 +151,170 @@ class TestDbQuotaDriver(base.BaseTestCase):
         self.assertRaises(exceptions.QuotaResourceUnknown,
                           self.plugin.limit_check, context.get_admin_context(),
                           PROJECT, resources, values)
+
+
+class TestTrackedDbQuotaDriver(base.BaseTestCase):
+    def setUp(self):
+        super(TestTrackedDbQuotaDriver, self).setUp()
+        cfg.CONF.set_override('quota_driver', quota.QUOTA_TRACKED_DRIVER,
+                              group='QUOTAS')
+        self.plugin = FakePlugin()
+        self.driver = quota_db.TrackedDbQuotaDriver()
+        self.context = context.get_admin_context()
+        self.resources = {'network': TestResource('network', 2),
+                          'port': TestResource('port', 2),
+                          RESOURCE: TestResource(RESOURCE, 2)}
+        self.addCleanup(db.clear_db)
+
+    def _create_network(self):
+        return self.plugin.create_network(self.context, {'network': {
+            'name': 'net', 'admin_state_up': True, 'shared': False,
+            'tenant_id': PROJECT}})
+
+    def _reserve(self, delta=1):
+        return self.driver.make_reservation(self.context, PROJECT,
+                                            self.resources, 'network', delta,
+                                            self.plugin, 'networks')
+
+    def _create_port(self, network_id, tenant_id=PROJECT):
+        return self.plugin.create_port(self.context, {'port': {
+            'network_id': network_id, 'name': '', 'admin_state_up': True,
+            'device_id': '', 'device_owner': '', 'fixed_ips': [],
+            'mac_address': attributes.ATTR_NOT_SPECIFIED,
+            'tenant_id': tenant_id}})
+
+    def _get_details(self, resource='network', tenant_id=PROJECT):
+        return self.driver.get_detailed_tenant_quotas(
+            self.context, self.resources, tenant_id)[resource]
+
+    def _get_usage_tenants(self, resource):
+        return set(tenant_id for tenant_id, in self.context.session.query(
+            quota_db.QuotaUsage.tenant_id).filter_by(resource=resource))
+
+    def test_make_reservation(self):
+        self._create_network()
+        self.assertIsNotNone(self._reserve())
+        self.assertEqual({'limit': 2, 'used': 1, 'reserved': 1},
+                         self._get_details())
+
+    def test_make_reservation_over_quota(self):
+        self._create_network()
+        self.assertRaises(exceptions.OverQuota, self._reserve, 2)
+
+    def test_make_reservation_counts_reservations(self):
+        self._reserve()
+        self._reserve()
+        self.assertRaises(exceptions.OverQuota, self._reserve)
+
+    def test_make_reservation_ignores_expired_reservations(self):
+        self._reserve(2)
+        expired = timeutils.utcnow() + datetime.timedelta(
+            seconds=cfg.CONF.QUOTAS.reservation_expiration + 1)
+        with mock.patch.object(timeutils, 'utcnow', return_value=expired):
+            self.assertIsNotNone(self._reserve(2))
+
+    def test_make_reservation_unlimited(self):
+        self.resources['network'] = TestResource('network', -1)
+        self.assertIsNone(self._reserve(5))
+
+    def test_make_reservation_resource_without_table(self):
+        self.resources[RESOURCE].count = mock.Mock(return_value=2)
+        self.assertRaises(exceptions.OverQuota,
+                          self.driver.make_reservation, self.context,
+                          PROJECT, self.resources, RESOURCE, 1, self.plugin,
+                          'res_tests')
+        self.resources[RESOURCE].count.assert_called_once_with(
+            self.context, self.plugin, 'res_tests', PROJECT)
+
+    def test_commit_reservation(self):
+        reservation = self._reserve()
+        self._create_network()
+        self.driver.commit_reservation(self.context, reservation)
+        self.assertEqual({'limit': 2, 'used': 1, 'reserved': 0},
+                         self._get_details())
+
+    def test_cancel_reservation(self):
+        reservation = self._reserve()
+        self.driver.cancel_reservation(self.context, reservation)
+        self.assertEqual({'limit': 2, 'used': 0, 'reserved': 0},
+                         self._get_details())
+
+    def test_usage_tracks_created_and_deleted_resources(self):
+        self._get_details()
+        with mock.patch.object(self.context.session, 'query',
+                               wraps=self.context.session.query) as query:
+            network = self._create_network()
+            self._create_network()
+            self.plugin.delete_network(self.context, network['id'])
+            self.assertEqual(1, self._get_details()['used'])
+        # The networks were not counted again
+        self.assertNotIn(mock.call(models_v2.Network.__table__),
+                         query.call_args_list)
+
+    def test_usage_tracks_ports_deleted_in_bulk(self):
+        network = self._create_network()
+        self.assertEqual(0, self._get_details('port')['used'])
+        port = self._create_port(network['id'])
+        self.assertEqual(1, self._get_details('port')['used'])
+        # The port is not loaded in the session, its usage is counted again
+        self.plugin.delete_port(self.context, port['id'])
+        self.assertEqual(0, self._get_details('port')['used'])
+
+    def test_usage_of_other_tenants_kept_after_bulk_delete(self):
+        network = self._create_network()
+        port = self._create_port(network['id'])
+        self._create_port(network['id'], tenant_id='other')
+        self._get_details('port')
+        self._get_details('port', tenant_id='other')
+        self.plugin.delete_port(self.context, port['id'])
+        self.assertEqual(set(['other']), self._get_usage_tenants('port'))
+        self.assertEqual(0, self._get_details('port')['used'])
+        self.assertEqual(1, self._get_details('port', 'other')['used'])
+
+    def test_usage_counted_concurrently(self):
+        self._create_network()
+        # Another request counted the networks between the read of the
+        # usage and its insert
+        session = db.get_session()
+        with session.begin():
+            session.add(quota_db.QuotaUsage(
+                id='usage', tenant_id=PROJECT, resource='network', in_use=3,
+                counted_at=timeutils.utcnow()))
+        with mock.patch.object(orm.Query, 'first', return_value=None):
+            with self.context.session.begin():
+                self.assertEqual(3, self.driver._get_usage(
+                    self.context, PROJECT, 'network',
+                    models_v2.Network.__table__, lock=True))
+        self.assertEqual(set([PROJECT]), self._get_usage_tenants('network'))
+
+    def test_usage_tracks_loaded_resources_deleted_in_bulk(self):
+        self._get_details()
+        network = self._create_network()
+        self._create_network()
+        with mock.patch.object(self.context.session, 'query',
+                               wraps=self.context.session.query) as query:
+            with self.context.session.begin():
+                network_db = query(models_v2.Network).filter_by(
+                    id=network['id']).one()
+                query(models_v2.Network).filter_by(
+                    id=network_db.id).delete()
+            self.assertEqual(1, self._get_details()['used'])
+        # The networks were not counted again
+        self.assertNotIn(mock.call(models_v2.Network.__table__),
+                         query.call_args_list)
+
+    def test_usage_counted_again_after_interval(self):
+        self._get_details()
+        # Deleted outside of the ORM, not tracked
+        self._create_network()
+        self.context.session.execute(models_v2.Network.__table__.delete())
+        self.assertEqual(1, self._get_details()['used'])
+        cfg.CONF.set_override('usage_recount_interval', 0, group='QUOTAS')
+        self.assertEqual(0, self._get_details()['used'])
+
+    def test_usage_not_tracked_with_other_driver(self):
+        self._get_details()
+        cfg.CONF.set_override('quota_driver', quota.QUOTA_DB_DRIVER,
+                              group='QUOTAS')
+        self._create_network()
+        self.assertEqual(0, self._get_details()['used'])
@@ -0,0 +1,88 @@
+# Copyright (c) 2014 OpenStack Foundation.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from sqlalchemy import orm
+
+from neutron import context
+from neutron.db import api as db
+from neutron.db import models_v2
+from neutron.db import sqlalchemyutils
+from neutron.tests import base
+
+
+class TestPaginateQuery(base.BaseTestCase):
+
+    def _paginate(self, sorts, marker_obj):
+        query = orm.Query(models_v2.Network)
+        return str(sqlalchemyutils.paginate_query(query, models_v2.Network,
+                                                  10, sorts,
+                                                  marker_obj=marker_obj))
+
+    def test_first_sort_key_bounded_by_marker(self):
+        marker = models_v2.Network(name='net1', id='id1')
+        query = self._paginate([('name', True), ('id', True)], marker)
+        self.assertIn('networks.name >= ', query)
+
+    def test_first_sort_key_bounded_by_marker_desc(self):
+        marker = models_v2.Network(name='net1', id='id1')
+        query = self._paginate([('name', False), ('id', True)], marker)
+        self.assertIn('networks.name <= ', query)
+
+    def test_single_sort_key_not_bounded_twice(self):
+        marker = models_v2.Network(name='net1', id='id1')
+        query = self._paginate([('id', True)], marker)
+        self.assertNotIn('networks.id >= ', query)
+        self.assertIn('networks.id > ', query)
+
+
+class TestPaginateQueryDb(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestPaginateQueryDb, self).setUp()
+        db.configure_db()
+        self.addCleanup(db.clear_db)
+        self.ctx = context.get_admin_context()
+
+    def _paginate_all(self, sorts):
+        pages = []
+        marker = None
+        while True:
+            query = self.ctx.session.query(models_v2.Network)
+            page = sqlalchemyutils.paginate_query(
+                query, models_v2.Network, 1, sorts, marker_obj=marker).all()
+            if not page:
+                return pages
+            pages.append(page[0].id)
+            marker = page[0]
+
+    def _test_paginate_nullable_sort_key(self, ascending):
+        # networks sorted by name, then id
+        names = [None, None, 'net1', 'net2']
+        network_ids = ['id%d' % i for i in range(len(names))]
+        with self.ctx.session.begin():
+            for network_id, name in zip(network_ids, names):
+                self.ctx.session.add(models_v2.Network(id=network_id,
+                                                       name=name))
+        if not ascending:
+            network_ids = ['id3', 'id2', 'id0', 'id1']
+        self.assertEqual(network_ids,
+                         self._paginate_all([('name', ascending),
+                                             ('id', True)]))
+
+    def test_paginate_nullable_sort_key(self):
+        self._test_paginate_nullable_sort_key(True)
+
+    def test_paginate_nullable_sort_key_desc(self):
+        self._test_paginate_nullable_sort_key(False)
@@ -237,6 +237,8 @@ class TestCiscoV2HTTPResponse(CiscoML2MechanismTestCase,
 class TestCiscoPortsV2(CiscoML2MechanismTestCase,
                        test_db_plugin.TestPortsV2):
 
+    _bulk_port_create_method = '_create_port_db'
+
     @contextlib.contextmanager
     def _create_resources(self, name=NETWORK_NAME, cidr=CIDR_1,
                           device_id=DEVICE_ID_1,
@@ -298,9 +300,9 @@ class TestCiscoPortsV2(CiscoML2MechanismTestCase,
         with mock.patch('__builtin__.hasattr',
                         new=fakehasattr):
             plugin_obj = manager.NeutronManager.get_plugin()
-            orig = plugin_obj.create_port
-            with mock.patch.object(plugin_obj,
-                                   'create_port') as patched_plugin:
+            orig = getattr(plugin_obj, self._bulk_port_create_method)
+            with mock.patch.object(plugin_obj, self._bulk_port_create_method
+                                   ) as patched_plugin:
 
                 def side_effect(*args, **kwargs):
                     return self._do_side_effect(patched_plugin, orig,
@@ -332,9 +334,9 @@ class TestCiscoPortsV2(CiscoML2MechanismTestCase,
         ctx = context.get_admin_context()
         with self.network() as net:
             plugin_obj = manager.NeutronManager.get_plugin()
-            orig = plugin_obj.create_port
-            with mock.patch.object(plugin_obj,
-                                   'create_port') as patched_plugin:
+            orig = getattr(plugin_obj, self._bulk_port_create_method)
+            with mock.patch.object(plugin_obj, self._bulk_port_create_method
+                                   ) as patched_plugin:
 
                 def side_effect(*args, **kwargs):
                     return self._do_side_effect(patched_plugin, orig,
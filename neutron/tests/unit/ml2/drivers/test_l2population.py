@@ -30,8 +30,10 @@ from neutron import manager
 from neutron.openstack.common import timeutils
 from neutron.plugins.ml2 import config as config
 from neutron.plugins.ml2.drivers.l2pop import constants as l2_consts
+from neutron.plugins.ml2.drivers.l2pop import rpc as l2pop_rpc
 from neutron.plugins.ml2 import managers
 from neutron.plugins.ml2 import rpc
+from neutron.tests import base
 from neutron.tests.unit import test_db_plugin as test_plugin
 
 HOST = 'my_l2_host'
@@ -130,6 +132,13 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
         uptime_patch = mock.patch(uptime, return_value=190)
         uptime_patch.start()
 
+        config.cfg.CONF.set_override('notification_batch_interval', 0,
+                                     'l2pop')
+        self.host2_topic = topics.get_topic_name(topics.AGENT,
+                                                 topics.L2POPULATION,
+                                                 topics.UPDATE,
+                                                 L2_AGENT_2['host'])
+
         self.addCleanup(db_api.clear_db)
 
     def tearDown(self):
@@ -151,8 +160,20 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                               agent_state={'agent_state': L2_AGENT_4},
                               time=timeutils.strtime())
 
+    def _make_remote_port(self, host=L2_AGENT_2['host']):
+        """Bind a port of the network to another agent.
+
+        Only the agents with ports on a network are notified of its fdb
+        changes.
+        """
+        host_arg = {portbindings.HOST_ID: host}
+        return self._make_port(self.fmt, self._network['network']['id'],
+                               fixed_ips=[],
+                               arg_list=(portbindings.HOST_ID,), **host_arg)
+
     def test_fdb_add_called(self):
         self._register_ml2_agents()
+        self._make_remote_port()
 
         with self.subnet(network=self._network) as subnet:
             host_arg = {portbindings.HOST_ID: HOST}
@@ -184,8 +205,41 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                 'namespace': None,
                                 'method': 'add_fdb_entries'}
 
-                    self.mock_fanout.assert_called_with(
-                        mock.ANY, expected, topic=self.fanout_topic)
+                    self.mock_cast.assert_any_call(
+                        mock.ANY, expected, topic=self.host2_topic)
+
+    def test_fdb_add_only_sent_to_agents_on_network(self):
+        self._register_ml2_agents()
+        self._make_remote_port()
+
+        with self.subnet(network=self._network) as subnet:
+            with self.subnet(cidr='10.1.0.0/24') as subnet2:
+                host4_arg = {portbindings.HOST_ID: L2_AGENT_4['host']}
+                with self.port(subnet=subnet2,
+                               arg_list=(portbindings.HOST_ID,),
+                               **host4_arg):
+                    host_arg = {portbindings.HOST_ID: HOST}
+                    with self.port(subnet=subnet,
+                                   arg_list=(portbindings.HOST_ID,),
+                                   **host_arg) as port1:
+                        device = 'tap' + port1['port']['id']
+
+                        self.mock_cast.reset_mock()
+                        self.callbacks.update_device_up(self.adminContext,
+                                                        agent_id=HOST,
+                                                        device=device)
+
+                        topics_cast = set(call[1]['topic'] for call in
+                                          self.mock_cast.call_args_list)
+                        host_topic = topics.get_topic_name(
+                            topics.AGENT, topics.L2POPULATION,
+                            topics.UPDATE, HOST)
+                        self.assertEqual(set([host_topic, self.host2_topic]),
+                                         topics_cast)
+                        self.assertNotIn(
+                            self.fanout_topic,
+                            [call[1].get('topic') for call in
+                             self.mock_fanout.call_args_list])
 
     def test_fdb_add_not_called_type_local(self):
         self._register_ml2_agents()
@@ -255,9 +309,9 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                                   topics.UPDATE,
                                                   HOST)
 
-                    self.mock_cast.assert_called_with(mock.ANY,
-                                                      expected1,
-                                                      topic=topic)
+                    self.mock_cast.assert_any_call(mock.ANY,
+                                                   expected1,
+                                                   topic=topic)
 
                     expected2 = {'args':
                                  {'fdb_entries':
@@ -271,8 +325,8 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                  'namespace': None,
                                  'method': 'add_fdb_entries'}
 
-                    self.mock_fanout.assert_called_with(
-                        mock.ANY, expected2, topic=self.fanout_topic)
+                    self.mock_cast.assert_any_call(
+                        mock.ANY, expected2, topic=self.host2_topic)
 
     def test_fdb_add_called_two_networks(self):
         self._register_ml2_agents()
@@ -321,9 +375,9 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                                           topics.UPDATE,
                                                           HOST)
 
-                            self.mock_cast.assert_called_with(mock.ANY,
-                                                              expected1,
-                                                              topic=topic)
+                            self.mock_cast.assert_any_call(mock.ANY,
+                                                           expected1,
+                                                           topic=topic)
 
                             p3_ips = [p['ip_address']
                                       for p in p3['fixed_ips']]
@@ -340,12 +394,13 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                          'namespace': None,
                                          'method': 'add_fdb_entries'}
 
-                            self.mock_fanout.assert_called_with(
+                            self.mock_cast.assert_any_call(
                                 mock.ANY, expected2,
-                                topic=self.fanout_topic)
+                                topic=self.host2_topic)
 
     def test_update_port_down(self):
         self._register_ml2_agents()
+        self._make_remote_port()
 
         with self.subnet(network=self._network) as subnet:
             host_arg = {portbindings.HOST_ID: HOST}
@@ -386,11 +441,12 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                 'namespace': None,
                                 'method': 'remove_fdb_entries'}
 
-                    self.mock_fanout.assert_called_with(
-                        mock.ANY, expected, topic=self.fanout_topic)
+                    self.mock_cast.assert_any_call(
+                        mock.ANY, expected, topic=self.host2_topic)
 
     def test_update_port_down_last_port_up(self):
         self._register_ml2_agents()
+        self._make_remote_port()
 
         with self.subnet(network=self._network) as subnet:
             host_arg = {portbindings.HOST_ID: HOST}
@@ -425,11 +481,12 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                 'namespace': None,
                                 'method': 'remove_fdb_entries'}
 
-                    self.mock_fanout.assert_called_with(
-                        mock.ANY, expected, topic=self.fanout_topic)
+                    self.mock_cast.assert_any_call(
+                        mock.ANY, expected, topic=self.host2_topic)
 
     def test_delete_port(self):
         self._register_ml2_agents()
+        self._make_remote_port()
 
         with self.subnet(network=self._network) as subnet:
             host_arg = {portbindings.HOST_ID: HOST}
@@ -467,11 +524,12 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                             'namespace': None,
                             'method': 'remove_fdb_entries'}
 
-                self.mock_fanout.assert_any_call(
-                    mock.ANY, expected, topic=self.fanout_topic)
+                self.mock_cast.assert_any_call(
+                    mock.ANY, expected, topic=self.host2_topic)
 
     def test_delete_port_last_port_up(self):
         self._register_ml2_agents()
+        self._make_remote_port()
 
         with self.subnet(network=self._network) as subnet:
             host_arg = {portbindings.HOST_ID: HOST}
@@ -502,11 +560,12 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                             'namespace': None,
                             'method': 'remove_fdb_entries'}
 
-                self.mock_fanout.assert_any_call(
-                    mock.ANY, expected, topic=self.fanout_topic)
+                self.mock_cast.assert_any_call(
+                    mock.ANY, expected, topic=self.host2_topic)
 
     def test_fixed_ips_changed(self):
         self._register_ml2_agents()
+        self._make_remote_port()
 
         with self.subnet(network=self._network) as subnet:
             host_arg = {portbindings.HOST_ID: HOST}
@@ -540,8 +599,8 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                 'namespace': None,
                                 'method': 'update_fdb_entries'}
 
-                self.mock_fanout.assert_any_call(
-                    mock.ANY, add_expected, topic=self.fanout_topic)
+                self.mock_cast.assert_any_call(
+                    mock.ANY, add_expected, topic=self.host2_topic)
 
                 self.mock_fanout.reset_mock()
 
@@ -564,8 +623,8 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                 'namespace': None,
                                 'method': 'update_fdb_entries'}
 
-                self.mock_fanout.assert_any_call(
-                    mock.ANY, upd_expected, topic=self.fanout_topic)
+                self.mock_cast.assert_any_call(
+                    mock.ANY, upd_expected, topic=self.host2_topic)
 
                 self.mock_fanout.reset_mock()
 
@@ -585,8 +644,8 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                 'namespace': None,
                                 'method': 'update_fdb_entries'}
 
-                self.mock_fanout.assert_any_call(
-                    mock.ANY, del_expected, topic=self.fanout_topic)
+                self.mock_cast.assert_any_call(
+                    mock.ANY, del_expected, topic=self.host2_topic)
 
     def test_no_fdb_updates_without_port_updates(self):
         self._register_ml2_agents()
@@ -664,8 +723,8 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                 'namespace': None,
                                 'method': 'remove_fdb_entries'}
 
-                    self.mock_fanout.assert_called_with(
-                        mock.ANY, expected, topic=self.fanout_topic)
+                    self.mock_cast.assert_any_call(
+                        mock.ANY, expected, topic=self.host2_topic)
 
     def test_host_changed_twice(self):
         self._register_ml2_agents()
@@ -720,5 +779,78 @@ class TestL2PopulationRpcTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                 'namespace': None,
                                 'method': 'remove_fdb_entries'}
 
-                    self.mock_fanout.assert_called_with(
-                        mock.ANY, expected, topic=self.fanout_topic)
+                    self.mock_cast.assert_any_call(
+                        mock.ANY, expected, topic=self.host2_topic)
+
+
+class TestL2populationAgentNotifyAPI(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestL2populationAgentNotifyAPI, self).setUp()
+        config.cfg.CONF.set_override('notification_batch_interval', 1,
+                                     'l2pop')
+        self.notifier = l2pop_rpc.L2populationAgentNotifyAPI()
+        self.mock_cast = mock.patch.object(self.notifier, 'cast').start()
+        self.spawn_after = mock.patch('eventlet.spawn_after').start()
+
+    def _fdb_entries(self, *ports):
+        return {'net1': {'segment_id': 1,
+                         'network_type': 'vxlan',
+                         'ports': {'20.0.0.1': list(ports)}}}
+
+    def _flush(self):
+        self.spawn_after.assert_called_once_with(
+            1, self.notifier._flush_notifications, 'ctx')
+        self.notifier._flush_notifications('ctx')
+
+    def test_notifications_merged_and_ordered(self):
+        port1 = ['fa:16:3e:00:00:01', '10.0.0.1']
+        port2 = ['fa:16:3e:00:00:02', '10.0.0.2']
+        self.notifier.add_fdb_entries(
+            'ctx', self._fdb_entries(constants.FLOODING_ENTRY, port1), 'h1')
+        self.notifier.add_fdb_entries(
+            'ctx', self._fdb_entries(constants.FLOODING_ENTRY, port2), 'h1')
+        self.notifier.remove_fdb_entries('ctx', self._fdb_entries(port1),
+                                         'h1')
+        self.notifier.add_fdb_entries('ctx', self._fdb_entries(port1), 'h1')
+        self.notifier.add_fdb_entries('ctx', self._fdb_entries(port2), 'h2')
+        self.assertFalse(self.mock_cast.called)
+
+        self._flush()
+
+        topic_h1 = '%s.h1' % self.notifier.topic_l2pop_update
+        topic_h2 = '%s.h2' % self.notifier.topic_l2pop_update
+        expected_h1 = [
+            mock.call('ctx', self.notifier.make_msg(
+                'add_fdb_entries', fdb_entries=self._fdb_entries(
+                    constants.FLOODING_ENTRY, port1, port2)),
+                topic=topic_h1),
+            mock.call('ctx', self.notifier.make_msg(
+                'remove_fdb_entries', fdb_entries=self._fdb_entries(port1)),
+                topic=topic_h1),
+            mock.call('ctx', self.notifier.make_msg(
+                'add_fdb_entries', fdb_entries=self._fdb_entries(port1)),
+                topic=topic_h1)]
+        calls = self.mock_cast.call_args_list
+        self.assertEqual(expected_h1,
+                         [c for c in calls if c[1]['topic'] == topic_h1])
+        self.assertEqual(
+            [mock.call('ctx', self.notifier.make_msg(
+                'add_fdb_entries', fdb_entries=self._fdb_entries(port2)),
+                topic=topic_h2)],
+            [c for c in calls if c[1]['topic'] == topic_h2])
+
+    def test_flush_scheduled_again_after_flush(self):
+        self.notifier.add_fdb_entries('ctx', self._fdb_entries(), 'h1')
+        self._flush()
+        self.spawn_after.reset_mock()
+        self.notifier.update_fdb_entries('ctx', {'chg_ip': {}}, 'h1')
+        self._flush()
+        self.assertEqual(2, self.mock_cast.call_count)
+
+    def test_no_batching_without_interval(self):
+        config.cfg.CONF.set_override('notification_batch_interval', 0,
+                                     'l2pop')
+        self.notifier.add_fdb_entries('ctx', self._fdb_entries(), 'h1')
+        self.assertEqual(1, self.mock_cast.call_count)
+        self.assertFalse(self.spawn_after.called)
@@ -47,4 +47,5 @@ class NCSMechanismTestNetworksV2(test_plugin.TestNetworksV2, NCSTestCase):
 
 
 class NCSMechanismTestPortsV2(test_plugin.TestPortsV2, NCSTestCase):
-    pass
+
+    _bulk_port_create_method = '_create_port_db'
@@ -114,4 +114,5 @@ class OpenDaylightMechanismTestSubnetsV2(test_plugin.TestSubnetsV2,
 
 class OpenDaylightMechanismTestPortsV2(test_plugin.TestPortsV2,
                                        OpenDaylightTestCase):
-    pass
+
+    _bulk_port_create_method = '_create_port_db'
@@ -19,8 +19,10 @@ import testtools
 import uuid
 import webob
 
+from neutron.api.rpc.agentnotifiers import dhcp_rpc_agent_api
 from neutron.common import exceptions as exc
 from neutron import context
+from neutron.db import db_base_plugin_v2
 from neutron.extensions import multiprovidernet as mpnet
 from neutron.extensions import portbindings
 from neutron.extensions import providernet as pnet
@@ -115,6 +117,8 @@ class TestMl2SubnetsV2(test_plugin.TestSubnetsV2,
 
 class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
 
+    _bulk_port_create_method = '_create_port_db'
+
     def test_update_port_status_build(self):
         with self.port() as port:
             self.assertEqual('DOWN', port['port']['status'])
@@ -162,6 +166,139 @@ class TestMl2PortsV2(test_plugin.TestPortsV2, Ml2PluginV2TestCase):
                 mock.call(ctx, disassociate_floatingips.return_value)
             ])
 
+    def test_create_ports_bulk_calls_bulk_driver_methods(self):
+        with contextlib.nested(
+            self.subnet(),
+            mock.patch.object(mech_test.TestMechanismDriver,
+                              'create_port_precommit'),
+            mock.patch.object(mech_test.TestMechanismDriver,
+                              'create_port_bulk_precommit'),
+            mock.patch.object(mech_test.TestMechanismDriver,
+                              'create_port_bulk_postcommit')
+        ) as (subnet, precommit, bulk_precommit, bulk_postcommit):
+            res = self._create_port_bulk(self.fmt, 3,
+                                         subnet['subnet']['network_id'],
+                                         'test', True)
+            self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+            ports = self.deserialize(self.fmt, res)['ports']
+            self.assertFalse(precommit.called)
+            self.assertEqual(1, bulk_precommit.call_count)
+            self.assertEqual(1, bulk_postcommit.call_count)
+            contexts = bulk_postcommit.call_args[0][0]
+            self.assertEqual([p['id'] for p in ports],
+                             [c.current['id'] for c in contexts])
+            self.assertEqual(3, len(set(p['mac_address'] for p in ports)))
+            self.assertEqual(3, len(set(p['fixed_ips'][0]['ip_address']
+                                        for p in ports)))
+            for p in ports:
+                self._delete('ports', p['id'])
+
+    def test_create_ports_bulk_does_not_generate_requested_macs(self):
+        requested_mac = 'fa:16:3e:00:00:01'
+        with contextlib.nested(
+            self.network(),
+            mock.patch.object(db_base_plugin_v2.NeutronDbPluginV2,
+                              '_random_mac',
+                              side_effect=[requested_mac,
+                                           'fa:16:3e:00:00:02'])
+        ) as (net, random_mac):
+            res = self._create_port_bulk(
+                self.fmt, 2, net['network']['id'], 'test', True,
+                override={1: {'mac_address': requested_mac}})
+            self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+            ports = self.deserialize(self.fmt, res)['ports']
+            self.assertEqual(['fa:16:3e:00:00:02', requested_mac],
+                             [p['mac_address'] for p in ports])
+            for p in ports:
+                self._delete('ports', p['id'])
+
+    def test_create_ports_bulk_notifies_security_groups_once(self):
+        plugin = manager.NeutronManager.get_plugin()
+        with contextlib.nested(
+            self.network(),
+            mock.patch.object(plugin.notifier,
+                              'security_groups_member_updated')
+        ) as (net, member_updated):
+            res = self._create_port_bulk(self.fmt, 3, net['network']['id'],
+                                         'test', True)
+            self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+            self.assertEqual(1, member_updated.call_count)
+            for p in self.deserialize(self.fmt, res)['ports']:
+                self._delete('ports', p['id'])
+
+    def test_create_ports_bulk_notifies_dhcp_agents_once(self):
+        with contextlib.nested(
+            self.network(),
+            mock.patch.object(dhcp_rpc_agent_api.DhcpAgentNotifyAPI,
+                              '_notify_ports_created')
+        ) as (net, ports_created):
+            res = self._create_port_bulk(self.fmt, 3, net['network']['id'],
+                                         'test', True)
+            self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+            ports = self.deserialize(self.fmt, res)['ports']
+            ports_created.assert_called_once_with(
+                mock.ANY, mock.ANY, net['network']['id'])
+            self.assertEqual([p['id'] for p in ports],
+                             [p['id'] for p in ports_created.call_args[0][1]])
+            for p in ports:
+                self._delete('ports', p['id'])
+
+    def test_create_ports_bulk_allocates_ips_in_one_pass(self):
+        plugin = manager.NeutronManager.get_plugin()
+        with contextlib.nested(
+            self.subnet(),
+            mock.patch.object(plugin.ip_allocator, 'generate_ip'),
+            mock.patch.object(plugin.ip_allocator, 'generate_ips',
+                              wraps=plugin.ip_allocator.generate_ips)
+        ) as (subnet, generate_ip, generate_ips):
+            res = self._create_port_bulk(self.fmt, 3,
+                                         subnet['subnet']['network_id'],
+                                         'test', True)
+            self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+            ports = self.deserialize(self.fmt, res)['ports']
+            self.assertFalse(generate_ip.called)
+            generate_ips.assert_called_once_with(mock.ANY, mock.ANY, 3)
+            self.assertEqual(['10.0.0.2', '10.0.0.3', '10.0.0.4'],
+                             [p['fixed_ips'][0]['ip_address'] for p in ports])
+            for p in ports:
+                self._delete('ports', p['id'])
+
+    def test_create_ports_bulk_rebuilds_availability_ranges(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            network_id = subnet['subnet']['network_id']
+            res = self._create_port_bulk(self.fmt, 3, network_id, 'test',
+                                         True)
+            ports = self.deserialize(self.fmt, res)['ports']
+            for p in ports[:2]:
+                self._delete('ports', p['id'])
+            # 10.0.0.2 and 10.0.0.3 are only available once the ranges
+            # are rebuilt
+            res = self._create_port_bulk(self.fmt, 3, network_id, 'test',
+                                         True)
+            self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+            ports = ports[2:] + self.deserialize(self.fmt, res)['ports']
+            self.assertEqual(
+                ['10.0.0.4', '10.0.0.5', '10.0.0.6', '10.0.0.2'],
+                [p['fixed_ips'][0]['ip_address'] for p in ports])
+            res = self._create_port(self.fmt, network_id)
+            port = self.deserialize(self.fmt, res)
+            self.assertEqual('10.0.0.3', port['port']['fixed_ips'][0][
+                'ip_address'])
+            for p in ports + [port['port']]:
+                self._delete('ports', p['id'])
+
+    def test_create_ports_bulk_postcommit_failure_deletes_ports(self):
+        with contextlib.nested(
+            self.network(),
+            mock.patch.object(mech_test.TestMechanismDriver,
+                              'create_port_bulk_postcommit',
+                              side_effect=ml2_exc.MechanismDriverError)
+        ) as (net, bulk_postcommit):
+            res = self._create_port_bulk(self.fmt, 2, net['network']['id'],
+                                         'test', True)
+            self._validate_behavior_on_bulk_failure(
+                res, 'ports', webob.exc.HTTPServerError.code)
+
     def test_disassociate_floatingips_do_notify_returns_nothing(self):
         ctx = context.get_admin_context()
         l3plugin = manager.NeutronManager.get_service_plugins().get(
@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+
 import mock
 
 from neutron import context
@@ -94,6 +96,59 @@ class PortBindingTestCase(test_plugin.NeutronDbPluginV2TestCase):
                                 portbindings.VIF_TYPE_OVS,
                                 True, True, 'ACTIVE')
 
+    def test_get_devices_details_list(self):
+        host_arg = {portbindings.HOST_ID: 'host-ovs-no_filter'}
+        with self.subnet() as subnet:
+            with contextlib.nested(
+                self.port(subnet=subnet, arg_list=(portbindings.HOST_ID,),
+                          **host_arg),
+                self.port(subnet=subnet, arg_list=(portbindings.HOST_ID,),
+                          **host_arg),
+                self.port(subnet=subnet)
+            ) as (bound, truncated, unbound):
+                bound_id = bound['port']['id']
+                truncated_id = truncated['port']['id']
+                unbound_id = unbound['port']['id']
+                devices = [bound_id, 'tap' + truncated_id[:11], unbound_id,
+                           'tapnotexisting']
+                neutron_context = context.get_admin_context()
+                details = self.plugin.endpoints[0].get_devices_details_list(
+                    neutron_context, agent_id="theAgentId", devices=devices,
+                    host='host-ovs-no_filter')
+
+                self.assertEqual(devices,
+                                 [entry['device'] for entry in details])
+                self.assertEqual(bound_id, details[0]['port_id'])
+                self.assertEqual('local', details[0]['network_type'])
+                self.assertEqual(truncated_id[:11], details[1]['port_id'])
+                self.assertEqual('local', details[1]['network_type'])
+                self.assertNotIn('network_type', details[2])
+                self.assertNotIn('network_type', details[3])
+                for port_id, status in ((bound_id, 'BUILD'),
+                                        (truncated_id, 'BUILD'),
+                                        (unbound_id, 'DOWN')):
+                    port = self._show('ports', port_id)['port']
+                    self.assertEqual(status, port['status'])
+
+    def test_get_devices_details_list_calls_mechanism_drivers(self):
+        host_arg = {portbindings.HOST_ID: 'host-ovs-no_filter'}
+        with self.port(name='name', arg_list=(portbindings.HOST_ID,),
+                       **host_arg) as port:
+            port_id = port['port']['id']
+            neutron_context = context.get_admin_context()
+            mech_manager = self.plugin.mechanism_manager
+            with contextlib.nested(
+                mock.patch.object(mech_manager, 'update_port_precommit'),
+                mock.patch.object(mech_manager, 'update_port_postcommit')
+            ) as (precommit, postcommit):
+                self.plugin.endpoints[0].get_devices_details_list(
+                    neutron_context, agent_id="theAgentId",
+                    devices=[port_id])
+            self.assertEqual(1, precommit.call_count)
+            mech_context = postcommit.call_args[0][0]
+            self.assertEqual('BUILD', mech_context.current['status'])
+            self.assertEqual('DOWN', mech_context.original['status'])
+
     def _test_update_port_binding(self, host, new_host=None):
         with mock.patch.object(self.plugin,
                                '_notify_port_updated') as notify_mock:
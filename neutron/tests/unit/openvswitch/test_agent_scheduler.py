@@ -24,6 +24,7 @@ from neutron.api import extensions
 from neutron.api.rpc.agentnotifiers import dhcp_rpc_agent_api
 from neutron.api.v2 import attributes
 from neutron.common import constants
+from neutron.common import utils
 from neutron import context
 from neutron.db import agents_db
 from neutron.db import dhcp_rpc_base
@@ -275,6 +276,32 @@ class OvsAgentSchedulerTestCase(OvsAgentSchedulerTestCaseBase):
         self.assertEqual(0, num_hosta_nets)
         self.assertEqual(2, num_hostc_nets)
 
+    def test_rpc_get_active_networks_revisions(self):
+        dhcp_rpc = dhcp_rpc_base.DhcpRpcCallbackMixin()
+        self._register_agent_states()
+        with self.subnet() as subnet:
+            network_id = subnet['subnet']['network_id']
+            revisions = dhcp_rpc.get_active_networks_revisions(
+                self.adminContext, host=DHCP_HOSTA)
+            network = dhcp_rpc.get_network_info(
+                self.adminContext, network_id=network_id, host=DHCP_HOSTA)
+            self.assertEqual({network_id: utils.get_dhcp_network_revision(
+                network)}, revisions)
+            self.assertEqual(
+                [network_id],
+                [n['id'] for n in dhcp_rpc.get_networks_info(
+                    self.adminContext, network_ids=[network_id],
+                    host=DHCP_HOSTA)])
+
+            with self.port(subnet=subnet):
+                new_revisions = dhcp_rpc.get_active_networks_revisions(
+                    self.adminContext, host=DHCP_HOSTA)
+                network = dhcp_rpc.get_network_info(
+                    self.adminContext, network_id=network_id, host=DHCP_HOSTA)
+                self.assertNotEqual(revisions, new_revisions)
+                self.assertEqual({network_id: utils.get_dhcp_network_revision(
+                    network)}, new_revisions)
+
     def test_network_auto_schedule_with_no_dhcp(self):
         cfg.CONF.set_override('allow_overlapping_ips', True)
         with contextlib.nested(self.subnet(enable_dhcp=False),
@@ -388,11 +415,14 @@ class OvsAgentSchedulerTestCase(OvsAgentSchedulerTestCaseBase):
                 hostc_nets = self._list_networks_hosted_by_dhcp_agent(hostc_id)
                 num_hostc_nets = len(hostc_nets['networks'])
 
+        # the first network is only hosted by a disabled agent, so it is
+        # scheduled to the enabled one as well
         self.assertEqual(1, num_hosta_nets)
-        self.assertEqual(1, num_hostc_nets)
-        self.assertEqual(1, len(dhcp_agents_1['agents']))
+        self.assertEqual(2, num_hostc_nets)
+        self.assertEqual(set([DHCP_HOSTA, DHCP_HOSTC]),
+                         set(agent['host']
+                             for agent in dhcp_agents_1['agents']))
         self.assertEqual(1, len(dhcp_agents_2['agents']))
-        self.assertEqual(DHCP_HOSTA, dhcp_agents_1['agents'][0]['host'])
         self.assertEqual(DHCP_HOSTC, dhcp_agents_2['agents'][0]['host'])
 
     def test_network_scheduling_on_port_creation(self):
@@ -789,6 +819,21 @@ class OvsAgentSchedulerTestCase(OvsAgentSchedulerTestCaseBase):
             self.assertIn(router_ids[0], [r['id'] for r in ret_a])
             self.assertIn(router_ids[2], [r['id'] for r in ret_a])
 
+    def test_rpc_get_router_ids(self):
+        l3_rpc = l3_rpc_base.L3RpcCallbackMixin()
+        self._register_agent_states()
+
+        self.assertEqual([], l3_rpc.get_router_ids(self.adminContext,
+                                                   host=L3_HOSTA))
+        with contextlib.nested(self.router(),
+                               self.router()) as routers:
+            router_ids = [r['router']['id'] for r in routers]
+            ret_a = l3_rpc.get_router_ids(self.adminContext, host=L3_HOSTA)
+            self.assertEqual(set(router_ids), set(ret_a))
+            # The routers are scheduled to the first agent asking for them
+            ret_b = l3_rpc.get_router_ids(self.adminContext, host=L3_HOSTB)
+            self.assertEqual([], ret_b)
+
     def test_router_auto_schedule_for_specified_routers(self):
 
         def _sync_router_with_ids(router_ids, exp_synced, exp_hosted, host_id):
@@ -534,6 +534,68 @@ class TestOvsNeutronAgent(base.BaseTestCase):
         ):
             return self.agent.scan_ports(registered_ports, updated_ports)
 
+    def _device(self, name, vif_id, ofport=1):
+        return {'name': name, 'ofport': ofport,
+                'external_ids': {'iface-id': vif_id,
+                                 'attached-mac': 'fa:16:3e:00:00:01'}}
+
+    def mock_process_ports_events(self, events, registered_ports,
+                                  updated_ports=None, int_br_ports=()):
+        def port_to_br(port_name):
+            if port_name in int_br_ports:
+                return self.agent.int_br.br_name + '\n'
+        with mock.patch.object(self.agent.int_br,
+                               'get_bridge_name_for_port_name',
+                               side_effect=port_to_br):
+            return self.agent.process_ports_events(events, registered_ports,
+                                                   updated_ports)
+
+    def test_process_ports_events(self):
+        events = [('added', self._device('tap3', 'vif3')),
+                  ('removed', self._device('tap1', 'vif1')),
+                  ('modified', self._device('tap2', 'vif2')),
+                  ('added', self._device('qg-1', 'vif4'))]
+        actual = self.mock_process_ports_events(
+            events, set(['vif1', 'vif2']), set(['vif1', 'vif5']),
+            int_br_ports=('tap2', 'tap3'))
+        self.assertEqual({'current': set(['vif2', 'vif3']),
+                          'updated': set(['vif2']),
+                          'added': set(['vif3']),
+                          'removed': set(['vif1'])}, actual)
+        self.assertEqual(2, self.agent.int_br_device_count)
+
+    def test_process_ports_events_keeps_latest_event(self):
+        events = [('added', self._device('tap1', 'vif1', ofport=None)),
+                  ('modified', self._device('tap1', 'vif1', ofport=3)),
+                  ('added', self._device('tap2', 'vif2')),
+                  ('removed', self._device('tap2', 'vif2'))]
+        actual = self.mock_process_ports_events(
+            events, set(), int_br_ports=('tap1', 'tap2'))
+        self.assertEqual({'current': set(['vif1']),
+                          'added': set(['vif1']),
+                          'removed': set()}, actual)
+
+    def test_process_ports_events_removes_failed_port(self):
+        events = [('modified', self._device('tap1', 'vif1', ofport=-1))]
+        actual = self.mock_process_ports_events(
+            events, set(['vif1']), int_br_ports=('tap1',))
+        self.assertEqual({'current': set(),
+                          'added': set(),
+                          'removed': set(['vif1'])}, actual)
+
+    def test_process_ports_events_replaced_interface(self):
+        events = [('removed', self._device('tap1', 'vif1')),
+                  ('added', self._device('tap1-new', 'vif1'))]
+        actual = self.mock_process_ports_events(
+            events, set(['vif1']), int_br_ports=('tap1-new',))
+        self.assertEqual({'current': set(['vif1'])}, actual)
+
+    def test_process_ports_events_xenserver_requires_scan(self):
+        events = [('added', {'name': 'tap1', 'ofport': 1,
+                             'external_ids': {'xs-vif-uuid': 'xs1',
+                                              'attached-mac': 'mac'}})]
+        self.assertIsNone(self.mock_process_ports_events(events, set()))
+
     def test_scan_ports_returns_current_only_for_unchanged_ports(self):
         vif_port_set = set([1, 3])
         registered_ports = set([1, 3])
@@ -715,6 +777,44 @@ class TestOvsNeutronAgent(base.BaseTestCase):
             self.assertTrue(treat_vif_port.called)
             self.assertTrue(upd_dev_down.called)
 
+    def test_treat_devices_added_updated_applies_flows_before_status(self):
+        details = {'admin_state_up': True,
+                   'port_id': 'xxx',
+                   'device': 'xxx',
+                   'network_id': 'yyy',
+                   'physical_network': 'foo',
+                   'segmentation_id': 'bar',
+                   'network_type': 'baz',
+                   'fixed_ips': [],
+                   'device_owner': 'compute:None'}
+
+        def treat_vif_port(*args):
+            self.agent.int_br.delete_flows(in_port=1)
+            self.agent.int_br.add_flow(priority=2, in_port=2, actions='drop')
+
+        parent = mock.Mock()
+        with contextlib.nested(
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=[details, details]),
+            mock.patch.object(self.agent.int_br, 'get_vif_port_by_id'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_device_up'),
+            mock.patch.object(self.agent.int_br, 'run_ofctl'),
+            mock.patch.object(self.agent, 'treat_vif_port',
+                              side_effect=treat_vif_port)
+        ) as (get_dev_fn, get_vif_func, upd_dev_up, run_ofctl, treat_fn):
+            parent.attach_mock(upd_dev_up, 'update_device_up')
+            parent.attach_mock(run_ofctl, 'run_ofctl')
+            self.agent.treat_devices_added_or_updated(['xxx'], False)
+        self.assertEqual(
+            [mock.call.run_ofctl('del-flows', ['-'], 'in_port=1\n'),
+             mock.call.run_ofctl('add-flows', ['-'], mock.ANY),
+             mock.call.run_ofctl('del-flows', ['-'], 'in_port=1\n'),
+             mock.call.run_ofctl('add-flows', ['-'], mock.ANY),
+             mock.call.update_device_up(mock.ANY, 'xxx', mock.ANY, mock.ANY),
+             mock.call.update_device_up(mock.ANY, 'xxx', mock.ANY, mock.ANY)],
+            parent.mock_calls)
+
     def test_treat_devices_removed_returns_true_for_missing_device(self):
         with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
                                side_effect=Exception()):
@@ -767,6 +867,11 @@ class TestOvsNeutronAgent(base.BaseTestCase):
         with mock.patch.object(self.agent.state_rpc,
                                "report_state") as report_st:
             self.agent.int_br_device_count = 5
+            firewall_refresh_stats = {'refreshes': 1,
+                                      'devices_refreshed': 2,
+                                      'devices_unchanged': 3}
+            self.agent.sg_agent.firewall_refresh_stats = (
+                firewall_refresh_stats)
             self.agent._report_state()
             report_st.assert_called_with(self.agent.context,
                                          self.agent.agent_state)
@@ -775,6 +880,9 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                 self.agent.agent_state["configurations"]["devices"],
                 self.agent.int_br_device_count
             )
+            self.assertEqual(
+                firewall_refresh_stats,
+                self.agent.agent_state["configurations"]["firewall_refresh"])
 
     def test_network_delete(self):
         with contextlib.nested(
@@ -1305,6 +1413,45 @@ class TestOvsNeutronAgent(base.BaseTestCase):
         expected_calls = [mock.call('gre-0a0a0a0a', '10.10.10.10', 'gre')]
         self.agent._setup_tunnel_port.assert_has_calls(expected_calls)
 
+    def test_rpc_loop_processes_ports_events(self):
+        reply1 = {'current': set(['tap0']),
+                  'added': set(['tap0']),
+                  'removed': set([])}
+        reply2 = {'current': set(['tap0', 'tap1']),
+                  'added': set(['tap1']),
+                  'removed': set([])}
+        events = [('added', {'name': 'tap1'})]
+        polling_manager = mock.Mock()
+        polling_manager.get_events.side_effect = [[], events]
+
+        with contextlib.nested(
+            mock.patch.object(log.ContextAdapter, 'exception'),
+            mock.patch.object(self.agent, 'scan_ports',
+                              return_value=reply1),
+            mock.patch.object(self.agent, 'process_ports_events',
+                              return_value=reply2),
+            mock.patch.object(self.agent, 'process_network_ports'),
+            mock.patch.object(self.agent, 'check_ovs_restart',
+                              return_value=False),
+            mock.patch('time.sleep')
+        ) as (log_exception, scan_ports, process_ports_events,
+              process_network_ports, check_ovs_restart, sleep):
+            log_exception.side_effect = Exception(
+                'Fake exception to get out of the loop')
+            process_network_ports.side_effect = [
+                False, Exception('Fake exception to get out of the loop')]
+            try:
+                self.agent.rpc_loop(polling_manager=polling_manager)
+            except Exception:
+                pass
+
+        # The first iteration scans all the ports
+        scan_ports.assert_called_once_with(set(), set())
+        process_ports_events.assert_called_once_with(
+            events, set(['tap0']), set())
+        process_network_ports.assert_has_calls([
+            mock.call(reply1, False), mock.call(reply2, False)])
+
     def test_ovs_restart(self):
         reply2 = {'current': set(['tap0']),
                   'added': set(['tap2']),
@@ -13,9 +13,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import copy
+import datetime
 import time
 
+import mock
 from oslo.config import cfg
 from webob import exc
 
@@ -26,6 +29,8 @@ from neutron import context
 from neutron.db import agents_db
 from neutron.db import db_base_plugin_v2
 from neutron.extensions import agent
+from neutron import manager
+from neutron.openstack.common import jsonutils
 from neutron.openstack.common import log as logging
 from neutron.openstack.common import timeutils
 from neutron.openstack.common import uuidutils
@@ -252,6 +257,127 @@ class AgentDBTestCase(AgentDBTestMixIn,
             query_string='binary=neutron-l3-agent&host=' + L3_HOSTB)
         self.assertFalse(agents['agents'][0]['alive'])
 
+    def _report_l3_agent_state(self, callback, configurations=None):
+        agent_state = {'binary': 'neutron-l3-agent',
+                       'host': L3_HOSTA,
+                       'topic': topics.L3_AGENT,
+                       'configurations': configurations or {'routers': 0},
+                       'agent_type': constants.AGENT_TYPE_L3}
+        callback.report_state(self.adminContext,
+                              agent_state={'agent_state': agent_state},
+                              time=timeutils.strtime(
+                                  datetime.datetime.utcnow()))
+
+    def _get_l3_agent(self):
+        plugin = manager.NeutronManager.get_plugin()
+        self.adminContext.session.expire_all()
+        return plugin._get_agent_by_type_and_host(
+            self.adminContext, constants.AGENT_TYPE_L3, L3_HOSTA)
+
+    def test_heartbeats_written_in_bulk(self):
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 10)
+        callback = agents_db.AgentExtRpcCallback()
+        first = datetime.datetime(2014, 1, 1, 0, 0, 0)
+        later = first + datetime.timedelta(seconds=30)
+        with mock.patch.object(agents_db.loopingcall,
+                               'FixedIntervalLoopingCall') as loop:
+            with mock.patch.object(timeutils, 'utcnow', return_value=first):
+                self._report_l3_agent_state(callback)
+            self.assertEqual(first, self._get_l3_agent().heartbeat_timestamp)
+
+            with mock.patch.object(timeutils, 'utcnow', return_value=later):
+                self._report_l3_agent_state(callback)
+            self.assertEqual(first, self._get_l3_agent().heartbeat_timestamp)
+            loop.return_value.start.assert_called_once_with(
+                interval=10, initial_delay=10)
+
+        callback.heartbeats.flush()
+        agent_db = self._get_l3_agent()
+        self.assertEqual(later, agent_db.heartbeat_timestamp)
+        self.assertEqual({'routers': 0},
+                         jsonutils.loads(agent_db.configurations))
+
+    def test_heartbeats_changed_configurations_written(self):
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 10)
+        cfg.CONF.set_override('agent_configurations_write_interval', 0)
+        callback = agents_db.AgentExtRpcCallback()
+        with mock.patch.object(agents_db.loopingcall,
+                               'FixedIntervalLoopingCall'):
+            self._report_l3_agent_state(callback)
+            self._report_l3_agent_state(callback, {'routers': 2})
+        self.assertEqual({'routers': 0}, jsonutils.loads(
+            self._get_l3_agent().configurations))
+        callback.heartbeats.flush()
+        self.assertEqual({'routers': 2}, jsonutils.loads(
+            self._get_l3_agent().configurations))
+
+    def test_heartbeats_do_not_go_back_in_time(self):
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 10)
+        callback = agents_db.AgentExtRpcCallback()
+        first = datetime.datetime(2014, 1, 1, 0, 0, 0)
+        with mock.patch.object(agents_db.loopingcall,
+                               'FixedIntervalLoopingCall'):
+            self._report_l3_agent_state(callback)
+            with mock.patch.object(timeutils, 'utcnow', return_value=first):
+                self._report_l3_agent_state(callback)
+        later = self._get_l3_agent().heartbeat_timestamp
+        callback.heartbeats.flush()
+        self.assertEqual(later, self._get_l3_agent().heartbeat_timestamp)
+
+    def test_heartbeats_configurations_written_at_interval(self):
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 10)
+        cfg.CONF.set_override('agent_configurations_write_interval', 300)
+        callback = agents_db.AgentExtRpcCallback()
+        first = datetime.datetime(2014, 1, 1, 0, 0, 0)
+        later = first + datetime.timedelta(seconds=30)
+        due = first + datetime.timedelta(seconds=300)
+        with contextlib.nested(
+            mock.patch.object(agents_db.loopingcall,
+                              'FixedIntervalLoopingCall'),
+            mock.patch.object(timeutils, 'utcnow', return_value=first)
+        ) as (loop, utcnow):
+            self._report_l3_agent_state(callback, {'routers': 0})
+            utcnow.return_value = later
+            self._report_l3_agent_state(callback, {'routers': 2})
+            callback.heartbeats.flush()
+            agent_db = self._get_l3_agent()
+            self.assertEqual(later, agent_db.heartbeat_timestamp)
+            self.assertEqual({'routers': 0},
+                             jsonutils.loads(agent_db.configurations))
+
+            utcnow.return_value = due
+            self._report_l3_agent_state(callback, {'routers': 3})
+            callback.heartbeats.flush()
+            agent_db = self._get_l3_agent()
+            self.assertEqual(due, agent_db.heartbeat_timestamp)
+            self.assertEqual({'routers': 3},
+                             jsonutils.loads(agent_db.configurations))
+
+    def test_heartbeats_changed_configurations_do_not_go_back_in_time(self):
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 10)
+        cfg.CONF.set_override('agent_configurations_write_interval', 0)
+        callback = agents_db.AgentExtRpcCallback()
+        first = datetime.datetime(2014, 1, 1, 0, 0, 0)
+        with mock.patch.object(agents_db.loopingcall,
+                               'FixedIntervalLoopingCall'):
+            self._report_l3_agent_state(callback)
+            with mock.patch.object(timeutils, 'utcnow', return_value=first):
+                self._report_l3_agent_state(callback, {'routers': 2})
+        later = self._get_l3_agent().heartbeat_timestamp
+        callback.heartbeats.flush()
+        agent_db = self._get_l3_agent()
+        self.assertEqual(later, agent_db.heartbeat_timestamp)
+        self.assertEqual({'routers': 0},
+                         jsonutils.loads(agent_db.configurations))
+
+    def test_heartbeat_flush_interval_delays_dead_agent(self):
+        cfg.CONF.set_override('agent_down_time', 10)
+        cfg.CONF.set_override('agent_heartbeat_flush_interval', 5)
+        heartbeat = timeutils.utcnow() - datetime.timedelta(seconds=12)
+        self.assertFalse(agents_db.AgentDbMixin.is_agent_down(heartbeat))
+        heartbeat -= datetime.timedelta(seconds=5)
+        self.assertTrue(agents_db.AgentDbMixin.is_agent_down(heartbeat))
+
 
 class AgentDBTestCaseXML(AgentDBTestCase):
     fmt = 'xml'
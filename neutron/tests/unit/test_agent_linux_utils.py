@@ -14,8 +14,10 @@
 
 import fixtures
 import mock
+from oslo.config import cfg
 import testtools
 
+from neutron.agent.common import config
 from neutron.agent.linux import utils
 from neutron.tests import base
 
@@ -111,6 +113,67 @@ class AgentUtilsExecuteTest(base.BaseTestCase):
                 self.assertTrue(log.debug.called)
 
 
+class AgentUtilsExecuteRootwrapDaemonTest(base.BaseTestCase):
+    def setUp(self):
+        super(AgentUtilsExecuteRootwrapDaemonTest, self).setUp()
+        config.register_root_helper(cfg.CONF)
+        self.daemon_cmd = 'sudo neutron-rootwrap-daemon /etc/rootwrap.conf'
+        cfg.CONF.set_override('root_helper_daemon', self.daemon_cmd, 'AGENT')
+        mock.patch.dict(utils._rootwrap_daemon_clients, clear=True).start()
+        self.client_cls = mock.patch.object(utils.client, 'Client').start()
+        self.client = self.client_cls.return_value
+        self.client.execute.return_value = (0, 'out', 'err')
+        self.create_process = mock.patch.object(utils,
+                                                'create_process').start()
+
+    def test_execute_with_helper_uses_daemon(self):
+        result = utils.execute(['ip', 'link', 1], root_helper='sudo',
+                               process_input='in', return_stderr=True)
+        self.assertEqual(('out', 'err'), result)
+        self.client_cls.assert_called_once_with(
+            ['sudo', 'neutron-rootwrap-daemon', '/etc/rootwrap.conf'])
+        self.client.execute.assert_called_once_with(['ip', 'link', '1'],
+                                                    None, 'in')
+        self.assertFalse(self.create_process.called)
+
+    def test_daemon_client_is_reused(self):
+        utils.execute(['ls'], root_helper='sudo')
+        utils.execute(['ls'], root_helper='sudo')
+        self.assertEqual(1, self.client_cls.call_count)
+        self.assertEqual(2, self.client.execute.call_count)
+
+    def test_execute_with_addl_env(self):
+        utils.execute(['ls'], root_helper='sudo', addl_env={'foo': 'bar'})
+        env = self.client.execute.call_args[0][1]
+        self.assertEqual('bar', env['foo'])
+
+    def test_execute_without_helper_does_not_use_daemon(self):
+        self.create_process.return_value = FakeCreateProcess(0), ['ls']
+        utils.execute(['ls'])
+        self.assertFalse(self.client_cls.called)
+        self.assertTrue(self.create_process.called)
+
+    def test_execute_without_daemon_configured(self):
+        cfg.CONF.set_override('root_helper_daemon', None, 'AGENT')
+        self.create_process.return_value = FakeCreateProcess(0), ['ls']
+        utils.execute(['ls'], root_helper='sudo')
+        self.assertFalse(self.client_cls.called)
+        self.create_process.assert_called_once_with(
+            ['ls'], root_helper='sudo', addl_env=None)
+
+    def test_return_code_raises_runtime(self):
+        self.client.execute.return_value = (1, '', 'error')
+        with mock.patch.object(utils, 'LOG') as log:
+            self.assertRaises(RuntimeError, utils.execute, ['ls'],
+                              root_helper='sudo')
+            self.assertTrue(log.error.called)
+
+    def test_return_code_no_raise_runtime(self):
+        self.client.execute.return_value = (1, 'out', 'error')
+        self.assertEqual('out', utils.execute(['ls'], root_helper='sudo',
+                                              check_exit_code=False))
+
+
 class AgentUtilsGetInterfaceMAC(base.BaseTestCase):
     def test_get_interface_mac(self):
         expect_val = '01:02:03:04:05:06'
@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import os
 
 import mock
@@ -547,6 +548,35 @@ class JSONV2TestCase(APIv2TestBase, testlib_api.WebTestCase):
             # expect no results
             self.assertEqual(len(res['networks']), 0)
 
+    def test_list_parent_owner_loaded_once(self):
+        tenant_id = _uuid()
+        policy.init()
+        rules = common_policy.Rules(dict(common_policy._rules),
+                                    common_policy._rules.default_rule)
+        rules['get_port'] = common_policy.parse_rule(
+            'rule:admin_or_network_owner')
+        common_policy.set_rules(rules)
+        self.addCleanup(policy.reset)
+        ports = [{'id': _uuid(), 'network_id': network_id,
+                  'tenant_id': _uuid(), 'name': ''}
+                 for network_id in ('net1', 'net2') for i in range(5)]
+        instance = self.plugin.return_value
+        instance.get_ports.return_value = ports
+        instance.get_networks.return_value = [
+            {'id': 'net1', 'tenant_id': tenant_id},
+            {'id': 'net2', 'tenant_id': _uuid()}]
+
+        env = {'neutron.context': context.Context('', tenant_id)}
+        res = self.api.get(_get_path('ports', fmt=self.fmt),
+                           extra_environ=env)
+        res = self.deserialize(res)
+        self.assertEqual(5, len(res['ports']))
+        for port in res['ports']:
+            self.assertEqual('net1', port['network_id'])
+            self.assertNotIn('network:tenant_id', port)
+        self.assertEqual(1, instance.get_networks.call_count)
+        self.assertFalse(instance.get_network.called)
+
     def test_list_noauth(self):
         self._test_list(None, _uuid())
 
@@ -1381,6 +1411,80 @@ class QuotaTest(APIv2TestBase):
             _get_path('networks'), initial_input)
         self.assertEqual(res.status_int, exc.HTTPCreated.code)
 
+    def test_create_network_commits_quota_reservation(self):
+        tenant_id = _uuid()
+        initial_input = {'network': {'name': 'net1', 'tenant_id': tenant_id}}
+        instance = self.plugin.return_value
+        instance.create_network.return_value = {'id': _uuid(),
+                                                'tenant_id': tenant_id}
+        with contextlib.nested(
+            mock.patch.object(quota.QUOTAS, 'make_reservation',
+                              return_value='r1'),
+            mock.patch.object(quota.QUOTAS, 'commit_reservation'),
+            mock.patch.object(quota.QUOTAS, 'cancel_reservation')
+        ) as (make, commit, cancel):
+            res = self.api.post_json(_get_path('networks'), initial_input)
+        self.assertEqual(res.status_int, exc.HTTPCreated.code)
+        make.assert_called_once_with(mock.ANY, tenant_id, 'network', 1,
+                                     mock.ANY, 'networks')
+        commit.assert_called_once_with(mock.ANY, 'r1')
+        self.assertFalse(cancel.called)
+
+    def test_create_network_failure_cancels_quota_reservation(self):
+        initial_input = {'network': {'name': 'net1', 'tenant_id': _uuid()}}
+        instance = self.plugin.return_value
+        instance.create_network.side_effect = n_exc.BadRequest(
+            resource='network', msg='fake')
+        with contextlib.nested(
+            mock.patch.object(quota.QUOTAS, 'make_reservation',
+                              return_value='r1'),
+            mock.patch.object(quota.QUOTAS, 'commit_reservation'),
+            mock.patch.object(quota.QUOTAS, 'cancel_reservation')
+        ) as (make, commit, cancel):
+            res = self.api.post_json(_get_path('networks'), initial_input,
+                                     expect_errors=True)
+        self.assertEqual(res.status_int, exc.HTTPBadRequest.code)
+        cancel.assert_called_once_with(mock.ANY, 'r1')
+        self.assertFalse(commit.called)
+
+    def test_create_networks_bulk_reserves_once_per_tenant(self):
+        tenant_1, tenant_2 = _uuid(), _uuid()
+        initial_input = {'networks': [{'name': 'net1', 'tenant_id': tenant_1},
+                                      {'name': 'net2', 'tenant_id': tenant_1},
+                                      {'name': 'net3', 'tenant_id': tenant_2}]}
+        instance = self.plugin.return_value
+        instance.create_network.side_effect = (
+            lambda context, network: dict(network['network'], id=_uuid()))
+        with contextlib.nested(
+            mock.patch.object(quota.QUOTAS, 'make_reservation',
+                              side_effect=['r1', 'r2']),
+            mock.patch.object(quota.QUOTAS, 'commit_reservation')
+        ) as (make, commit):
+            res = self.api.post_json(_get_path('networks'), initial_input)
+        self.assertEqual(res.status_int, exc.HTTPCreated.code)
+        self.assertEqual(2, make.call_count)
+        make.assert_has_calls([
+            mock.call(mock.ANY, tenant_1, 'network', 2, mock.ANY, 'networks'),
+            mock.call(mock.ANY, tenant_2, 'network', 1, mock.ANY, 'networks')],
+            any_order=True)
+        self.assertEqual(2, commit.call_count)
+
+    def test_create_networks_bulk_over_quota_cancels_reservations(self):
+        initial_input = {'networks': [{'name': 'net1', 'tenant_id': _uuid()},
+                                      {'name': 'net2', 'tenant_id': _uuid()}]}
+        instance = self.plugin.return_value
+        over_quota = n_exc.OverQuota(overs=['network'])
+        with contextlib.nested(
+            mock.patch.object(quota.QUOTAS, 'make_reservation',
+                              side_effect=['r1', over_quota]),
+            mock.patch.object(quota.QUOTAS, 'cancel_reservation')
+        ) as (make, cancel):
+            res = self.api.post_json(_get_path('networks'), initial_input,
+                                     expect_errors=True)
+        self.assertEqual(res.status_int, exc.HTTPConflict.code)
+        cancel.assert_called_once_with(mock.ANY, 'r1')
+        self.assertFalse(instance.create_network.called)
+
 
 class ExtensionTestCase(base.BaseTestCase):
     def setUp(self):
@@ -381,3 +381,36 @@ class TestDict2Tuples(base.BaseTestCase):
         expected = ((42, 'baz'), ('aaa', 'zzz'), ('foo', 'bar'))
         output_tuple = utils.dict2tuple(input_dict)
         self.assertEqual(expected, output_tuple)
+
+
+class TestGetDhcpNetworkRevision(base.BaseTestCase):
+    def _network(self):
+        return {'id': 'net', 'admin_state_up': True,
+                'subnets': [{'id': 'sub1', 'cidr': '10.0.0.0/24',
+                             'ip_version': 4, 'gateway_ip': '10.0.0.1',
+                             'enable_dhcp': True},
+                            {'id': 'sub2', 'cidr': '10.0.1.0/24',
+                             'ip_version': 4, 'gateway_ip': '10.0.1.1',
+                             'enable_dhcp': False}],
+                'ports': [{'id': 'port1', 'mac_address': 'aa:bb:cc:dd:ee:ff',
+                           'device_id': 'vm', 'device_owner': 'compute:nova',
+                           'status': 'ACTIVE',
+                           'fixed_ips': [{'subnet_id': 'sub1',
+                                          'ip_address': '10.0.0.2'}]}]}
+
+    def test_unchanged(self):
+        network = self._network()
+        revision = utils.get_dhcp_network_revision(network)
+        network['ports'][0]['status'] = 'DOWN'
+        network['subnets'][1]['gateway_ip'] = '10.0.1.254'
+        self.assertEqual(revision, utils.get_dhcp_network_revision(network))
+        network['ports'].reverse()
+        network['subnets'].reverse()
+        self.assertEqual(revision, utils.get_dhcp_network_revision(network))
+
+    def test_changed(self):
+        network = self._network()
+        revision = utils.get_dhcp_network_revision(network)
+        network['ports'][0]['fixed_ips'][0]['ip_address'] = '10.0.0.3'
+        self.assertNotEqual(revision,
+                            utils.get_dhcp_network_revision(network))
@@ -18,6 +18,7 @@ import copy
 
 import mock
 from oslo.config import cfg
+from sqlalchemy import orm
 from testtools import matchers
 import webob.exc
 
@@ -33,6 +34,7 @@ from neutron.common import test_lib
 from neutron.common import utils
 from neutron import context
 from neutron.db import api as db
+from neutron.db import common_db_mixin
 from neutron.db import db_base_plugin_v2
 from neutron.db import models_v2
 from neutron import manager
@@ -774,6 +776,11 @@ class TestV2HTTPResponse(NeutronDbPluginV2TestCase):
 
 
 class TestPortsV2(NeutronDbPluginV2TestCase):
+
+    # Plugin method called for each port of a bulk request, in which the
+    # bulk failure tests inject faults
+    _bulk_port_create_method = 'create_port'
+
     def test_create_port_json(self):
         keys = [('admin_state_up', True), ('status', self.port_create_status)]
         with self.port(name='myname') as port:
@@ -891,9 +898,10 @@ class TestPortsV2(NeutronDbPluginV2TestCase):
 
         with mock.patch('__builtin__.hasattr',
                         new=fakehasattr):
-            orig = manager.NeutronManager.get_plugin().create_port
-            with mock.patch.object(manager.NeutronManager.get_plugin(),
-                                   'create_port') as patched_plugin:
+            plugin = manager.NeutronManager.get_plugin()
+            orig = getattr(plugin, self._bulk_port_create_method)
+            with mock.patch.object(plugin, self._bulk_port_create_method
+                                   ) as patched_plugin:
 
                 def side_effect(*args, **kwargs):
                     return self._fail_second_call(patched_plugin, orig,
@@ -916,8 +924,9 @@ class TestPortsV2(NeutronDbPluginV2TestCase):
         ctx = context.get_admin_context()
         with self.network() as net:
             plugin = manager.NeutronManager.get_plugin()
-            orig = plugin.create_port
-            with mock.patch.object(plugin, 'create_port') as patched_plugin:
+            orig = getattr(plugin, self._bulk_port_create_method)
+            with mock.patch.object(plugin, self._bulk_port_create_method
+                                   ) as patched_plugin:
 
                 def side_effect(*args, **kwargs):
                     return self._fail_second_call(patched_plugin, orig,
@@ -938,6 +947,25 @@ class TestPortsV2(NeutronDbPluginV2TestCase):
                                self.port()) as ports:
             self._test_list_resources('port', ports)
 
+    def test_list_ports_with_column_fields_skips_extensions(self):
+        plugin = manager.NeutronManager.get_plugin()
+        extend = mock.Mock()
+        with contextlib.nested(
+            self.port(),
+            mock.patch.dict(plugin._dict_extend_functions,
+                            {attributes.PORTS: [extend]})) as (port, _m):
+            ports = self._list('ports',
+                               query_params='fields=id&fields=name')['ports']
+        self.assertEqual([{'id': port['port']['id'],
+                           'name': port['port']['name']}], ports)
+        self.assertFalse(extend.called)
+
+    def test_list_ports_with_fixed_ips_field(self):
+        with self.port() as port:
+            ports = self._list('ports',
+                               query_params='fields=fixed_ips')['ports']
+        self.assertEqual([{'fixed_ips': port['port']['fixed_ips']}], ports)
+
     def test_list_ports_filtered_by_fixed_ip(self):
         # for this test we need to enable overlapping ips
         cfg.CONF.set_default('allow_overlapping_ips', True)
@@ -3880,6 +3908,62 @@ class TestNeutronDbPluginV2(base.BaseTestCase):
         self.assertEqual(2, generate.call_count)
         rebuild.assert_called_once_with('c', 's')
 
+    def test_generate_macs_retries_macs_in_use(self):
+        context = mock.Mock()
+        in_use = ['fa:16:3e:00:00:02']
+        context.session.query.return_value.filter.side_effect = [
+            [(mac,) for mac in in_use], []]
+        with mock.patch.object(db_base_plugin_v2.NeutronDbPluginV2,
+                               '_random_mac',
+                               side_effect=['fa:16:3e:00:00:01',
+                                            'fa:16:3e:00:00:02',
+                                            'fa:16:3e:00:00:03']):
+            macs = db_base_plugin_v2.NeutronDbPluginV2._generate_macs(
+                context, 'n', 2)
+
+        self.assertEqual(['fa:16:3e:00:00:01', 'fa:16:3e:00:00:03'],
+                         sorted(macs))
+        self.assertEqual(2, context.session.query.call_count)
+
+    def test_generate_macs_skips_reserved_macs(self):
+        context = mock.Mock()
+        context.session.query.return_value.filter.return_value = []
+        with mock.patch.object(db_base_plugin_v2.NeutronDbPluginV2,
+                               '_random_mac',
+                               side_effect=['fa:16:3e:00:00:01',
+                                            'fa:16:3e:00:00:02']):
+            macs = db_base_plugin_v2.NeutronDbPluginV2._generate_macs(
+                context, 'n', 1, reserved=['fa:16:3e:00:00:01'])
+
+        self.assertEqual(['fa:16:3e:00:00:02'], macs)
+
+    def test_generate_macs_exhausted(self):
+        context = mock.Mock()
+        context.session.query.return_value.filter.return_value = [
+            ('fa:16:3e:00:00:01',)]
+        with mock.patch.object(db_base_plugin_v2.NeutronDbPluginV2,
+                               '_random_mac',
+                               return_value='fa:16:3e:00:00:01'):
+            self.assertRaises(
+                n_exc.MacAddressGenerationFailure,
+                db_base_plugin_v2.NeutronDbPluginV2._generate_macs,
+                context, 'n', 1)
+
+        self.assertEqual(cfg.CONF.mac_generation_retries,
+                         context.session.query.call_count)
+
+    def test_apply_fields_to_query_columns_only(self):
+        query = orm.Query(models_v2.Port)
+        self.assertIn('ipallocations', str(query))
+        query = common_db_mixin.CommonDbMixin()._apply_fields_to_query(
+            query, models_v2.Port, ['id', 'name'])
+        self.assertNotIn('ipallocations', str(query))
+
+    def test_apply_fields_to_query_relationship_field(self):
+        query = common_db_mixin.CommonDbMixin()._apply_fields_to_query(
+            orm.Query(models_v2.Port), models_v2.Port, ['id', 'fixed_ips'])
+        self.assertIn('ipallocations', str(query))
+
     def test_rebuild_availability_ranges(self):
         pools = [{'id': 'a',
                   'first_ip': '192.168.1.3',
@@ -18,6 +18,7 @@ from oslo.db import exception as db_exc
 
 from neutron.common import constants
 from neutron.common import exceptions as n_exc
+from neutron.common import utils
 from neutron.db import dhcp_rpc_base
 from neutron.tests import base
 
@@ -47,6 +48,48 @@ class TestDhcpRpcCallbackMixin(base.BaseTestCase):
 
         self.assertEqual(len(self.log.mock_calls), 1)
 
+    def test_get_active_networks_info(self):
+        self.plugin.get_networks.return_value = [dict(id='a'), dict(id='b')]
+        self.plugin.get_ports.return_value = [dict(id='p', network_id='a')]
+        self.plugin.get_subnets.return_value = [dict(id='s', network_id='b')]
+
+        networks = self.callbacks.get_active_networks_info(mock.Mock(),
+                                                           host='host')
+
+        self.assertEqual([dict(id='a', subnets=[],
+                               ports=[dict(id='p', network_id='a')]),
+                          dict(id='b', subnets=[dict(id='s', network_id='b')],
+                               ports=[])], networks)
+        self.plugin.get_subnets.assert_called_once_with(
+            mock.ANY, filters=dict(network_id=['a', 'b'], enable_dhcp=[True]))
+
+    def test_get_active_networks_revisions(self):
+        self.plugin.get_networks.return_value = [
+            dict(id='a', admin_state_up=True)]
+        self.plugin.get_ports.return_value = []
+        self.plugin.get_subnets.return_value = []
+
+        revisions = self.callbacks.get_active_networks_revisions(mock.Mock(),
+                                                                 host='host')
+
+        self.assertEqual(
+            {'a': utils.get_dhcp_network_revision(
+                dict(id='a', admin_state_up=True, subnets=[], ports=[]))},
+            revisions)
+
+    def test_get_networks_info(self):
+        self.plugin.get_networks.return_value = [dict(id='a')]
+        self.plugin.get_ports.return_value = []
+        self.plugin.get_subnets.return_value = []
+
+        networks = self.callbacks.get_networks_info(mock.Mock(),
+                                                    network_ids=['a', 'b'],
+                                                    host='host')
+
+        self.assertEqual([dict(id='a', subnets=[], ports=[])], networks)
+        self.plugin.get_networks.assert_called_once_with(
+            mock.ANY, filters=dict(id=['a', 'b'], admin_state_up=[True]))
+
     def _test__port_action_with_failures(self, exc=None, action=None):
         port = {
             'network_id': 'foo_network_id',
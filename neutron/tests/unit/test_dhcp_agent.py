@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import copy
 import sys
 import uuid
@@ -30,6 +31,7 @@ from neutron.common import config as common_config
 from neutron.common import constants as const
 from neutron.common import exceptions
 from neutron.common import rpc as n_rpc
+from neutron.common import utils
 from neutron.tests import base
 
 
@@ -243,6 +245,11 @@ class TestDhcpAgent(base.BaseTestCase):
     def _test_sync_state_helper(self, known_networks, active_networks):
         with mock.patch(DHCP_PLUGIN) as plug:
             mock_plugin = mock.Mock()
+            mock_plugin.get_active_networks_revisions.side_effect = (
+                n_rpc.RemoteError(exc_type='NoSuchMethod'))
+            mock_plugin.get_active_networks.return_value = ['a']
+            mock_plugin.get_networks_info.side_effect = (
+                n_rpc.RemoteError(exc_type='UnsupportedVersion'))
             mock_plugin.get_active_networks_info.return_value = active_networks
             plug.return_value = mock_plugin
 
@@ -291,6 +298,79 @@ class TestDhcpAgent(base.BaseTestCase):
             self._test_sync_state_helper(known_networks, active_networks)
             w.assert_called_once_with()
 
+    def _test_sync_state_revisions(self, revisions, known_networks,
+                                   fetched_ids, chunk_size=100):
+        cfg.CONF.set_override('sync_networks_chunk_size', chunk_size)
+        with mock.patch(DHCP_PLUGIN) as plug:
+            mock_plugin = mock.Mock()
+            mock_plugin.get_active_networks_revisions.return_value = revisions
+            mock_plugin.get_active_networks.return_value = sorted(revisions)
+            mock_plugin.get_networks_info.side_effect = (
+                lambda network_ids: [mock.Mock(id=network_id)
+                                     for network_id in network_ids])
+            plug.return_value = mock_plugin
+
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            for network in known_networks:
+                dhcp.cache.put(network)
+
+            with contextlib.nested(
+                mock.patch.object(dhcp, 'safe_configure_dhcp_for_network'),
+                mock.patch.object(dhcp, 'disable_dhcp_helper')
+            ) as (configure, disable):
+                dhcp.sync_state()
+
+                self.assertFalse(mock_plugin.get_active_networks_info.called)
+                self.assertEqual(
+                    sorted(fetched_ids),
+                    sorted(network_id for call in
+                           mock_plugin.get_networks_info.call_args_list
+                           for network_id in call[0][0]))
+                self.assertEqual(
+                    sorted(fetched_ids),
+                    sorted(call[0][0].id for call in configure.call_args_list))
+                known_ids = set(network.id for network in known_networks)
+                disable.assert_has_calls(
+                    [mock.call(network_id)
+                     for network_id in known_ids - set(revisions)])
+                return mock_plugin
+
+    def test_sync_state_revisions_unchanged(self):
+        revisions = {fake_network.id:
+                     utils.get_dhcp_network_revision(fake_network)}
+        self._test_sync_state_revisions(revisions, [fake_network], [])
+
+    def test_sync_state_revisions_changed(self):
+        revisions = {fake_network.id: 'changed', 'new': 'new'}
+        self._test_sync_state_revisions(revisions, [fake_network],
+                                        sorted(revisions))
+
+    def test_sync_state_revisions_deleted(self):
+        self._test_sync_state_revisions({}, [fake_network], [])
+
+    def test_sync_state_revisions_dhcp_inactive(self):
+        self.driver.return_value.active = False
+        revisions = {fake_network.id:
+                     utils.get_dhcp_network_revision(fake_network)}
+        self._test_sync_state_revisions(revisions, [fake_network],
+                                        [fake_network.id])
+
+    def test_sync_state_revisions_chunks(self):
+        revisions = dict((str(i), str(i)) for i in range(5))
+        mock_plugin = self._test_sync_state_revisions(
+            revisions, [fake_network], sorted(revisions), chunk_size=2)
+        self.assertEqual(3, mock_plugin.get_networks_info.call_count)
+
+    def test_sync_state_nothing_configured(self):
+        # The revisions are not fetched when all the networks are stale
+        revisions = dict((str(i), str(i)) for i in range(5))
+        placeholder = dhcp.NetModel(True, {'id': '0', 'subnets': [],
+                                           'ports': []})
+        mock_plugin = self._test_sync_state_revisions(
+            revisions, [placeholder], sorted(revisions), chunk_size=2)
+        self.assertFalse(mock_plugin.get_active_networks_revisions.called)
+        self.assertEqual(3, mock_plugin.get_networks_info.call_count)
+
     def test_sync_state_plugin_error(self):
         with mock.patch(DHCP_PLUGIN) as plug:
             mock_plugin = mock.Mock()
@@ -790,6 +870,23 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.call_driver.assert_called_once_with('reload_allocations',
                                                  fake_network)
 
+    def test_ports_create_end(self):
+        payload = dict(ports=[fake_port1, fake_port2])
+        self.cache.get_network_by_id.return_value = fake_network
+        self.dhcp.ports_create_end(None, payload)
+        self.cache.assert_has_calls(
+            [mock.call.get_network_by_id(fake_port1.network_id),
+             mock.call.put_port(fake_port1),
+             mock.call.put_port(fake_port2)])
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+
+    def test_ports_create_end_unknown_network(self):
+        self.cache.get_network_by_id.return_value = None
+        self.dhcp.ports_create_end(None, dict(ports=[fake_port1]))
+        self.assertFalse(self.cache.put_port.called)
+        self.assertFalse(self.call_driver.called)
+
     def test_port_update_change_ip_on_port(self):
         payload = dict(port=fake_port1)
         self.cache.get_network_by_id.return_value = fake_network
@@ -816,6 +913,41 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.call_driver.assert_has_calls(
             [mock.call.call_driver('reload_allocations', fake_network)])
 
+    def test_port_update_end_coalesces_reloads(self):
+        payload = dict(port=fake_port2)
+        self.cache.get_network_by_id.return_value = fake_network
+        with mock.patch.object(dhcp_agent.eventlet,
+                               'spawn_after') as spawn_after:
+            self.dhcp.port_update_end(None, payload)
+            self.dhcp.port_update_end(None, payload)
+            self.dhcp.port_delete_end(None, dict(port_id=fake_port2.id))
+            self.call_driver.assert_called_once_with('reload_allocations',
+                                                     fake_network)
+            spawn_after.assert_called_once_with(
+                0.5, self.dhcp._pending_reload_expired, fake_network.id)
+
+            self.dhcp._pending_reload_expired(fake_network.id)
+            self.assertEqual(2, self.call_driver.call_count)
+            self.assertEqual(2, spawn_after.call_count)
+            self.assertEqual({'allocation_reloads': 2,
+                              'coalesced_reloads': 2},
+                             self.dhcp.reload_counts)
+
+            self.dhcp._pending_reload_expired(fake_network.id)
+            self.assertEqual(2, self.call_driver.call_count)
+            self.assertEqual({}, self.dhcp.pending_reloads)
+
+    def test_port_update_end_without_reload_delay(self):
+        cfg.CONF.set_override('reload_allocations_delay', 0)
+        payload = dict(port=fake_port2)
+        self.cache.get_network_by_id.return_value = fake_network
+        with mock.patch.object(dhcp_agent.eventlet,
+                               'spawn_after') as spawn_after:
+            self.dhcp.port_update_end(None, payload)
+            self.dhcp.port_update_end(None, payload)
+        self.assertEqual(2, self.call_driver.call_count)
+        self.assertFalse(spawn_after.called)
+
     def test_port_delete_end_unknown_port(self):
         payload = dict(port_id='unknown')
         self.cache.get_port_by_id.return_value = None
@@ -865,6 +997,26 @@ class TestDhcpPluginApiProxy(base.BaseTestCase):
         self.make_msg.assert_called_once_with('get_active_networks_info',
                                               host='foo')
 
+    def test_get_active_networks(self):
+        self.proxy.get_active_networks()
+        self.make_msg.assert_called_once_with('get_active_networks',
+                                              host='foo')
+
+    def test_get_active_networks_revisions(self):
+        self.proxy.get_active_networks_revisions()
+        self.make_msg.assert_called_once_with('get_active_networks_revisions',
+                                              host='foo')
+        self.assertEqual('1.2', self.call.call_args[1]['version'])
+
+    def test_get_networks_info(self):
+        self.call.return_value = [dict(a=1)]
+        retval = self.proxy.get_networks_info(['netid'])
+        self.assertEqual(1, retval[0].a)
+        self.make_msg.assert_called_once_with('get_networks_info',
+                                              network_ids=['netid'],
+                                              host='foo')
+        self.assertEqual('1.2', self.call.call_args[1]['version'])
+
     def test_create_dhcp_port(self):
         port_body = (
             {'port':
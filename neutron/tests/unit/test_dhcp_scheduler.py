@@ -14,6 +14,7 @@
 # limitations under the License.
 
 import mock
+from oslo.config import cfg
 
 from neutron.common import constants
 from neutron.common import topics
@@ -22,15 +23,16 @@ from neutron.db import agents_db
 from neutron.db import agentschedulers_db
 from neutron.db import api as db
 from neutron.db import models_v2
+from neutron.openstack.common import jsonutils
 from neutron.openstack.common import timeutils
 from neutron.scheduler import dhcp_agent_scheduler
 from neutron.tests import base
 
 
-class DhcpSchedulerTestCase(base.BaseTestCase):
+class DhcpSchedulerTestBase(base.BaseTestCase):
 
     def setUp(self):
-        super(DhcpSchedulerTestCase, self).setUp()
+        super(DhcpSchedulerTestBase, self).setUp()
         db.configure_db()
         self.ctx = context.get_admin_context()
         self.network_id = 'foo_network_id'
@@ -61,6 +63,9 @@ class DhcpSchedulerTestCase(base.BaseTestCase):
             with self.ctx.session.begin(subtransactions=True):
                 self.ctx.session.add(models_v2.Network(id=network_id))
 
+
+class DhcpSchedulerTestCase(DhcpSchedulerTestBase):
+
     def _test_schedule_bind_network(self, agents, network_id):
         scheduler = dhcp_agent_scheduler.ChanceScheduler()
         scheduler._schedule_bind_network(self.ctx, agents, network_id)
@@ -125,3 +130,110 @@ class DhcpSchedulerTestCase(base.BaseTestCase):
             self.ctx.session.query(agentschedulers_db.NetworkDhcpAgentBinding)
             .all())
         self.assertEqual(1, len(results))
+
+    def test_auto_schedule_networks_hosted_by_disabled_agent(self):
+        plugin = mock.MagicMock()
+        plugin.get_subnets.return_value = [{"network_id": self.network_id,
+                                            "enable_dhcp": True}]
+        agents = self._get_agents(['host-a', 'host-b'])
+        agents[0].admin_state_up = False
+        self._save_agents(agents)
+        self._test_schedule_bind_network(agents[:1], self.network_id)
+        scheduler = dhcp_agent_scheduler.ChanceScheduler()
+        self.assertTrue(scheduler.auto_schedule_networks(plugin,
+                                                         self.ctx, "host-b"))
+        results = (
+            self.ctx.session.query(agentschedulers_db.NetworkDhcpAgentBinding)
+            .all())
+        self.assertEqual(set([agents[0].id, agents[1].id]),
+                         set(result.dhcp_agent_id for result in results))
+
+    def test_auto_schedule_networks_binds_in_one_transaction(self):
+        network_ids = ['foo_network_id_%d' % i for i in range(3)]
+        self._save_networks(network_ids)
+        plugin = mock.MagicMock()
+        plugin.get_subnets.return_value = [{"network_id": network_id,
+                                            "enable_dhcp": True}
+                                           for network_id in network_ids]
+        agents = self._get_agents(['host-a'])
+        self._save_agents(agents)
+        scheduler = dhcp_agent_scheduler.ChanceScheduler()
+        with mock.patch.object(scheduler,
+                               '_schedule_bind_network') as bind_network:
+            self.assertTrue(scheduler.auto_schedule_networks(
+                plugin, self.ctx, "host-a"))
+        self.assertFalse(bind_network.called)
+        results = (
+            self.ctx.session.query(agentschedulers_db.NetworkDhcpAgentBinding)
+            .all())
+        self.assertEqual(set(network_ids),
+                         set(result.network_id for result in results))
+
+    def test_bind_networks_already_bound(self):
+        network_ids = [self.network_id, 'bar_network_id']
+        self._save_networks(network_ids[1:])
+        agents = self._get_agents(['host-a'])
+        self._save_agents(agents)
+        self._test_schedule_bind_network(agents, self.network_id)
+        scheduler = dhcp_agent_scheduler.ChanceScheduler()
+        with mock.patch.object(dhcp_agent_scheduler.LOG, 'info') as fake_log:
+            scheduler._bind_networks(
+                self.ctx, [(agents[0], network_id)
+                           for network_id in network_ids])
+            self.assertEqual(1, fake_log.call_count)
+        results = (
+            self.ctx.session.query(agentschedulers_db.NetworkDhcpAgentBinding)
+            .all())
+        self.assertEqual(set(network_ids),
+                         set(result.network_id for result in results))
+
+
+class DhcpWeightSchedulerTestCase(DhcpSchedulerTestBase):
+
+    def setUp(self):
+        super(DhcpWeightSchedulerTestCase, self).setUp()
+        self.scheduler = dhcp_agent_scheduler.WeightScheduler()
+        self.plugin = mock.Mock()
+        self.agents = self._get_agents(['host-a', 'host-b', 'host-c'])
+        self._save_agents(self.agents)
+        self.plugin.get_dhcp_agents_hosting_networks.return_value = []
+        self.plugin.get_agents_db.return_value = self.agents
+        self.plugin.get_configuration_dict = (
+            agents_db.AgentDbMixin().get_configuration_dict)
+
+    def _bind_networks(self, agent, count, ports=0):
+        network_ids = ['%s_network_%d' % (agent.host, i)
+                       for i in range(count)]
+        self._save_networks(network_ids)
+        with self.ctx.session.begin(subtransactions=True):
+            agent.configurations = jsonutils.dumps({'networks': count,
+                                                    'ports': ports})
+        self.scheduler._bind_networks(
+            self.ctx, [(agent, network_id) for network_id in network_ids])
+
+    def test_schedule_least_networks(self):
+        self._bind_networks(self.agents[0], 2)
+        self._bind_networks(self.agents[2], 1)
+        chosen = self.scheduler.schedule(self.plugin, self.ctx,
+                                         {'id': self.network_id})
+        self.assertEqual([self.agents[1]], chosen)
+
+    def test_schedule_ports_add_to_load(self):
+        self._bind_networks(self.agents[0], 1, ports=20)
+        self._bind_networks(self.agents[1], 1, ports=5)
+        self._bind_networks(self.agents[2], 2)
+        chosen = self.scheduler.schedule(self.plugin, self.ctx,
+                                         {'id': self.network_id})
+        self.assertEqual([self.agents[1]], chosen)
+
+    def test_schedule_multiple_agents(self):
+        cfg.CONF.set_override('dhcp_agents_per_network', 2)
+        self._bind_networks(self.agents[1], 1)
+        chosen = self.scheduler.schedule(self.plugin, self.ctx,
+                                         {'id': self.network_id})
+        self.assertEqual(set([self.agents[0].id, self.agents[2].id]),
+                         set(agent.id for agent in chosen))
+        results = (
+            self.ctx.session.query(agentschedulers_db.NetworkDhcpAgentBinding)
+            .filter_by(network_id=self.network_id).all())
+        self.assertEqual(2, len(results))
@@ -1221,3 +1221,137 @@ class IptablesFirewallTestCase(base.BaseTestCase):
                  mock.call.add_rule('ofake_dev', '-j $sg-fallback'),
                  mock.call.add_rule('sg-chain', '-j ACCEPT')]
         self.v4filter_inst.assert_has_calls(calls)
+
+
+class IptablesFirewallEnhancedIpsetTestCase(IptablesFirewallTestCase):
+    def setUp(self):
+        cfg.CONF.set_override('enable_ipset', True, group='SECURITYGROUP')
+        super(IptablesFirewallEnhancedIpsetTestCase, self).setUp()
+        self.firewall.ipset = mock.Mock()
+        self.firewall.ipset.ipset_sets = {}
+        self.firewall.ipset.set_exists.return_value = False
+        self.sg_id = 'fake_sgid'
+        self.remote_sg_id = 'fake_remote_sgid'
+        self.ipset_name = 'IPv4%s' % self.remote_sg_id
+
+    def _fake_port(self):
+        port = super(IptablesFirewallEnhancedIpsetTestCase,
+                     self)._fake_port()
+        port['security_groups'] = [self.sg_id]
+        port['security_group_rules'] = []
+        return port
+
+    def _fake_sg_rule(self):
+        return {'direction': 'ingress', 'ethertype': 'IPv4',
+                'protocol': 'tcp', 'port_range_min': 22,
+                'port_range_max': 22, 'security_group_id': self.sg_id,
+                'remote_group_id': self.remote_sg_id}
+
+    def test_prepare_port_filter_with_remote_group(self):
+        self.firewall.update_security_group_rules(self.sg_id,
+                                                  [self._fake_sg_rule()])
+        self.firewall.update_security_group_members(
+            self.remote_sg_id, {'IPv4': ['10.0.0.2'], 'IPv6': []})
+        self.firewall.prepare_port_filter(self._fake_port())
+        self.firewall.ipset.set_members.assert_called_once_with(
+            self.ipset_name, 'IPv4', ['10.0.0.2'])
+        sg_set_chain = self.firewall._sg_set_chain_name((self.sg_id,),
+                                                        'ingress')
+        self.v4filter_inst.assert_has_calls(
+            [mock.call.add_chain(sg_set_chain),
+             mock.call.add_rule(sg_set_chain,
+                                '-p tcp -m tcp --dport 22 -m set '
+                                '--match-set %s src -j RETURN' %
+                                self.ipset_name),
+             mock.call.add_rule(sg_set_chain, '-j $sg-fallback'),
+             mock.call.add_rule('ifake_dev',
+                                '-m state --state INVALID -j DROP'),
+             mock.call.add_rule('ifake_dev',
+                                '-m state --state RELATED,ESTABLISHED '
+                                '-j RETURN'),
+             mock.call.add_rule('ifake_dev', '-j $%s' % sg_set_chain),
+             mock.call.add_rule('ifake_dev', '-j RETURN')])
+
+    def _sg_set_chain_calls(self, filter_inst):
+        return [call for call in filter_inst.add_chain.call_args_list
+                if call[0][0].startswith('gi')]
+
+    def test_ports_with_same_security_groups_share_chain(self):
+        self.firewall.update_security_group_rules(self.sg_id,
+                                                  [self._fake_sg_rule()])
+        port1 = self._fake_port()
+        port2 = self._fake_port()
+        port2['device'] = 'tapfake_dev2'
+        with self.firewall.defer_apply():
+            self.firewall.prepare_port_filter(port1)
+            self.firewall.prepare_port_filter(port2)
+        self.assertEqual(1, len(self._sg_set_chain_calls(self.v4filter_inst)))
+        sg_set_chain = self.firewall._sg_set_chain_name((self.sg_id,),
+                                                        'ingress')
+        for chain_name in ('ifake_dev', 'ifake_dev2'):
+            self.v4filter_inst.add_rule.assert_any_call(
+                chain_name, '-j $%s' % sg_set_chain)
+
+    def test_sg_set_rules_compiled_once(self):
+        self.firewall.update_security_group_rules(self.sg_id,
+                                                  [self._fake_sg_rule()])
+        port = self._fake_port()
+        self.firewall.prepare_port_filter(port)
+        with mock.patch.object(self.firewall, '_build_sgr_iptables_rules',
+                               return_value=[]) as build:
+            self.firewall.update_port_filter(port)
+            self.firewall.update_security_group_rules(
+                self.sg_id, [self._fake_sg_rule()])
+            self.firewall.update_port_filter(port)
+            # only the (empty) port rules are built for each direction
+            self.assertEqual(8, build.call_count)
+
+            rule = self._fake_sg_rule()
+            rule['port_range_min'] = rule['port_range_max'] = 80
+            self.firewall.update_security_group_rules(self.sg_id, [rule])
+            build.reset_mock()
+            self.firewall.update_port_filter(port)
+            # the rules of the set are compiled again for each direction
+            # and ethertype
+            self.assertEqual(8, build.call_count)
+
+    def test_remove_port_filter_removes_sg_set_chain(self):
+        self.firewall.update_security_group_rules(self.sg_id,
+                                                  [self._fake_sg_rule()])
+        port = self._fake_port()
+        self.firewall.prepare_port_filter(port)
+        self.firewall.remove_port_filter(port)
+        sg_set_chain = self.firewall._sg_set_chain_name((self.sg_id,),
+                                                        'ingress')
+        self.v4filter_inst.ensure_remove_chain.assert_any_call(sg_set_chain)
+        self.assertEqual({}, self.firewall.sg_set_chains)
+
+    def test_update_security_group_members_existing_set(self):
+        self.firewall.ipset.set_exists.side_effect = (
+            lambda name: name == self.ipset_name)
+        self.firewall.update_security_group_members(
+            self.remote_sg_id, {'IPv4': ['10.0.0.2'], 'IPv6': []})
+        self.firewall.ipset.set_members.assert_called_once_with(
+            self.ipset_name, 'IPv4', ['10.0.0.2'])
+        self.assertFalse(self.iptables_inst.apply.called)
+
+    def test_update_security_group_members_deferred(self):
+        with self.firewall.defer_apply():
+            self.firewall.update_security_group_members(
+                self.remote_sg_id, {'IPv4': ['10.0.0.2'], 'IPv6': []})
+            self.assertFalse(self.firewall.ipset.set_members.called)
+
+    def test_remove_port_filter_destroys_unused_ipset(self):
+        self.firewall.update_security_group_rules(self.sg_id,
+                                                  [self._fake_sg_rule()])
+        port = self._fake_port()
+        self.firewall.prepare_port_filter(port)
+        self.firewall.ipset.ipset_sets = {self.ipset_name: set()}
+        self.firewall.remove_port_filter(port)
+        self.firewall.ipset.destroy_ipset.assert_called_once_with(
+            self.ipset_name)
+
+    def test_expanded_rule_does_not_use_ipset(self):
+        rule = self._fake_sg_rule()
+        rule['source_ip_prefix'] = '10.0.0.2/32'
+        self.assertEqual([], self.firewall._remote_group_arg(rule))
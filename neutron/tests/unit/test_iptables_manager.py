@@ -701,3 +701,102 @@ class IptablesManagerStateLessTestCase(base.BaseTestCase):
 
     def test_nat_not_found(self):
         self.assertNotIn('nat', self.iptables.ipv4)
+
+
+class IptablesManagerIncrementalApplyTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IptablesManagerIncrementalApplyTestCase, self).setUp()
+        self.root_helper = 'sudo'
+        self.iptables = (iptables_manager.
+                         IptablesManager(root_helper=self.root_helper,
+                                         incremental_apply=True))
+        self.execute = mock.patch.object(self.iptables, "execute").start()
+        self.execute.return_value = ''
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+    def _noflush_call(self, lines):
+        return mock.call(['iptables-restore', '--noflush'],
+                         process_input='\n'.join(lines) + '\n',
+                         root_helper=self.root_helper)
+
+    def test_first_apply_is_full(self):
+        self.iptables._applied_state = {}
+        self.iptables.apply()
+        self.execute.assert_has_calls(
+            [mock.call(['iptables-save', '-c'],
+                       root_helper=self.root_helper),
+             mock.call(['iptables-restore', '-c'],
+                       process_input=mock.ANY,
+                       root_helper=self.root_helper)])
+        self.assertTrue(self.iptables.apply_stats['full'])
+
+    def test_apply_without_change(self):
+        self.iptables.apply()
+        self.assertFalse(self.execute.called)
+        self.assertEqual({'full': False, 'chains': 0, 'rules': 0},
+                         self.iptables.apply_stats)
+
+    def test_apply_changed_chain_only(self):
+        self.iptables.ipv4['filter'].add_rule('filter', '-s 10.0.0.1 -j DROP')
+        self.iptables.apply()
+        self.assertEqual(
+            [self._noflush_call(
+                ['*filter',
+                 ':%(bn)s-filter - [0:0]' % IPTABLES_ARG,
+                 '-A %(bn)s-filter -j DROP' % IPTABLES_ARG,
+                 '-A %(bn)s-filter -s 10.0.0.1 -j DROP' % IPTABLES_ARG,
+                 'COMMIT'])],
+            self.execute.mock_calls)
+        self.assertEqual({'full': False, 'chains': 1, 'rules': 2},
+                         self.iptables.apply_stats)
+
+    def test_apply_remove_and_add_same_chain(self):
+        self.iptables.ipv4['filter'].remove_chain('filter')
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self.iptables.apply()
+        self.assertFalse(self.execute.called)
+
+    def test_apply_removed_chain(self):
+        self.iptables.ipv4['filter'].remove_chain('filter')
+        self.iptables.apply()
+        self.assertEqual(
+            [self._noflush_call(['*filter',
+                                 ':%(bn)s-filter - [0:0]' % IPTABLES_ARG,
+                                 '-X %(bn)s-filter' % IPTABLES_ARG,
+                                 'COMMIT'])],
+            self.execute.mock_calls)
+        self.assertEqual({'full': False, 'chains': 1, 'rules': 0},
+                         self.iptables.apply_stats)
+
+    def test_apply_unwrapped_change_is_full(self):
+        self.iptables.ipv4['filter'].add_rule('FORWARD', '-j DROP',
+                                              wrap=False)
+        self.iptables.apply()
+        self.execute.assert_has_calls(
+            [mock.call(['iptables-save', '-c'],
+                       root_helper=self.root_helper)])
+        self.assertTrue(self.iptables.apply_stats['full'])
+
+    def test_apply_incremental_failure_falls_back_to_full(self):
+        self.execute.side_effect = [RuntimeError(), '', None]
+        self.iptables.ipv4['filter'].add_rule('filter', '-s 10.0.0.1 -j DROP')
+        self.iptables.apply()
+        self.assertEqual(3, self.execute.call_count)
+        self.execute.assert_has_calls(
+            [mock.call(['iptables-save', '-c'],
+                       root_helper=self.root_helper),
+             mock.call(['iptables-restore', '-c'],
+                       process_input=mock.ANY,
+                       root_helper=self.root_helper)])
+        self.assertTrue(self.iptables.apply_stats['full'])
+
+    def test_apply_full_failure_forgets_state(self):
+        self.execute.side_effect = [RuntimeError(), '', RuntimeError()]
+        self.iptables.ipv4['filter'].add_rule('filter', '-s 10.0.0.1 -j DROP')
+        self.assertRaises(RuntimeError, self.iptables.apply)
+        self.assertNotIn('iptables', self.iptables._applied_state)
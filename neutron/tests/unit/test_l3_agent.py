@@ -28,6 +28,7 @@ from neutron.agent.linux import interface
 from neutron.common import config as base_config
 from neutron.common import constants as l3_constants
 from neutron.common import exceptions as n_exc
+from neutron.common import rpc as n_rpc
 from neutron.openstack.common import processutils
 from neutron.openstack.common import uuidutils
 from neutron.tests import base
@@ -249,6 +250,7 @@ class TestBasicRouterOperations(base.BaseTestCase):
         l3pluginApi_cls = self.l3pluginApi_cls_p.start()
         self.plugin_api = mock.Mock()
         l3pluginApi_cls.return_value = self.plugin_api
+        self.plugin_api.get_router_ids.return_value = [_uuid()]
 
         self.looping_call_p = mock.patch(
             'neutron.openstack.common.loopingcall.FixedIntervalLoopingCall')
@@ -268,6 +270,78 @@ class TestBasicRouterOperations(base.BaseTestCase):
             agent._sync_routers_task(agent.context)
         self.assertTrue(f.called)
 
+    def test__sync_routers_task_resync_completion(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        routers = [prepare_router_data(), prepare_router_data()]
+        self.plugin_api.get_router_ids.return_value = [r['id']
+                                                       for r in routers]
+        self.plugin_api.get_routers.return_value = routers
+        agent._sync_routers_task(agent.context)
+        self.assertEqual(set(r['id'] for r in routers),
+                         agent._resync_router_ids)
+        self.assertEqual(2, agent._queue.qsize())
+
+        with contextlib.nested(
+            mock.patch.object(agent, '_process_routers'),
+            mock.patch.object(l3_agent, 'LOG')
+        ) as (process_routers, log):
+            agent._process_router_update()
+            self.assertEqual(1, len(agent._resync_router_ids))
+            self.assertFalse(log.info.called)
+            agent._process_router_update()
+        self.assertEqual(2, process_routers.call_count)
+        self.assertEqual(set(), agent._resync_router_ids)
+        self.assertEqual(1, log.info.call_count)
+        self.assertEqual(0, agent._queue.qsize())
+
+    def test__sync_routers_task_fetches_routers_by_chunks(self):
+        self.conf.set_override('sync_routers_chunk_size', 2)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        routers = [prepare_router_data() for i in range(5)]
+        router_ids = [r['id'] for r in routers]
+        self.plugin_api.get_router_ids.return_value = router_ids
+        self.plugin_api.get_routers.side_effect = [
+            routers[0:2], routers[2:4], routers[4:]]
+        agent._sync_routers_task(agent.context)
+        self.assertEqual(
+            [mock.call(agent.context, router_ids[0:2]),
+             mock.call(agent.context, router_ids[2:4]),
+             mock.call(agent.context, router_ids[4:])],
+            self.plugin_api.get_routers.call_args_list)
+        self.assertEqual(5, agent._queue.qsize())
+        self.assertFalse(agent.fullsync)
+
+    def test__sync_routers_task_router_ids_not_supported(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        routers = [prepare_router_data(), prepare_router_data()]
+        self.plugin_api.get_router_ids.side_effect = n_rpc.RemoteError(
+            'UnsupportedVersion')
+        self.plugin_api.get_routers.return_value = routers
+        agent._sync_routers_task(agent.context)
+        self.plugin_api.get_routers.assert_called_once_with(agent.context)
+        self.assertEqual(2, agent._queue.qsize())
+        self.assertFalse(agent.fullsync)
+
+    def test__sync_routers_task_timeout_decreases_chunk_size(self):
+        self.conf.set_override('sync_routers_chunk_size', 100)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_router_ids.return_value = ['fake_id']
+        self.plugin_api.get_routers.side_effect = n_rpc.MessagingTimeout
+        agent._sync_routers_task(agent.context)
+        self.assertEqual(50, agent.sync_routers_chunk_size)
+        agent._sync_routers_task(agent.context)
+        self.assertEqual(l3_agent.SYNC_ROUTERS_MIN_CHUNK_SIZE,
+                         agent.sync_routers_chunk_size)
+        self.assertTrue(agent.fullsync)
+
+    def test__process_routers_loop_uses_configured_workers(self):
+        self.conf.set_override('router_processing_workers', 3)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        with mock.patch('eventlet.GreenPool') as pool_cls:
+            pool_cls.return_value.spawn_n.side_effect = [None, SystemExit]
+            self.assertRaises(SystemExit, agent._process_routers_loop)
+        pool_cls.assert_called_once_with(size=3)
+
     def test_router_info_create(self):
         id = _uuid()
         ri = l3_agent.RouterInfo(id, self.conf.root_helper,
@@ -291,6 +291,9 @@ class TestL3NatServicePlugin(common_db_mixin.CommonDbMixin,
                              l3_dvr_db.L3_NAT_with_dvr_db_mixin,
                              l3_db.L3_NAT_db_mixin):
 
+    __native_pagination_support = True
+    __native_sorting_support = True
+
     supported_extension_aliases = ["router"]
 
     def __init__(self):
@@ -124,6 +124,44 @@ class L3SchedulerTestCase(l3_agentschedulers_db.L3AgentSchedulerDbMixin,
             router['router']['id'], subnet['subnet']['network_id'])
         self._delete('routers', router['router']['id'])
 
+    def _get_router_agent_ids(self, router_ids):
+        return dict((router_id, [agent['id'] for agent in
+                                 self.get_l3_agents_hosting_routers(
+                                     self.adminContext, [router_id])])
+                    for router_id in router_ids)
+
+    def test_auto_schedule_routers(self):
+        with contextlib.nested(self.router(), self.router()) as routers:
+            router_ids = [router['router']['id'] for router in routers]
+            self.assertTrue(self.plugin.auto_schedule_routers(
+                self.adminContext, HOST, None))
+            self.assertEqual(dict((router_id, [self.agent_id1])
+                                  for router_id in router_ids),
+                             self._get_router_agent_ids(router_ids))
+            self.assertFalse(self.plugin.auto_schedule_routers(
+                self.adminContext, HOST_2, router_ids))
+
+    def test_auto_schedule_routers_hosted_by_disabled_agent(self):
+        with contextlib.nested(self.router(), self.router()) as routers:
+            router_ids = [router['router']['id'] for router in routers]
+            self.plugin.auto_schedule_routers(self.adminContext, HOST, None)
+            self._set_l3_agent_admin_state(self.adminContext,
+                                           self.agent_id1, False)
+            # Only the given routers are scheduled again
+            self.assertFalse(self.plugin.auto_schedule_routers(
+                self.adminContext, HOST_2, None))
+            self.assertTrue(self.plugin.auto_schedule_routers(
+                self.adminContext, HOST_2, router_ids[:1]))
+            agent_id2 = self.plugin.get_agents_db(
+                self.adminContext, filters={'host': [HOST_2]})[0].id
+            self.assertEqual({router_ids[0]: [self.agent_id1, agent_id2],
+                              router_ids[1]: [self.agent_id1]},
+                             dict((router_id, sorted(agent_ids, key=[
+                                 self.agent_id1, agent_id2].index))
+                                  for router_id, agent_ids in
+                                  self._get_router_agent_ids(
+                                      router_ids).items()))
+
 
 class L3AgentChanceSchedulerTestCase(L3SchedulerTestCase):
 
@@ -204,3 +242,34 @@ class L3AgentLeastRoutersSchedulerTestCase(L3SchedulerTestCase):
                         agent_id3 = agents[0]['id']
 
                         self.assertNotEqual(agent_id1, agent_id3)
+
+    def test_schedule_routers(self):
+        agent_id2 = self.plugin.get_agents_db(
+            self.adminContext, filters={'host': [HOST_2]})[0].id
+        with contextlib.nested(*[self.router() for i in range(4)]) as routers:
+            router_ids = [router['router']['id'] for router in routers]
+            with mock.patch.object(
+                self.plugin, 'get_l3_agents_router_counts',
+                wraps=self.plugin.get_l3_agents_router_counts) as counts:
+                self.plugin.schedule_routers(self.adminContext, router_ids)
+            self.assertEqual(1, counts.call_count)
+            agent_ids = self._get_router_agent_ids(router_ids).values()
+            self.assertEqual(sorted([[self.agent_id1], [agent_id2]] * 2),
+                             sorted(agent_ids))
+
+    def test_schedule_routers_without_router_ids(self):
+        with contextlib.nested(self.router(), self.router()) as routers:
+            router_ids = [router['router']['id'] for router in routers]
+            self.plugin.schedule_routers(self.adminContext, [])
+            self.assertEqual({router_ids[0]: [], router_ids[1]: []},
+                             self._get_router_agent_ids(router_ids))
+
+    def test_get_l3_agents_router_counts(self):
+        agent_id2 = self.plugin.get_agents_db(
+            self.adminContext, filters={'host': [HOST_2]})[0].id
+        with contextlib.nested(self.router(), self.router()):
+            self.plugin.auto_schedule_routers(self.adminContext, HOST, None)
+            self.assertEqual({self.agent_id1: 2, agent_id2: 0},
+                             self.plugin.get_l3_agents_router_counts(
+                                 self.adminContext,
+                                 [self.agent_id1, agent_id2]))
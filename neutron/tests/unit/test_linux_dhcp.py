@@ -442,6 +442,7 @@ class TestBase(base.BaseTestCase):
         self.execute_p = mock.patch('neutron.agent.linux.utils.execute')
         self.safe = self.replace_p.start()
         self.execute = self.execute_p.start()
+        self.addCleanup(dhcp.DhcpLocalProcess._conf_file_digests.clear)
 
 
 class TestDhcpBase(TestBase):
@@ -663,6 +664,25 @@ class TestDhcpLocalProcess(TestBase):
             lp = LocalChild(self.conf, FakeDualNetwork())
             self.assertIsNone(lp.pid)
 
+    def test_get_process_cmdline(self):
+        with contextlib.nested(
+            mock.patch('__builtin__.open'),
+            mock.patch.object(LocalChild, 'pid')
+        ) as (mock_open, pid):
+            pid.__get__ = mock.Mock(return_value=5)
+            mock_open.return_value.__enter__ = lambda s: s
+            mock_open.return_value.__exit__ = mock.Mock()
+            mock_open.return_value.read.return_value = 'dnsmasq\0--foo\0'
+            lp = LocalChild(self.conf, FakeDualNetwork())
+            self.assertEqual(['dnsmasq', '--foo'], lp._get_process_cmdline())
+            mock_open.assert_called_once_with('/proc/5/cmdline', 'r')
+
+    def test_get_process_cmdline_no_pid(self):
+        with mock.patch.object(LocalChild, 'pid') as pid:
+            pid.__get__ = mock.Mock(return_value=None)
+            lp = LocalChild(self.conf, FakeDualNetwork())
+            self.assertIsNone(lp._get_process_cmdline())
+
     def test_get_interface_name(self):
         with mock.patch('__builtin__.open') as mock_open:
             mock_open.return_value.__enter__ = lambda s: s
@@ -1179,6 +1199,66 @@ tag:tag0,option:router""".lstrip()
         self.execute.assert_called_once_with(exp_args, 'sudo')
         device_manager.update.assert_called_with(fake_net, 'tap12345678-12')
 
+    def _test_enable_active(self, cmdline_matches):
+        attrs_to_mock = dict(
+            [(a, mock.DEFAULT) for a in
+                ['active', 'interface_name', 'get_conf_file_name',
+                 '_get_process_cmdline', 'reload_allocations', 'restart']]
+        )
+
+        with mock.patch.multiple(dhcp.Dnsmasq, **attrs_to_mock) as mocks:
+            mocks['get_conf_file_name'].side_effect = (
+                lambda kind, ensure_conf_dir=False: '/dhcp/%s' % kind)
+            mocks['active'].__get__ = mock.Mock(return_value=True)
+            mocks['interface_name'].__get__ = mock.Mock(return_value='tap0')
+            dm = dhcp.Dnsmasq(self.conf, FakeDualNetwork(),
+                              version=dhcp.Dnsmasq.MINIMUM_VERSION)
+            dm.device_manager.setup.return_value = 'tap0'
+            cmdline = dm._build_cmdline()
+            if not cmdline_matches:
+                cmdline = cmdline[:-1]
+            mocks['_get_process_cmdline'].return_value = cmdline
+            dm.enable()
+            self.assertEqual(cmdline_matches,
+                             mocks['reload_allocations'].called)
+            self.assertEqual(not cmdline_matches, mocks['restart'].called)
+
+    def test_enable_adopts_current_process(self):
+        self._test_enable_active(True)
+
+    def test_enable_restarts_outdated_process(self):
+        self._test_enable_active(False)
+
+    def test_reload_allocations_unchanged(self):
+        dm = dhcp.Dnsmasq(self.conf, FakeDualNetwork(),
+                          version=dhcp.Dnsmasq.MINIMUM_VERSION)
+
+        with contextlib.nested(
+            mock.patch('os.path.isdir', return_value=True),
+            mock.patch('shutil.rmtree'),
+            mock.patch.object(dhcp.Dnsmasq, 'active'),
+            mock.patch.object(dhcp.Dnsmasq, 'pid'),
+            mock.patch.object(dhcp.Dnsmasq, 'interface_name'),
+            mock.patch.object(dhcp.Dnsmasq, '_make_subnet_interface_ip_map'),
+            mock.patch.object(dm, 'device_manager')
+        ) as (isdir, rmtree, active, pid, interface_name, ip_map,
+              device_manager):
+            active.__get__ = mock.Mock(return_value=True)
+            pid.__get__ = mock.Mock(return_value=5)
+            interface_name.__get__ = mock.Mock(return_value='tap12345678-12')
+            ip_map.return_value = {}
+            dm.reload_allocations()
+            dm.reload_allocations()
+            self.assertEqual(3, self.safe.call_count)
+            self.assertEqual(1, self.execute.call_count)
+            self.assertEqual(1, device_manager.update.call_count)
+
+            # the files are written again once removed
+            dm._remove_config_files()
+            dm.reload_allocations()
+            self.assertEqual(6, self.safe.call_count)
+            self.assertEqual(2, self.execute.call_count)
+
     def test_reload_allocations_stale_pid(self):
         (exp_host_name, exp_host_data,
          exp_addn_name, exp_addn_data,
@@ -15,6 +15,7 @@
 
 """Test of Policy Engine For Neutron"""
 
+import contextlib
 import urllib2
 
 import fixtures
@@ -461,6 +462,126 @@ class NeutronPolicyTestCase(base.BaseTestCase):
             result = policy.enforce(self.context, action, target)
             self.assertTrue(result)
 
+    def test_read_check_result_is_cached(self):
+        policy.init()
+        with mock.patch.object(common_policy, 'check',
+                               wraps=common_policy.check) as check:
+            self.assertTrue(policy.check(
+                self.context, 'get_network',
+                {'tenant_id': 'fake', 'shared': False, 'name': 'net1'}))
+            self.assertTrue(policy.check(
+                self.context, 'get_network',
+                {'tenant_id': 'fake', 'shared': False, 'name': 'net2'}))
+            self.assertEqual(1, check.call_count)
+            self.assertFalse(policy.check(
+                self.context, 'get_network',
+                {'tenant_id': 'somebody_else', 'shared': False}))
+            self.assertEqual(2, check.call_count)
+            admin_context = context.get_admin_context()
+            self.assertTrue(policy.check(
+                admin_context, 'get_network',
+                {'tenant_id': 'somebody_else', 'shared': False}))
+            self.assertEqual(3, check.call_count)
+
+    def test_write_check_result_is_not_cached(self):
+        policy.init()
+        with mock.patch.object(common_policy, 'check',
+                               wraps=common_policy.check) as check:
+            for i in range(2):
+                policy.enforce(self.context, 'create_network',
+                               {'tenant_id': 'fake'})
+            self.assertEqual(2, check.call_count)
+
+    def test_cached_read_check_result_dropped_on_rules_change(self):
+        policy.init()
+        target = {'tenant_id': 'somebody_else', 'shared': False}
+        self.assertFalse(policy.check(self.context, 'get_network', target))
+        self.rules['get_network'] = common_policy.parse_rule('@')
+        policy.init()
+        self.assertTrue(policy.check(self.context, 'get_network', target))
+
+    def test_read_check_parent_resource_loaded_once(self):
+        self.rules['get_port'] = common_policy.parse_rule(
+            'rule:admin_or_network_owner')
+        policy.init()
+        plugin = manager.NeutronManager.get_instance().plugin
+        # The admin context used to load the network calls policy.init,
+        # which unlike the real one replaces the rules every time
+        with contextlib.nested(
+            mock.patch.object(neutron.policy, 'init'),
+            mock.patch.object(plugin, 'get_network',
+                              return_value={'tenant_id': 'fake'})
+        ) as (init, get):
+            for i in range(2):
+                self.assertTrue(policy.check(self.context, 'get_port',
+                                             {'network_id': 'net1'}))
+            self.assertEqual(1, get.call_count)
+            self.assertTrue(policy.check(self.context, 'get_port',
+                                         {'network_id': 'net2'}))
+            self.assertEqual(2, get.call_count)
+
+    def test_read_check_http_rule_is_not_cached(self):
+        self.rules['get_network'] = common_policy.parse_rule(
+            'http:%(url)s')
+        policy.init()
+        with mock.patch.object(urllib2, 'urlopen',
+                               side_effect=lambda url, data:
+                               six.StringIO("True")) as urlopen:
+            for i in range(2):
+                self.assertTrue(policy.check(self.context, 'get_network',
+                                             {'url': '//url'}))
+            self.assertEqual(2, urlopen.call_count)
+
+    def test_fetch_parent_attributes(self):
+        self.rules['get_port'] = common_policy.parse_rule(
+            'rule:admin_or_network_owner')
+        policy.init()
+        plugin = manager.NeutronManager.get_instance().plugin
+        targets = [{'network_id': 'net1'}, {'network_id': 'net2'},
+                   {'network_id': 'net1'},
+                   {'network_id': 'net3', 'network:tenant_id': 'known'}]
+        networks = [{'id': 'net1', 'tenant_id': 'fake'},
+                    {'id': 'net2', 'tenant_id': 'somebody_else'}]
+        with contextlib.nested(
+            mock.patch.object(plugin, 'get_networks', return_value=networks),
+            mock.patch.object(plugin, 'get_network')
+        ) as (get_networks, get_network):
+            policy.fetch_parent_attributes('get_port', targets)
+            self.assertEqual(1, get_networks.call_count)
+            kwargs = get_networks.call_args[1]
+            self.assertEqual(['net1', 'net2'],
+                             sorted(kwargs['filters']['id']))
+            self.assertEqual(['id', 'tenant_id'], kwargs['fields'])
+            self.assertEqual(['fake', 'somebody_else', 'fake', 'known'],
+                             [t['network:tenant_id'] for t in targets])
+            self.assertEqual([True, False, True, False],
+                             [policy.check(self.context, 'get_port', t)
+                              for t in targets])
+            self.assertFalse(get_network.called)
+
+    def test_fetch_parent_attributes_after_uncached_check(self):
+        self.rules['get_port'] = common_policy.parse_rule(
+            'http:%(url)s or rule:admin_or_network_owner')
+        policy.init()
+        plugin = manager.NeutronManager.get_instance().plugin
+        targets = [{'network_id': 'net1'}]
+        with mock.patch.object(plugin, 'get_networks',
+                               return_value=[{'id': 'net1',
+                                              'tenant_id': 'fake'}]):
+            policy.fetch_parent_attributes('get_port', targets)
+        self.assertEqual([{'network_id': 'net1',
+                           'network:tenant_id': 'fake'}], targets)
+
+    def test_fetch_parent_attributes_no_parent_in_policy(self):
+        policy.init()
+        plugin = manager.NeutronManager.get_instance().plugin
+        targets = [{'network_id': 'net1', 'tenant_id': 'fake'}]
+        with mock.patch.object(plugin, 'get_networks') as get_networks:
+            policy.fetch_parent_attributes('get_port', targets)
+            self.assertFalse(get_networks.called)
+            self.assertEqual([{'network_id': 'net1', 'tenant_id': 'fake'}],
+                             targets)
+
     def test_tenant_id_check_no_target_field_raises(self):
         # Try and add a bad rule
         self.assertRaises(
@@ -85,11 +85,12 @@ class QuotaExtensionTestCase(testlib_api.WebTestCase):
 
 class QuotaExtensionDbTestCase(QuotaExtensionTestCase):
     fmt = 'json'
+    quota_driver = 'neutron.db.quota_db.DbQuotaDriver'
 
     def setUp(self):
         cfg.CONF.set_override(
             'quota_driver',
-            'neutron.db.quota_db.DbQuotaDriver',
+            self.quota_driver,
             group='QUOTAS')
         super(QuotaExtensionDbTestCase, self).setUp()
 
@@ -315,6 +316,31 @@ class QuotaExtensionDbTestCaseXML(QuotaExtensionDbTestCase):
     fmt = 'xml'
 
 
+class QuotaExtensionTrackedDbTestCase(QuotaExtensionDbTestCase):
+    quota_driver = 'neutron.db.quota_db.TrackedDbQuotaDriver'
+
+    def test_show_quota_details(self):
+        tenant_id = 'tenant_id1'
+        env = {'neutron.context': context.Context('', tenant_id)}
+        res = self.api.get(_get_path('quotas', id=tenant_id,
+                                     action='details', fmt=self.fmt),
+                           extra_environ=env)
+        self.assertEqual(200, res.status_int)
+        quota = self.deserialize(res)
+        self.assertEqual({'limit': 50, 'used': 0, 'reserved': 0},
+                         quota['quota']['port'])
+        self.assertEqual({'limit': -1, 'reserved': 0},
+                         quota['quota']['extra1'])
+
+    def test_show_quota_details_without_admin_forbidden_returns_403(self):
+        tenant_id = 'tenant_id1'
+        env = {'neutron.context': context.Context('', tenant_id + '2')}
+        res = self.api.get(_get_path('quotas', id=tenant_id,
+                                     action='details', fmt=self.fmt),
+                           extra_environ=env, expect_errors=True)
+        self.assertEqual(403, res.status_int)
+
+
 class QuotaExtensionCfgTestCase(QuotaExtensionTestCase):
     fmt = 'json'
 
@@ -368,6 +394,14 @@ class QuotaExtensionCfgTestCase(QuotaExtensionTestCase):
                               extra_environ=env, expect_errors=True)
         self.assertEqual(403, res.status_int)
 
+    def test_show_quota_details_not_implemented(self):
+        tenant_id = 'tenant_id1'
+        env = {'neutron.context': context.Context('', tenant_id)}
+        res = self.api.get(_get_path('quotas', id=tenant_id,
+                                     action='details', fmt=self.fmt),
+                           extra_environ=env, expect_errors=True)
+        self.assertEqual(501, res.status_int)
+
 
 class QuotaExtensionCfgTestCaseXML(QuotaExtensionCfgTestCase):
     fmt = 'xml'
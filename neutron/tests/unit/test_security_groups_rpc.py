@@ -29,6 +29,7 @@ from neutron.common import constants as const
 from neutron.common import ipv6_utils as ipv6
 from neutron.common import rpc as n_rpc
 from neutron import context
+from neutron.db import securitygroups_db as sg_db
 from neutron.db import securitygroups_rpc_base as sg_db_rpc
 from neutron.extensions import allowedaddresspairs as addr_pair
 from neutron.extensions import securitygroup as ext_sg
@@ -382,6 +383,159 @@ class SGServerRpcCallBackMixinTestCase(test_sg.SecurityGroupDBTestCase):
                 self._delete('ports', port_id1)
                 self._delete('ports', port_id2)
 
+    def test_security_group_info_for_devices_ipv4_source_group(self):
+
+        with self.network() as n:
+            with contextlib.nested(self.subnet(n),
+                                   self.security_group(),
+                                   self.security_group()) as (subnet_v4,
+                                                              sg1,
+                                                              sg2):
+                sg1_id = sg1['security_group']['id']
+                sg2_id = sg2['security_group']['id']
+                rule1 = self._build_security_group_rule(
+                    sg1_id,
+                    'ingress', const.PROTO_NAME_TCP, '24',
+                    '25', remote_group_id=sg2['security_group']['id'])
+                rules = {
+                    'security_group_rules': [rule1['security_group_rule']]}
+                res = self._create_security_group_rule(self.fmt, rules)
+                self.deserialize(self.fmt, res)
+                self.assertEqual(res.status_int, webob.exc.HTTPCreated.code)
+
+                res1 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg1_id])
+                ports_rest1 = self.deserialize(self.fmt, res1)
+                port_id1 = ports_rest1['port']['id']
+                self.rpc.devices = {port_id1: ports_rest1['port']}
+                devices = [port_id1, 'no_exist_device']
+
+                res2 = self._create_port(
+                    self.fmt, n['network']['id'],
+                    security_groups=[sg2_id])
+                ports_rest2 = self.deserialize(self.fmt, res2)
+                port_id2 = ports_rest2['port']['id']
+                ctx = context.get_admin_context()
+                sg_info = self.rpc.security_group_info_for_devices(
+                    ctx, devices=devices)
+                expected = {
+                    sg1_id: [{'direction': 'egress',
+                              'ethertype': const.IPv4,
+                              'security_group_id': sg1_id},
+                             {'direction': 'egress',
+                              'ethertype': const.IPv6,
+                              'security_group_id': sg1_id},
+                             {'direction': u'ingress',
+                              'protocol': const.PROTO_NAME_TCP,
+                              'ethertype': const.IPv4,
+                              'port_range_max': 25, 'port_range_min': 24,
+                              'remote_group_id': sg2_id,
+                              'security_group_id': sg1_id}]}
+                self.assertEqual(expected, sg_info['security_groups'])
+                self.assertEqual({sg2_id: {const.IPv4: [u'10.0.0.3'],
+                                           const.IPv6: []}},
+                                 sg_info['sg_member_ips'])
+                port_rpc = sg_info['devices'][port_id1]
+                self.assertEqual([], port_rpc['security_group_rules'])
+                self.assertEqual([sg2_id],
+                                 port_rpc['security_group_source_groups'])
+                self._delete('ports', port_id1)
+                self._delete('ports', port_id2)
+
+    def _bump_member_revisions(self, ctx, sg_ids):
+        plugin = sg_db_rpc.SecurityGroupServerRpcMixin()
+        plugin.bump_security_group_member_revisions(ctx, sg_ids)
+
+    def _create_remote_group_members(self, n, sg_id, count):
+        port_ids = []
+        for i in range(count):
+            res = self._create_port(self.fmt, n['network']['id'],
+                                    security_groups=[sg_id])
+            port_ids.append(self.deserialize(self.fmt, res)['port']['id'])
+        return port_ids
+
+    def test_security_group_member_ips_delta(self):
+        with self.network() as n:
+            with contextlib.nested(self.subnet(n),
+                                   self.security_group()) as (subnet_v4,
+                                                              sg1):
+                sg1_id = sg1['security_group']['id']
+                port_ids = self._create_remote_group_members(n, sg1_id, 2)
+                ctx = context.get_admin_context()
+                deltas = self.rpc.security_group_member_ips_delta(
+                    ctx, security_groups={sg1_id: None})
+                version = deltas[sg1_id]['version']
+                self.assertEqual({const.IPv4: ['10.0.0.2', '10.0.0.3'],
+                                  const.IPv6: []},
+                                 deltas[sg1_id]['members'])
+
+                self._delete('ports', port_ids.pop(0))
+                port_ids += self._create_remote_group_members(n, sg1_id, 1)
+                self._bump_member_revisions(ctx, [sg1_id])
+                deltas = self.rpc.security_group_member_ips_delta(
+                    ctx, security_groups={sg1_id: version})
+                self.assertNotEqual(version, deltas[sg1_id]['version'])
+                self.assertEqual({const.IPv4: ['10.0.0.4'], const.IPv6: []},
+                                 deltas[sg1_id]['added'])
+                self.assertEqual({const.IPv4: ['10.0.0.2'], const.IPv6: []},
+                                 deltas[sg1_id]['removed'])
+                for port_id in port_ids:
+                    self._delete('ports', port_id)
+
+    def test_security_group_member_ips_delta_unknown_version(self):
+        with self.network() as n:
+            with contextlib.nested(self.subnet(n),
+                                   self.security_group()) as (subnet_v4,
+                                                              sg1):
+                sg1_id = sg1['security_group']['id']
+                port_ids = self._create_remote_group_members(n, sg1_id, 1)
+                ctx = context.get_admin_context()
+                deltas = self.rpc.security_group_member_ips_delta(
+                    ctx, security_groups={sg1_id: 'unknown_version'})
+                self.assertEqual({const.IPv4: ['10.0.0.2'], const.IPv6: []},
+                                 deltas[sg1_id]['members'])
+                self._delete('ports', port_ids[0])
+
+    def test_select_ips_for_remote_group_uses_member_cache(self):
+        with self.network() as n:
+            with contextlib.nested(self.subnet(n),
+                                   self.security_group()) as (subnet_v4,
+                                                              sg1):
+                sg1_id = sg1['security_group']['id']
+                port_ids = self._create_remote_group_members(n, sg1_id, 1)
+                ctx = context.get_admin_context()
+                select = mock.patch.object(
+                    self.rpc, '_select_member_ips_for_remote_group',
+                    wraps=self.rpc._select_member_ips_for_remote_group)
+                with select as select_mock:
+                    ips = self.rpc._select_ips_for_remote_group(ctx, [sg1_id])
+                    self.assertEqual({sg1_id: ['10.0.0.2']}, ips)
+                    ips = self.rpc._select_ips_for_remote_group(ctx, [sg1_id])
+                    self.assertEqual({sg1_id: ['10.0.0.2']}, ips)
+                    self.assertEqual(1, select_mock.call_count)
+
+                    port_ids += self._create_remote_group_members(n, sg1_id,
+                                                                  1)
+                    self._bump_member_revisions(ctx, [sg1_id])
+                    ips = self.rpc._select_ips_for_remote_group(ctx, [sg1_id])
+                    self.assertEqual({sg1_id: ['10.0.0.2', '10.0.0.3']}, ips)
+                    self.assertEqual(2, select_mock.call_count)
+                for port_id in port_ids:
+                    self._delete('ports', port_id)
+
+    def test_member_revisions_bumped_after_transaction(self):
+        with self.security_group() as sg1:
+            sg1_id = sg1['security_group']['id']
+            ctx = context.get_admin_context()
+            revision = self.rpc._select_member_revisions(ctx, [sg1_id])
+            with ctx.session.begin(subtransactions=True):
+                self._bump_member_revisions(ctx, [sg1_id])
+                self.assertEqual(revision, self.rpc._select_member_revisions(
+                    context.get_admin_context(), [sg1_id]))
+            self.assertEqual({sg1_id: revision[sg1_id] + 1},
+                             self.rpc._select_member_revisions(ctx, [sg1_id]))
+
     def test_security_group_rules_for_devices_ipv6_ingress(self):
         fake_prefix = FAKE_PREFIX[const.IPv6]
         fake_gateway = FAKE_IP[const.IPv6]
@@ -833,6 +987,35 @@ class SGServerRpcCallBackMixinTestCaseXML(SGServerRpcCallBackMixinTestCase):
     fmt = 'xml'
 
 
+class SecurityGroupMemberCacheTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(SecurityGroupMemberCacheTestCase, self).setUp()
+        self.cache = sg_db_rpc.SecurityGroupMemberCache(snapshots=2, size=2)
+
+    def test_get_ips(self):
+        self.cache.set_ips('sg1', 1, ['10.0.0.2'])
+        self.assertEqual(['10.0.0.2'], self.cache.get_ips('sg1', 1))
+        self.assertIsNone(self.cache.get_ips('sg1', 2))
+
+    def test_least_recently_used_ips_evicted(self):
+        self.cache.set_ips('sg1', 1, ['10.0.0.2'])
+        self.cache.set_ips('sg2', 1, ['10.0.0.3'])
+        self.cache.get_ips('sg1', 1)
+        self.cache.set_ips('sg3', 1, ['10.0.0.4'])
+        self.assertEqual(['10.0.0.2'], self.cache.get_ips('sg1', 1))
+        self.assertIsNone(self.cache.get_ips('sg2', 1))
+        self.assertEqual(['10.0.0.4'], self.cache.get_ips('sg3', 1))
+
+    def test_snapshots_bounded(self):
+        for version in ('v1', 'v2', 'v3'):
+            self.cache.add_snapshot('sg1', version, {version: []})
+        self.assertIsNone(self.cache.get_snapshot('sg1', 'v1'))
+        self.assertEqual({'v3': []}, self.cache.get_snapshot('sg1', 'v3'))
+        self.cache.add_snapshot('sg2', 'v1', {})
+        self.cache.add_snapshot('sg3', 'v1', {})
+        self.assertIsNone(self.cache.get_snapshot('sg1', 'v3'))
+
+
 class SGAgentRpcCallBackMixinTestCase(base.BaseTestCase):
     def setUp(self):
         super(SGAgentRpcCallBackMixinTestCase, self).setUp()
@@ -940,29 +1123,227 @@ class SecurityGroupAgentRpcTestCase(base.BaseTestCase):
         self.agent.refresh_firewall.assert_has_calls(
             [mock.call.refresh_firewall()])
 
+    def _updated_fake_devices(self):
+        updated_device = dict(self.fake_device)
+        updated_device['security_group_rules'] = (
+            self.fake_device['security_group_rules'] +
+            [{'security_group_id': 'fake_sgid1', 'protocol': 'tcp'}])
+        self.agent.plugin_rpc.security_group_rules_for_devices.return_value = {
+            'fake_device': updated_device}
+        return updated_device
+
     def test_refresh_firewall(self):
         self.agent.prepare_devices_filter(['fake_port_id'])
+        updated_device = self._updated_fake_devices()
         self.agent.refresh_firewall()
         calls = [mock.call.defer_apply(),
                  mock.call.prepare_port_filter(self.fake_device),
                  mock.call.defer_apply(),
-                 mock.call.update_port_filter(self.fake_device)]
+                 mock.call.update_port_filter(updated_device)]
         self.firewall.assert_has_calls(calls)
 
     def test_refresh_firewall_devices(self):
         self.agent.prepare_devices_filter(['fake_port_id'])
+        updated_device = self._updated_fake_devices()
         self.agent.refresh_firewall([self.fake_device])
         calls = [mock.call.defer_apply(),
                  mock.call.prepare_port_filter(self.fake_device),
                  mock.call.defer_apply(),
-                 mock.call.update_port_filter(self.fake_device)]
+                 mock.call.update_port_filter(updated_device)]
         self.firewall.assert_has_calls(calls)
 
+    def test_refresh_firewall_unchanged_device(self):
+        self.agent.prepare_devices_filter(['fake_port_id'])
+        self.agent.refresh_firewall()
+        self.assertFalse(self.firewall.update_port_filter.called)
+        self.assertEqual({'refreshes': 1,
+                          'devices_refreshed': 0,
+                          'devices_unchanged': 1},
+                         self.agent.firewall_refresh_stats)
+
+    def test_refresh_firewall_stats(self):
+        self._updated_fake_devices()
+        self.agent.refresh_firewall()
+        self.agent.refresh_firewall()
+        self.assertEqual({'refreshes': 2,
+                          'devices_refreshed': 2,
+                          'devices_unchanged': 0},
+                         self.agent.firewall_refresh_stats)
+
     def test_refresh_firewall_none(self):
         self.agent.refresh_firewall([])
         self.firewall.assert_has_calls([])
 
 
+class SecurityGroupAgentEnhancedRpcTestCase(base.BaseTestCase):
+    def setUp(self, defer_refresh_firewall=False):
+        super(SecurityGroupAgentEnhancedRpcTestCase, self).setUp()
+        cfg.CONF.set_default('firewall_driver',
+                             'neutron.agent.firewall.NoopFirewallDriver',
+                             group='SECURITYGROUP')
+        cfg.CONF.set_override('enable_ipset', True, group='SECURITYGROUP')
+        self.agent = sg_rpc.SecurityGroupAgentRpcMixin()
+        self.agent.context = None
+        self.agent.root_helper = 'sudo'
+        self.agent.init_firewall(defer_refresh_firewall=defer_refresh_firewall)
+        self.firewall = mock.Mock()
+        firewall_object = firewall_base.FirewallDriver()
+        self.firewall.defer_apply.side_effect = firewall_object.defer_apply
+        self.agent.firewall = self.firewall
+        self.rpc = mock.Mock()
+        self.agent.plugin_rpc = self.rpc
+        self.fake_device = {'device': 'fake_device',
+                            'security_groups': ['fake_sgid1', 'fake_sgid2'],
+                            'security_group_source_groups': ['fake_sgid2'],
+                            'security_group_rules': []}
+        self.fake_sg_rules = [{'security_group_id': 'fake_sgid1',
+                               'remote_group_id': 'fake_sgid2'}]
+        self.fake_member_ips = {const.IPv4: ['10.0.0.1'], const.IPv6: []}
+        fake_devices = {'fake_device': self.fake_device}
+        self.firewall.ports = fake_devices
+        self.rpc.security_group_info_for_devices.return_value = {
+            'devices': fake_devices,
+            'security_groups': {'fake_sgid1': self.fake_sg_rules},
+            'sg_member_ips': {'fake_sgid2': self.fake_member_ips},
+            'sg_member_versions': {'fake_sgid2': 'fake_version1'}}
+        self.rpc.security_group_member_ips_delta.return_value = {
+            'fake_sgid2': {'version': 'fake_version1',
+                           'members': self.fake_member_ips}}
+
+    def test_use_enhanced_rpc(self):
+        self.assertTrue(self.agent.use_enhanced_rpc)
+        self.rpc.security_group_info_for_devices.assert_called_once_with(
+            None, devices=[])
+
+    def test_use_enhanced_rpc_not_supported_by_server(self):
+        self.rpc.security_group_info_for_devices.side_effect = (
+            n_rpc.RemoteError(exc_type='UnsupportedVersion'))
+        self.assertFalse(self.agent.use_enhanced_rpc)
+
+    def test_use_enhanced_rpc_disabled(self):
+        cfg.CONF.set_override('enable_ipset', False, group='SECURITYGROUP')
+        self.agent.init_firewall()
+        self.agent.firewall = self.firewall
+        self.assertFalse(self.agent.use_enhanced_rpc)
+        self.assertFalse(self.rpc.security_group_info_for_devices.called)
+
+    def test_prepare_devices_filter(self):
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.firewall.assert_has_calls(
+            [mock.call.update_security_group_rules('fake_sgid1',
+                                                   self.fake_sg_rules),
+             mock.call.update_security_group_members('fake_sgid2',
+                                                     self.fake_member_ips),
+             mock.call.defer_apply(),
+             mock.call.prepare_port_filter(self.fake_device)])
+        self.assertFalse(self.rpc.security_group_rules_for_devices.called)
+
+    def test_refresh_firewall(self):
+        self.agent.refresh_firewall()
+        self.firewall.assert_has_calls(
+            [mock.call.update_security_group_rules('fake_sgid1',
+                                                   self.fake_sg_rules),
+             mock.call.update_security_group_members('fake_sgid2',
+                                                     self.fake_member_ips),
+             mock.call.defer_apply(),
+             mock.call.update_port_filter(self.fake_device)])
+
+    def test_refresh_firewall_unchanged_rules(self):
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.agent.refresh_firewall()
+        self.assertFalse(self.firewall.update_port_filter.called)
+
+    def test_refresh_firewall_updated_rules(self):
+        self.agent.prepare_devices_filter(['fake_device'])
+        updated_sg_rules = self.fake_sg_rules + [
+            {'security_group_id': 'fake_sgid1', 'protocol': 'tcp'}]
+        self.rpc.security_group_info_for_devices.return_value[
+            'security_groups'] = {'fake_sgid1': updated_sg_rules}
+        self.agent.refresh_firewall()
+        self.firewall.update_port_filter.assert_called_once_with(
+            self.fake_device)
+
+    def test_security_groups_member_updated(self):
+        self.agent.refresh_firewall = mock.Mock()
+        self.agent.security_groups_member_updated(['fake_sgid2',
+                                                   'fake_sgid3'])
+        self.rpc.security_group_member_ips_delta.assert_called_with(
+            None, security_groups={'fake_sgid2': None})
+        self.firewall.update_security_group_members.assert_called_once_with(
+            'fake_sgid2', self.fake_member_ips)
+        self.assertEqual('fake_version1',
+                         self.agent.sg_member_versions['fake_sgid2'])
+        self.assertFalse(self.agent.refresh_firewall.called)
+        self.assertFalse(self.firewall.update_port_filter.called)
+
+    def test_refresh_security_group_members_applies_delta(self):
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.firewall.reset_mock()
+        self.rpc.security_group_member_ips_delta.return_value = {
+            'fake_sgid2': {'version': 'fake_version2',
+                           'added': {const.IPv4: ['10.0.0.2'],
+                                     const.IPv6: ['fe80::2']},
+                           'removed': {const.IPv4: ['10.0.0.1'],
+                                       const.IPv6: []}}}
+        self.agent.refresh_security_group_members(['fake_sgid2'])
+        self.rpc.security_group_member_ips_delta.assert_called_with(
+            None, security_groups={'fake_sgid2': 'fake_version1'})
+        self.firewall.update_security_group_members.assert_called_once_with(
+            'fake_sgid2', {const.IPv4: ['10.0.0.2'],
+                           const.IPv6: ['fe80::2']})
+        self.assertEqual('fake_version2',
+                         self.agent.sg_member_versions['fake_sgid2'])
+
+    def test_refresh_security_group_members_same_version(self):
+        self.agent.prepare_devices_filter(['fake_device'])
+        self.firewall.reset_mock()
+        self.rpc.security_group_member_ips_delta.return_value = {
+            'fake_sgid2': {'version': 'fake_version1',
+                           'added': {const.IPv4: [], const.IPv6: []},
+                           'removed': {const.IPv4: [], const.IPv6: []}}}
+        self.agent.refresh_security_group_members(['fake_sgid2'])
+        self.assertFalse(self.firewall.update_security_group_members.called)
+
+    def test_refresh_security_group_members_not_supported(self):
+        self.rpc.security_group_member_ips_delta.side_effect = (
+            n_rpc.RemoteError(exc_type='NoSuchMethod'))
+        self.agent.refresh_security_group_members(['fake_sgid2'])
+        self.assertFalse(self.agent.use_member_delta_rpc)
+        self.rpc.security_group_info_for_devices.assert_called_with(
+            None, ['fake_device'])
+        self.firewall.update_security_group_members.assert_called_once_with(
+            'fake_sgid2', self.fake_member_ips)
+
+    def test_security_groups_member_not_updated(self):
+        self.agent.security_groups_member_updated(['fake_sgid3'])
+        self.assertFalse(self.firewall.update_security_group_members.called)
+
+
+class SecurityGroupAgentEnhancedRpcWithDeferredRefreshTestCase(
+    SecurityGroupAgentEnhancedRpcTestCase):
+
+    def setUp(self):
+        super(SecurityGroupAgentEnhancedRpcWithDeferredRefreshTestCase,
+              self).setUp(defer_refresh_firewall=True)
+
+    def test_security_groups_member_updated(self):
+        self.agent.security_groups_member_updated(['fake_sgid2',
+                                                   'fake_sgid3'])
+        self.assertEqual(set(['fake_sgid2']),
+                         self.agent.sg_members_to_refresh)
+        self.assertTrue(self.agent.firewall_refresh_needed())
+        self.assertFalse(self.firewall.update_security_group_members.called)
+
+    def test_setup_port_filters_sg_member_updates_only(self):
+        self.agent.sg_members_to_refresh = set(['fake_sgid2'])
+        self.agent.refresh_firewall = mock.Mock()
+        self.agent.setup_port_filters(set(), set())
+        self.firewall.update_security_group_members.assert_called_once_with(
+            'fake_sgid2', self.fake_member_ips)
+        self.assertFalse(self.agent.refresh_firewall.called)
+        self.assertFalse(self.agent.sg_members_to_refresh)
+
+
 class SecurityGroupAgentRpcWithDeferredRefreshTestCase(
     SecurityGroupAgentRpcTestCase):
 
@@ -1187,6 +1568,28 @@ class SecurityGroupServerRpcApiTestCase(base.BaseTestCase):
              version=sg_rpc.SG_RPC_VERSION,
              topic='fake_topic')])
 
+    def test_security_group_info_for_devices(self):
+        self.rpc.security_group_info_for_devices(None, ['fake_device'])
+        self.rpc.call.assert_has_calls(
+            [mock.call(None,
+             {'args':
+                 {'devices': ['fake_device']},
+              'method': 'security_group_info_for_devices',
+              'namespace': None},
+             version=sg_rpc.SG_INFO_RPC_VERSION,
+             topic='fake_topic')])
+
+    def test_security_group_member_ips_delta(self):
+        self.rpc.security_group_member_ips_delta(None, {'fake_sgid': None})
+        self.rpc.call.assert_has_calls(
+            [mock.call(None,
+             {'args':
+                 {'security_groups': {'fake_sgid': None}},
+              'method': 'security_group_member_ips_delta',
+              'namespace': None},
+             version=sg_rpc.SG_MEMBER_IPS_RPC_VERSION,
+             topic='fake_topic')])
+
 
 class FakeSGNotifierAPI(n_rpc.RpcProxy,
                         sg_rpc.SecurityGroupAgentRpcApiMixin):
@@ -1822,6 +2225,8 @@ class TestSecurityGroupAgentWithIptables(base.BaseTestCase):
         self.agent.init_firewall(defer_refresh_firewall=defer_refresh_firewall)
 
         self.iptables = self.agent.firewall.iptables
+        # These tests check the full content of the tables on each apply
+        self.iptables.incremental_apply = False
         self.iptables_execute = mock.patch.object(self.iptables,
                                                   "execute").start()
         self.iptables_execute_return_values = []
@@ -2040,6 +2445,27 @@ class SGNotificationTestMixin():
                         [mock.call.security_groups_member_updated(
                             mock.ANY, [mock.ANY])])
 
+    def _get_member_revision(self, security_group_id):
+        ctx = context.get_admin_context()
+        sg = ctx.session.query(sg_db.SecurityGroup).filter_by(
+            id=security_group_id).one()
+        return sg.member_revision
+
+    def test_security_group_member_revision_bumped(self):
+        with self.network() as n:
+            with self.subnet(n):
+                with self.security_group() as sg:
+                    security_group_id = sg['security_group']['id']
+                    res = self._create_port(
+                        self.fmt, n['network']['id'],
+                        security_groups=[security_group_id])
+                    port = self.deserialize(self.fmt, res)
+                    self.assertEqual(
+                        1, self._get_member_revision(security_group_id))
+                    self._delete('ports', port['port']['id'])
+                    self.assertEqual(
+                        2, self._get_member_revision(security_group_id))
+
 
 class TestSecurityGroupAgentWithOVSIptables(
         TestSecurityGroupAgentWithIptables):
@@ -0,0 +1,149 @@
+# Copyright (c) 2014 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark the DHCP schedulers with many networks and fake agents.
+
+Networks are scheduled one by one to fake DHCP agents by each scheduler,
+then all of them are auto-scheduled to a restarting agent, and the time
+taken and the spread of the networks between the agents are reported:
+
+    python tools/dhcp_scheduler_benchmark.py --networks 10000 --agents 50
+
+The database is wiped before each run, so do not point it at a real Neutron
+database.
+"""
+
+import argparse
+import time
+
+from oslo.config import cfg
+from sqlalchemy import func
+
+from neutron.common import config  # noqa
+from neutron.common import constants
+from neutron.common import topics
+from neutron import context
+from neutron.db import agents_db
+from neutron.db import agentschedulers_db
+from neutron.db import api as db
+from neutron.db import common_db_mixin
+from neutron.db import models_v2
+from neutron.openstack.common import timeutils
+from neutron.openstack.common import uuidutils
+from neutron.scheduler import dhcp_agent_scheduler
+
+
+SCHEDULERS = [dhcp_agent_scheduler.ChanceScheduler,
+              dhcp_agent_scheduler.WeightScheduler]
+
+
+class _Plugin(common_db_mixin.CommonDbMixin,
+              agentschedulers_db.DhcpAgentSchedulerDbMixin):
+
+    def get_subnets(self, context, filters=None, fields=None):
+        query = context.session.query(models_v2.Subnet.network_id,
+                                      models_v2.Subnet.enable_dhcp)
+        return [{'network_id': network_id, 'enable_dhcp': enable_dhcp}
+                for network_id, enable_dhcp in query]
+
+
+def _create_agents(ctx, count):
+    now = timeutils.utcnow()
+    with ctx.session.begin(subtransactions=True):
+        for i in range(count):
+            ctx.session.add(agents_db.Agent(
+                binary='neutron-dhcp-agent',
+                host='host-%d' % i,
+                topic=topics.DHCP_AGENT,
+                configurations='{}',
+                agent_type=constants.AGENT_TYPE_DHCP,
+                admin_state_up=True,
+                created_at=now,
+                started_at=now,
+                heartbeat_timestamp=now))
+
+
+def _create_networks(ctx, count):
+    network_ids = [uuidutils.generate_uuid() for i in range(count)]
+    with ctx.session.begin(subtransactions=True):
+        ctx.session.execute(models_v2.Network.__table__.insert(),
+                            [{'id': network_id, 'admin_state_up': True}
+                             for network_id in network_ids])
+        ctx.session.execute(models_v2.Subnet.__table__.insert(),
+                            [{'id': uuidutils.generate_uuid(),
+                              'network_id': network_id,
+                              'ip_version': 4,
+                              'cidr': '10.0.0.0/24',
+                              'enable_dhcp': True}
+                             for network_id in network_ids])
+    return network_ids
+
+
+def _report(name, ctx, elapsed, count):
+    binding = agentschedulers_db.NetworkDhcpAgentBinding
+    networks = dict((agent_id, 0) for agent_id,
+                    in ctx.session.query(agents_db.Agent.id))
+    networks.update(ctx.session.query(
+        binding.dhcp_agent_id,
+        func.count(binding.network_id)).group_by(binding.dhcp_agent_id))
+    print('%-16s %6d networks in %7.2fs (%8.1f networks/s), networks per '
+          'agent min %5d max %5d' % (
+              name, count, elapsed, count / elapsed,
+              min(networks.values()), max(networks.values())))
+
+
+def run(scheduler_class, args):
+    db.clear_db()
+    db.configure_db()
+    plugin = _Plugin()
+    scheduler = scheduler_class()
+    ctx = context.get_admin_context()
+    _create_agents(ctx, args.agents)
+    network_ids = _create_networks(ctx, args.networks)
+
+    start = time.time()
+    for network_id in network_ids:
+        scheduler.schedule(plugin, ctx, {'id': network_id})
+    _report(scheduler_class.__name__, ctx, time.time() - start,
+            len(network_ids))
+
+    # an agent restarting with the networks of a dead agent to host
+    ctx.session.query(agentschedulers_db.NetworkDhcpAgentBinding).delete()
+    start = time.time()
+    scheduler.auto_schedule_networks(plugin, ctx, 'host-0')
+    _report('auto-schedule', ctx, time.time() - start, len(network_ids))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--connection',
+                        default='sqlite:////tmp/dhcp_scheduler.sqlite',
+                        help='SQLAlchemy URL of a scratch database')
+    parser.add_argument('--networks', type=int, default=10000,
+                        help='number of networks to schedule')
+    parser.add_argument('--agents', type=int, default=50,
+                        help='number of fake DHCP agents')
+    args = parser.parse_args()
+
+    cfg.CONF(args=[], project='neutron')
+    cfg.CONF.set_override('connection', args.connection, 'database')
+    # The fake agents never report, keep them alive during the benchmark
+    cfg.CONF.set_override('agent_down_time', 24 * 3600)
+    for scheduler_class in SCHEDULERS:
+        run(scheduler_class, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+# Copyright (c) 2014 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark the L3 schedulers with many routers and fake agents.
+
+Routers are scheduled by batches to fake L3 agents by each scheduler, as
+done when the agents are notified of router updates, then all of them are
+auto-scheduled to an L3 agent added to the cloud, and the time taken and
+the spread of the routers between the agents are reported:
+
+    python tools/l3_scheduler_benchmark.py --routers 5000 --agents 10
+
+The database is wiped before each run, so do not point it at a real Neutron
+database.
+"""
+
+import argparse
+import time
+
+from oslo.config import cfg
+from sqlalchemy import func
+
+from neutron.common import config  # noqa
+from neutron.common import constants
+from neutron.common import topics
+from neutron import context
+from neutron.db import agents_db
+from neutron.db import api as db
+from neutron.db import common_db_mixin
+from neutron.db import l3_agentschedulers_db
+from neutron.db import l3_db
+from neutron.openstack.common import timeutils
+from neutron.openstack.common import uuidutils
+from neutron.scheduler import l3_agent_scheduler
+
+
+SCHEDULERS = [l3_agent_scheduler.ChanceScheduler,
+              l3_agent_scheduler.LeastRoutersScheduler]
+
+
+class _Plugin(common_db_mixin.CommonDbMixin,
+              l3_db.L3_NAT_db_mixin,
+              l3_agentschedulers_db.L3AgentSchedulerDbMixin):
+    pass
+
+
+def _create_agents(ctx, hosts):
+    now = timeutils.utcnow()
+    with ctx.session.begin(subtransactions=True):
+        for host in hosts:
+            ctx.session.add(agents_db.Agent(
+                binary='neutron-l3-agent',
+                host=host,
+                topic=topics.L3_AGENT,
+                configurations='{}',
+                agent_type=constants.AGENT_TYPE_L3,
+                admin_state_up=True,
+                created_at=now,
+                started_at=now,
+                heartbeat_timestamp=now))
+
+
+def _create_routers(ctx, count):
+    router_ids = [uuidutils.generate_uuid() for i in range(count)]
+    with ctx.session.begin(subtransactions=True):
+        ctx.session.execute(l3_db.Router.__table__.insert(),
+                            [{'id': router_id,
+                              'name': '',
+                              'status': constants.NET_STATUS_ACTIVE,
+                              'admin_state_up': True}
+                             for router_id in router_ids])
+    return router_ids
+
+
+def _report(name, ctx, elapsed, count):
+    binding = l3_agentschedulers_db.RouterL3AgentBinding
+    routers = dict((agent_id, 0) for agent_id,
+                   in ctx.session.query(agents_db.Agent.id))
+    routers.update(ctx.session.query(
+        binding.l3_agent_id,
+        func.count(binding.router_id)).group_by(binding.l3_agent_id))
+    print('%-22s %6d routers in %7.2fs (%8.1f routers/s), routers per '
+          'agent min %5d max %5d' % (
+              name, count, elapsed, count / elapsed,
+              min(routers.values()), max(routers.values())))
+
+
+def run(scheduler_class, args):
+    db.clear_db()
+    db.configure_db()
+    plugin = _Plugin()
+    plugin.router_scheduler = scheduler_class()
+    ctx = context.get_admin_context()
+    _create_agents(ctx, ['host-%d' % i for i in range(args.agents)])
+    router_ids = _create_routers(ctx, args.routers)
+
+    start = time.time()
+    for i in range(0, len(router_ids), args.batch_size):
+        plugin.schedule_routers(ctx, router_ids[i:i + args.batch_size])
+    _report(scheduler_class.__name__, ctx, time.time() - start,
+            len(router_ids))
+
+    # the routers of dead agents are picked up by a new agent
+    ctx.session.query(l3_agentschedulers_db.RouterL3AgentBinding).delete()
+    _create_agents(ctx, ['new-host'])
+    start = time.time()
+    plugin.auto_schedule_routers(ctx, 'new-host', None)
+    _report('auto-schedule', ctx, time.time() - start, len(router_ids))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--connection',
+                        default='sqlite:////tmp/l3_scheduler.sqlite',
+                        help='SQLAlchemy URL of a scratch database')
+    parser.add_argument('--routers', type=int, default=5000,
+                        help='number of routers to schedule')
+    parser.add_argument('--agents', type=int, default=10,
+                        help='number of fake L3 agents')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='number of routers scheduled together')
+    args = parser.parse_args()
+
+    cfg.CONF(args=[], project='neutron')
+    cfg.CONF.set_override('connection', args.connection, 'database')
+    # The fake agents never report, keep them alive during the benchmark
+    cfg.CONF.set_override('agent_down_time', 24 * 3600)
+    for scheduler_class in SCHEDULERS:
+        run(scheduler_class, args)
+
+
+if __name__ == '__main__':
+    main()
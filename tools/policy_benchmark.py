@@ -0,0 +1,121 @@
+# Copyright (c) 2014 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark listing ports through the API as admin and as a tenant.
+
+Ports are created on a network of a tenant, then GET /v2.0/ports is served
+by the API router of the core plugin for an admin context and for the
+tenant, so that policy checks are run on every port:
+
+    python tools/policy_benchmark.py --ports 5000 \\
+        --policy-file etc/policy.json
+
+The database is wiped first, so do not point it at a real Neutron database.
+"""
+
+import argparse
+import os
+import time
+
+from oslo.config import cfg
+from oslo import messaging
+import webob
+
+from neutron.api.v2 import attributes
+from neutron.api.v2 import router
+from neutron.common import config  # noqa
+from neutron.common import rpc as n_rpc
+from neutron import context
+from neutron.db import api as db
+from neutron import manager
+from neutron import policy
+
+
+TENANT_ID = 'policy-benchmark'
+
+
+def _create_ports(plugin, ctx, count):
+    network = plugin.create_network(ctx, {'network': {
+        'name': 'policy-benchmark',
+        'admin_state_up': True,
+        'shared': False,
+        'tenant_id': TENANT_ID}})
+    port = {'network_id': network['id'],
+            'name': '',
+            'admin_state_up': True,
+            'device_id': '',
+            'device_owner': '',
+            'mac_address': attributes.ATTR_NOT_SPECIFIED,
+            'fixed_ips': [],
+            'tenant_id': TENANT_ID}
+    plugin.create_port_bulk(ctx, {'ports': [{'port': dict(port)}
+                                            for i in range(count)]})
+
+
+def run(api, name, ctx, args):
+    timings = []
+    for i in range(args.requests):
+        request = webob.Request.blank('/ports.json')
+        request.environ['neutron.context'] = ctx
+        start = time.time()
+        response = request.get_response(api)
+        timings.append(time.time() - start)
+        if response.status_int != 200:
+            raise Exception(response.body)
+    timings.sort()
+    print('%-6s %6d ports, %3d requests, mean %8.2fms, median %8.2fms, '
+          'max %8.2fms' % (name, args.ports, args.requests,
+                           sum(timings) * 1000 / len(timings),
+                           timings[len(timings) // 2] * 1000,
+                           timings[-1] * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--connection', default='sqlite://',
+                        help='SQLAlchemy URL of a scratch database')
+    parser.add_argument('--policy-file', default='etc/policy.json',
+                        help='policy file the requests are checked against')
+    parser.add_argument('--ports', type=int, default=1000,
+                        help='number of ports listed by each request')
+    parser.add_argument('--requests', type=int, default=10,
+                        help='number of requests per context')
+    args = parser.parse_args()
+
+    cfg.CONF(args=[], project='neutron')
+    cfg.CONF.set_override('connection', args.connection, 'database')
+    cfg.CONF.set_override('policy_file',
+                          os.path.abspath(args.policy_file))
+    cfg.CONF.set_override('core_plugin',
+                          'neutron.db.db_base_plugin_v2.NeutronDbPluginV2')
+    cfg.CONF.set_override('notify_nova_on_port_status_changes', False)
+    cfg.CONF.set_override('notify_nova_on_port_data_changes', False)
+    # The transport options are registered when a transport is loaded
+    messaging.get_transport(cfg.CONF, url='fake:/').cleanup()
+    cfg.CONF.set_override('rpc_backend', 'fake')
+    n_rpc.init(cfg.CONF)
+    db.clear_db()
+    db.configure_db()
+    api = router.APIRouter()
+    plugin = manager.NeutronManager.get_plugin()
+    _create_ports(plugin, context.get_admin_context(), args.ports)
+
+    policy.init()
+    run(api, 'admin', context.get_admin_context(), args)
+    run(api, 'tenant', context.Context('user', TENANT_ID), args)
+
+
+if __name__ == '__main__':
+    main()
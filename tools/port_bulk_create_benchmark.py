@@ -0,0 +1,139 @@
+# Copyright (c) 2014 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark bulk port creation with the ML2 plugin.
+
+Batches of ports are created on a /16 network with the native ML2 bulk
+create, then with one create_port call per port as done when the API
+emulates bulk requests, and the throughput is reported per batch size:
+
+    python tools/port_bulk_create_benchmark.py \\
+        --connection sqlite:////tmp/port_bulk.sqlite --batch-size 1 \\
+        --batch-size 10 --batch-size 100 --batch-size 1000
+
+No mechanism driver is loaded and RPC notifications go to the fake driver,
+so the figures measure the database and plugin code. The database is wiped
+before each run, so do not point it at a real Neutron database.
+"""
+
+import argparse
+import time
+
+from oslo.config import cfg
+from oslo import messaging
+
+from neutron.api.v2 import attributes
+from neutron.common import config  # noqa
+from neutron.common import rpc as n_rpc
+from neutron import context
+from neutron.db import api as db
+from neutron.plugins.ml2 import plugin as ml2_plugin
+
+
+BATCH_SIZES = [1, 10, 100, 1000]
+TENANT_ID = 'port-bulk-benchmark'
+
+
+def _create_network(plugin, ctx, cidr):
+    network = plugin.create_network(ctx, {'network': {
+        'name': 'port-bulk-benchmark',
+        'admin_state_up': True,
+        'shared': False,
+        'tenant_id': TENANT_ID}})
+    plugin.create_subnet(ctx, {'subnet': {
+        'network_id': network['id'],
+        'name': '',
+        'cidr': cidr,
+        'ip_version': 4,
+        'enable_dhcp': False,
+        'gateway_ip': attributes.ATTR_NOT_SPECIFIED,
+        'allocation_pools': attributes.ATTR_NOT_SPECIFIED,
+        'dns_nameservers': attributes.ATTR_NOT_SPECIFIED,
+        'host_routes': attributes.ATTR_NOT_SPECIFIED,
+        'ipv6_ra_mode': attributes.ATTR_NOT_SPECIFIED,
+        'ipv6_address_mode': attributes.ATTR_NOT_SPECIFIED,
+        'tenant_id': TENANT_ID}})
+    return network['id']
+
+
+def _port(network_id):
+    return {'port': {'network_id': network_id,
+                     'name': '',
+                     'admin_state_up': True,
+                     'device_id': '',
+                     'device_owner': '',
+                     'mac_address': attributes.ATTR_NOT_SPECIFIED,
+                     'fixed_ips': attributes.ATTR_NOT_SPECIFIED,
+                     'tenant_id': TENANT_ID}}
+
+
+def _create_ports_bulk(plugin, ctx, network_id, batch_size):
+    plugin.create_port_bulk(ctx, {'ports': [_port(network_id)
+                                            for i in range(batch_size)]})
+
+
+def _create_ports_one_by_one(plugin, ctx, network_id, batch_size):
+    for i in range(batch_size):
+        plugin.create_port(ctx, _port(network_id))
+
+
+def run(method, batch_size, args):
+    db.clear_db()
+    db.configure_db()
+    plugin = ml2_plugin.Ml2Plugin()
+    ctx = context.get_admin_context()
+    network_id = _create_network(plugin, ctx, args.cidr)
+
+    created = 0
+    start = time.time()
+    for i in range(args.batches):
+        method(plugin, ctx, network_id, batch_size)
+        created += batch_size
+    elapsed = time.time() - start
+    print('%-10s batch size %5d: %6d ports in %7.2fs (%8.1f ports/s)' % (
+        method is _create_ports_bulk and 'bulk' or 'one-by-one',
+        batch_size, created, elapsed, created / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--connection',
+                        default='sqlite:////tmp/port_bulk.sqlite',
+                        help='SQLAlchemy URL of a scratch database')
+    parser.add_argument('--batch-size', type=int, action='append',
+                        help='number of ports created by each request, may '
+                             'be repeated (default: %s)' % BATCH_SIZES)
+    parser.add_argument('--batches', type=int, default=3,
+                        help='number of requests per batch size')
+    parser.add_argument('--cidr', default='10.0.0.0/16',
+                        help='CIDR of the subnet ports are created on')
+    args = parser.parse_args()
+
+    cfg.CONF(args=[], project='neutron')
+    cfg.CONF.set_override('connection', args.connection, 'database')
+    # The transport options are registered when a transport is loaded
+    messaging.get_transport(cfg.CONF, url='fake:/').cleanup()
+    cfg.CONF.set_override('rpc_backend', 'fake')
+    cfg.CONF.set_override('notify_nova_on_port_status_changes', False)
+    cfg.CONF.set_override('notify_nova_on_port_data_changes', False)
+    cfg.CONF.set_override('mechanism_drivers', [], 'ml2')
+    n_rpc.init(cfg.CONF)
+    for batch_size in args.batch_size or BATCH_SIZES:
+        for method in (_create_ports_bulk, _create_ports_one_by_one):
+            run(method, batch_size, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# Copyright (c) 2014 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the latency of commands run through rootwrap and its daemon.
+
+The same command is run through neutron.agent.linux.utils.execute with
+the root helper spawned for each call, then with the rootwrap daemon:
+
+    python tools/rootwrap_daemon_benchmark.py \\
+        --root-helper 'sudo neutron-rootwrap /etc/neutron/rootwrap.conf' \\
+        --root-helper-daemon \\
+            'sudo neutron-rootwrap-daemon /etc/neutron/rootwrap.conf' \\
+        --count 200 ip link show lo
+
+The command must be allowed by the filters of the rootwrap configuration.
+"""
+
+import argparse
+import time
+
+import eventlet
+eventlet.monkey_patch()
+
+from oslo.config import cfg
+
+from neutron.agent.common import config
+from neutron.agent.linux import utils
+
+
+def run(args, root_helper_daemon):
+    cfg.CONF.set_override('root_helper_daemon', root_helper_daemon, 'AGENT')
+    # The first call spawns the daemon, do not account for it
+    utils.execute(args.command, root_helper=args.root_helper)
+    timings = []
+    for i in range(args.count):
+        start = time.time()
+        utils.execute(args.command, root_helper=args.root_helper)
+        timings.append(time.time() - start)
+    timings.sort()
+    print('%-8s %6d calls, mean %8.2fms, median %8.2fms, max %8.2fms' % (
+        root_helper_daemon and 'daemon' or 'rootwrap', args.count,
+        sum(timings) * 1000 / len(timings),
+        timings[len(timings) // 2] * 1000, timings[-1] * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--root-helper',
+                        default='sudo neutron-rootwrap '
+                                '/etc/neutron/rootwrap.conf',
+                        help='root helper spawned for each command')
+    parser.add_argument('--root-helper-daemon',
+                        default='sudo neutron-rootwrap-daemon '
+                                '/etc/neutron/rootwrap.conf',
+                        help='command starting the rootwrap daemon')
+    parser.add_argument('--count', type=int, default=100,
+                        help='number of times the command is run')
+    parser.add_argument('command', nargs='+',
+                        help='command to run as root')
+    args = parser.parse_args()
+
+    config.register_root_helper(cfg.CONF)
+    cfg.CONF(args=[], project='neutron')
+    run(args, None)
+    run(args, args.root_helper_daemon)
+
+
+if __name__ == '__main__':
+    main()